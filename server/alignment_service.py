@@ -12,6 +12,10 @@ import os
 import argparse
 from typing import List, Dict, Any, Optional
 
+from segment_table import SegmentTable
+from transcript_index import IntervalTree
+from tracing import span, add_trace_arguments, start_tracing, finish_tracing
+
 def parse_time(time_str):
     """解析时间字符串为秒数"""
     if isinstance(time_str, (int, float)):
@@ -84,28 +88,8 @@ def merge_adjacent_segments(segments, max_gap=2.0):
     if not segments:
         return segments
 
-    merged = []
-    current = segments[0].copy()
-
-    for next_seg in segments[1:]:
-        # 检查是否是同一说话人且时间间隔较小
-        gap = parse_time(next_seg["start"]) - parse_time(current["end"])
-
-        if (current["speaker"] == next_seg["speaker"] and
-            gap <= max_gap):
-            # 合并片段
-            current["end"] = next_seg["end"]
-            current["text"] += " " + next_seg["text"]
-            current["duration"] = parse_time(current["end"]) - parse_time(current["start"])
-        else:
-            # 保存当前片段，开始新片段
-            merged.append(current)
-            current = next_seg.copy()
-
-    # 添加最后一个片段
-    merged.append(current)
-
-    return merged
+    merged = SegmentTable.from_segments(segments, keep_extra=True).merge_adjacent(max_gap)
+    return merged.to_segments(formatter=format_timestamp)
 
 def align_asr_with_diarization(asr_segments, diarization_segments,
                                overlap_threshold=0.5, merge_gap=2.0):
@@ -126,9 +110,20 @@ def align_asr_with_diarization(asr_segments, diarization_segments,
     aligned_segments = []
     unmatched_count = 0
 
+    # 说话人片段建区间树，每个文本片段只检查与之重叠的候选
+    speaker_tree = IntervalTree(
+        [parse_time(seg["start"]) for seg in diarization_segments],
+        [parse_time(seg["end"]) for seg in diarization_segments]
+    )
+
     for i, text_seg in enumerate(asr_segments):
         # 为每个文本片段找到对应的说话人
-        speaker = find_overlapping_speaker(text_seg, diarization_segments, overlap_threshold)
+        candidates = speaker_tree.overlap(parse_time(text_seg["start"]), parse_time(text_seg["end"]))
+        speaker = find_overlapping_speaker(
+            text_seg,
+            [diarization_segments[j] for j in sorted(candidates)],
+            overlap_threshold
+        )
 
         # 创建对齐片段
         aligned_segment = {
@@ -153,7 +148,8 @@ def align_asr_with_diarization(asr_segments, diarization_segments,
     if merge_gap > 0:
         print(f"🔄 合并相邻片段 (最大间隔: {merge_gap}秒)", file=sys.stderr)
         original_count = len(aligned_segments)
-        aligned_segments = merge_adjacent_segments(aligned_segments, merge_gap)
+        with span("merge"):
+            aligned_segments = merge_adjacent_segments(aligned_segments, merge_gap)
         merged_count = original_count - len(aligned_segments)
         print(f"✅ 合并完成: 减少了 {merged_count} 个片段", file=sys.stderr)
 
@@ -171,25 +167,10 @@ def load_json_file(filepath):
 def save_aligned_results(aligned_segments, speakers, output_file, audio_file=""):
     """保存对齐结果"""
     try:
-        # 统计说话人信息
-        speaker_stats = {}
-        total_duration = 0
-
-        for seg in aligned_segments:
-            speaker = seg["speaker"]
-            duration = seg["duration"]
-
-            if speaker not in speaker_stats:
-                speaker_stats[speaker] = {
-                    "segments": 0,
-                    "duration": 0,
-                    "words": 0
-                }
-
-            speaker_stats[speaker]["segments"] += 1
-            speaker_stats[speaker]["duration"] += duration
-            speaker_stats[speaker]["words"] += len(seg["text"].split())
-            total_duration += duration
+        # 统计说话人信息（列式向量化统计）
+        table = SegmentTable.from_segments(aligned_segments)
+        speaker_stats = table.speaker_totals()
+        total_duration = float(table.durations.sum())
 
         result = {
             "success": True,
@@ -204,14 +185,14 @@ def save_aligned_results(aligned_segments, speakers, output_file, audio_file="")
             }
         }
 
-        with open(output_file, 'w', encoding='utf-8') as f:
+        with span("file_write"), open(output_file, 'w', encoding='utf-8') as f:
             json.dump(result, f, ensure_ascii=False, indent=2)
 
         print(f"💾 保存对齐结果: {output_file}", file=sys.stderr)
 
         # 生成可视化Markdown
         md_file = output_file.replace('.json', '.md')
-        with open(md_file, 'w', encoding='utf-8') as f:
+        with span("file_write"), open(md_file, 'w', encoding='utf-8') as f:
             f.write(f"# 对齐转录结果\n\n")
             f.write(f"**音频文件**: {audio_file}  \n")
             f.write(f"**说话人数量**: {len(speaker_stats)}  \n")
@@ -251,8 +232,10 @@ def main():
                       help='重叠阈值 (默认: 0.5)')
     parser.add_argument('--merge-gap', type=float, default=2.0,
                       help='合并间隔（秒，默认: 2.0）')
+    add_trace_arguments(parser)
 
     args = parser.parse_args()
+    start_tracing(args)
 
     # 加载ASR结果
     asr_data = load_json_file(args.asr_file)
@@ -273,12 +256,13 @@ def main():
         sys.exit(1)
 
     # 执行对齐
-    aligned_segments = align_asr_with_diarization(
-        asr_data["segments"],
-        diarization_data["segments"],
-        args.overlap_threshold,
-        args.merge_gap
-    )
+    with span("alignment"):
+        aligned_segments = align_asr_with_diarization(
+            asr_data["segments"],
+            diarization_data["segments"],
+            args.overlap_threshold,
+            args.merge_gap
+        )
 
     # 保存结果
     audio_file = asr_data.get("audio_file", "") or diarization_data.get("audio_file", "")
@@ -290,6 +274,7 @@ def main():
     )
 
     if result:
+        finish_tracing(result, args)
         print(json.dumps(result, ensure_ascii=False))
         sys.exit(0)
     else:
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+本机 CPU 调优
+用一段校准音频测各引擎的线程数 / 并行 worker / 批大小组合，结果按主机保存为配置文件，
+各转录脚本启动时自动读取（没有配置时沿用原来的默认值）
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import platform
+import argparse
+import threading
+from datetime import datetime
+
+cache_dir = os.path.expanduser("~/.cache/podcast-transcriber")
+
+# whisper: whisper_transcribe / enhanced_whisper_transcribe 的 beam 5 解码；whisper-optimized: optimize_whisper 的 beam 1
+ENGINES = ("whisper", "whisper-optimized", "sensevoice", "pyannote")
+CALIBRATION_SECONDS = 60
+DEFAULT_BATCH_SIZES = (60, 100, 200, 300)
+
+_profile = None
+
+
+def host_info():
+    """主机标识：换了机器（或 CPU）后旧配置不再适用"""
+    model = platform.processor() or ""
+    physical = set()
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            physical_id = core_id = None
+            for line in f:
+                key, _, value = line.partition(":")
+                key, value = key.strip(), value.strip()
+                if key == "model name" and not model:
+                    model = value
+                elif key == "physical id":
+                    physical_id = value
+                elif key == "core id":
+                    core_id = value
+                elif not key and physical_id is not None:
+                    physical.add((physical_id, core_id))
+                    physical_id = core_id = None
+    except OSError:
+        pass
+    logical = os.cpu_count() or 1
+    return {
+        "hostname": socket.gethostname(),
+        "cpu_model": model,
+        "logical_cpus": logical,
+        "physical_cores": len(physical) or logical
+    }
+
+
+def default_profile_path():
+    return os.getenv("AUTOTUNE_PROFILE") or os.path.join(cache_dir, "autotune", f"{socket.gethostname()}.json")
+
+
+def load_profile(path=None):
+    """
+    读取本机调优配置（进程内只读一次）
+
+    返回:
+        配置 dict；没有配置、已禁用 (AUTOTUNE_DISABLE) 或 CPU 不匹配时为 {}
+    """
+    global _profile
+    if _profile is not None and path is None:
+        return _profile
+    profile = {}
+    path = path or default_profile_path()
+    if os.getenv("AUTOTUNE_DISABLE") != "true" and os.path.exists(path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                profile = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 调优配置读取失败: {e}", file=sys.stderr)
+            profile = {}
+        host = host_info()
+        saved = profile.get("host", {})
+        if profile and (saved.get("cpu_model"), saved.get("logical_cpus")) != (host["cpu_model"], host["logical_cpus"]):
+            print(f"⚠️ 调优配置来自不同的 CPU ({saved.get('cpu_model')}, {saved.get('logical_cpus')} 核)，已忽略，"
+                  f"请重新运行 autotune.py run", file=sys.stderr)
+            profile = {}
+    _profile = profile
+    return profile
+
+
+def engine_settings(engine):
+    """某个引擎 (whisper / whisper-optimized / sensevoice / pyannote) 的调优结果，没有时为 {}"""
+    return dict(load_profile().get("engines", {}).get(engine, {}))
+
+
+def whisper_model_kwargs(device="cpu", engine="whisper"):
+    """
+    WhisperModel 的 cpu_threads / num_workers（只对 CPU 推理生效，持有核租约时不超过租到的核数）
+
+    参数:
+        engine: "whisper"（beam 5 的脚本）或 "whisper-optimized"（optimize_whisper 的 beam 1），按各自的解码参数调优
+    """
+    from cpu_allocator import current_threads
+    settings = engine_settings(engine)
+    leased = current_threads()
+    if device == "cuda" or not (settings or leased):
+        return {}
+    if leased:
+        return {"cpu_threads": min(settings.get("cpu_threads") or leased, leased), "num_workers": 1}
+    return {"cpu_threads": settings["cpu_threads"], "num_workers": settings.get("num_workers", 1)}
+
+
+def apply_torch_threads(engine, device="cpu"):
+    """按调优结果设置 torch 的 intra-op 线程数，返回设置的值（未设置为 None）"""
+    from cpu_allocator import current_threads
+    threads = engine_settings(engine).get("torch_threads")
+    if not threads or str(device).startswith("cuda"):
+        return None
+    threads = min(threads, current_threads() or threads)
+    import torch
+    torch.set_num_threads(threads)
+    return threads
+
+
+def recommended_concurrency():
+    """同时跑几个 CPU 转录吞吐最高（调优时并行 worker 的最优值），没有配置时为 None"""
+    return engine_settings("whisper").get("concurrent", {}).get("num_workers")
+
+
+def thread_candidates(host=None):
+    """线程数候选：1、2 的幂、物理核数、逻辑核数"""
+    host = host or host_info()
+    logical, physical = host["logical_cpus"], host["physical_cores"]
+    candidates = {1, physical, logical}
+    n = 2
+    while n < logical:
+        candidates.add(n)
+        n *= 2
+    return sorted(candidates)
+
+
+def calibration_clip(path=None, duration=CALIBRATION_SECONDS):
+    """校准音频：指定文件，或生成一段确定性的合成对话"""
+    if path:
+        return path
+    from synthetic_audio import conversation, write_wav
+    clip = os.path.join(cache_dir, "autotune", f"calibration_{duration}s.wav")
+    if not os.path.exists(clip):
+        os.makedirs(os.path.dirname(clip), exist_ok=True)
+        samples, _ = conversation(duration, speakers=2, seed=42)
+        write_wav(clip, samples)
+    return clip
+
+
+def _best(results, key):
+    ok = [r for r in results if r.get(key)]
+    return max(ok, key=lambda r: r[key]) if ok else None
+
+
+def _decode_whisper(model, audio, options):
+    segments, _ = model.transcribe(audio, **options)
+    for _ in segments:
+        pass
+
+
+def tune_whisper(clip, audio_seconds, threads, workers, model="base", compute_type="int8", repeats=1,
+                 engine="whisper"):
+    """
+    CTranslate2 的 intra 线程数 × 并行 worker 网格：worker 数 = 同时解码的流数，
+    单流最快的线程数用于单个任务，总吞吐最高的组合作为并发建议
+
+    参数:
+        engine: "whisper" 用 whisper_transcribe 的解码参数 (beam 5)，"whisper-optimized" 用 optimize_whisper 的 (beam 1)
+    """
+    from faster_whisper import WhisperModel, decode_audio
+    if engine == "whisper-optimized":
+        from optimize_whisper import DECODE_OPTIONS
+    else:
+        from whisper_transcribe import DECODE_OPTIONS
+    options = dict(DECODE_OPTIONS)
+    audio = decode_audio(clip)
+    cpus = os.cpu_count() or 1
+    results = []
+    for num_workers in workers:
+        for cpu_threads in threads:
+            if cpu_threads * num_workers > cpus:
+                continue
+            print(f"🔧 {engine}: cpu_threads={cpu_threads}, num_workers={num_workers}", file=sys.stderr)
+            model_obj = WhisperModel(model, device="cpu", compute_type=compute_type,
+                                     cpu_threads=cpu_threads, num_workers=num_workers)
+            elapsed = None
+            for _ in range(repeats):
+                pool = [threading.Thread(target=_decode_whisper, args=(model_obj, audio, options))
+                        for _ in range(num_workers)]
+                start = time.perf_counter()
+                for t in pool:
+                    t.start()
+                for t in pool:
+                    t.join()
+                run = time.perf_counter() - start
+                elapsed = run if elapsed is None else min(elapsed, run)
+            del model_obj
+            results.append({
+                "cpu_threads": cpu_threads,
+                "num_workers": num_workers,
+                "elapsed_s": round(elapsed, 3),
+                "rtf": round(elapsed / audio_seconds, 4),
+                "throughput": round(num_workers * audio_seconds / elapsed, 3)
+            })
+    solo = _best([r for r in results if r["num_workers"] == 1], "throughput")
+    if solo is None:
+        return None
+    concurrent = _best(results, "throughput")
+    return {
+        "model": model,
+        "compute_type": compute_type,
+        "beam_size": options.get("beam_size"),
+        "cpu_threads": solo["cpu_threads"],
+        "num_workers": 1,
+        "rtf": solo["rtf"],
+        "concurrent": {k: concurrent[k] for k in ("cpu_threads", "num_workers", "throughput")},
+        "results": results
+    }
+
+
+def tune_sensevoice(clip, audio_seconds, threads, batch_sizes, repeats=1):
+    """torch 线程数 × batch_size_s 网格（模型只加载一次）"""
+    import torch
+    from sensevoice_transcribe import load_model
+    model, device = load_model()
+    if device != "cpu":
+        print(f"⚠️ SenseVoice 使用 {device}，CPU 调优跳过", file=sys.stderr)
+        return None
+    results = []
+    for torch_threads in threads:
+        torch.set_num_threads(torch_threads)
+        for batch_size_s in batch_sizes:
+            print(f"🔧 sensevoice: torch_threads={torch_threads}, batch_size_s={batch_size_s}", file=sys.stderr)
+            elapsed = None
+            for _ in range(repeats):
+                start = time.perf_counter()
+                model.generate(input=clip, cache={}, language="auto", use_itn=True, batch_size_s=batch_size_s,
+                               merge_vad=True, merge_length_s=15, pred_timestamp=True, disable_pbar=True)
+                run = time.perf_counter() - start
+                elapsed = run if elapsed is None else min(elapsed, run)
+            results.append({"torch_threads": torch_threads, "batch_size_s": batch_size_s,
+                            "elapsed_s": round(elapsed, 3), "rtf": round(elapsed / audio_seconds, 4),
+                            "throughput": round(audio_seconds / elapsed, 3)})
+    best = _best(results, "throughput")
+    return {"torch_threads": best["torch_threads"], "batch_size_s": best["batch_size_s"], "merge_length_s": 15,
+            "rtf": best["rtf"], "results": results}
+
+
+def tune_pyannote(clip, audio_seconds, threads, repeats=1):
+    """torch 线程数（只计 diarization 阶段，不含管道加载）"""
+    import torch
+    from pyannote_diarization import diarize_audio
+    from tracing import tracer
+    if torch.cuda.is_available():
+        print("⚠️ pyannote 使用 GPU，CPU 调优跳过", file=sys.stderr)
+        return None
+    results = []
+    for torch_threads in threads:
+        torch.set_num_threads(torch_threads)
+        print(f"🔧 pyannote: torch_threads={torch_threads}", file=sys.stderr)
+        elapsed = None
+        for _ in range(repeats):
+            before = tracer.stage_seconds("diarization")
+            result = diarize_audio(clip)
+            if not result.get("success"):
+                print(f"⚠️ pyannote 调优失败: {result.get('error')}", file=sys.stderr)
+                return None
+            run = tracer.stage_seconds("diarization") - before
+            elapsed = run if elapsed is None else min(elapsed, run)
+        results.append({"torch_threads": torch_threads, "elapsed_s": round(elapsed, 3),
+                        "rtf": round(elapsed / audio_seconds, 4), "throughput": round(audio_seconds / elapsed, 3)})
+    best = _best(results, "throughput")
+    return {"torch_threads": best["torch_threads"], "rtf": best["rtf"], "results": results}
+
+
+def run_autotune(engines=ENGINES, clip=None, duration=CALIBRATION_SECONDS, threads=None, workers=None,
+                 batch_sizes=DEFAULT_BATCH_SIZES, model="base", repeats=1, path=None):
+    """
+    依次调优各引擎并写入配置（已有配置中未重新调优的引擎保留）
+
+    返回:
+        新的配置 dict
+    """
+    from runtime_predictor import probe_duration
+    host = host_info()
+    threads = threads or thread_candidates(host)
+    workers = workers or [w for w in (1, 2, 4) if w <= host["logical_cpus"]]
+    clip = calibration_clip(clip, duration)
+    audio_seconds = probe_duration(clip) or duration
+    print(f"🧪 校准音频: {clip} ({audio_seconds:.0f}秒)，线程候选: {threads}", file=sys.stderr)
+
+    path = path or default_profile_path()
+    profile = load_profile(path) or {}
+    profile.update(host=host, created_at=datetime.now().isoformat(timespec="seconds"),
+                   calibration={"clip": clip, "audio_seconds": round(audio_seconds, 2)})
+    tuned = profile.setdefault("engines", {})
+    for engine in engines:
+        try:
+            if engine in ("whisper", "whisper-optimized"):
+                settings = tune_whisper(clip, audio_seconds, threads, workers, model=model, repeats=repeats,
+                                        engine=engine)
+            elif engine == "sensevoice":
+                settings = tune_sensevoice(clip, audio_seconds, threads, batch_sizes, repeats=repeats)
+            elif engine == "pyannote":
+                settings = tune_pyannote(clip, audio_seconds, threads, repeats=repeats)
+            else:
+                raise ValueError(f"未知引擎: {engine}")
+        except ImportError as e:
+            print(f"⚠️ {engine} 依赖未安装，跳过: {e}", file=sys.stderr)
+            continue
+        if settings:
+            tuned[engine] = settings
+            print(f"✅ {engine}: {json.dumps({k: v for k, v in settings.items() if k != 'results'}, ensure_ascii=False)}",
+                  file=sys.stderr)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(profile, f, ensure_ascii=False, indent=2)
+    print(f"📁 调优配置已保存: {path}", file=sys.stderr)
+    global _profile
+    _profile = None
+    return profile
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(",") if v.strip()] if value else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本机 CPU 调优（线程数 / 并行 worker / 批大小）')
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="运行调优并保存本机配置")
+    p.add_argument("--engines", default=",".join(ENGINES), help="要调优的引擎，逗号分隔 (默认: 全部)")
+    p.add_argument("--clip", help="校准音频 (默认生成合成对话)")
+    p.add_argument("--duration", type=int, default=CALIBRATION_SECONDS, help="合成校准音频时长（秒）")
+    p.add_argument("--threads", help="线程数候选，逗号分隔 (默认按 CPU 拓扑)")
+    p.add_argument("--workers", help="Whisper 并行 worker 候选，逗号分隔 (默认: 1,2,4)")
+    p.add_argument("--batch-sizes", default=",".join(map(str, DEFAULT_BATCH_SIZES)),
+                   help="SenseVoice batch_size_s 候选，逗号分隔")
+    p.add_argument("--model", default="base", help="Whisper 调优用的模型 (默认: base)")
+    p.add_argument("--repeats", type=int, default=1, help="每个组合的重复次数（取最快）")
+    p.add_argument("--profile", help="配置文件路径 (默认按主机名保存在缓存目录)")
+
+    p = sub.add_parser("show", help="查看本机配置")
+    p.add_argument("--profile", help="配置文件路径")
+
+    args = parser.parse_args()
+    if args.command == "show":
+        profile = load_profile(args.profile)
+        print(json.dumps({"path": args.profile or default_profile_path(), "host": host_info(), "profile": profile},
+                         ensure_ascii=False, indent=2))
+        return
+
+    profile = run_autotune(
+        engines=[e.strip() for e in args.engines.split(",") if e.strip()],
+        clip=args.clip, duration=args.duration,
+        threads=_int_list(args.threads), workers=_int_list(args.workers),
+        batch_sizes=_int_list(args.batch_sizes) or DEFAULT_BATCH_SIZES,
+        model=args.model, repeats=args.repeats, path=args.profile
+    )
+    print(json.dumps(profile, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+端到端引擎基准测试
+在固定语料上对比各 Whisper 脚本的解码配置、SenseVoice 以及组合说话人分离流程，
+输出冷启动、热态 RTF、首段延迟、峰值内存和分阶段耗时（JSON），并与基线比较标记性能回退
+"""
+
+import sys
+import os
+import json
+import time
+import socket
+import argparse
+import platform
+import importlib
+import statistics
+import multiprocessing
+from pathlib import Path
+
+from synthetic_audio import build_corpus
+from runtime_predictor import probe_duration
+from tracing import tracer, span
+from loop_guard import guarded_transcribe
+import feature_cache
+
+cache_dir = os.path.expanduser("~/.cache/podcast-transcriber")
+
+# 每个用例对应一个入口脚本的模型构造方式和解码参数
+CASES = {
+    "whisper": {"kind": "whisper", "module": "whisper_transcribe", "transcriber": "LocalWhisperTranscriber"},
+    "whisper-enhanced": {"kind": "whisper", "module": "enhanced_whisper_transcribe", "transcriber": "EnhancedWhisperTranscriber"},
+    "whisper-optimized": {"kind": "whisper", "module": "optimize_whisper", "transcriber": "OptimizedWhisperTranscriber"},
+    "sensevoice": {"kind": "sensevoice"},
+    "sensevoice-optimized": {"kind": "sensevoice-optimized"},
+    "combined": {"kind": "combined"},
+    # 不需要模型权重：压测编排和基准测试框架本身
+    "synthetic": {"kind": "engine", "engine": "synthetic"},
+}
+
+# 越小越好的指标，及判定回退时的绝对容差（避免噪声误报）
+REGRESSION_METRICS = {
+    "cold_start_s": 0.5,
+    "warm_rtf": 0.01,
+    "ttfs_s": 0.2,
+    "peak_rss_mb": 50.0,
+}
+
+
+def peak_rss_mb(children=False):
+    """当前进程（或已回收子进程）的峰值常驻内存，MB"""
+    import resource
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_whisper(case, clip, transcriber, module):
+    # 与入口脚本相同的解码路径（音频缓存、特征缓存、循环保护），各阶段耗时由 tracer 汇总
+    start = time.perf_counter()
+    with span("audio_decode"):
+        audio = feature_cache.load_audio(clip["path"], module.decode_audio)
+    with span("vad_language_detection"):
+        segments, info = guarded_transcribe(transcriber.model, audio, None, module.DECODE_OPTIONS)
+
+    first_segment = None
+    count = 0
+    with span("decoding"):
+        for _ in segments:
+            if first_segment is None:
+                first_segment = time.perf_counter() - start
+            count += 1
+    wall = time.perf_counter() - start
+
+    return {
+        "wall_s": wall,
+        "ttfs_s": first_segment if first_segment is not None else wall,
+        "segments": count,
+        "stages": {}
+    }
+
+
+def _run_sensevoice(case, clip, loaded):
+    start = time.perf_counter()
+    if case["kind"] == "sensevoice":
+        module = importlib.import_module("sensevoice_transcribe")
+        result = module.transcribe_audio(clip["path"], model=loaded)
+    else:
+        module = importlib.import_module("sensevoice_optimize")
+        result = module.transcribe_audio_optimized(clip["path"], loaded=loaded)
+    wall = time.perf_counter() - start
+    if not result.get("success"):
+        raise RuntimeError(result.get("error", "SenseVoice 转录失败"))
+    # SenseVoice 一次性返回全部结果，首段延迟即总耗时
+    return {"wall_s": wall, "ttfs_s": wall, "segments": len(result["segments"]), "stages": {"generate": wall}}
+
+
+def _run_combined(case, clip, loaded):
+    module = importlib.import_module("sensevoice_with_diarization")
+    start = time.perf_counter()
+    result = module.sensevoice_with_diarization(clip["path"])
+    wall = time.perf_counter() - start
+    if not result.get("success"):
+        raise RuntimeError(result.get("error", "组合转录失败"))
+    stats = result["stats"]
+    return {
+        "wall_s": wall,
+        "ttfs_s": wall,
+        "segments": len(result["segments"]),
+        "stages": {
+            "sensevoice": stats.get("sensevoice_time", 0),
+            "diarization": stats.get("diarization_time", 0),
+            "alignment": stats.get("alignment_time", 0)
+        }
+    }
+
+
+def _run_engine(case, clip, engine):
+    start = time.perf_counter()
+    first_segment = None
+    count = 0
+    with span("decoding", engine=engine.name):
+        for _ in engine.transcribe(clip["path"]):
+            if first_segment is None:
+                first_segment = time.perf_counter() - start
+            count += 1
+    wall = time.perf_counter() - start
+    return {"wall_s": wall, "ttfs_s": first_segment if first_segment is not None else wall,
+            "segments": count, "stages": {"decoding": wall}}
+
+
+def _stage_totals():
+    return {name: item["total_s"] for name, item in tracer.summary()["stages"].items()}
+
+
+def _traced(run_once, clip):
+    """
+    执行一次并用 tracer 的分阶段累计耗时之差作为本次的阶段耗时（嵌套阶段各自计入）；
+    没有记录到阶段时（如组合流程在子进程里运行）保留用例自己给出的阶段
+    """
+    before = _stage_totals()
+    run = run_once(clip)
+    stages = {name: round(total - before.get(name, 0.0), 4) for name, total in _stage_totals().items()
+              if total > before.get(name, 0.0)}
+    if stages:
+        run["stages"] = stages
+    return run
+
+
+def run_case(case_name, clips, model_size="base", repeats=2):
+    """
+    在独立子进程中执行一个用例：先测冷启动（导入 + 加载模型），再逐条语料测首次和热态运行
+
+    返回:
+        用例报告 dict
+    """
+    case = CASES[case_name]
+    report = {"case": case_name, "success": True, "clips": {}}
+
+    try:
+        start = time.perf_counter()
+        if case["kind"] == "whisper":
+            module = importlib.import_module(case["module"])
+            transcriber = getattr(module, case["transcriber"])(model_size=model_size)
+            run_once = lambda clip: _run_whisper(case, clip, transcriber, module)
+            report["model"] = model_size
+            report["decode_options"] = {k: v for k, v in module.DECODE_OPTIONS.items() if k != "vad_parameters"}
+        elif case["kind"] == "sensevoice":
+            loaded, _ = importlib.import_module("sensevoice_transcribe").load_model()
+            run_once = lambda clip: _run_sensevoice(case, clip, loaded)
+        elif case["kind"] == "engine":
+            engine = importlib.import_module("engines").create_engine(case["engine"]).load()
+            run_once = lambda clip: _run_engine(case, clip, engine)
+        elif case["kind"] == "sensevoice-optimized":
+            loaded = importlib.import_module("sensevoice_optimize").load_optimized_model()
+            run_once = lambda clip: _run_sensevoice(case, clip, loaded)
+        else:
+            # 组合流程每次都会启动子脚本，没有可复用的热态模型
+            importlib.import_module("sensevoice_with_diarization")
+            run_once = lambda clip: _run_combined(case, clip, None)
+        report["cold_start_s"] = time.perf_counter() - start
+
+        for clip in clips:
+            runs = [_traced(run_once, clip) for _ in range(1 + repeats)]
+            first, warm = runs[0], runs[1:] or runs[:1]
+            duration = clip["duration"]
+            stage_names = {name for r in warm for name in r["stages"]}
+            report["clips"][clip["name"]] = {
+                "audio_duration_s": duration,
+                "first_run_rtf": first["wall_s"] / duration,
+                "warm_rtf": statistics.median(r["wall_s"] for r in warm) / duration,
+                "ttfs_s": statistics.median(r["ttfs_s"] for r in warm),
+                "segments": warm[-1]["segments"],
+                "stages": {
+                    name: statistics.median(r["stages"].get(name, 0.0) for r in warm) for name in sorted(stage_names)
+                }
+            }
+    except Exception as e:
+        report["success"] = False
+        report["error"] = str(e)
+        print(f"❌ 用例 {case_name} 失败: {e}", file=sys.stderr)
+
+    report["peak_rss_mb"] = max(peak_rss_mb(), peak_rss_mb(children=True))
+    return report
+
+
+def summarize(report):
+    """汇总用例指标：各语料热态 RTF、首段延迟取中位数"""
+    clips = report.get("clips", {})
+    if not clips:
+        return report
+    report["warm_rtf"] = statistics.median(c["warm_rtf"] for c in clips.values())
+    report["first_run_rtf"] = statistics.median(c["first_run_rtf"] for c in clips.values())
+    report["ttfs_s"] = statistics.median(c["ttfs_s"] for c in clips.values())
+    stage_totals = {}
+    for clip in clips.values():
+        for name, seconds in clip["stages"].items():
+            stage_totals[name] = stage_totals.get(name, 0.0) + seconds
+    report["stage_totals_s"] = stage_totals
+    return report
+
+
+def compare_with_baseline(reports, baseline, tolerance=0.15):
+    """
+    与基线比较，指标超过 基线 * (1 + tolerance) 且超过绝对容差时判定为回退
+
+    返回:
+        (comparison, regressions)
+    """
+    base_cases = {c["case"]: c for c in baseline.get("cases", [])}
+    comparison = {}
+    regressions = []
+    for report in reports:
+        base = base_cases.get(report["case"])
+        if not base or not report.get("success") or not base.get("success"):
+            continue
+        entries = {}
+        for metric, floor in REGRESSION_METRICS.items():
+            if metric not in report or metric not in base:
+                continue
+            old, new = base[metric], report[metric]
+            change = (new - old) / old if old else 0.0
+            regressed = new > old * (1 + tolerance) and new - old > floor
+            entries[metric] = {
+                "baseline": old,
+                "current": new,
+                "change": round(change, 4),
+                "status": "regression" if regressed else ("improved" if new < old * (1 - tolerance) else "ok")
+            }
+            if regressed:
+                regressions.append(f"{report['case']}.{metric}: {old:.3f} -> {new:.3f} ({change:+.1%})")
+        comparison[report["case"]] = entries
+    return comparison, regressions
+
+
+def load_corpus(corpus_dir=None, synthetic=True, scale=1.0):
+    """语料 = 合成音频 +（可选）目录中的真实音频"""
+    clips = []
+    if synthetic:
+        clips.extend(build_corpus(os.path.join(cache_dir, "bench_corpus"), scale))
+    if corpus_dir:
+        for path in sorted(Path(corpus_dir).iterdir()):
+            if path.suffix.lower() in (".wav", ".mp3", ".m4a", ".flac", ".aac", ".ogg"):
+                clips.append({"name": path.stem, "path": str(path), "duration": probe_duration(str(path)), "kind": "real"})
+    return clips
+
+
+def main():
+    parser = argparse.ArgumentParser(description='端到端转录引擎基准测试')
+    parser.add_argument('--engines', default='whisper,whisper-enhanced,whisper-optimized,sensevoice,sensevoice-optimized',
+                      help=f'用例列表，逗号分隔 (可选: {",".join(CASES)})')
+    parser.add_argument('--model', default='base', help='Whisper 模型大小 (默认: base)')
+    parser.add_argument('--repeats', type=int, default=2, help='每条语料的热态重复次数')
+    parser.add_argument('--corpus-dir', help='额外的真实音频目录')
+    parser.add_argument('--no-synthetic', action='store_true', help='不使用合成语料')
+    parser.add_argument('--scale', type=float, default=1.0, help='合成语料时长倍数')
+    parser.add_argument('--output', help='报告输出路径（默认输出到stdout）')
+    parser.add_argument('--baseline', help='基线报告路径，用于回退检测')
+    parser.add_argument('--save-baseline', help='将本次报告保存为基线')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='回退判定的相对容差 (默认: 0.15)')
+
+    args = parser.parse_args()
+
+    case_names = [c.strip() for c in args.engines.split(",") if c.strip()]
+    unknown = [c for c in case_names if c not in CASES]
+    if unknown:
+        parser.error(f"未知用例: {', '.join(unknown)}")
+
+    clips = load_corpus(args.corpus_dir, synthetic=not args.no_synthetic, scale=args.scale)
+    if not clips:
+        parser.error("语料为空")
+    print(f"🧪 基准测试: {len(case_names)} 个用例, {len(clips)} 条语料, "
+          f"总时长 {sum(c['duration'] for c in clips):.0f}秒", file=sys.stderr)
+
+    # 每个用例在全新的子进程中运行，保证冷启动和峰值内存互不干扰
+    ctx = multiprocessing.get_context("spawn")
+    reports = []
+    for case_name in case_names:
+        print(f"▶️ 用例: {case_name}", file=sys.stderr)
+        with ctx.Pool(1) as pool:
+            report = pool.apply(run_case, (case_name, clips, args.model, args.repeats))
+        reports.append(summarize(report))
+        if report.get("success"):
+            print(f"📊 {case_name}: 冷启动 {report['cold_start_s']:.2f}秒, 热态RTF {report.get('warm_rtf', 0):.3f}, "
+                  f"首段 {report.get('ttfs_s', 0):.2f}秒, 峰值内存 {report['peak_rss_mb']:.0f}MB", file=sys.stderr)
+
+    output = {
+        "success": all(r.get("success") for r in reports),
+        "host": socket.gethostname(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "corpus": [{k: v for k, v in c.items() if k != "turns"} for c in clips],
+        "cases": reports
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        output["comparison"], regressions = compare_with_baseline(reports, baseline, args.tolerance)
+        output["regressions"] = regressions
+        for line in regressions:
+            print(f"⚠️ 性能回退: {line}", file=sys.stderr)
+        if not regressions:
+            print("✅ 与基线相比无性能回退", file=sys.stderr)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+        print(f"💾 基线已保存: {args.save_baseline}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+        print(f"📁 报告已保存到: {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(output, ensure_ascii=False))
+
+    sys.exit(1 if regressions or not output["success"] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+恒定内存模式（多小时录音）
+音频按窗口从 ffmpeg 管道流式读取，片段逐条落盘，全文只在写结果时从磁盘拼接，
+峰值内存只与窗口长度有关，与节目时长无关
+"""
+
+import os
+import json
+import tempfile
+import subprocess
+from types import SimpleNamespace
+
+import numpy as np
+
+from deadline import SAMPLE_RATE, CUT_SEARCH_SECONDS, quiet_cut
+from tracing import span
+
+# 每个解码窗口的时长（秒）；窗口末尾 CUT_SEARCH_SECONDS 内找静音处切开
+WINDOW_SECONDS = 300
+# ffmpeg 管道每次读取的时长（秒）
+READ_BLOCK_SECONDS = 30
+# 跨窗口携带的上文长度（字符）
+PROMPT_CARRY_CHARS = 200
+# 单文件超过该时长时入口脚本自动启用恒定内存模式（CONSTANT_MEMORY_AUTO_SECONDS 可调，0 为关闭）
+AUTO_SECONDS = 2 * 3600
+
+
+def should_enable(audio_path):
+    """按音频时长判断是否自动启用恒定内存模式"""
+    threshold = float(os.getenv("CONSTANT_MEMORY_AUTO_SECONDS", AUTO_SECONDS))
+    if threshold <= 0:
+        return False
+    from runtime_predictor import probe_duration
+    duration = probe_duration(audio_path)
+    return bool(duration and duration >= threshold)
+
+
+def ffmpeg_blocks(path, block_seconds=READ_BLOCK_SECONDS):
+    """ffmpeg 解码为 16kHz 单声道，按块产出 float32 数组（不整段读入内存）"""
+    block_bytes = int(block_seconds * SAMPLE_RATE) * 2
+    proc = subprocess.Popen(
+        ["ffmpeg", "-nostdin", "-v", "error", "-i", str(path), "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    try:
+        while True:
+            raw = proc.stdout.read(block_bytes)
+            if not raw:
+                break
+            # 管道读到奇数字节时丢掉最后半个样本
+            yield np.frombuffer(raw[:len(raw) // 2 * 2], np.int16).astype(np.float32) / 32768.0
+        proc.wait()
+        if proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg 解码失败: {proc.stderr.read().decode('utf-8', 'replace').strip()}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+
+
+def audio_windows(blocks, window_seconds=WINDOW_SECONDS, search_seconds=CUT_SEARCH_SECONDS):
+    """
+    把任意长度的音频块拼成解码窗口
+
+    返回:
+        生成器，产出 (窗口起点秒, float32 数组)；切点选在窗口末尾的低能量处，剩余部分并入下一窗口
+    """
+    window = int(window_seconds * SAMPLE_RATE)
+    search = int(search_seconds * SAMPLE_RATE)
+    # 固定大小的缓冲区：窗口 + 切点搜索区，切出的窗口复制交给调用方，剩余部分移到缓冲区开头
+    buffer = np.empty(window + search, dtype=np.float32)
+    filled = 0
+    offset = 0
+    for block in blocks:
+        pos = 0
+        while pos < len(block):
+            n = min(len(buffer) - filled, len(block) - pos)
+            buffer[filled:filled + n] = block[pos:pos + n]
+            filled += n
+            pos += n
+            if filled == len(buffer):
+                cut = quiet_cut(buffer, window, search)
+                yield offset / SAMPLE_RATE, buffer[:cut].copy()
+                offset += cut
+                buffer[:filled - cut] = buffer[cut:filled]
+                filled -= cut
+    if filled:
+        yield offset / SAMPLE_RATE, buffer[:filled].copy()
+
+
+class SegmentSpool:
+    """
+    片段落盘：每条片段写一行 JSON，内存里只保留计数和最后的时间
+    迭代时重新从文件逐行读取，可以反复遍历
+    """
+
+    def __init__(self, directory=None):
+        fd, self.path = tempfile.mkstemp(prefix="segments_", suffix=".jsonl", dir=directory)
+        self._file = os.fdopen(fd, "w", encoding="utf-8")
+        self.count = 0
+        self.characters = 0
+        self.last_end = 0.0
+
+    def append(self, segment):
+        self._file.write(json.dumps(segment, ensure_ascii=False))
+        self._file.write("\n")
+        self.count += 1
+        self.characters += len(segment.get("text", ""))
+        self.last_end = segment.get("end") or self.last_end
+
+    def extend(self, segments):
+        for segment in segments:
+            self.append(segment)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        self._file.flush()
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def iter_text(self, separator=" "):
+        """逐段产出全文（与 " ".join(seg["text"]) 的结果一致，跳过空文本）"""
+        first = True
+        for segment in self:
+            text = segment.get("text", "")
+            if not text:
+                continue
+            if not first:
+                yield separator
+            yield text
+            first = False
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_result_json(fp, result, spool, text_separator=" "):
+    """
+    流式写出与普通模式相同结构的结果 JSON：result 中的其他字段照常序列化，
+    "segments" 和 "text" 从落盘片段逐条写出
+    """
+    fields = {k: v for k, v in result.items() if k not in ("segments", "text")}
+    head = json.dumps(fields, ensure_ascii=False)
+    fp.write(head[:-1])
+    fp.write(', "text": "' if fields else '{"text": "')
+    for piece in spool.iter_text(text_separator):
+        # 去掉 json.dumps 两端的引号，只写转义后的内容
+        fp.write(json.dumps(piece, ensure_ascii=False)[1:-1])
+    fp.write('", "segments": [')
+    for i, segment in enumerate(spool):
+        if i:
+            fp.write(", ")
+        fp.write(json.dumps(segment, ensure_ascii=False))
+    fp.write("]}\n")
+
+
+def write_markdown(path, header, spool, footer="", text_separator=" "):
+    """Markdown 转录文件：标题 + 逐段写入的正文 + 结尾（如来源链接）"""
+    with span("file_write"), open(path, "w", encoding="utf-8") as f:
+        f.write(header)
+        for piece in spool.iter_text(text_separator):
+            f.write(piece)
+        f.write(footer)
+
+
+def whisper_window_transcribe(model, windows, language=None, options=None, prompt_kwargs=None, audio_seconds=None):
+    """
+    逐窗口调用 WhisperModel.transcribe，接口与其一致：返回 (片段生成器, info)
+
+    参数:
+        windows: audio_windows() 的输出
+        audio_seconds: 总时长（用于进度；未知时为 None）
+
+    返回:
+        (segments, info)；片段时间相对整段音频
+    """
+    options = dict(options or {})
+    prompt_kwargs = dict(prompt_kwargs or {})
+    base_prompt = prompt_kwargs.get("initial_prompt")
+    windows = iter(windows)
+
+    # 第一个窗口的 transcribe() 完成语言检测，之后各窗口固定该语言
+    first = next(windows, None)
+    if first is None:
+        raise ValueError("音频为空")
+    with span("vad_language_detection"):
+        first_segments, first_info = model.transcribe(first[1], language=language, **options, **prompt_kwargs)
+    info = SimpleNamespace(language=first_info.language, language_probability=first_info.language_probability,
+                           duration=audio_seconds)
+
+    def generate():
+        offset, segments = first[0], first_segments
+        window_end = first[0] + len(first[1]) / SAMPLE_RATE
+        pending = windows
+        while True:
+            last_text = ""
+            for segment in segments:
+                last_text = segment.text
+                yield SimpleNamespace(start=segment.start + offset, end=segment.end + offset, text=segment.text,
+                                      avg_logprob=segment.avg_logprob, no_speech_prob=segment.no_speech_prob,
+                                      compression_ratio=segment.compression_ratio)
+            if last_text:
+                carry = last_text[-PROMPT_CARRY_CHARS:]
+                prompt_kwargs["initial_prompt"] = f"{base_prompt} {carry}" if base_prompt else carry
+            nxt = next(pending, None)
+            if nxt is None:
+                break
+            offset, audio = nxt
+            window_end = offset + len(audio) / SAMPLE_RATE
+            segments, _ = model.transcribe(audio, language=info.language, **options, **prompt_kwargs)
+            del audio
+        info.duration = window_end
+
+    return generate(), info
+
+
+def main():
+    """调试用：按窗口读取一个文件并打印窗口边界"""
+    import argparse
+    parser = argparse.ArgumentParser(description='恒定内存模式：查看音频窗口划分')
+    parser.add_argument('file', help='音频文件')
+    parser.add_argument('--window-seconds', type=float, default=WINDOW_SECONDS)
+    args = parser.parse_args()
+    bounds = [(round(offset, 2), round(offset + len(audio) / SAMPLE_RATE, 2))
+              for offset, audio in audio_windows(ffmpeg_blocks(args.file), args.window_seconds)]
+    print(json.dumps(bounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+本机 CPU 核分配
+多个转录脚本同时运行时各自默认开满线程，核被超额订阅后总吞吐反而不如串行。
+这里用一个文件锁保护的租约表给每个任务分配互不重叠的核：
+设置进程亲和性和 OMP/MKL/torch/CTranslate2 线程数与之匹配，进程退出时释放（进程已死的租约自动回收）
+"""
+
+import os
+import sys
+import json
+import time
+import fcntl
+import atexit
+import argparse
+import contextlib
+
+cache_dir = os.path.expanduser("~/.cache/podcast-transcriber")
+
+DEFAULT_MAX_CORES = 8
+# 拿不到想要的核数时，至少要有这么多比例的核才开始，否则等待
+MIN_GRANT_RATIO = 0.5
+DEFAULT_WAIT_SECONDS = 600
+POLL_SECONDS = 2.0
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+_lease = None
+
+
+def default_registry_dir():
+    return os.getenv("CPU_LEASE_DIR") or os.path.join(cache_dir, "cpu_leases")
+
+
+def _parse_cpu_list(value):
+    """'0-3,6,8-9' -> [0, 1, 2, 3, 6, 8, 9]"""
+    cores = []
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            low, high = part.split("-", 1)
+            cores.extend(range(int(low), int(high) + 1))
+        else:
+            cores.append(int(part))
+    return cores
+
+
+def host_cores():
+    """
+    可分配的核（CPU_ALLOCATOR_CORES 可限定，如 "0-7"），按 (插槽, 物理核, 逻辑核) 排序，
+    这样连续分配时同一物理核的超线程会分到同一个任务
+    """
+    if os.getenv("CPU_ALLOCATOR_CORES"):
+        cores = _parse_cpu_list(os.getenv("CPU_ALLOCATOR_CORES"))
+    else:
+        cores = list(range(os.cpu_count() or 1))
+
+    def topology(cpu):
+        base = f"/sys/devices/system/cpu/cpu{cpu}/topology"
+        try:
+            with open(f"{base}/physical_package_id") as f:
+                package = int(f.read())
+            with open(f"{base}/core_id") as f:
+                core = int(f.read())
+            return package, core, cpu
+        except (OSError, ValueError):
+            return 0, cpu, cpu
+
+    return sorted(cores, key=topology)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Lease:
+    """一个任务持有的核集合"""
+
+    def __init__(self, registry, lease_id, cores, engine, shared=False):
+        self.registry = registry
+        self.lease_id = lease_id
+        self.cores = cores
+        self.engine = engine
+        self.shared = shared
+        self.released = False
+
+    @property
+    def threads(self):
+        return len(self.cores)
+
+    def apply(self):
+        """把当前进程绑定到租到的核上，并让各线程池的线程数与核数一致"""
+        try:
+            os.sched_setaffinity(0, self.cores)
+        except (AttributeError, OSError) as e:
+            print(f"⚠️ 设置 CPU 亲和性失败: {e}", file=sys.stderr)
+        for name in THREAD_ENV_VARS:
+            os.environ[name] = str(self.threads)
+        # torch 已导入时环境变量不再生效，直接设置
+        torch = sys.modules.get("torch")
+        if torch is not None:
+            torch.set_num_threads(self.threads)
+
+    def release(self):
+        if not self.released:
+            self.registry.release(self.lease_id)
+            self.released = True
+
+    def to_dict(self):
+        return {"lease_id": self.lease_id, "cores": self.cores, "threads": self.threads,
+                "engine": self.engine, "shared": self.shared}
+
+
+class CoreRegistry:
+    """
+    租约表：registry_dir/leases.json，所有读写都在 registry_dir/leases.lock 的排他 flock 内
+    """
+
+    def __init__(self, registry_dir=None, cores=None):
+        self.registry_dir = registry_dir or default_registry_dir()
+        self.cores = cores or host_cores()
+        os.makedirs(self.registry_dir, exist_ok=True)
+        self.table_path = os.path.join(self.registry_dir, "leases.json")
+        self.lock_path = os.path.join(self.registry_dir, "leases.lock")
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                leases = self._read()
+                # 回收已退出进程的租约（被 kill 的任务来不及释放）
+                alive = {k: v for k, v in leases.items() if _pid_alive(v["pid"])}
+                yield alive
+                self._write(alive)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read(self):
+        try:
+            with open(self.table_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, leases):
+        tmp = f"{self.table_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(leases, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.table_path)
+
+    def leases(self):
+        with self._locked() as leases:
+            return dict(leases)
+
+    def _try_acquire(self, leases, want, min_cores, engine, share):
+        used = {core for lease in leases.values() for core in lease["cores"]}
+        free = [core for core in self.cores if core not in used]
+        shared = False
+        if len(free) >= min_cores:
+            cores = free[:want]
+        elif share:
+            # 等不到空闲核：按占用最少的核分配（与其他任务共享），至少不比无管控更差
+            load = {core: 0 for core in self.cores}
+            for lease in leases.values():
+                for core in lease["cores"]:
+                    if core in load:
+                        load[core] += 1
+            cores = sorted(self.cores, key=lambda c: load[c])[:want]
+            shared = True
+        else:
+            return None
+        lease_id = f"{os.getpid()}-{time.time_ns()}"
+        leases[lease_id] = {"pid": os.getpid(), "cores": sorted(cores), "engine": engine,
+                            "shared": shared, "acquired_at": time.time()}
+        return Lease(self, lease_id, sorted(cores), engine, shared)
+
+    def acquire(self, want, engine=None, min_cores=None, wait_seconds=DEFAULT_WAIT_SECONDS):
+        """
+        申请 want 个核
+
+        参数:
+            min_cores: 空闲核至少有这么多才开始（默认 want 的一半），否则等待
+            wait_seconds: 最长等待时间，超时后与其他任务共享占用最少的核
+
+        返回:
+            Lease
+        """
+        want = max(1, min(want, len(self.cores)))
+        min_cores = max(1, min(min_cores or int(want * MIN_GRANT_RATIO) or 1, want))
+        deadline = time.time() + wait_seconds
+        announced = False
+        while True:
+            timed_out = time.time() >= deadline
+            with self._locked() as leases:
+                lease = self._try_acquire(leases, want, min_cores, engine, share=timed_out)
+            if lease is not None:
+                return lease
+            if not announced:
+                print(f"⏳ 空闲 CPU 核不足 {min_cores} 个，等待其他转录任务释放（最长 {wait_seconds:.0f}秒）",
+                      file=sys.stderr)
+                announced = True
+            time.sleep(POLL_SECONDS)
+
+    def release(self, lease_id):
+        with self._locked() as leases:
+            leases.pop(lease_id, None)
+
+
+def default_threads(engine):
+    """任务想要的核数：CPU_LEASE_CORES > 本机调优结果 > min(8, 核数)"""
+    if os.getenv("CPU_LEASE_CORES"):
+        return int(os.getenv("CPU_LEASE_CORES"))
+    import autotune
+    # whisper-optimized 有自己的调优结果，其余变体（whisper-enhanced 等）沿用同族引擎的
+    tuned = autotune.engine_settings(engine) or autotune.engine_settings((engine or "").split("-")[0])
+    return tuned.get("cpu_threads") or tuned.get("torch_threads") or min(DEFAULT_MAX_CORES, os.cpu_count() or 1)
+
+
+def acquire_for_job(engine, device="cpu", threads=None):
+    """
+    转录脚本启动时调用：CPU 推理时租一组核并绑定，进程退出时自动释放
+
+    返回:
+        Lease；GPU 推理、已禁用 (CPU_ALLOCATOR_DISABLE=true) 或已持有租约时为 None / 现有租约
+    """
+    global _lease
+    if _lease is not None and not _lease.released:
+        return _lease
+    if os.getenv("CPU_ALLOCATOR_DISABLE") == "true" or str(device).startswith("cuda"):
+        return None
+    try:
+        registry = CoreRegistry()
+        lease = registry.acquire(threads or default_threads(engine), engine=engine,
+                                 wait_seconds=float(os.getenv("CPU_LEASE_WAIT_SECONDS", DEFAULT_WAIT_SECONDS)))
+    except OSError as e:
+        print(f"⚠️ CPU 核分配失败，按默认线程运行: {e}", file=sys.stderr)
+        return None
+    lease.apply()
+    atexit.register(lease.release)
+    _lease = lease
+    print(f"📌 CPU 核租约: {_format_cores(lease.cores)}（{lease.threads} 线程"
+          f"{'，与其他任务共享' if lease.shared else ''}）", file=sys.stderr)
+    return lease
+
+
+def release_for_job():
+    """
+    让出当前进程的核租约（经队列运行的任务让出名额、等待期间不占核），之后可以再次 acquire_for_job
+
+    返回:
+        是否释放了租约
+    """
+    if _lease is None or _lease.released:
+        return False
+    _lease.release()
+    return True
+
+
+def current_threads():
+    """当前进程租到的核数，没有租约时为 None"""
+    return _lease.threads if _lease is not None and not _lease.released else None
+
+
+def _format_cores(cores):
+    ranges = []
+    for core in sorted(cores):
+        if ranges and core == ranges[-1][1] + 1:
+            ranges[-1][1] = core
+        else:
+            ranges.append([core, core])
+    return ",".join(f"{a}-{b}" if a != b else str(a) for a, b in ranges)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本机 CPU 核分配（转录任务租约）')
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="查看当前租约")
+    p = sub.add_parser("run", help="租一组核后运行命令（命令结束释放）")
+    p.add_argument("--cores", type=int, help="想要的核数 (默认按调优结果或 min(8, 核数))")
+    p.add_argument("--engine", default="external", help="租约标签")
+    p.add_argument("cmd", nargs=argparse.REMAINDER, help="要运行的命令")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        registry = CoreRegistry()
+        leases = registry.leases()
+        used = {core for lease in leases.values() for core in lease["cores"]}
+        print(json.dumps({
+            "cores": _format_cores(registry.cores),
+            "free": _format_cores([c for c in registry.cores if c not in used]),
+            "leases": leases
+        }, ensure_ascii=False, indent=2))
+        return
+
+    cmd = args.cmd[1:] if args.cmd[:1] == ["--"] else args.cmd
+    if not cmd:
+        parser.error("缺少要运行的命令")
+    import subprocess
+    # 子进程继承亲和性和线程数环境变量；租约记在本进程名下，子进程结束后释放
+    lease = CoreRegistry().acquire(args.cores or default_threads(args.engine), engine=args.engine)
+    lease.apply()
+    try:
+        sys.exit(subprocess.call(cmd))
+    finally:
+        lease.release()
+
+
+if __name__ == "__main__":
+    main()
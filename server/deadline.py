@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+截止时间感知的分块解码
+音频按块解码，每块开始前用已测得的 RTF 估算剩余音频能否在截止时间前完成，
+来不及时逐级降低解码开销（beam / best_of / 词级时间戳 -> 更小的模型；SenseVoice 为时间戳预测 / ITN / 批大小），
+每个时间段实际使用的设置写入结果的 "deadline" 字段
+"""
+
+import sys
+import time
+import subprocess
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+
+from runtime_predictor import MODEL_COST, BEAM_COST, PRIOR_LOAD_SECONDS, model_cost
+from tracing import span
+
+SAMPLE_RATE = 16000
+# 每块音频时长（秒）与切点搜索窗口：在块末尾这段范围内找能量最低处切开，避免切在字中间
+CHUNK_SECONDS = 120
+CUT_SEARCH_SECONDS = 5
+# 预测完成时间不超过剩余时间的这个比例才算来得及（留出后处理和保存的余量）
+SAFETY = 0.9
+# 词级时间戳的额外开销
+WORD_TIMESTAMP_COST = 1.15
+
+# 降级到的更小模型
+FALLBACK_MODEL = {"large-v3": "small", "medium": "base", "small": "base", "base": "tiny"}
+
+
+def parse_deadline(value, now=None):
+    """
+    解析 --deadline
+
+    支持: 秒数 ("900")、带单位的时长 ("15m" / "2h")、当天时刻 ("06:30"，已过则为次日)、ISO 时间
+
+    返回:
+        截止时间（epoch 秒）
+    """
+    now = now or time.time()
+    value = str(value).strip()
+    units = {"s": 1, "m": 60, "h": 3600}
+    try:
+        if value[-1:].lower() in units:
+            return now + float(value[:-1]) * units[value[-1].lower()]
+        return now + float(value)
+    except ValueError:
+        pass
+    current = datetime.fromtimestamp(now)
+    for fmt in ("%H:%M", "%H:%M:%S"):
+        try:
+            clock = datetime.strptime(value, fmt).time()
+        except ValueError:
+            continue
+        target = datetime.combine(current.date(), clock)
+        if target <= current:
+            target += timedelta(days=1)
+        return target.timestamp()
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(f"无法解析截止时间: {value}（支持秒数、15m/2h、HH:MM 或 ISO 时间）")
+
+
+def load_audio(path):
+    """ffmpeg 解码为 16kHz 单声道 float32"""
+    output = subprocess.run(
+        ["ffmpeg", "-nostdin", "-v", "error", "-i", str(path), "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-"],
+        capture_output=True, check=True
+    )
+    return np.frombuffer(output.stdout, np.int16).astype(np.float32) / 32768.0
+
+
+def chunk_bounds(num_samples, chunk_seconds=CHUNK_SECONDS, search_seconds=CUT_SEARCH_SECONDS, audio=None):
+    """
+    分块边界 [(起点样本, 终点样本), ...]
+
+    给了 audio 时在每块末尾 search_seconds 内按 20ms 帧能量找最低点切开
+    """
+    chunk = int(chunk_seconds * SAMPLE_RATE)
+    search = int(search_seconds * SAMPLE_RATE)
+    bounds = []
+    start = 0
+    while start < num_samples:
+        end = min(start + chunk, num_samples)
+        if audio is not None and end < num_samples:
+            end = quiet_cut(audio, end, search)
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+
+def quiet_cut(audio, end, search):
+    """在 audio[end - search:end] 内按 20ms 帧能量找最低点，返回切点样本位置"""
+    frame = SAMPLE_RATE // 50
+    search = min(search, end)
+    if search <= frame:
+        return end
+    window = audio[end - search:end]
+    frames = window[:len(window) // frame * frame].reshape(-1, frame)
+    return end - search + int(np.argmin((frames ** 2).mean(axis=1))) * frame + frame // 2
+
+
+class DeadlineController:
+    """
+    按块选择解码级别（只降不升，避免来回抖动）
+
+    参数:
+        deadline_at: 截止时间（epoch 秒）
+        audio_seconds: 音频总时长
+        levels: 解码级别列表，开销从高到低
+        cost: level -> 相对开销（用于把已测 RTF 折算到未试过的级别）
+        initial_rtf: 第 0 级的预期 RTF（尚未测到时使用，通常来自耗时历史）
+        load_seconds: level -> 切到该级别需要的额外加载耗时（如换模型）
+    """
+
+    def __init__(self, deadline_at, audio_seconds, levels, cost, initial_rtf, load_seconds=None):
+        self.deadline_at = deadline_at
+        self.audio_seconds = audio_seconds
+        self.levels = levels
+        self.cost = cost
+        self.initial_rtf = initial_rtf
+        self.load_seconds = load_seconds or (lambda level: 0.0)
+        self.level = 0
+        self.ranges = []
+        self._measured = None  # (级别下标, RTF)
+
+    def estimated_rtf(self, index):
+        if self._measured is None:
+            ref_index, ref_rtf = 0, self.initial_rtf
+        else:
+            ref_index, ref_rtf = self._measured
+        return ref_rtf * self.cost(self.levels[index]) / self.cost(self.levels[ref_index])
+
+    def choose(self, position):
+        """position 秒处开始下一块前调用，返回本块使用的级别"""
+        remaining_audio = max(0.0, self.audio_seconds - position)
+        budget = (self.deadline_at - time.time()) * SAFETY
+        previous = self.level
+        while self.level < len(self.levels) - 1:
+            projected = remaining_audio * self.estimated_rtf(self.level) + self.load_seconds(self.levels[self.level])
+            if projected <= budget:
+                break
+            self.level += 1
+        if self.level != previous:
+            print(f"⏬ 剩余 {remaining_audio:.0f}秒音频、可用 {budget:.0f}秒，解码降级为: "
+                  f"{describe(self.levels[self.level])}", file=sys.stderr)
+        return self.levels[self.level]
+
+    def record(self, start, end, elapsed):
+        """记录一块的实际耗时，更新该级别的实测 RTF"""
+        audio = max(end - start, 1e-6)
+        rtf = elapsed / audio
+        self._measured = (self.level, rtf)
+        level = self.levels[self.level]
+        if self.ranges and self.ranges[-1]["settings"] == level:
+            self.ranges[-1]["end"] = round(end, 2)
+            self.ranges[-1]["elapsed_s"] = round(self.ranges[-1]["elapsed_s"] + elapsed, 2)
+        else:
+            self.ranges.append({"start": round(start, 2), "end": round(end, 2), "level": self.level,
+                                "settings": dict(level), "elapsed_s": round(elapsed, 2)})
+        self.ranges[-1]["rtf"] = round(self.ranges[-1]["elapsed_s"] / max(self.ranges[-1]["end"] - self.ranges[-1]["start"], 1e-6), 4)
+
+    def report(self):
+        finished = time.time()
+        return {
+            "deadline": datetime.fromtimestamp(self.deadline_at).isoformat(timespec="seconds"),
+            "finished": datetime.fromtimestamp(finished).isoformat(timespec="seconds"),
+            "met": finished <= self.deadline_at,
+            "slack_s": round(self.deadline_at - finished, 1),
+            "degraded": any(r["level"] > 0 for r in self.ranges),
+            "ranges": self.ranges
+        }
+
+
+def describe(level):
+    return ", ".join(f"{k}={v}" for k, v in level.items())
+
+
+# ---------------------------------------------------------------------------
+# Whisper
+# ---------------------------------------------------------------------------
+
+def whisper_levels(model_size, options):
+    """从脚本的解码参数出发逐级降级：beam 减半 -> beam 1 -> 关词级时间戳 -> 更小的模型"""
+    beam = options.get("beam_size", 5)
+    current = {"model": model_size, "beam_size": beam, "best_of": options.get("best_of", beam),
+               "word_timestamps": bool(options.get("word_timestamps", False))}
+    levels = [current]
+
+    def step(**changes):
+        level = dict(levels[-1], **changes)
+        if level != levels[-1]:
+            levels.append(level)
+
+    if beam > 2:
+        step(beam_size=max(2, beam // 2), best_of=max(2, beam // 2))
+    step(beam_size=1, best_of=1)
+    step(word_timestamps=False)
+    if model_size in FALLBACK_MODEL:
+        step(model=FALLBACK_MODEL[model_size])
+    return levels
+
+
+def whisper_cost(level):
+    beam = level["beam_size"]
+    beam_cost = BEAM_COST.get(beam, BEAM_COST[1] + (1 - BEAM_COST[1]) * (beam - 1) / 4)
+    return (MODEL_COST.get(level["model"], 1.0) * beam_cost
+            * (WORD_TIMESTAMP_COST if level["word_timestamps"] else 1.0))
+
+
+def whisper_deadline_transcribe(transcriber, audio, deadline_at, options, model_size, language=None,
+                                prompt_kwargs=None, initial_rtf=None, load_model=None):
+    """
+    截止时间感知的 Whisper 分块转录，接口与 WhisperModel.transcribe 一致：返回 (片段生成器, info)
+
+    参数:
+        transcriber: 带 model 属性（已加载的 WhisperModel）的转录器
+        audio: decode_audio() 得到的 16kHz 数组
+        options: 脚本的 DECODE_OPTIONS
+        initial_rtf: 第 0 级的预期 RTF（来自耗时历史），为空时按先验
+        load_model: model_size -> WhisperModel，降级到更小模型时调用
+
+    返回:
+        (segments, info)；info.deadline 在片段迭代完后补全为降级报告
+    """
+    prompt_kwargs = dict(prompt_kwargs or {})
+    base_prompt = prompt_kwargs.get("initial_prompt")
+    audio_seconds = len(audio) / SAMPLE_RATE
+    levels = whisper_levels(model_size, options)
+    if load_model is None:
+        levels = [level for level in levels if level["model"] == model_size]
+    models = {model_size: transcriber.model}
+    controller = DeadlineController(
+        deadline_at, audio_seconds, levels, whisper_cost,
+        initial_rtf or 0.12 * MODEL_COST.get(model_size, 1.0),
+        load_seconds=lambda level: 0.0 if level["model"] in models
+        else PRIOR_LOAD_SECONDS * max(1.0, model_cost(level["model"]) ** 0.5)
+    )
+    bounds = chunk_bounds(len(audio), audio=audio)
+
+    def decode_chunk(start, end, chunk_language):
+        level = controller.choose(start / SAMPLE_RATE)
+        if level["model"] not in models:
+            with span("model_load", model=level["model"]):
+                models[level["model"]] = load_model(level["model"])
+        return models[level["model"]].transcribe(
+            audio[start:end], language=chunk_language, **_whisper_options(options, level), **prompt_kwargs)
+
+    # 第一块的 transcribe() 完成语言检测，之后各块固定该语言
+    chunk_start = time.perf_counter()
+    with span("vad_language_detection"):
+        first_segments, first_info = decode_chunk(*bounds[0], language)
+    info = SimpleNamespace(language=first_info.language, language_probability=first_info.language_probability,
+                           duration=audio_seconds, deadline=None)
+
+    def generate():
+        nonlocal chunk_start
+        segments = first_segments
+        for index, (start, end) in enumerate(bounds):
+            offset = start / SAMPLE_RATE
+            if index > 0:
+                chunk_start = time.perf_counter()
+                segments, _ = decode_chunk(start, end, info.language)
+            last_text = ""
+            for segment in segments:
+                last_text = segment.text
+                yield SimpleNamespace(start=segment.start + offset, end=segment.end + offset, text=segment.text,
+                                      avg_logprob=segment.avg_logprob, no_speech_prob=segment.no_speech_prob,
+                                      compression_ratio=segment.compression_ratio)
+            controller.record(offset, end / SAMPLE_RATE, time.perf_counter() - chunk_start)
+            # 下一块以本块结尾的文本作为上下文（保留热词提示）
+            if last_text:
+                prompt_kwargs["initial_prompt"] = f"{base_prompt} {last_text[-200:]}" if base_prompt else last_text[-200:]
+        info.deadline = controller.report()
+        status = "✅ 按时完成" if info.deadline["met"] else "⚠️ 未能按时完成"
+        print(f"{status} (截止 {info.deadline['deadline']}, 余量 {info.deadline['slack_s']}秒, "
+              f"{len(controller.ranges)} 个设置段)", file=sys.stderr)
+
+    return generate(), info
+
+
+def _whisper_options(options, level):
+    return dict(options, beam_size=level["beam_size"], best_of=level["best_of"],
+                word_timestamps=level["word_timestamps"])
+
+
+# ---------------------------------------------------------------------------
+# SenseVoice（没有 beam search，降级项为时间戳预测、ITN 和更大的批）
+# ---------------------------------------------------------------------------
+
+SENSEVOICE_COST = {"pred_timestamp": 1.2, "use_itn": 1.05}
+
+
+def sensevoice_levels(use_itn, batch_size_s):
+    levels = [{"pred_timestamp": True, "use_itn": use_itn, "batch_size_s": batch_size_s}]
+    levels.append(dict(levels[-1], pred_timestamp=False))
+    if use_itn:
+        levels.append(dict(levels[-1], use_itn=False))
+    levels.append(dict(levels[-1], batch_size_s=batch_size_s * 2))
+    return levels
+
+
+def sensevoice_cost(level):
+    cost = 1.0
+    for key, factor in SENSEVOICE_COST.items():
+        if level[key]:
+            cost *= factor
+    # 批越大吞吐越高，按经验取平方根
+    return cost / (level["batch_size_s"] / 60) ** 0.5
+
+
+def sensevoice_deadline_generate(model, audio_path, deadline_at, language="auto", use_itn=True, batch_size_s=60,
+                                 merge_length_s=30, initial_rtf=0.03, audio=None):
+    """
+    截止时间感知的 SenseVoice 分块转录
+
+    参数:
+        audio: 已解码的 16kHz 音频（None 时从 audio_path 解码）
+
+    返回:
+        (res, report)：res 与 model.generate() 的返回格式一致（单个条目，片段时间相对整段音频）
+    """
+    if audio is None:
+        with span("audio_decode"):
+            audio = load_audio(audio_path)
+    audio_seconds = len(audio) / SAMPLE_RATE
+    controller = DeadlineController(deadline_at, audio_seconds, sensevoice_levels(use_itn, batch_size_s),
+                                    sensevoice_cost, initial_rtf)
+    texts, segments = [], []
+    merged = {}
+    for start, end in chunk_bounds(len(audio), audio=audio):
+        offset = start / SAMPLE_RATE
+        level = controller.choose(offset)
+        chunk_start = time.perf_counter()
+        res = model.generate(
+            input=audio[start:end],
+            cache={},
+            language=language,
+            use_itn=level["use_itn"],
+            batch_size_s=level["batch_size_s"],
+            merge_vad=True,
+            merge_length_s=merge_length_s,
+            pred_timestamp=level["pred_timestamp"],
+        )
+        controller.record(offset, end / SAMPLE_RATE, time.perf_counter() - chunk_start)
+        if not res:
+            continue
+        entry = res[0]
+        for key in ("language", "emotion", "event"):
+            if key in entry and key not in merged:
+                merged[key] = entry[key]
+        texts.append(entry.get("text", ""))
+        if "segments" in entry:
+            for seg in entry["segments"]:
+                segments.append(dict(seg, start=seg.get("start", 0) + offset, end=seg.get("end", 0) + offset))
+        else:
+            # 关掉时间戳预测后只有块级时间
+            segments.append({"start": offset, "end": end / SAMPLE_RATE, "text": entry.get("text", "")})
+
+    report = controller.report()
+    merged.update(text="".join(texts), segments=segments)
+    return [merged], report
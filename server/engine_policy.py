@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+自适应引擎 / 模型选择
+按音频时长、语言、当前积压和目标周转时间，从质量最高的配置开始往下找第一个能按时完成的
+（如 large-v3/beam 5 -> … -> SenseVoice -> base/beam 1），每次决策写入审计库
+"""
+
+import sys
+import os
+import json
+import time
+import sqlite3
+import argparse
+
+import runtime_predictor
+import autotune
+
+cache_dir = os.path.expanduser("~/.cache/podcast-transcriber")
+
+# 质量从高到低的候选配置；SenseVoice 只在它支持的语言上参与
+LADDER = [
+    {"engine": "whisper", "model": "large-v3", "beam_size": 5},
+    {"engine": "whisper", "model": "medium", "beam_size": 5},
+    {"engine": "whisper", "model": "small", "beam_size": 5},
+    {"engine": "whisper", "model": "base", "beam_size": 5},
+    {"engine": "sensevoice", "model": "SenseVoiceSmall", "beam_size": None},
+    {"engine": "whisper", "model": "base", "beam_size": 1},
+    {"engine": "whisper", "model": "tiny", "beam_size": 1},
+]
+SENSEVOICE_LANGUAGES = ("zh", "en", "yue", "ja", "ko")
+WHISPER_MODELS = ("tiny", "base", "small", "medium", "large-v3")
+
+# 未指定目标周转时间时：至少 5 分钟，长音频放宽到音频时长的一半
+MIN_TARGET_SECONDS = 300
+TARGET_AUDIO_RATIO = 0.5
+
+
+def default_audit_path():
+    return os.getenv("ENGINE_POLICY_DB") or os.path.join(cache_dir, "engine_policy.db")
+
+
+def engine_label(engine, enhanced=None, optimized=None):
+    """Node 端实际调用的脚本对应的引擎标签（与耗时历史和指标中的 engine 一致）"""
+    if engine == "whisper":
+        if enhanced is None:
+            enhanced = os.getenv("USE_ENHANCED_TRANSCRIPTION") != "false"
+        return "whisper-enhanced" if enhanced else "whisper"
+    if optimized is None:
+        optimized = os.getenv("SENSEVOICE_OPTIMIZE") != "false"
+    return "sensevoice-optimized" if optimized else "sensevoice"
+
+
+def static_decision():
+    """与原来的环境变量配置一致的选择（TRANSCRIPTION_ENGINE / WHISPER_MODEL）"""
+    engine = os.getenv("TRANSCRIPTION_ENGINE") or "whisper"
+    if engine.startswith("sensevoice"):
+        return {"engine": "sensevoice", "model": "SenseVoiceSmall", "beam_size": None}
+    return {"engine": "whisper", "model": os.getenv("WHISPER_MODEL") or "base", "beam_size": 5}
+
+
+def queue_backlog_seconds():
+    """本地任务队列中尚未完成的预测工作量 / 槽位数；没有队列库时为 0"""
+    from job_queue import default_queue_path, JobQueue
+    if not os.path.exists(default_queue_path()):
+        return 0.0
+    try:
+        with JobQueue() as queue:
+            return queue.backlog_seconds()
+    except Exception as e:
+        print(f"⚠️ 读取任务队列积压失败: {e}", file=sys.stderr)
+        return 0.0
+
+
+class EnginePolicy:
+    """
+    每个任务的引擎 / 模型 / 解码参数选择
+
+    参数:
+        slots: 可同时跑的转录数（并发超过它时按比例放慢）
+        max_model: 候选的最大 Whisper 模型
+    """
+
+    def __init__(self, audit_path=None, slots=None, max_model=None, enhanced=None, optimized=None):
+        self.audit_path = audit_path or default_audit_path()
+        self.slots = slots or int(os.getenv("ENGINE_POLICY_SLOTS") or autotune.recommended_concurrency() or 1)
+        self.max_model = max_model or os.getenv("ENGINE_POLICY_MAX_MODEL") or "large-v3"
+        self.enhanced = enhanced
+        self.optimized = optimized
+
+    def candidates(self, language):
+        language = (language or "auto").lower()
+        ceiling = WHISPER_MODELS.index(self.max_model) if self.max_model in WHISPER_MODELS else len(WHISPER_MODELS) - 1
+        for option in LADDER:
+            if option["engine"] == "whisper" and WHISPER_MODELS.index(option["model"]) > ceiling:
+                continue
+            if option["engine"] == "sensevoice" and language not in SENSEVOICE_LANGUAGES + ("auto",):
+                continue
+            yield option
+
+    def _predict(self, predictor, option, audio_seconds, language):
+        label = engine_label(option["engine"], self.enhanced, self.optimized)
+        # 没有该模型 / beam 的历史时，predictor 借用同引擎其他配置的历史并按耗时比例折算
+        model = runtime_predictor.history_model(option["model"], option["beam_size"])
+        return label, model, predictor.predict(label, audio_seconds=audio_seconds, model=model, language=language)
+
+    def decide(self, audio_path=None, audio_seconds=None, language=None, inflight=0, target_seconds=None,
+               backlog_seconds=None, job_id=None):
+        """
+        选择配置
+
+        参数:
+            inflight: 正在运行的转录数（不含本任务），并发超过 slots 时预测耗时按比例放大
+            target_seconds: 目标周转时间（秒）
+            backlog_seconds: 排队等待时间；为空时从本地任务队列估算
+
+        返回:
+            {"engine", "label", "model", "beam_size", "predicted_seconds", "target_seconds", "reason", ...}
+        """
+        if audio_seconds is None and audio_path:
+            audio_seconds = runtime_predictor.probe_duration(audio_path)
+        if not audio_seconds:
+            # 读不到时长就无法预测，沿用静态配置
+            decision = dict(static_decision(), label=None, reason="读不到音频时长，使用静态配置")
+            decision["label"] = engine_label(decision["engine"], self.enhanced, self.optimized)
+            self.audit(decision, audio_path, job_id)
+            return decision
+        if target_seconds is None and os.getenv("TARGET_TURNAROUND_SECONDS"):
+            target_seconds = float(os.getenv("TARGET_TURNAROUND_SECONDS"))
+        if target_seconds is None:
+            target_seconds = max(MIN_TARGET_SECONDS, TARGET_AUDIO_RATIO * (audio_seconds or 0))
+        if backlog_seconds is None:
+            backlog_seconds = queue_backlog_seconds()
+        # 同时跑的转录超过槽位时共享 CPU，各自按比例变慢
+        contention = max(1.0, (inflight + 1) / self.slots)
+
+        evaluated = []
+        chosen = None
+        with runtime_predictor.RuntimePredictor() as predictor:
+            for option in self.candidates(language):
+                label, model, prediction = self._predict(predictor, option, audio_seconds, language)
+                predicted = prediction.get("predicted_seconds")
+                turnaround = backlog_seconds + predicted * contention
+                entry = dict(option, label=label, history_model=model, predicted_seconds=predicted,
+                             turnaround_seconds=round(turnaround, 1),
+                             basis=prediction["basis"], samples=prediction["samples"])
+                evaluated.append(entry)
+                if turnaround <= target_seconds:
+                    chosen = entry
+                    break
+
+        if chosen is None:
+            chosen = min(evaluated, key=lambda e: e["turnaround_seconds"])
+            reason = "没有候选能在目标时间内完成，选预测最快的"
+        elif chosen is evaluated[0]:
+            reason = "最高质量配置可按时完成"
+        else:
+            reason = f"积压 {backlog_seconds:.0f}秒 / 并发 {inflight}，降级到能按时完成的最高质量配置"
+
+        decision = {
+            "engine": chosen["engine"],
+            "label": chosen["label"],
+            "model": chosen["model"],
+            "beam_size": chosen["beam_size"],
+            "history_model": chosen["history_model"],
+            "predicted_seconds": chosen["predicted_seconds"],
+            "turnaround_seconds": chosen["turnaround_seconds"],
+            "target_seconds": round(target_seconds, 1),
+            "audio_seconds": round(audio_seconds, 2),
+            "language": language,
+            "inflight": inflight,
+            "backlog_seconds": round(backlog_seconds, 1),
+            "reason": reason,
+            "candidates": evaluated
+        }
+        self.audit(decision, audio_path, job_id)
+        return decision
+
+    def audit(self, decision, audio_path=None, job_id=None):
+        """写入审计库（失败只告警，不影响转录）"""
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.audit_path)), exist_ok=True)
+            with sqlite3.connect(self.audit_path, timeout=30) as conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS policy_decisions (
+                        id INTEGER PRIMARY KEY,
+                        decided_at REAL NOT NULL,
+                        job_id TEXT,
+                        audio_path TEXT,
+                        engine TEXT,
+                        model TEXT,
+                        beam_size INTEGER,
+                        predicted_seconds REAL,
+                        target_seconds REAL,
+                        reason TEXT,
+                        details TEXT
+                    )
+                """)
+                conn.execute(
+                    "INSERT INTO policy_decisions (decided_at, job_id, audio_path, engine, model, beam_size, "
+                    "predicted_seconds, target_seconds, reason, details) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (time.time(), str(job_id) if job_id is not None else None, str(audio_path) if audio_path else None,
+                     decision["engine"], decision["model"], decision.get("beam_size"),
+                     decision.get("predicted_seconds"), decision.get("target_seconds"), decision["reason"], json.dumps(decision, ensure_ascii=False))
+                )
+        except sqlite3.Error as e:
+            print(f"⚠️ 决策审计写入失败: {e}", file=sys.stderr)
+
+    def recent(self, limit=20):
+        if not os.path.exists(self.audit_path):
+            return []
+        with sqlite3.connect(self.audit_path, timeout=30) as conn:
+            rows = conn.execute(
+                "SELECT decided_at, job_id, audio_path, details FROM policy_decisions ORDER BY id DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [dict(json.loads(details), decided_at=decided_at, job_id=job_id, audio_path=audio_path)
+                for decided_at, job_id, audio_path, details in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='自适应引擎 / 模型选择')
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("decide", help="为一个音频文件选择引擎和模型")
+    p.add_argument("file", help="音频文件")
+    p.add_argument("--language", help="语言提示 (zh/en/...，默认自动)")
+    p.add_argument("--inflight", type=int, default=0, help="正在运行的转录数（不含本任务）")
+    p.add_argument("--target", type=float, help="目标周转时间（秒）")
+    p.add_argument("--backlog", type=float, help="排队等待时间（秒，默认从任务队列估算）")
+    p.add_argument("--slots", type=int, help="可同时跑的转录数 (默认 ENGINE_POLICY_SLOTS、本机调优结果或 1)")
+    p.add_argument("--max-model", choices=WHISPER_MODELS, help="候选的最大 Whisper 模型")
+    p.add_argument("--job-id", help="关联的任务 id（写入审计）")
+    p.add_argument("--static", action="store_true", help="按环境变量的静态配置选择（仍写审计）")
+
+    p = sub.add_parser("audit", help="查看最近的决策")
+    p.add_argument("--limit", type=int, default=20)
+
+    args = parser.parse_args()
+    policy = EnginePolicy(slots=getattr(args, "slots", None), max_model=getattr(args, "max_model", None))
+
+    if args.command == "audit":
+        print(json.dumps(policy.recent(args.limit), ensure_ascii=False))
+        return
+
+    if args.static:
+        decision = dict(static_decision(), reason="静态配置 (TRANSCRIPTION_ENGINE / WHISPER_MODEL)")
+        decision["label"] = engine_label(decision["engine"])
+        policy.audit(decision, args.file, args.job_id)
+    else:
+        decision = policy.decide(args.file, language=args.language, inflight=args.inflight,
+                                 target_seconds=args.target, backlog_seconds=args.backlog, job_id=args.job_id)
+    print(f"🧭 引擎选择: {decision['label']} {decision['model']}"
+          f"{' beam ' + str(decision['beam_size']) if decision.get('beam_size') else ''} ({decision['reason']})",
+          file=sys.stderr)
+    print(json.dumps(decision, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+统一的转录引擎接口
+各 Whisper / SenseVoice 脚本适配为同一个流式接口（load / transcribe 片段迭代器 / info / close），
+另有可配置延迟和 RTF 的确定性合成引擎，不需要模型权重即可压测调度、缓存、对齐和输出环节
+"""
+
+import sys
+import os
+import json
+import time
+import random
+import argparse
+import importlib
+import statistics
+import concurrent.futures
+from pathlib import Path
+
+from tracing import span
+from runtime_predictor import probe_duration
+
+# 各脚本结果里的附加报告，随 run 带回 run_engine 的结果
+_REPORT_KEYS = ("emotion", "events", "hotword_domain", "hotwords", "deadline", "redecode", "loop_guard",
+                "nonspeech", "recurring")
+
+
+def audio_duration(path):
+    """音频时长（秒），读不到时返回 None"""
+    return probe_duration(str(path))
+
+
+class SegmentStream:
+    """transcribe() 的返回值：片段迭代器，run 随迭代补全本次转录的语言和音频时长"""
+
+    def __init__(self, segments, run):
+        self.segments = segments
+        self.run = run
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.segments)
+
+
+class TranscriptionEngine:
+    """
+    引擎基类
+
+    用法:
+        with create_engine("whisper", model="base") as engine:
+            stream = engine.transcribe("a.mp3")
+            for segment in stream:
+                ...  # {"start", "end", "text", ...}
+            stream.run     # 本次转录的语言、音频时长等
+            engine.info()  # 引擎信息 + 最近一次转录
+    """
+
+    name = "base"
+    # 是否支持 transcribe(..., offset=秒) 从中途续跑（任务队列据此在片段边界抢占）
+    resumable = False
+
+    def __init__(self, model=None, device="cpu", compute_type="int8", **options):
+        self.model = model
+        self.device = device
+        self.compute_type = compute_type
+        self.options = options
+        self.loaded = False
+        self.load_time = None
+        self.last_run = {}
+
+    def load(self):
+        """加载模型（重复调用无副作用）"""
+        if not self.loaded:
+            start = time.perf_counter()
+            with span("model_load", engine=self.name, model=self.model):
+                self._load()
+            self.load_time = time.perf_counter() - start
+            self.loaded = True
+        return self
+
+    def transcribe(self, audio_path, language=None, **options):
+        """
+        转录音频，返回逐个产出片段 dict 的 SegmentStream（同一引擎可被多个线程共用）
+
+        resumable 的引擎支持 offset=秒：跳过此前的音频，片段时间仍相对整段音频
+        """
+        self.load()
+        run = {"file": str(audio_path), "language": language, "duration": None}
+        self.last_run = run
+        return SegmentStream(self._transcribe(audio_path, language, options, run), run)
+
+    def info(self):
+        return {
+            "engine": self.name,
+            "model": self.model,
+            "device": self.device,
+            "compute_type": self.compute_type,
+            "loaded": self.loaded,
+            "load_time": round(self.load_time, 3) if self.load_time is not None else None,
+            "last_run": dict(self.last_run)
+        }
+
+    def close(self):
+        self._close()
+        self.loaded = False
+
+    def __enter__(self):
+        return self.load()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _load(self):
+        raise NotImplementedError
+
+    def _transcribe(self, audio_path, language, options, run):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+
+class WhisperEngine(TranscriptionEngine):
+    """
+    whisper_transcribe.LocalWhisperTranscriber 的适配：直接调用入口脚本的转录方法，
+    热词提示、循环保护、繁简转换和后处理与脚本完全一致；整段转完后再产出片段，不支持续跑
+    """
+
+    name = "whisper"
+    module = "whisper_transcribe"
+    transcriber_class = "LocalWhisperTranscriber"
+    transcribe_method = "transcribe_file"
+    # 转录方法自身的参数，其余 transcribe 参数（如 beam_size）作为解码参数覆盖
+    method_options = ("hotwords", "deadline", "redecode", "skip_music", "feed")
+
+    def __init__(self, model="base", device="cpu", compute_type="int8", **options):
+        super().__init__(model, device, compute_type, **options)
+
+    def _load(self):
+        module = importlib.import_module(self.module)
+        self.transcriber = getattr(module, self.transcriber_class)(
+            model_size=self.model, device=self.device, compute_type=self.compute_type, **self.options)
+
+    def _transcribe(self, audio_path, language, options, run):
+        kwargs = {key: options.pop(key) for key in self.method_options if key in options}
+        if options:
+            kwargs["decode_options"] = options
+        result = getattr(self.transcriber, self.transcribe_method)(str(audio_path), language, **kwargs)
+        if not result.get("success"):
+            raise RuntimeError(result.get("error", "Whisper 转录失败"))
+        run.update(language=result.get("language"), language_probability=result.get("language_probability"),
+                   duration=result.get("duration"))
+        for key in _REPORT_KEYS:
+            if key in result:
+                run[key] = result[key]
+        yield from result["segments"]
+
+    def _close(self):
+        self.transcriber = None
+
+
+class EnhancedWhisperEngine(WhisperEngine):
+    """enhanced_whisper_transcribe 的适配：片段附带情绪标记"""
+
+    name = "whisper-enhanced"
+    module = "enhanced_whisper_transcribe"
+    transcriber_class = "EnhancedWhisperTranscriber"
+    transcribe_method = "transcribe_file_enhanced"
+
+
+class OptimizedWhisperEngine(WhisperEngine):
+    """optimize_whisper 的适配：速度优先的解码参数"""
+
+    name = "whisper-optimized"
+    module = "optimize_whisper"
+    transcriber_class = "OptimizedWhisperTranscriber"
+    transcribe_method = "transcribe_file_optimized"
+    method_options = ()
+
+    def __init__(self, model="base", device="auto", compute_type="auto", **options):
+        super().__init__(model, device, compute_type, **options)
+
+
+class SenseVoiceEngine(TranscriptionEngine):
+    """sensevoice_transcribe 的适配（SenseVoice 一次性返回全部片段）"""
+
+    name = "sensevoice"
+
+    def __init__(self, model="SenseVoiceSmall", device="auto", compute_type="float32", **options):
+        super().__init__(model, device, compute_type, **options)
+
+    def _load(self):
+        from sensevoice_transcribe import load_model
+        self.loaded_model, self.device = load_model()
+
+    def _run(self, audio_path, language, options):
+        from sensevoice_transcribe import transcribe_audio
+        return transcribe_audio(str(audio_path), language=language or "auto",
+                                model=self.loaded_model, **{**self.options, **options})
+
+    def _transcribe(self, audio_path, language, options, run):
+        result = self._run(audio_path, language, options)
+        if not result.get("success"):
+            raise RuntimeError(result.get("error", "SenseVoice 转录失败"))
+        segments = result.get("segments") or []
+        # 结果里的 duration 是处理耗时；音频时长读文件头，读不到再退回最后一个片段的结束时间
+        duration = audio_duration(audio_path) or (segments[-1]["end"] if segments else None)
+        run.update(language=result.get("language"), duration=duration)
+        for key in _REPORT_KEYS:
+            if key in result:
+                run[key] = result[key]
+        yield from segments
+
+    def _close(self):
+        self.loaded_model = None
+
+
+class OptimizedSenseVoiceEngine(SenseVoiceEngine):
+    """sensevoice_optimize 的适配：按设备自动调整批大小，关闭时释放显存"""
+
+    name = "sensevoice-optimized"
+
+    def _load(self):
+        from sensevoice_optimize import load_optimized_model
+        self.loaded_model = load_optimized_model()
+        self.device = self.loaded_model["device"]
+
+    def _run(self, audio_path, language, options):
+        from sensevoice_optimize import transcribe_audio_optimized
+        return transcribe_audio_optimized(str(audio_path), language=language or "auto",
+                                          loaded=self.loaded_model, **{**self.options, **options})
+
+    def _close(self):
+        from sensevoice_optimize import clear_gpu_cache
+        self.loaded_model = None
+        clear_gpu_cache()
+
+
+_SYNTHETIC_WORDS = ["我们", "今天", "聊一聊", "人工智能", "大模型", "播客", "嗯", "对", "其实", "然后",
+                    "这个", "问题", "非常", "有意思", "所以", "但是", "数据", "产品", "用户", "时间"]
+
+
+class SyntheticEngine(TranscriptionEngine):
+    """
+    确定性合成引擎：按音频时长和种子生成固定的片段和文本，按配置的 RTF 控制产出节奏
+
+    参数:
+        rtf: 实时因子（每秒音频的处理耗时），0 表示不等待
+        load_seconds: 模拟模型加载耗时
+        first_segment_latency: 首个片段前的额外延迟（模拟 VAD / 语言检测）
+        segment_seconds: 平均片段时长
+        speakers: 片段上标注的说话人数（0 表示不标注）
+        failure_rate: 按文件名确定性失败的比例，用于测试重试和错误统计
+        duration: 音频时长；为空时读取文件头，读不到再用 default_duration
+    """
+
+    name = "synthetic"
+    resumable = True
+
+    def __init__(self, model="synthetic", device="cpu", compute_type="none", rtf=0.05, load_seconds=0.0,
+                 first_segment_latency=0.0, segment_seconds=4.0, speakers=2, seed=0, language="zh",
+                 failure_rate=0.0, duration=None, default_duration=60.0):
+        super().__init__(model, device, compute_type)
+        self.rtf = float(rtf)
+        self.load_seconds = float(load_seconds)
+        self.first_segment_latency = float(first_segment_latency)
+        self.segment_seconds = float(segment_seconds)
+        self.speakers = int(speakers)
+        self.seed = seed
+        self.language = language
+        self.failure_rate = float(failure_rate)
+        self.duration = duration
+        self.default_duration = float(default_duration)
+
+    def _load(self):
+        if self.load_seconds:
+            time.sleep(self.load_seconds)
+
+    def _transcribe(self, audio_path, language, options, run):
+        duration = options.get("duration") or self.duration or audio_duration(audio_path) or self.default_duration
+        duration = float(duration)
+        offset = float(options.get("offset") or 0)
+        rng = random.Random(f"{self.seed}:{Path(str(audio_path)).name}")
+        run.update(language=language or self.language, language_probability=1.0, duration=duration)
+
+        if self.failure_rate and rng.random() < self.failure_rate:
+            raise RuntimeError(f"合成引擎模拟失败: {Path(str(audio_path)).name}")
+        if self.first_segment_latency:
+            time.sleep(self.first_segment_latency)
+
+        t = 0.0
+        speaker = 0
+        while t < duration - 1e-6:
+            length = min(rng.uniform(0.5, 1.5) * self.segment_seconds, duration - t)
+            # 续跑时照常推进随机序列，只是不等待也不产出，保证结果与一次跑完相同
+            skipped = t + length <= offset + 1e-3
+            if self.rtf and not skipped:
+                time.sleep(length * self.rtf)
+            segment = {
+                "start": round(t, 3),
+                "end": round(t + length, 3),
+                "text": "".join(rng.choice(_SYNTHETIC_WORDS) for _ in range(max(1, int(length * 2)))),
+            }
+            if self.speakers:
+                if rng.random() < 0.3:
+                    speaker = (speaker + 1) % self.speakers
+                segment["speaker"] = f"SPEAKER_{speaker:02d}"
+            if not skipped:
+                yield segment
+            t += length + rng.uniform(0.0, 0.4)
+
+
+# 引擎名 -> 适配类（名称与 benchmark_engines.CASES 一致）
+ENGINES = {
+    "whisper": WhisperEngine,
+    "whisper-enhanced": EnhancedWhisperEngine,
+    "whisper-optimized": OptimizedWhisperEngine,
+    "sensevoice": SenseVoiceEngine,
+    "sensevoice-optimized": OptimizedSenseVoiceEngine,
+    "synthetic": SyntheticEngine,
+}
+
+
+def create_engine(name, **kwargs):
+    """按名称创建引擎（参数为空的项使用各引擎默认值）"""
+    if name not in ENGINES:
+        raise ValueError(f"未知引擎: {name}（可选: {', '.join(ENGINES)}）")
+    return ENGINES[name](**{k: v for k, v in kwargs.items() if v is not None})
+
+
+def run_engine(engine, audio_path, language=None, **options):
+    """
+    完整跑一遍并返回与各入口脚本一致的结果 dict
+
+    返回:
+        {"success", "file", "engine", "model", "text", "segments", "language", "duration",
+         "processing_time", "real_time_factor", "ttfs"}
+    """
+    start = time.perf_counter()
+    first = None
+    segments = []
+    try:
+        with span("decoding", engine=engine.name):
+            stream = engine.transcribe(audio_path, language, **options)
+            for segment in stream:
+                if first is None:
+                    first = time.perf_counter() - start
+                segments.append(segment)
+    except Exception as e:
+        return {"success": False, "file": str(audio_path), "engine": engine.name, "error": str(e),
+                "text": "", "segments": []}
+
+    elapsed = time.perf_counter() - start
+    run = stream.run
+    duration = run.get("duration")
+    result = {
+        "success": True,
+        "file": str(audio_path),
+        "engine": engine.name,
+        "model": engine.model,
+        "text": " ".join(seg["text"] for seg in segments).strip(),
+        "segments": segments,
+        "language": run.get("language"),
+        "duration": duration,
+        "processing_time": round(elapsed, 3),
+        "real_time_factor": round(elapsed / duration, 4) if duration else None,
+        "ttfs": round(first, 3) if first is not None else None
+    }
+    for key in _REPORT_KEYS:
+        if key in run:
+            result[key] = run[key]
+    return result
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def load_test(engine, audio_paths, jobs, concurrency=1, language=None, align=False, save_dir=None):
+    """
+    压测编排和输出环节：同一引擎上并发执行 jobs 个任务，可选对齐和写文件
+
+    返回:
+        吞吐量和延迟分位数
+    """
+    import io
+    import contextlib
+
+    def one(i):
+        audio = audio_paths[i % len(audio_paths)]
+        start = time.perf_counter()
+        result = run_engine(engine, audio, language)
+        if result["success"] and align:
+            from alignment_service import align_asr_with_diarization
+            turns = [dict(seg) for seg in result["segments"] if "speaker" in seg]
+            with contextlib.redirect_stderr(io.StringIO()):
+                result["segments"] = align_asr_with_diarization(result["segments"], turns)
+        if result["success"] and save_dir:
+            from whisper_transcribe import save_transcript_to_file
+            with contextlib.redirect_stderr(io.StringIO()):
+                save_transcript_to_file(result["text"], save_dir, file_prefix=f"loadtest_{i:05d}",
+                                        segments=result["segments"])
+        return result, time.perf_counter() - start
+
+    engine.load()
+    wall_start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one, range(jobs)))
+    wall = time.perf_counter() - wall_start
+
+    latencies = [seconds for _, seconds in outcomes]
+    ok = [result for result, _ in outcomes if result["success"]]
+    audio_seconds = sum(result["duration"] or 0 for result in ok)
+    return {
+        "engine": engine.name,
+        "jobs": jobs,
+        "concurrency": concurrency,
+        "succeeded": len(ok),
+        "failed": jobs - len(ok),
+        "wall_s": round(wall, 3),
+        "jobs_per_s": round(jobs / wall, 3) if wall else None,
+        "audio_seconds_per_s": round(audio_seconds / wall, 2) if wall else None,
+        "latency_p50_s": round(statistics.median(latencies), 4),
+        "latency_p95_s": round(_percentile(latencies, 0.95), 4),
+        "ttfs_p50_s": round(statistics.median(r["ttfs"] for r in ok if r["ttfs"] is not None), 4)
+                      if any(r["ttfs"] is not None for r in ok) else None
+    }
+
+
+def _parse_options(pairs):
+    """--option key=value，值按 JSON 解析，失败则作为字符串"""
+    options = {}
+    for pair in pairs or []:
+        key, _, value = pair.partition("=")
+        try:
+            options[key] = json.loads(value)
+        except ValueError:
+            options[key] = value
+    return options
+
+
+def main():
+    parser = argparse.ArgumentParser(description='统一引擎接口：转录或压测')
+    parser.add_argument('engine', choices=list(ENGINES), help='引擎名')
+    parser.add_argument('files', nargs='+', help='音频文件路径（合成引擎可以是不存在的文件名）')
+    parser.add_argument('--model', help='模型名')
+    parser.add_argument('--device', help='计算设备')
+    parser.add_argument('--compute-type', help='计算精度')
+    parser.add_argument('--language', help='指定语言代码')
+    parser.add_argument('--option', action='append', metavar='KEY=VALUE',
+                      help='引擎构造参数，可重复（如 rtf=0.02、load_seconds=1）')
+    parser.add_argument('--load-test', type=int, metavar='JOBS', help='压测模式：执行的任务数')
+    parser.add_argument('--concurrency', type=int, default=4, help='压测并发数 (默认: 4)')
+    parser.add_argument('--align', action='store_true', help='压测时对结果做说话人对齐')
+    parser.add_argument('--save-dir', help='压测时把转录写入该目录')
+    parser.add_argument('--queue', action='store_true',
+                      help='提交到本地任务队列并等待结果（由 job_queue.py worker 执行）')
+    parser.add_argument('--user', default=os.getenv("USER", "default"), help='队列模式的提交用户')
+    parser.add_argument('--priority', type=int, default=0, help='队列模式的优先级')
+    args = parser.parse_args()
+
+    if args.queue:
+        from job_queue import JobQueue
+        with JobQueue() as queue:
+            options = {"engine": _parse_options(args.option)} if args.option else None
+            ids = [queue.submit(path, args.engine, model=args.model, device=args.device,
+                                compute_type=args.compute_type, language=args.language,
+                                user=args.user, priority=args.priority, options=options)
+                   for path in args.files]
+            print(f"📥 已提交到任务队列: {', '.join(map(str, ids))}", file=sys.stderr)
+            jobs = queue.wait(ids)
+        results = [jobs[i].get("result") or {"success": False, "file": jobs[i]["audio_path"],
+                                              "error": jobs[i].get("error") or jobs[i]["status"]}
+                   for i in ids]
+        output = results[0] if len(results) == 1 else {"results": results, "batch": True}
+        print(json.dumps(output, ensure_ascii=False))
+        return
+
+    engine = create_engine(args.engine, model=args.model, device=args.device,
+                           compute_type=args.compute_type, **_parse_options(args.option))
+    try:
+        if args.load_test:
+            print(f"🏋️ 压测 {args.engine}: {args.load_test} 个任务, 并发 {args.concurrency}", file=sys.stderr)
+            report = load_test(engine, args.files, args.load_test, args.concurrency,
+                               args.language, args.align, args.save_dir)
+            print(json.dumps({"success": True, "load_test": report, "engine_info": engine.info()},
+                             ensure_ascii=False))
+            return
+        results = [run_engine(engine, path, args.language) for path in args.files]
+        output = results[0] if len(results) == 1 else {"results": results, "batch": True}
+        print(json.dumps(output, ensure_ascii=False))
+    finally:
+        engine.close()
+
+if __name__ == "__main__":
+    main()
@@ -8,12 +8,33 @@ import sys
 import json
 import argparse
 import time
-import re
 from pathlib import Path
-from faster_whisper import WhisperModel
+from segment_table import SegmentTable
+from transcript_search import index_saved_transcript
+from hotword_engine import HotwordEngine
+from postprocess_pipeline import PostProcessor, EmotionTagger
+from tracing import tracer, span, add_trace_arguments, start_tracing, finish_tracing
+import runtime_predictor
+import autotune
+import cpu_allocator
+import feature_cache
+from deadline import parse_deadline, whisper_deadline_transcribe
+from loop_guard import guarded_transcribe, guard_segments
+import nonspeech
+from fingerprint import RecurringSegments, source_feed
+from job_queue import add_queue_arguments, queue_slot, track_slot
+from redecode import confidence_fields, redecode_low_confidence, REDECODE_MODEL, LOGPROB_THRESHOLD
+import metrics
 import warnings
 warnings.filterwarnings("ignore")
 
+# 模型库（只做格式化/情绪检测时可以不安装）
+try:
+    from faster_whisper import WhisperModel, decode_audio
+except ImportError:
+    WhisperModel = None
+    decode_audio = None
+
 # 繁简转换
 try:
     import opencc
@@ -23,14 +44,37 @@ except ImportError:
     HAS_OPENCC = False
     print("⚠️ 繁简转换库未安装，跳过转换", file=sys.stderr)
 
+# 解码参数（基准测试和评估工具复用）
+DECODE_OPTIONS = dict(
+    vad_filter=True,
+    vad_parameters=dict(min_silence_duration_ms=500),
+    word_timestamps=True,  # 启用词级时间戳
+    # 添加其他参数来优化中文转录
+    beam_size=5,
+    best_of=5,
+    temperature=0.0  # 使用确定性解码
+)
+
 class EnhancedWhisperTranscriber:
-    def __init__(self, model_size="base", device="cpu", compute_type="int8"):
+    def __init__(self, model_size="base", device="cpu", compute_type="int8", load_model=True):
         """
         初始化增强版Whisper模型
+        
+        Args:
+            load_model: 为 False 时只用于格式化输出，不加载模型
         """
-        print(f"🔄 正在加载Whisper模型: {model_size}", file=sys.stderr)
-        self.model = WhisperModel(model_size, device=device, compute_type=compute_type)
-        print(f"✅ 模型加载完成", file=sys.stderr)
+        self.model = None
+        self.model_size = model_size
+        self.device = device
+        self.compute_type = compute_type
+        if load_model:
+            if WhisperModel is None:
+                raise ImportError("faster-whisper 未安装，无法加载模型")
+            print(f"🔄 正在加载Whisper模型: {model_size}", file=sys.stderr)
+            with span("model_load", model=model_size):
+                self.model = feature_cache.install(WhisperModel(model_size, device=device, compute_type=compute_type,
+                                                                **autotune.whisper_model_kwargs(device)))
+            print(f"✅ 模型加载完成", file=sys.stderr)
         
         # 初始化繁简转换器
         if HAS_OPENCC:
@@ -53,6 +97,7 @@ class EnhancedWhisperTranscriber:
             '停顿': ['..', '...', '....'],
             '问候': ['大家好', '朋友們', '听众', '聽眾']
         }
+        self.emotion_tagger = EmotionTagger(self.emotion_keywords)
     
     def convert_to_simplified(self, text):
         """
@@ -72,7 +117,7 @@ class EnhancedWhisperTranscriber:
         """
         speakers = []
         current_speaker = "主持人"
-        speaker_count = 0
+        long_pauses = SegmentTable.from_segments(segments).gaps() > 2.0
         
         for i, segment in enumerate(segments):
             text = segment['text'].strip()
@@ -81,7 +126,7 @@ class EnhancedWhisperTranscriber:
             speaker_change_indicators = [
                 len(text) > 100,  # 长句子更可能是新说话人
                 text.startswith(('好', '那', '所以', '其实', '但是')),  # 转折词
-                i > 0 and segment['start'] - segments[i-1]['end'] > 2.0  # 长停顿
+                i > 0 and long_pauses[i - 1]  # 长停顿
             ]
             
             if any(speaker_change_indicators) and i > 0:
@@ -96,27 +141,9 @@ class EnhancedWhisperTranscriber:
     
     def detect_emotions(self, text):
         """
-        检测文本中的情绪标记
+        检测文本中的情绪标记（关键词、标点单次自动机匹配）
         """
-        emotions = []
-        
-        for emotion, keywords in self.emotion_keywords.items():
-            for keyword in keywords:
-                if keyword in text:
-                    emotions.append(emotion)
-                    break
-        
-        # 检测重复字符（表示强调或情绪）
-        if re.search(r'(.)\1{2,}', text):
-            emotions.append('强调')
-        
-        # 检测问号和感叹号
-        if '?' in text or '？' in text:
-            emotions.append('疑问')
-        if '!' in text or '！' in text:
-            emotions.append('激动')
-        
-        return list(set(emotions))
+        return self.emotion_tagger.tag(text)
     
     def format_transcript_with_speakers_and_emotions(self, segments, speakers, podcast_title=None):
         """
@@ -144,8 +171,10 @@ class EnhancedWhisperTranscriber:
         for i, (segment, speaker) in enumerate(zip(segments, speakers)):
             text = segment['text'].strip()
             
-            # 检测情绪
-            emotions = self.detect_emotions(text)
+            # 检测情绪（转录时已在后处理线程中计算的直接复用）
+            emotions = segment.get('emotions')
+            if emotions is None:
+                emotions = self.detect_emotions(text)
             emotion_tags = ' '.join([f'[{e}]' for e in emotions]) if emotions else ''
             
             # 时间戳
@@ -200,12 +229,30 @@ class EnhancedWhisperTranscriber:
         secs = int(seconds % 60)
         return f"{minutes:02d}:{secs:02d}"
     
-    def transcribe_file_enhanced(self, audio_path, language=None):
+    def load_extra_model(self, model_size):
+        """按需加载另一个尺寸的模型（截止时间降级、低置信度二次解码；同设备、同精度）"""
+        if model_size == self.model_size and self.model is not None:
+            return self.model
+        print(f"🔄 加载模型: {model_size}", file=sys.stderr)
+        return feature_cache.install(WhisperModel(model_size, device=self.device, compute_type=self.compute_type,
+                                                  **autotune.whisper_model_kwargs(self.device)))
+
+    def transcribe_file_enhanced(self, audio_path, language=None, hotwords=None, deadline=None, redecode=None,
+                                 skip_music=False, feed=None, decode_options=None):
         """
         增强版转录，支持说话人分离和情绪检测
+        
+        Args:
+            hotwords: 热词词库 (None为不使用; 主题名/词库名/"auto")
+            deadline: 截止时间 (epoch 秒)，设置后分块解码并按需降级
+            redecode: 低置信度片段二次解码设置 {"model", "beam_size", "logprob_threshold"}（None 为不做）
+            skip_music: 解码前预分类，音乐 / 噪声区域不送进解码器
+            feed: 节目名，设置后与该节目往期的片头 / 片尾 / 重复口播比对，重合部分复用往期转录
+            decode_options: 覆盖默认解码参数（如队列按积压选的 beam_size）
         """
         try:
             print(f"🎤 开始增强转录: {audio_path}", file=sys.stderr)
+            options = {**DECODE_OPTIONS, **(decode_options or {})}
             start_time = time.time()
             
             # 执行转录 - 自动检测语言，但中文统一使用简体
@@ -216,45 +263,86 @@ class EnhancedWhisperTranscriber:
             elif language is None:
                 print(f"🌐 自动检测语言模式", file=sys.stderr)
             
-            segments, info = self.model.transcribe(
-                audio_path, 
-                language=language,
-                vad_filter=True,
-                vad_parameters=dict(min_silence_duration_ms=500),
-                word_timestamps=True,  # 启用词级时间戳
-                # 添加其他参数来优化中文转录
-                beam_size=5,
-                best_of=5,
-                temperature=0.0  # 使用确定性解码
-            )
+            # 热词提示
+            hotword_engine = None
+            hotword_domain = None
+            prompt_kwargs = {}
+            if hotwords:
+                hotword_engine = HotwordEngine.load()
+                hotword_domain = hotword_engine.resolve_domain(hotwords, Path(audio_path).stem)
+                prompt_kwargs = hotword_engine.decoder_kwargs(hotword_domain, language)
+                print(f"🔥 使用热词库: {hotword_domain}", file=sys.stderr)
             
-            # 收集所有片段
-            transcript_segments = []
-            full_text = ""
+            with span("audio_decode"):
+                audio = feature_cache.load_audio(audio_path, decode_audio)
+            
+            # 与往期重合的片段（在屏蔽音乐之前比对，片头音乐也是指纹）
+            recurring = RecurringSegments(feed, audio, audio_path) if feed else None
+            
+            # 音乐 / 噪声区域置零，VAD 整段跳过
+            nonspeech_report = None
+            if skip_music:
+                prediction = runtime_predictor.current_prediction()
+                audio, nonspeech_report = nonspeech.detect(audio, prediction["rtf"] if prediction else None)
+            if recurring:
+                audio = recurring.mask(audio)
+            
+            # transcribe() 内完成 VAD、特征提取和语言检测，返回的生成器才开始解码
+            if deadline:
+                prediction = runtime_predictor.current_prediction()
+                segments, info = whisper_deadline_transcribe(
+                    self, audio, deadline, options, self.model_size, language, prompt_kwargs,
+                    initial_rtf=prediction["rtf"] if prediction else None,
+                    load_model=self.load_extra_model
+                )
+                segments = guard_segments(segments, info)
+            else:
+                with span("vad_language_detection"):
+                    segments, info = guarded_transcribe(self.model, audio, language, options, prompt_kwargs)
             
             # 根据检测的语言决定是否需要繁简转换
             need_conversion = info.language in ['zh', 'chinese'] and original_language is None
             if need_conversion:
                 print(f"🔄 检测到中文内容，将进行繁简转换", file=sys.stderr)
             
-            for segment in segments:
-                text = segment.text.strip()
-                # 如果是自动检测到的中文，进行繁简转换
-                if need_conversion:
-                    text = self.convert_to_simplified(text)
-                
-                segment_dict = {
-                    "start": segment.start,
-                    "end": segment.end,
-                    "text": text
-                }
-                transcript_segments.append(segment_dict)
-                full_text += text + " "
+            # 收集所有片段：解码的同时在后台线程批量做繁简转换和情绪标记
+            print(f"😊 检测情绪标记...", file=sys.stderr)
+            processor = PostProcessor(self.converter, self.emotion_keywords)
+            with span("decoding"):
+                transcript_segments = processor.run(
+                    (
+                        {"start": segment.start, "end": segment.end, "text": segment.text.strip(),
+                         **confidence_fields(segment)}
+                        for segment in track_slot(runtime_predictor.track_progress(segments, info.duration))
+                    ),
+                    need_conversion=need_conversion
+                )
+            
+            # 低置信度片段用更大的模型 / beam 二次解码
+            redecode_report = None
+            if redecode:
+                transcript_segments, redecode_report = redecode_low_confidence(
+                    transcript_segments, audio, self.load_extra_model,
+                    redecode.get("model") or REDECODE_MODEL.get(self.model_size, "medium"),
+                    language=info.language, options=options, beam_size=redecode.get("beam_size", 5),
+                    postprocess=lambda batch: processor.process_batch(batch, need_conversion),
+                    logprob_threshold=redecode.get("logprob_threshold", LOGPROB_THRESHOLD)
+                )
+            # 拼入复用的往期片段（在二次解码之后，复用部分不会被重新解码）
+            if recurring:
+                transcript_segments = recurring.splice(transcript_segments)
+            full_text = " ".join(seg["text"] for seg in transcript_segments)
+            
+            # 热词规范化（单次扫描）
+            hotword_summary = None
+            if hotword_engine:
+                with span("hotword_normalization"):
+                    hotword_summary = hotword_engine.normalize_segments(transcript_segments, hotword_domain)
+                full_text = " ".join(seg["text"] for seg in transcript_segments)
             
             print(f"🎭 检测说话人变化...", file=sys.stderr)
-            speakers = self.detect_speaker_change(transcript_segments)
-            
-            print(f"😊 检测情绪标记...", file=sys.stderr)
+            with span("speaker_change"):
+                speakers = self.detect_speaker_change(transcript_segments)
             
             duration = time.time() - start_time
             
@@ -270,6 +358,20 @@ class EnhancedWhisperTranscriber:
                 "processing_time": round(duration, 2),
                 "enhanced": True
             }
+            if hotword_engine:
+                result["hotword_domain"] = hotword_domain
+                result["hotwords"] = hotword_summary
+            if deadline:
+                result["deadline"] = info.deadline
+            if redecode_report:
+                result["redecode"] = redecode_report
+            if info.loop_guard and info.loop_guard["spans"]:
+                result["loop_guard"] = info.loop_guard
+            if nonspeech_report:
+                result["nonspeech"] = nonspeech_report
+            if recurring:
+                result["recurring"] = recurring.report(nonspeech_report["regions"] if nonspeech_report else None)
+                recurring.store(transcript_segments)
             
             print(f"✅ 增强转录完成: {duration:.1f}秒", file=sys.stderr)
             print(f"🎭 检测到说话人变化: {len(set(speakers))}个", file=sys.stderr)
@@ -296,8 +398,8 @@ def save_enhanced_transcript_to_file(result, save_dir, file_prefix=None, podcast
         save_path.mkdir(parents=True, exist_ok=True)
         saved_files = []
         
-        # 创建转录器实例来格式化内容
-        transcriber = EnhancedWhisperTranscriber()
+        # 创建转录器实例来格式化内容（不加载模型）
+        transcriber = EnhancedWhisperTranscriber(load_model=False)
         
         # 1. 保存原始转录文件（纯净版本）
         if file_prefix:
@@ -316,7 +418,7 @@ def save_enhanced_transcript_to_file(result, save_dir, file_prefix=None, podcast
         if source_url:
             raw_markdown_content += f"\n\n---\n\n**来源**: {source_url}\n"
         
-        with open(raw_file_path, 'w', encoding='utf-8') as f:
+        with span("file_write"), open(raw_file_path, 'w', encoding='utf-8') as f:
             f.write(raw_markdown_content)
         
         raw_file_size = raw_file_path.stat().st_size
@@ -346,7 +448,7 @@ def save_enhanced_transcript_to_file(result, save_dir, file_prefix=None, podcast
             if source_url:
                 enhanced_markdown_content += f"\n\n---\n\n**来源**: {source_url}\n"
             
-            with open(enhanced_file_path, 'w', encoding='utf-8') as f:
+            with span("file_write"), open(enhanced_file_path, 'w', encoding='utf-8') as f:
                 f.write(enhanced_markdown_content)
             
             enhanced_file_size = enhanced_file_path.stat().st_size
@@ -358,6 +460,20 @@ def save_enhanced_transcript_to_file(result, save_dir, file_prefix=None, podcast
             })
             print(f"📄 增强转录文本已保存: {enhanced_file_path} ({enhanced_file_size/1024:.1f}KB)", file=sys.stderr)
         
+        # 增量更新全文检索索引（以原始转录文件为键，附带说话人）
+        speakers = result.get('speakers') or []
+        with span("search_index"):
+            index_saved_transcript(
+                raw_file_path,
+                [
+                    dict(seg, speaker=speakers[i]) if i < len(speakers) else seg
+                    for i, seg in enumerate(result['segments'])
+                ],
+                title=podcast_title,
+                source_url=source_url,
+                save_dir=save_dir
+            )
+        
         return saved_files
         
     except Exception as e:
@@ -382,8 +498,47 @@ def main():
     parser.add_argument("--source-url", help="播客来源链接")
     parser.add_argument("--podcast-title", help="播客标题")
     parser.add_argument("--enhanced", action="store_true", help="启用增强模式（说话人分离+情绪检测）")
+    parser.add_argument("--hotwords", help="热词库 (科技/商业/教育/词库文件名，或 auto 按标题推断)")
+    parser.add_argument("--beam-size", type=int, help="解码 beam 大小 (默认: 5，积压时由调度策略调小)")
+    parser.add_argument("--deadline", help="截止时间 (秒数、15m/2h、HH:MM 或 ISO 时间)，来不及时逐块降低解码开销")
+    parser.add_argument("--redecode", action="store_true", help="用更大的模型二次解码低置信度片段")
+    parser.add_argument("--skip-music", action="store_true",
+                       help="解码前按频谱特征标出音乐 / 噪声区域并跳过（片头音乐、插曲、广告 jingle）")
+    parser.add_argument("--feed", help="节目名：与该节目往期比对音频指纹，片头 / 片尾 / 重复口播复用往期转录")
+    parser.add_argument("--reuse-previous", action="store_true",
+                       help="与同一 --source-url 之前转录过的版本对齐（重新上传、插入的广告不同），只转录变化的部分")
+    parser.add_argument("--redecode-model", choices=["tiny", "base", "small", "medium", "large-v3"],
+                       help="二次解码的模型 (默认: 比 --model 大一档以上)")
+    parser.add_argument("--redecode-beam", type=int, default=5, help="二次解码的 beam 大小 (默认: 5)")
+    parser.add_argument("--redecode-threshold", type=float, default=LOGPROB_THRESHOLD,
+                       help=f"avg_logprob 低于该值的片段二次解码 (默认: {LOGPROB_THRESHOLD})")
+    add_queue_arguments(parser)
+    add_trace_arguments(parser)
     
     args = parser.parse_args()
+    start_tracing(args)
+    
+    redecode = None
+    if args.redecode:
+        redecode = {"model": args.redecode_model, "beam_size": args.redecode_beam,
+                    "logprob_threshold": args.redecode_threshold}
+    
+    # 没有指定节目时按来源链接比对：同一链接之前下载的版本都在这个“节目”下
+    if args.reuse_previous and not args.feed:
+        if args.source_url:
+            args.feed = source_feed(args.source_url)
+        else:
+            print("⚠️ --reuse-previous 需要 --source-url，已忽略", file=sys.stderr)
+    
+    deadline = None
+    if args.deadline:
+        try:
+            deadline = parse_deadline(args.deadline)
+        except ValueError as e:
+            print(f"❌ {e}", file=sys.stderr)
+            sys.exit(1)
+    
+    engine = "whisper-enhanced" if args.enhanced else "whisper"
     
     # 验证文件存在
     audio_files = []
@@ -394,38 +549,66 @@ def main():
             sys.exit(1)
         audio_files.append(str(path.absolute()))
     
+    # auto 模式优先用播客标题推断领域
+    hotwords = args.hotwords
+    if hotwords == "auto" and args.podcast_title:
+        hotwords = HotwordEngine.load().resolve_domain("auto", args.podcast_title)
+    
+    if args.beam_size:
+        import whisper_transcribe
+        for options in (DECODE_OPTIONS, whisper_transcribe.DECODE_OPTIONS):
+            options.update(beam_size=args.beam_size, best_of=args.beam_size)
+    
     try:
-        # 初始化转录器
-        if args.enhanced:
-            print("🚀 启动增强转录模式", file=sys.stderr)
-            transcriber = EnhancedWhisperTranscriber(
-                model_size=args.model,
-                device=args.device,
-                compute_type=args.compute_type.replace("-", "_")
-            )
+        # 经队列运行时先等到名额，再租 CPU 核、开始计时和加载模型（排队时间不占核、不计入耗时）
+        with queue_slot(args, audio_files[0], engine, args.model, args.device, args.compute_type,
+                        args.language) as slot:
+            # 多个转录同时运行时分到互不重叠的 CPU 核
+            cpu_allocator.acquire_for_job(engine, device=args.device)
             
-            # 使用增强转录
-            if len(audio_files) == 1:
-                result = transcriber.transcribe_file_enhanced(audio_files[0], args.language)
+            # 按历史 RTF 预测耗时，解码过程中输出进度
+            job_start = time.perf_counter()
+            prediction = runtime_predictor.start_job(engine, audio_files,
+                                                     model=runtime_predictor.history_model(args.model, args.beam_size),
+                                                     compute_type=args.compute_type, language=args.language)
+            
+            # 初始化转录器
+            if args.enhanced:
+                print("🚀 启动增强转录模式", file=sys.stderr)
+                transcriber = EnhancedWhisperTranscriber(
+                    model_size=args.model,
+                    device=args.device,
+                    compute_type=args.compute_type.replace("-", "_")
+                )
+            
+                # 使用增强转录
+                if len(audio_files) == 1:
+                    result = transcriber.transcribe_file_enhanced(audio_files[0], args.language, hotwords, deadline,
+                                                                  redecode, args.skip_music, args.feed)
+                else:
+                    # 批量处理（暂时使用普通模式）
+                    print("⚠️ 批量模式暂不支持增强功能，使用普通转录", file=sys.stderr)
+                    from whisper_transcribe import LocalWhisperTranscriber
+                    basic_transcriber = LocalWhisperTranscriber(args.model, args.device,
+                                                                args.compute_type.replace("-", "_"))
+                    result = basic_transcriber.transcribe_multiple(audio_files, args.language, hotwords, deadline,
+                                                                   redecode, args.skip_music, args.feed)
             else:
-                # 批量处理（暂时使用普通模式）
-                print("⚠️ 批量模式暂不支持增强功能，使用普通转录", file=sys.stderr)
+                # 使用普通转录
                 from whisper_transcribe import LocalWhisperTranscriber
-                basic_transcriber = LocalWhisperTranscriber(args.model, args.device, args.compute_type.replace("-", "_"))
-                result = basic_transcriber.transcribe_multiple(audio_files, args.language)
-        else:
-            # 使用普通转录
-            from whisper_transcribe import LocalWhisperTranscriber
-            transcriber = LocalWhisperTranscriber(
-                model_size=args.model,
-                device=args.device,
-                compute_type=args.compute_type.replace("-", "_")
-            )
+                transcriber = LocalWhisperTranscriber(
+                    model_size=args.model,
+                    device=args.device,
+                    compute_type=args.compute_type.replace("-", "_")
+                )
             
-            if len(audio_files) == 1:
-                result = transcriber.transcribe_file(audio_files[0], args.language)
-            else:
-                result = transcriber.transcribe_multiple(audio_files, args.language)
+                if len(audio_files) == 1:
+                    result = transcriber.transcribe_file(audio_files[0], args.language, hotwords, deadline, redecode,
+                                                         args.skip_music, args.feed)
+                else:
+                    result = transcriber.transcribe_multiple(audio_files, args.language, hotwords, deadline, redecode,
+                                                             args.skip_music, args.feed)
+            slot.result = result
         
         # 处理转录文本保存
         saved_files = []
@@ -450,7 +633,8 @@ def main():
                     file_prefix=args.file_prefix,
                     original_filename=audio_files[0] if len(audio_files) == 1 else None,
                     source_url=args.source_url,
-                    podcast_title=args.podcast_title
+                    podcast_title=args.podcast_title,
+                    segments=result.get('segments')
                 )
                 if file_info:
                     saved_files.append(file_info)
@@ -459,6 +643,19 @@ def main():
         if isinstance(result, dict):
             result['savedFiles'] = saved_files
         
+        # 分阶段耗时汇总和任务指标
+        trace_summary = finish_tracing(result, args)
+        items = result if isinstance(result, list) else [result]
+        runtime_predictor.finish_job(result, prediction, time.perf_counter() - job_start,
+                                     load_seconds=tracer.stage_seconds("model_load"),
+                                     audio_seconds=sum(item.get("duration") or 0 for item in items))
+        for item in items:
+            metrics.record_job(engine, args.model, item,
+                               audio_seconds=item.get("duration"),
+                               processing_seconds=item.get("processing_time"))
+        metrics.record_stages(engine, args.model, trace_summary)
+        metrics.flush()
+        
         # 输出结果
         if args.output:
             with open(args.output, 'w', encoding='utf-8') as f:
@@ -470,9 +667,11 @@ def main():
     
     except KeyboardInterrupt:
         print("\n⚠️ 转录被用户中断", file=sys.stderr)
+        metrics.record_failure(engine, args.model, "KeyboardInterrupt")
         sys.exit(1)
     except Exception as e:
         print(f"❌ 程序错误: {e}", file=sys.stderr)
+        metrics.record_failure(engine, args.model, e)
         sys.exit(1)
 
 if __name__ == "__main__":
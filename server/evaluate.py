@@ -0,0 +1,593 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+速度-准确率评估
+在带参考转录（.txt）和 RTTM 的参考集上运行多组解码配置，计算 CER/WER/DER 与 RTF，
+输出 CSV、ASCII 散点图（可选 matplotlib PNG）和 Pareto 前沿，挑出满足准确率要求的最快配置
+"""
+
+import sys
+import io
+import re
+import csv
+import json
+import time
+import argparse
+import itertools
+import contextlib
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+
+from runtime_predictor import probe_duration
+import feature_cache
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".flac", ".ogg", ".aac", ".mp4")
+
+# DER 帧长与参考边界两侧不计分的宽度（秒），与 NIST md-eval 默认值一致
+DER_FRAME = 0.01
+DER_COLLAR = 0.25
+
+# 默认扫描的配置：覆盖两个 Whisper 脚本当前使用的 beam 设置和 SenseVoice 批大小
+DEFAULT_CONFIGS = [
+    {"name": "whisper-base-beam1", "engine": "whisper", "model": "base",
+     "options": {"beam_size": 1, "best_of": 1}},
+    {"name": "whisper-base-beam5", "engine": "whisper", "model": "base",
+     "options": {"beam_size": 5, "best_of": 5}},
+    {"name": "whisper-small-beam1", "engine": "whisper", "model": "small",
+     "options": {"beam_size": 1, "best_of": 1}},
+    {"name": "whisper-small-beam5", "engine": "whisper", "model": "small",
+     "options": {"beam_size": 5, "best_of": 5}},
+    {"name": "whisper-base-vad250", "engine": "whisper", "model": "base",
+     "options": {"beam_size": 1, "best_of": 1,
+                 "vad_parameters": {"min_silence_duration_ms": 250, "threshold": 0.5}}},
+    {"name": "sensevoice-batch64", "engine": "sensevoice", "options": {"batch_size_s": 64}},
+    {"name": "sensevoice-batch300", "engine": "sensevoice", "options": {"batch_size_s": 300}},
+]
+
+
+# ---------------------------------------------------------------------------
+# 编辑距离
+# ---------------------------------------------------------------------------
+
+def edit_distance(reference, hypothesis):
+    """
+    Levenshtein 距离（Myers/Hyyrö 位并行算法）
+
+    把较短的序列编码为位向量（Python 大整数），每处理另一序列的一个符号只做常数次位运算，
+    复杂度 O(n·⌈m/w⌉)，对按字切分的中文长文本比逐格动态规划快一到两个数量级
+
+    参数:
+        reference, hypothesis: 字符串或任意可哈希元素的序列
+    """
+    a, b = (reference, hypothesis) if len(reference) >= len(hypothesis) else (hypothesis, reference)
+    m = len(b)
+    if m == 0:
+        return len(a)
+
+    peq = {}
+    for i, symbol in enumerate(b):
+        peq[symbol] = peq.get(symbol, 0) | (1 << i)
+
+    mask = (1 << m) - 1
+    last = 1 << (m - 1)
+    pv, mv, score = mask, 0, m
+    for symbol in a:
+        eq = peq.get(symbol, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+    return score
+
+
+# ---------------------------------------------------------------------------
+# 文本规范化与切分
+# ---------------------------------------------------------------------------
+
+_converter = None
+
+
+def _t2s(text):
+    """繁体转简体（OpenCC 未安装时原样返回）"""
+    global _converter
+    if _converter is None:
+        try:
+            import opencc
+            _converter = opencc.OpenCC('t2s')
+        except Exception:
+            _converter = False
+    return _converter.convert(text) if _converter else text
+
+
+def _is_cjk(ch):
+    return "一" <= ch <= "鿿" or "㐀" <= ch <= "䶿" or "぀" <= ch <= "ヿ" or "가" <= ch <= "힯"
+
+
+def normalize_text(text):
+    """全角转半角、繁转简、小写，去掉标点和 SenseVoice 的 <|...|> 标签"""
+    text = re.sub(r"<\|[^|]*\|>", " ", text or "")
+    text = unicodedata.normalize("NFKC", _t2s(text)).lower()
+    return "".join(ch if not unicodedata.category(ch).startswith(("P", "S")) else " " for ch in text)
+
+
+def char_tokens(text):
+    """CER 的切分单位：去掉空白后的每个字符"""
+    return [ch for ch in normalize_text(text) if not ch.isspace()]
+
+
+def word_tokens(text):
+    """WER 的切分单位：中日韩文字按字，其余按空白分词（中英混排时英文单词算一个词）"""
+    tokens = []
+    word = []
+    for ch in normalize_text(text):
+        if ch.isspace() or _is_cjk(ch):
+            if word:
+                tokens.append("".join(word))
+                word = []
+            if _is_cjk(ch):
+                tokens.append(ch)
+        else:
+            word.append(ch)
+    if word:
+        tokens.append("".join(word))
+    return tokens
+
+
+def error_rate(reference_tokens, hypothesis_tokens):
+    """(编辑距离, 参考长度)"""
+    return edit_distance(reference_tokens, hypothesis_tokens), len(reference_tokens)
+
+
+# ---------------------------------------------------------------------------
+# DER
+# ---------------------------------------------------------------------------
+
+def load_rttm(path):
+    """读取 RTTM，返回 [(start, end, speaker), ...]"""
+    turns = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 8 and parts[0] == "SPEAKER":
+                start, duration = float(parts[3]), float(parts[4])
+                turns.append((start, start + duration, parts[7]))
+    return turns
+
+
+def write_rttm(path, turns, file_id="audio"):
+    with open(path, 'w', encoding='utf-8') as f:
+        for start, end, speaker in turns:
+            f.write(f"SPEAKER {file_id} 1 {start:.3f} {end - start:.3f} <NA> <NA> {speaker} <NA> <NA>\n")
+
+
+def _activity(turns, n_frames, frame):
+    """说话人 × 帧 的布尔活动矩阵"""
+    speakers = sorted({s for _, _, s in turns})
+    index = {s: i for i, s in enumerate(speakers)}
+    matrix = np.zeros((len(speakers), n_frames), dtype=bool)
+    for start, end, speaker in turns:
+        a, b = int(round(start / frame)), int(round(end / frame))
+        matrix[index[speaker], max(a, 0):max(b, 0)] = True
+    return speakers, matrix
+
+
+def _optimal_mapping(overlap):
+    """参考说话人与假设说话人的一一映射，使重叠帧数最大"""
+    try:
+        from scipy.optimize import linear_sum_assignment
+        rows, cols = linear_sum_assignment(-overlap)
+        return list(zip(rows.tolist(), cols.tolist()))
+    except ImportError:
+        pass
+    n_ref, n_hyp = overlap.shape
+    if min(n_ref, n_hyp) <= 7:
+        best, best_pairs = -1, []
+        if n_ref <= n_hyp:
+            for perm in itertools.permutations(range(n_hyp), n_ref):
+                total = overlap[range(n_ref), perm].sum()
+                if total > best:
+                    best, best_pairs = total, list(zip(range(n_ref), perm))
+        else:
+            for perm in itertools.permutations(range(n_ref), n_hyp):
+                total = overlap[perm, range(n_hyp)].sum()
+                if total > best:
+                    best, best_pairs = total, list(zip(perm, range(n_hyp)))
+        return best_pairs
+    # 说话人很多时退化为贪心
+    pairs, used_r, used_h = [], set(), set()
+    for flat in np.argsort(-overlap, axis=None):
+        r, h = divmod(int(flat), n_hyp)
+        if r not in used_r and h not in used_h and overlap[r, h] > 0:
+            pairs.append((r, h))
+            used_r.add(r)
+            used_h.add(h)
+    return pairs
+
+
+def diarization_error(reference, hypothesis, collar=DER_COLLAR, frame=DER_FRAME, skip_overlap=False):
+    """
+    说话人分离错误率（漏检 + 虚警 + 说话人混淆）/ 参考语音总时长
+
+    参数:
+        reference, hypothesis: [(start, end, speaker), ...]
+        collar: 参考片段边界两侧不计分的宽度（秒）
+        skip_overlap: 是否跳过参考中多人重叠的区域
+
+    返回:
+        {"der", "missed", "false_alarm", "confusion", "total", "mapping"}
+    """
+    end = max([e for _, e, _ in reference] + [e for _, e, _ in hypothesis] + [0.0])
+    n_frames = int(np.ceil(end / frame)) + 1
+    ref_speakers, ref = _activity(reference, n_frames, frame)
+    hyp_speakers, hyp = _activity(hypothesis, n_frames, frame)
+
+    scored = np.ones(n_frames, dtype=bool)
+    if collar > 0:
+        c = int(round(collar / frame))
+        for start, stop, _ in reference:
+            for boundary in (int(round(start / frame)), int(round(stop / frame))):
+                scored[max(boundary - c, 0):boundary + c] = False
+    n_ref = ref.sum(axis=0)
+    if skip_overlap:
+        scored &= n_ref <= 1
+    n_hyp = hyp.sum(axis=0)
+
+    ref_s, hyp_s = ref[:, scored], hyp[:, scored]
+    overlap = ref_s.astype(np.int64) @ hyp_s.T.astype(np.int64) if len(ref_speakers) and len(hyp_speakers) \
+        else np.zeros((len(ref_speakers), len(hyp_speakers)), dtype=np.int64)
+    pairs = _optimal_mapping(overlap) if overlap.size else []
+
+    n_correct = np.zeros(int(scored.sum()), dtype=np.int64)
+    for r, h in pairs:
+        n_correct += ref_s[r] & hyp_s[h]
+    n_ref_s, n_hyp_s = n_ref[scored], n_hyp[scored]
+
+    total = float(n_ref_s.sum()) * frame
+    missed = float(np.maximum(n_ref_s - n_hyp_s, 0).sum()) * frame
+    false_alarm = float(np.maximum(n_hyp_s - n_ref_s, 0).sum()) * frame
+    confusion = float((np.minimum(n_ref_s, n_hyp_s) - n_correct).sum()) * frame
+    return {
+        "der": (missed + false_alarm + confusion) / total if total else 0.0,
+        "missed": round(missed, 3),
+        "false_alarm": round(false_alarm, 3),
+        "confusion": round(confusion, 3),
+        "total": round(total, 3),
+        "mapping": {ref_speakers[r]: hyp_speakers[h] for r, h in pairs}
+    }
+
+
+# ---------------------------------------------------------------------------
+# 参考集与引擎运行
+# ---------------------------------------------------------------------------
+
+def load_reference_set(ref_dir):
+    """
+    扫描参考集目录：<name>.<音频扩展名> 配 <name>.txt（参考转录）和/或 <name>.rttm
+
+    返回:
+        [{"name", "audio", "text"?, "turns"?}, ...]
+    """
+    items = []
+    for audio in sorted(Path(ref_dir).iterdir()):
+        if audio.suffix.lower() not in AUDIO_EXTENSIONS:
+            continue
+        item = {"name": audio.stem, "audio": str(audio)}
+        txt, rttm = audio.with_suffix(".txt"), audio.with_suffix(".rttm")
+        if txt.exists():
+            item["text"] = txt.read_text(encoding='utf-8')
+        if rttm.exists():
+            item["turns"] = load_rttm(rttm)
+        if "text" in item or "turns" in item:
+            items.append(item)
+    return items
+
+
+class ConfigRunner:
+    """按配置运行引擎，同一模型在多个配置间复用"""
+
+    def __init__(self, device="cpu", compute_type="int8"):
+        self.device = device
+        self.compute_type = compute_type
+        self.models = {}
+
+    def _whisper(self, model):
+        key = ("whisper", model)
+        if key not in self.models:
+            from faster_whisper import WhisperModel
+            # 同一参考文件的 log-mel 特征在各解码配置间复用
+            self.models[key] = feature_cache.install(
+                WhisperModel(model, device=self.device, compute_type=self.compute_type))
+        return self.models[key]
+
+    def _sensevoice(self):
+        key = ("sensevoice", None)
+        if key not in self.models:
+            from sensevoice_transcribe import load_model
+            self.models[key], _ = load_model()
+        return self.models[key]
+
+    def transcribe(self, config, audio, language=None):
+        """返回 (文本, 说话人轮次或 None, 耗时秒)"""
+        engine = config["engine"]
+        options = dict(config.get("options") or {})
+        if engine == "whisper":
+            from whisper_transcribe import DECODE_OPTIONS
+            model = self._whisper(config.get("model", "base"))
+            start = time.perf_counter()
+            samples = feature_cache.load_audio(audio)
+            segments, _ = model.transcribe(samples, language=language, **{**DECODE_OPTIONS, **options})
+            text = "".join(seg.text for seg in segments)
+            return text, None, time.perf_counter() - start
+        if engine == "sensevoice":
+            from sensevoice_transcribe import transcribe_audio
+            model = self._sensevoice()
+            start = time.perf_counter()
+            result = transcribe_audio(audio, language=language or "auto",
+                                      batch_size=options.get("batch_size_s", 64), model=model)
+            return result.get("text", ""), None, time.perf_counter() - start
+        if engine == "pyannote":
+            from pyannote_diarization import diarize_audio
+            start = time.perf_counter()
+            result = diarize_audio(audio, **options)
+            turns = [(seg["start"], seg["end"], seg["speaker"]) for seg in result.get("segments", [])]
+            return None, turns, time.perf_counter() - start
+        raise ValueError(f"未知引擎: {engine}")
+
+
+def evaluate_config(runner, config, items, language=None, collar=DER_COLLAR):
+    """在整个参考集上运行一个配置，错误率按总编辑距离 / 总参考长度汇总"""
+    totals = {"cer": [0, 0], "wer": [0, 0]}
+    der_parts = {"missed": 0.0, "false_alarm": 0.0, "confusion": 0.0, "total": 0.0}
+    audio_seconds = processing_seconds = 0.0
+    per_file = []
+
+    for item in items:
+        with contextlib.redirect_stdout(io.StringIO()):
+            text, turns, elapsed = runner.transcribe(config, item["audio"], language)
+        duration = item.get("duration") or probe_duration(item["audio"]) or 0.0
+        audio_seconds += duration
+        processing_seconds += elapsed
+        row = {"name": item["name"], "rtf": elapsed / duration if duration else None}
+
+        if text is not None and "text" in item:
+            for metric, tokenize in (("cer", char_tokens), ("wer", word_tokens)):
+                errors, length = error_rate(tokenize(item["text"]), tokenize(text))
+                totals[metric][0] += errors
+                totals[metric][1] += length
+                row[metric] = errors / length if length else None
+        if turns is not None and "turns" in item:
+            der = diarization_error(item["turns"], turns, collar=collar)
+            for key in der_parts:
+                der_parts[key] += der[key]
+            row["der"] = der["der"]
+        per_file.append(row)
+        print(f"   {config['name']:<28} {item['name']:<24} RTF={row['rtf'] or 0:.3f} "
+              + " ".join(f"{k.upper()}={row[k]:.3f}" for k in ("cer", "wer", "der") if row.get(k) is not None),
+              file=sys.stderr)
+
+    summary = {
+        "name": config["name"],
+        "engine": config["engine"],
+        "model": config.get("model", ""),
+        "options": json.dumps(config.get("options") or {}, ensure_ascii=False, sort_keys=True),
+        "files": len(items),
+        "audio_seconds": round(audio_seconds, 2),
+        "processing_seconds": round(processing_seconds, 2),
+        "rtf": round(processing_seconds / audio_seconds, 4) if audio_seconds else None,
+        "cer": round(totals["cer"][0] / totals["cer"][1], 4) if totals["cer"][1] else None,
+        "wer": round(totals["wer"][0] / totals["wer"][1], 4) if totals["wer"][1] else None,
+        "der": round((der_parts["missed"] + der_parts["false_alarm"] + der_parts["confusion"]) / der_parts["total"], 4)
+               if der_parts["total"] else None,
+    }
+    return summary, per_file
+
+
+# ---------------------------------------------------------------------------
+# 结果分析与输出
+# ---------------------------------------------------------------------------
+
+def pareto_front(rows, metric):
+    """RTF 与错误率都不被其他配置同时超越的配置名"""
+    points = [r for r in rows if r.get("rtf") is not None and r.get(metric) is not None]
+    front = []
+    for r in points:
+        dominated = any(
+            o["rtf"] <= r["rtf"] and o[metric] <= r[metric] and (o["rtf"] < r["rtf"] or o[metric] < r[metric])
+            for o in points
+        )
+        if not dominated:
+            front.append(r["name"])
+    return front
+
+
+def pick_fastest(rows, limits):
+    """满足所有准确率上限的配置中 RTF 最小的一个"""
+    ok = [
+        r for r in rows
+        if r.get("rtf") is not None
+        and all(r.get(metric) is not None and r[metric] <= limit for metric, limit in limits.items())
+    ]
+    return min(ok, key=lambda r: r["rtf"]) if ok else None
+
+
+def ascii_scatter(rows, metric, width=60, height=16):
+    """错误率（纵轴）对 RTF（横轴）的字符散点图"""
+    points = [(r["rtf"], r[metric], r["name"]) for r in rows
+              if r.get("rtf") is not None and r.get(metric) is not None]
+    if not points:
+        return f"(无 {metric.upper()} 数据)"
+    xs, ys = [p[0] for p in points], [p[1] for p in points]
+    x0, x1 = min(xs), max(xs) if max(xs) > min(xs) else min(xs) + 1e-9
+    y0, y1 = min(ys), max(ys) if max(ys) > min(ys) else min(ys) + 1e-9
+    grid = [[" "] * width for _ in range(height)]
+    legend = []
+    for i, (x, y, name) in enumerate(points):
+        mark = chr(ord("A") + i % 26)
+        col = int((x - x0) / (x1 - x0) * (width - 1))
+        row = height - 1 - int((y - y0) / (y1 - y0) * (height - 1))
+        grid[row][col] = mark
+        legend.append(f"  {mark} = {name} (RTF {x:.3f}, {metric.upper()} {y:.3f})")
+    lines = [f"{metric.upper()} {y1:.3f} ┐"]
+    lines += ["           │" + "".join(r) for r in grid]
+    lines.append(f"{metric.upper()} {y0:.3f} └" + "─" * width)
+    lines.append(f"           RTF {x0:.3f}" + " " * max(width - 22, 1) + f"RTF {x1:.3f}")
+    return "\n".join(lines + legend)
+
+
+def save_plot(rows, metric, path):
+    """可选的 matplotlib 图（未安装时跳过）"""
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("⚠️ 未安装 matplotlib，跳过图片输出", file=sys.stderr)
+        return None
+    points = [r for r in rows if r.get("rtf") is not None and r.get(metric) is not None]
+    front = set(pareto_front(rows, metric))
+    fig, ax = plt.subplots(figsize=(8, 5))
+    for r in points:
+        ax.scatter(r["rtf"], r[metric], color="tab:red" if r["name"] in front else "tab:blue")
+        ax.annotate(r["name"], (r["rtf"], r[metric]), fontsize=8, xytext=(4, 4), textcoords="offset points")
+    ax.set_xlabel("RTF (lower is faster)")
+    ax.set_ylabel(metric.upper())
+    ax.grid(True, alpha=0.3)
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
+    plt.close(fig)
+    print(f"📈 图表已保存: {path}", file=sys.stderr)
+    return path
+
+
+def write_csv(rows, path):
+    fields = ["name", "engine", "model", "options", "files", "audio_seconds", "processing_seconds",
+              "rtf", "cer", "wer", "der"]
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"📁 CSV 已保存: {path}", file=sys.stderr)
+
+
+def _read_text_or_json(path):
+    """参考/假设转录：.txt 原文，.json 取 text 字段（兼容各转录脚本的输出）"""
+    if str(path).endswith(".json"):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data.get("text") or " ".join(seg.get("text", "") for seg in data.get("segments", []))
+    return Path(path).read_text(encoding='utf-8')
+
+
+def cmd_score(args):
+    """对已有输出打分，不运行模型"""
+    result = {"success": True}
+    if args.ref and args.hyp:
+        ref, hyp = _read_text_or_json(args.ref), _read_text_or_json(args.hyp)
+        for metric, tokenize in (("cer", char_tokens), ("wer", word_tokens)):
+            errors, length = error_rate(tokenize(ref), tokenize(hyp))
+            result[metric] = round(errors / length, 4) if length else None
+            result[f"{metric}_errors"] = errors
+            result[f"{metric}_length"] = length
+    if args.ref_rttm and args.hyp_rttm:
+        der = diarization_error(load_rttm(args.ref_rttm), load_rttm(args.hyp_rttm),
+                                collar=args.collar, skip_overlap=args.skip_overlap)
+        der["der"] = round(der["der"], 4)
+        result["der"] = der
+    print(json.dumps(result, ensure_ascii=False))
+
+
+def cmd_run(args):
+    items = load_reference_set(args.ref_dir)
+    if not items:
+        print(json.dumps({"success": False, "error": f"参考集为空: {args.ref_dir}"}, ensure_ascii=False))
+        sys.exit(1)
+
+    configs = DEFAULT_CONFIGS
+    if args.configs:
+        with open(args.configs, 'r', encoding='utf-8') as f:
+            configs = json.load(f)
+    if args.only:
+        wanted = set(args.only.split(","))
+        configs = [c for c in configs if c["name"] in wanted]
+
+    print(f"🧪 评估 {len(configs)} 组配置 × {len(items)} 个参考文件", file=sys.stderr)
+    runner = ConfigRunner(device=args.device, compute_type=args.compute_type)
+    rows, details = [], {}
+    for config in configs:
+        try:
+            summary, per_file = evaluate_config(runner, config, items, args.language, args.collar)
+        except Exception as e:
+            print(f"❌ 配置 {config['name']} 运行失败: {e}", file=sys.stderr)
+            continue
+        rows.append(summary)
+        details[config["name"]] = per_file
+
+    limits = {m: v for m, v in (("cer", args.max_cer), ("wer", args.max_wer), ("der", args.max_der)) if v is not None}
+    metric = args.metric
+    best = pick_fastest(rows, limits)
+
+    print("\n" + ascii_scatter(rows, metric), file=sys.stderr)
+    if best:
+        print(f"\n🏆 满足 {limits or '无限制'} 的最快配置: {best['name']} (RTF {best['rtf']})", file=sys.stderr)
+
+    if args.output:
+        write_csv(rows, args.output)
+    if args.plot:
+        save_plot(rows, metric, args.plot)
+
+    report = {
+        "success": True,
+        "configs": rows,
+        "per_file": details,
+        "pareto": {m: pareto_front(rows, m) for m in ("cer", "wer", "der")},
+        "limits": limits,
+        "recommended": best["name"] if best else None
+    }
+    print(json.dumps(report, ensure_ascii=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='转录速度-准确率评估 (CER/WER/DER vs RTF)')
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="在参考集上运行配置扫描")
+    p.add_argument("ref_dir", help="参考集目录（音频 + 同名 .txt / .rttm）")
+    p.add_argument("--configs", help="配置列表 JSON 文件（默认内置 beam/模型/VAD/批大小扫描）")
+    p.add_argument("--only", help="只运行这些配置名，逗号分隔")
+    p.add_argument("--language", help="指定语言代码")
+    p.add_argument("--device", default="cpu", help="Whisper 计算设备")
+    p.add_argument("--compute-type", default="int8", help="Whisper 计算精度")
+    p.add_argument("--collar", type=float, default=DER_COLLAR, help="DER 边界宽容（秒）")
+    p.add_argument("--metric", default="cer", choices=["cer", "wer", "der"], help="绘图使用的准确率指标")
+    p.add_argument("--max-cer", type=float, help="CER 上限")
+    p.add_argument("--max-wer", type=float, help="WER 上限")
+    p.add_argument("--max-der", type=float, help="DER 上限")
+    p.add_argument("--output", help="CSV 输出路径")
+    p.add_argument("--plot", help="PNG 图表输出路径（需要 matplotlib）")
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser("score", help="对已有输出计算 CER/WER/DER")
+    p.add_argument("--ref", help="参考转录（.txt 或 .json）")
+    p.add_argument("--hyp", help="假设转录（.txt 或 .json）")
+    p.add_argument("--ref-rttm", help="参考 RTTM")
+    p.add_argument("--hyp-rttm", help="假设 RTTM")
+    p.add_argument("--collar", type=float, default=DER_COLLAR, help="DER 边界宽容（秒）")
+    p.add_argument("--skip-overlap", action="store_true", help="DER 跳过多人重叠区域")
+    p.set_defaults(func=cmd_score)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+解码音频与 log-mel 特征缓存
+同一文件换解码参数重跑（指定语言、改 beam、换同 mel 维度的大模型）或评估工具扫参数时，
+音频解码和 log-mel 特征只算一次：结果按内容哈希存成 .npy，之后以内存映射方式读取
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+import tempfile
+
+import numpy as np
+
+from tracing import span
+
+cache_dir = os.path.expanduser("~/.cache/podcast-transcriber")
+
+SAMPLE_RATE = 16000
+# 缓存总大小上限（MB），超出时按最近使用时间淘汰（FEATURE_CACHE_MAX_MB 可调）
+DEFAULT_MAX_MB = 4096
+# 短于该时长的音频（截止时间分块、二次解码区间等）不缓存特征
+MIN_CACHE_SECONDS = 10
+HASH_BLOCK_BYTES = 1 << 20
+
+
+def enabled():
+    return os.getenv("FEATURE_CACHE_DISABLE") != "true"
+
+
+def default_cache_dir():
+    return os.getenv("FEATURE_CACHE_DIR") or os.path.join(cache_dir, "features")
+
+
+def file_hash(path):
+    """音频文件内容哈希（文件改动后自然失效，与路径无关）"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def array_hash(array):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str((array.dtype.str, array.shape)).encode())
+    digest.update(memoryview(np.ascontiguousarray(array)).cast("B"))
+    return digest.hexdigest()
+
+
+def _load(path):
+    """内存映射读取缓存（写时复制，调用方原地修改也不会写回文件）；顺便刷新使用时间"""
+    try:
+        array = np.load(path, mmap_mode="c")
+    except (OSError, ValueError):
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return array
+
+
+def _save(path, array):
+    """先写临时文件再改名，并发任务不会读到半个文件"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".tmp_", suffix=".npy", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"⚠️ 特征缓存写入失败: {e}", file=sys.stderr)
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return
+    prune()
+
+
+def cache_files(directory=None):
+    directory = directory or default_cache_dir()
+    if not os.path.isdir(directory):
+        return []
+    files = []
+    for name in os.listdir(directory):
+        if name.endswith(".npy") and not name.startswith(".tmp_"):
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+    return files
+
+
+def prune(max_mb=None, directory=None):
+    """缓存超过上限时删除最久没用过的文件，返回删除的文件数"""
+    max_bytes = float(max_mb if max_mb is not None else os.getenv("FEATURE_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024
+    files = sorted(cache_files(directory))
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for _, size, path in files:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+def load_audio(audio_path, decode=None):
+    """
+    解码音频（16kHz 单声道 float32），按文件内容哈希缓存
+
+    参数:
+        decode: 实际的解码函数（默认 faster_whisper.decode_audio）
+
+    返回:
+        float32 数组；命中缓存时为内存映射数组
+    """
+    if decode is None:
+        from faster_whisper import decode_audio as decode
+    if not enabled():
+        return decode(audio_path)
+    path = os.path.join(default_cache_dir(), f"audio_{file_hash(audio_path)}.npy")
+    cached = _load(path) if os.path.exists(path) else None
+    if cached is not None:
+        print(f"♻️ 使用缓存的解码音频 ({len(cached) / SAMPLE_RATE:.0f}秒)", file=sys.stderr)
+        return cached
+    audio = decode(audio_path)
+    _save(path, np.asarray(audio, dtype=np.float32))
+    return audio
+
+
+class CachedFeatureExtractor:
+    """
+    包装 faster-whisper 的 FeatureExtractor：按波形哈希 + mel 维度 + 调用参数缓存 log-mel 特征
+    VAD 裁剪后的波形也一样（VAD 参数相同时裁出的波形相同，哈希就相同）；其余属性原样转发
+    """
+
+    def __init__(self, extractor):
+        self.extractor = extractor
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name):
+        return getattr(self.extractor, name)
+
+    def n_mels(self):
+        filters = getattr(self.extractor, "mel_filters", None)
+        return filters.shape[0] if filters is not None else getattr(self.extractor, "feature_size", 80)
+
+    def __call__(self, waveform, *args, **kwargs):
+        array = np.asarray(waveform)
+        if not enabled() or array.ndim != 1 or len(array) < MIN_CACHE_SECONDS * SAMPLE_RATE:
+            return self.extractor(waveform, *args, **kwargs)
+        hop_length = getattr(self.extractor, "hop_length", 160)
+        key = hashlib.blake2b(f"{array_hash(array)}|{self.n_mels()}|{hop_length}|{args}|{sorted(kwargs.items())}"
+                              .encode(), digest_size=16).hexdigest()
+        path = os.path.join(default_cache_dir(), f"mel_{key}.npy")
+        cached = _load(path) if os.path.exists(path) else None
+        if cached is not None:
+            self.hits += 1
+            print(f"♻️ 使用缓存的 log-mel 特征 ({cached.shape[0]}×{cached.shape[-1]})", file=sys.stderr)
+            return cached
+        self.misses += 1
+        with span("feature_extraction"):
+            features = self.extractor(waveform, *args, **kwargs)
+        # 新版可能返回 torch 张量，落盘统一转成 numpy
+        stored = features.cpu().numpy() if hasattr(features, "cpu") else np.asarray(features)
+        _save(path, stored)
+        return features
+
+
+def install(model):
+    """给 WhisperModel 装上特征缓存（重复调用无副作用），返回 model"""
+    extractor = getattr(model, "feature_extractor", None)
+    if extractor is not None and not isinstance(extractor, CachedFeatureExtractor):
+        model.feature_extractor = CachedFeatureExtractor(extractor)
+    return model
+
+
+def stats(directory=None):
+    files = cache_files(directory)
+    return {
+        "path": directory or default_cache_dir(),
+        "enabled": enabled(),
+        "audio_files": sum(1 for *_, p in files if os.path.basename(p).startswith("audio_")),
+        "feature_files": sum(1 for *_, p in files if os.path.basename(p).startswith("mel_")),
+        "size_mb": round(sum(size for _, size, _ in files) / 1024 / 1024, 1),
+        "max_mb": float(os.getenv("FEATURE_CACHE_MAX_MB", DEFAULT_MAX_MB))
+    }
+
+
+def clear(directory=None):
+    removed = 0
+    for _, _, path in cache_files(directory):
+        try:
+            os.remove(path)
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='解码音频 / log-mel 特征缓存')
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="查看缓存大小")
+    p = sub.add_parser("prune", help="按大小上限淘汰最久没用的文件")
+    p.add_argument("--max-mb", type=float, help=f"大小上限 (默认: FEATURE_CACHE_MAX_MB 或 {DEFAULT_MAX_MB})")
+    sub.add_parser("clear", help="清空缓存")
+    args = parser.parse_args()
+
+    if args.command == "prune":
+        print(json.dumps({"removed": prune(args.max_mb), **stats()}, ensure_ascii=False))
+    elif args.command == "clear":
+        print(json.dumps({"removed": clear(), **stats()}, ensure_ascii=False))
+    else:
+        print(json.dumps(stats(), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
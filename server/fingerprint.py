@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+按播客节目的音频指纹索引
+每期节目的片头、赞助口播和片尾都一样：频谱峰值两两配对成哈希存入 SQLite，
+新一期到来时找出与往期重合的片段，不再重新转录，直接拼入往期的转录文本（时间戳按偏移校正）。
+同一期重新上传、或每次下载插入的广告不同时，按来源链接与旧版本对齐，只转录变化的部分
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+
+import numpy as np
+
+from tracing import span
+
+cache_dir = os.path.expanduser("~/.cache/podcast-transcriber")
+
+SAMPLE_RATE = 16000
+N_FFT = 1024
+HOP = 512                      # 32ms 一帧
+FRAME_SECONDS = HOP / SAMPLE_RATE
+MIN_BIN, MAX_BIN = 10, 320     # 约 150Hz - 5kHz
+BLOCK_FRAMES = 1875            # 每次处理约 60 秒
+# 峰值：时间 ±PEAK_TIME 帧、频率 ±PEAK_FREQ 个频点内的最大值，每秒保留最强的 PEAKS_PER_SECOND 个
+PEAK_TIME, PEAK_FREQ = 5, 10
+PEAKS_PER_SECOND = 15
+# 每个锚点与后面 FAN_OUT 个峰配对，时间差 1..MAX_DT 帧（哈希的低 6 位）
+FAN_OUT = 4
+MAX_DT = 63
+# 匹配：同一偏移的命中数、命中密度（次/秒）、最短时长（秒）和命中之间的最大间隔（秒）
+# 偏移按 OFFSET_TOLERANCE 帧分桶选出候选；音乐里持续的和弦每拍都一样，命中会散到前后几拍，
+# 划定区间时收进偏移相差不超过 OFFSET_SPREAD 秒的命中
+OFFSET_TOLERANCE = 2
+OFFSET_SPREAD = 0.6
+MIN_HITS = 20
+MIN_DENSITY = 2.0
+MIN_MATCH_SECONDS = 8.0
+MAX_GAP_SECONDS = 5.0
+# 拼接时往期片段可以超出匹配区间的余量（秒）
+SPLICE_TOLERANCE = 1.0
+# 每个节目最多保留的期数（更早的指纹和转录被删除）
+MAX_EPISODES = 30
+
+
+def default_db_path():
+    return os.getenv("FINGERPRINT_DB") or os.path.join(cache_dir, "fingerprints.db")
+
+
+def _local_max(values, size, axis):
+    """沿一个轴的滑动最大值（窗口 2*size+1，边缘按 -inf 填充）"""
+    pad = [(0, 0)] * values.ndim
+    pad[axis] = (size, size)
+    padded = np.pad(values, pad, constant_values=-np.inf)
+    out = np.full(values.shape, -np.inf, dtype=values.dtype)
+    length = values.shape[axis]
+    for shift in range(2 * size + 1):
+        out = np.maximum(out, np.take(padded, np.arange(shift, shift + length), axis=axis))
+    return out
+
+
+def spectral_peaks(audio):
+    """
+    频谱峰值
+
+    返回:
+        (帧号数组, 频点数组)，按时间排序
+    """
+    audio = np.ascontiguousarray(audio, dtype=np.float32)
+    window = np.hanning(N_FFT).astype(np.float32)
+    n_frames = max(0, (len(audio) - N_FFT) // HOP + 1)
+    times, freqs = [], []
+    for first in range(0, n_frames, BLOCK_FRAMES):
+        # 前后多取 PEAK_TIME 帧，块边界上的峰值判断与整段一致
+        lo, hi = max(0, first - PEAK_TIME), min(n_frames, first + BLOCK_FRAMES + PEAK_TIME)
+        block = audio[lo * HOP:(hi - 1) * HOP + N_FFT]
+        stride = block.strides[0]
+        frames = np.lib.stride_tricks.as_strided(block, (hi - lo, N_FFT), (stride * HOP, stride))
+        spec = np.log(np.abs(np.fft.rfft(frames * window, axis=1))[:, MIN_BIN:MAX_BIN] + 1e-6)
+        neighborhood = _local_max(_local_max(spec, PEAK_FREQ, 1), PEAK_TIME, 0)
+        # 比所在帧的中位数高出一截，避开静音里的随机峰
+        is_peak = (spec == neighborhood) & (spec > np.median(spec, axis=1, keepdims=True) + 2.0)
+        core = slice(first - lo, first - lo + min(BLOCK_FRAMES, n_frames - first))
+        t, f = np.nonzero(is_peak[core])
+        strength = spec[core][t, f]
+        t = t + first
+        # 每秒只保留最强的几个峰
+        second = (t * FRAME_SECONDS).astype(np.int64)
+        order = np.lexsort((-strength, second))
+        t, f, second = t[order], f[order], second[order]
+        rank = np.arange(len(t)) - np.searchsorted(second, second)
+        keep = rank < PEAKS_PER_SECOND
+        times.append(t[keep])
+        freqs.append(f[keep] + MIN_BIN)
+    if not times:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64)
+    t, f = np.concatenate(times), np.concatenate(freqs)
+    order = np.lexsort((f, t))
+    return t[order], f[order]
+
+
+def fingerprint(audio):
+    """
+    峰值两两配对得到的哈希
+
+    返回:
+        (锚点帧号数组, 哈希数组)；哈希 = f1 << 15 | f2 << 6 | dt
+    """
+    t, f = spectral_peaks(audio)
+    anchors, hashes = [], []
+    for k in range(1, FAN_OUT + 1):
+        dt = t[k:] - t[:-k]
+        valid = (dt >= 1) & (dt <= MAX_DT)
+        anchors.append(t[:-k][valid])
+        hashes.append((f[:-k][valid] << 15) | (f[k:][valid] << 6) | dt[valid])
+    if not anchors:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64)
+    return np.concatenate(anchors).astype(np.int64), np.concatenate(hashes).astype(np.int64)
+
+
+def match_regions(query_times, db_episodes, db_times, target_times=None):
+    """
+    按偏移聚类命中，找出与往期相同的区间（重新上传 / 插入广告的版本会得到多段、各自的偏移）
+
+    参数:
+        query_times / db_episodes / db_times: 每次哈希命中的新音频帧号、往期 id、往期帧号
+        target_times: 命中哈希里配对峰值的新音频帧号（区间终点取到最后一个配对峰，不越过插入的内容）
+
+    返回:
+        [{"episode_id", "start", "end", "offset", "hits"}, ...]，时间为秒，往期时间 = 新时间 + offset
+    """
+    if not len(query_times):
+        return []
+    offsets = db_times - query_times
+    bins = np.round(offsets / OFFSET_TOLERANCE).astype(np.int64)
+    keys = np.stack([db_episodes, bins], axis=1)
+    candidates, inverse, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+    max_gap = MAX_GAP_SECONDS / FRAME_SECONDS
+    spread = OFFSET_SPREAD / FRAME_SECONDS
+    regions = []
+    taken = []
+    for index in sorted(np.nonzero(counts >= MIN_HITS)[0], key=lambda i: -counts[i]):
+        episode_id = int(candidates[index][0])
+        offset = float(np.median(offsets[inverse == index]))
+        # 同一期相邻的偏移桶是同一段匹配
+        if any(e == episode_id and abs(o - offset) <= spread for e, o in taken):
+            continue
+        taken.append((episode_id, offset))
+        selected = (db_episodes == episode_id) & (np.abs(offsets - offset) <= spread)
+        order = np.argsort(query_times[selected], kind="stable")
+        times = query_times[selected][order]
+        targets = target_times[selected][order] if target_times is not None else times + MAX_DT // 2
+        splits = np.nonzero(np.diff(times) > max_gap)[0] + 1
+        for cluster, cluster_targets in zip(np.split(times, splits), np.split(targets, splits)):
+            start, end = float(cluster[0] * FRAME_SECONDS), float(cluster_targets.max() * FRAME_SECONDS)
+            hits = len(cluster)
+            if end - start < MIN_MATCH_SECONDS or hits < MIN_HITS or hits / (end - start) < MIN_DENSITY:
+                continue
+            regions.append({"episode_id": episode_id, "start": round(start, 2), "end": round(end, 2),
+                            "offset": round(offset * FRAME_SECONDS, 3), "hits": hits})
+
+    # 同一段在多期里都出现时取命中最多的一期，区间互不重叠
+    chosen = []
+    for region in sorted(regions, key=lambda r: -r["hits"]):
+        for other in chosen:
+            if region["start"] < other["end"] and other["start"] < region["end"]:
+                if other["start"] <= region["start"]:
+                    region["start"] = other["end"]
+                else:
+                    region["end"] = other["start"]
+        if region["end"] - region["start"] >= MIN_MATCH_SECONDS and \
+                all(region["end"] <= o["start"] or region["start"] >= o["end"] for o in chosen):
+            chosen.append(region)
+    return sorted(chosen, key=lambda r: r["start"])
+
+
+class FingerprintIndex:
+    """
+    节目指纹与往期转录（SQLite，多进程共用）
+
+    表:
+        episodes: 每期音频（按内容哈希去重）
+        fingerprints: (节目, 哈希) -> (期, 帧号)
+        segments: 每期的最终转录片段
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or default_db_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS episodes (
+                id INTEGER PRIMARY KEY,
+                feed TEXT NOT NULL,
+                audio_hash TEXT NOT NULL,
+                title TEXT,
+                duration REAL,
+                added_at REAL,
+                UNIQUE (feed, audio_hash)
+            );
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                feed TEXT NOT NULL,
+                hash INTEGER NOT NULL,
+                episode_id INTEGER NOT NULL,
+                t INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_fingerprints_hash ON fingerprints (feed, hash);
+            CREATE INDEX IF NOT EXISTS idx_fingerprints_episode ON fingerprints (episode_id);
+            CREATE TABLE IF NOT EXISTS segments (
+                episode_id INTEGER NOT NULL,
+                start REAL NOT NULL,
+                end REAL NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_segments_episode ON segments (episode_id, start);
+        """)
+
+    def close(self):
+        self.conn.close()
+
+    def lookup(self, feed, times, hashes, exclude_hash=None):
+        """
+        在节目的往期指纹里查找命中
+
+        返回:
+            (新音频帧号, 往期 id, 往期帧号, 配对峰值的新音频帧号) 四个数组
+        """
+        conn = self.conn
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS query (hash INTEGER, t INTEGER)")
+        conn.execute("DELETE FROM query")
+        conn.executemany("INSERT INTO query VALUES (?, ?)", zip(hashes.tolist(), times.tolist()))
+        rows = conn.execute("""
+            SELECT q.t, f.episode_id, f.t, q.t + (q.hash & 63) FROM query q
+            CROSS JOIN fingerprints f ON f.feed = ? AND f.hash = q.hash
+            JOIN episodes e ON e.id = f.episode_id
+            WHERE e.audio_hash != ?
+        """, (feed, exclude_hash or "")).fetchall()
+        conn.execute("DELETE FROM query")
+        if not rows:
+            return tuple(np.zeros(0, np.int64) for _ in range(4))
+        data = np.array(rows, dtype=np.int64)
+        return data[:, 0], data[:, 1], data[:, 2], data[:, 3]
+
+    def episode_segments(self, episode_id, start, end):
+        """往期在 [start, end] 内的转录片段"""
+        rows = self.conn.execute(
+            "SELECT data FROM segments WHERE episode_id = ? AND start >= ? AND end <= ? ORDER BY start",
+            (episode_id, start, end)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def episode_title(self, episode_id):
+        row = self.conn.execute("SELECT title FROM episodes WHERE id = ?", (episode_id,)).fetchone()
+        return row[0] if row else None
+
+    def add_episode(self, feed, audio_hash, title, duration, times, hashes, segments):
+        """保存一期的指纹和最终转录（同一音频重复转录时覆盖），返回期 id"""
+        with self.conn:
+            self.delete_episode(feed, audio_hash)
+            cursor = self.conn.execute(
+                "INSERT INTO episodes (feed, audio_hash, title, duration, added_at) VALUES (?, ?, ?, ?, ?)",
+                (feed, audio_hash, title, duration, time.time())
+            )
+            episode_id = cursor.lastrowid
+            self.conn.executemany("INSERT INTO fingerprints VALUES (?, ?, ?, ?)",
+                                  ((feed, h, episode_id, t) for h, t in zip(hashes.tolist(), times.tolist())))
+            self.conn.executemany("INSERT INTO segments VALUES (?, ?, ?, ?)",
+                                  ((episode_id, s["start"], s["end"], json.dumps(s, ensure_ascii=False))
+                                   for s in segments))
+            self.prune(feed)
+        return episode_id
+
+    def delete_episode(self, feed, audio_hash=None, episode_id=None):
+        if episode_id is None:
+            row = self.conn.execute("SELECT id FROM episodes WHERE feed = ? AND audio_hash = ?",
+                                    (feed, audio_hash)).fetchone()
+            if not row:
+                return
+            episode_id = row[0]
+        self.conn.execute("DELETE FROM fingerprints WHERE episode_id = ?", (episode_id,))
+        self.conn.execute("DELETE FROM segments WHERE episode_id = ?", (episode_id,))
+        self.conn.execute("DELETE FROM episodes WHERE id = ?", (episode_id,))
+
+    def prune(self, feed, keep=MAX_EPISODES):
+        old = self.conn.execute("SELECT id FROM episodes WHERE feed = ? ORDER BY added_at DESC LIMIT -1 OFFSET ?",
+                                (feed, keep)).fetchall()
+        for (episode_id,) in old:
+            self.delete_episode(feed, episode_id=episode_id)
+
+    def stats(self):
+        feeds = self.conn.execute("""
+            SELECT feed, COUNT(*), COALESCE(SUM(duration), 0) FROM episodes GROUP BY feed ORDER BY feed
+        """).fetchall()
+        return {
+            "path": self.db_path,
+            "feeds": [{"feed": f, "episodes": n, "hours": round(d / 3600, 2)} for f, n, d in feeds],
+            "fingerprints": self.conn.execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0]
+        }
+
+
+def covered_seconds(spans):
+    """区间并集的总时长（秒）"""
+    total, reach = 0.0, None
+    for start, end in sorted((s["start"], s["end"]) for s in spans):
+        if reach is None or start > reach:
+            total += end - start
+            reach = end
+        elif end > reach:
+            total += end - reach
+            reach = end
+    return total
+
+
+def source_feed(source_url):
+    """按来源链接区分的“节目”：同一链接重新下载的版本（插入的广告不同、重新上传）互相比对"""
+    return f"source:{source_url}"
+
+
+class RecurringSegments:
+    """
+    一期节目的重复片段处理：转录前找出与往期相同的区间并屏蔽，转录后拼入往期文本、保存本期
+    同一期重新上传或每次下载插入不同广告时，与旧版本对齐后只有变化的部分需要转录
+
+    参数:
+        feed: 节目名
+        audio: 16kHz 音频数组
+        audio_path: 音频文件（内容哈希用于去重，同一文件重跑时不匹配自己）
+    """
+
+    def __init__(self, feed, audio, audio_path, title=None, db_path=None):
+        from feature_cache import file_hash
+        self.feed = feed
+        self.title = title or os.path.basename(str(audio_path))
+        self.audio_seconds = len(audio) / SAMPLE_RATE
+        self.audio_hash = file_hash(audio_path)
+        self.index = FingerprintIndex(db_path)
+        self.matches = []
+        self.cached = []
+        started = time.perf_counter()
+        with span("fingerprint"):
+            self.times, self.hashes = fingerprint(audio)
+            regions = match_regions(*self.index.lookup(feed, self.times, self.hashes, self.audio_hash))
+        for region in regions:
+            offset = region["offset"]
+            segments = self.index.episode_segments(region["episode_id"], region["start"] + offset - SPLICE_TOLERANCE,
+                                                   region["end"] + offset + SPLICE_TOLERANCE)
+            shifted = [dict(s, start=round(s["start"] - offset, 3), end=round(s["end"] - offset, 3), cached=True)
+                       for s in segments if s.get("text")]
+            # 剪辑点两侧的区间可能取到同一句话，只留先取到的
+            shifted = [s for s in shifted
+                       if not any(s["start"] < c["end"] and c["start"] < s["end"] for c in self.cached)]
+            if not shifted:
+                continue
+            self.cached.extend(shifted)
+            self.matches.append(dict(region, episode=self.index.episode_title(region["episode_id"]),
+                                     segments=len(shifted), reused_start=shifted[0]["start"],
+                                     reused_end=max(s["end"] for s in shifted)))
+        self.fingerprint_seconds = time.perf_counter() - started
+        if self.matches:
+            reused = self.reused_seconds()
+            print(f"🔁 与往期重合 {len(self.matches)} 段（{reused:.0f}秒），复用往期转录，"
+                  f"只解码其余 {1 - reused / self.audio_seconds:.1%}", file=sys.stderr)
+
+    def spans(self):
+        """需要屏蔽的区间：每段匹配从第一个到最后一个复用片段（片段之间的空隙也不再解码）"""
+        return [{"start": m["reused_start"], "end": m["reused_end"]} for m in self.matches]
+
+    def reused_seconds(self):
+        return covered_seconds(self.spans())
+
+    def mask(self, audio):
+        """把复用区间置零（VAD 整段跳过）"""
+        from nonspeech import mask
+        return mask(audio, self.spans())
+
+    def splice(self, segments):
+        """新解码的片段与复用的往期片段按时间合并（去掉落在复用区间内的零碎解码结果）"""
+        if not self.cached:
+            return segments
+        spans = self.spans()
+        kept = [s for s in segments
+                if not any(c["start"] <= (s["start"] + s["end"]) / 2 <= c["end"] for c in spans)]
+        return sorted(kept + [dict(s) for s in self.cached], key=lambda s: s["start"])
+
+    def report(self, skipped=None):
+        """
+        复用统计
+
+        参数:
+            skipped: 其他原因没送进解码器的区间（音乐 / 噪声），计入实际解码比例
+        """
+        reused = self.reused_seconds()
+        decoded = max(0.0, self.audio_seconds - covered_seconds(self.spans() + list(skipped or [])))
+        return {
+            "feed": self.feed,
+            "matches": [{k: m[k] for k in ("start", "end", "offset", "episode", "segments", "hits")}
+                        for m in self.matches],
+            "reused_seconds": round(reused, 2),
+            "reused_fraction": round(reused / self.audio_seconds, 4) if self.audio_seconds else 0.0,
+            "decoded_seconds": round(decoded, 2),
+            "decoded_fraction": round(decoded / self.audio_seconds, 4) if self.audio_seconds else 0.0,
+            "fingerprint_seconds": round(self.fingerprint_seconds, 2)
+        }
+
+    def store(self, segments):
+        """保存本期指纹和最终转录，供之后的节目复用"""
+        with span("fingerprint_store"):
+            stored = [{k: v for k, v in s.items() if k != "cached"} for s in segments]
+            self.index.add_episode(self.feed, self.audio_hash, self.title, self.audio_seconds,
+                                   self.times, self.hashes, stored)
+        self.index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='节目音频指纹索引（片头 / 片尾 / 重复口播）')
+    parser.add_argument('--db', help='索引数据库路径 (默认: FINGERPRINT_DB 或缓存目录)')
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="查看各节目的期数")
+    p = sub.add_parser("match", help="查找一个音频与往期重合的区间")
+    p.add_argument("feed", help="节目名")
+    p.add_argument("file", help="音频文件")
+    p = sub.add_parser("forget", help="删除一个节目的全部索引")
+    p.add_argument("feed", help="节目名")
+    args = parser.parse_args()
+
+    index = FingerprintIndex(args.db)
+    if args.command == "stats":
+        print(json.dumps(index.stats(), ensure_ascii=False, indent=2))
+    elif args.command == "forget":
+        episodes = index.conn.execute("SELECT id FROM episodes WHERE feed = ?", (args.feed,)).fetchall()
+        with index.conn:
+            for (episode_id,) in episodes:
+                index.delete_episode(args.feed, episode_id=episode_id)
+        print(json.dumps({"feed": args.feed, "removed": len(episodes)}, ensure_ascii=False))
+    else:
+        from deadline import load_audio
+        index.close()
+        recurring = RecurringSegments(args.feed, load_audio(args.file), args.file, db_path=args.db)
+        print(json.dumps(recurring.report(), ensure_ascii=False, indent=2))
+        recurring.index.close()
+        return
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+热词引擎
+将 data/hotwords 下的领域词库（术语 + 变体）编译为 Aho-Corasick 自动机并缓存到磁盘，
+一次遍历完成片段文本的热词扫描和英文术语大小写规范化（不改写中文原话），并为 faster-whisper 生成解码提示
+"""
+
+import sys
+import os
+import re
+import json
+import time
+import pickle
+import hashlib
+import argparse
+import random
+from collections import deque
+from pathlib import Path
+
+import metrics
+
+HOTWORD_DIR = Path(__file__).parent / "data" / "hotwords"
+cache_dir = os.path.expanduser("~/.cache/podcast-transcriber")
+
+# 与 hotwordMatchingService.js 保持一致的主题映射
+DOMAIN_FILE_MAP = {
+    '科技': 'tech-ai.json',
+    '人工智能': 'tech-ai.json',
+    'AI': 'tech-ai.json',
+    '商业': 'business.json',
+    '创业': 'business.json',
+    '投资': 'business.json',
+    '教育': 'education.json',
+    '职场': 'education.json',
+    '学习': 'education.json'
+}
+
+_CJK_RE = re.compile(r'[一-龥]')
+
+
+def _is_alnum(ch):
+    return ch.isascii() and ch.isalnum()
+
+
+def _lower_same_length(text):
+    """小写化并保证长度不变（个别字符小写后会变长，保持原样）"""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return ''.join(c.lower() if len(c.lower()) == 1 else c for c in text)
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick 多模式匹配自动机
+
+    参数:
+        patterns: 模式字符串列表（匹配时按下标返回）
+        ignore_case: 是否忽略大小写
+    """
+
+    def __init__(self, patterns, ignore_case=True):
+        self.patterns = list(patterns)
+        self.ignore_case = ignore_case
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [()]
+        self._build()
+
+    def _build(self):
+        goto, fail = self.goto, self.fail
+        outputs = [[]]
+
+        for pid, pattern in enumerate(self.patterns):
+            if not pattern:
+                continue
+            key = _lower_same_length(pattern) if self.ignore_case else pattern
+            state = 0
+            for ch in key:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    fail.append(0)
+                    outputs.append([])
+                state = nxt
+            outputs[state].append(pid)
+
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                outputs[nxt].extend(outputs[fail[nxt]])
+
+        self.output = [tuple(o) for o in outputs]
+
+    def iter_matches(self, text):
+        """
+        遍历所有匹配（含重叠）
+
+        返回:
+            生成 (start, end, pattern_id)，end 为开区间
+        """
+        if self.ignore_case:
+            text = _lower_same_length(text)
+        goto, fail, output = self.goto, self.fail, self.output
+        lengths = [len(p) for p in self.patterns]
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                for pid in output[state]:
+                    yield (i + 1 - lengths[pid], i + 1, pid)
+
+    def find_all(self, text):
+        return list(self.iter_matches(text))
+
+    def find_longest(self, text, accept=None):
+        """
+        最左最长、互不重叠的匹配
+
+        参数:
+            accept: 可选过滤函数 accept(text, start, end, pattern_id)
+        """
+        matches = sorted(self.iter_matches(text), key=lambda m: (m[0], -(m[1] - m[0])))
+        selected = []
+        cursor = 0
+        for start, end, pid in matches:
+            if start < cursor:
+                continue
+            if accept is not None and not accept(text, start, end, pid):
+                continue
+            selected.append((start, end, pid))
+            cursor = end
+        return selected
+
+    def contains_any(self, text):
+        """返回命中的模式下标集合（只需一次遍历）"""
+        return {pid for _, _, pid in self.iter_matches(text)}
+
+
+class HotwordEngine:
+    """
+    编译后的热词引擎
+
+    参数:
+        domains: {filename: 词库dict}
+    """
+
+    def __init__(self, domains):
+        self.domains = domains
+        self.entries = []  # (pattern, domain_file, term_index, kind)
+        for filename, data in domains.items():
+            for term_index, term in enumerate(data.get("terms", [])):
+                seen = set()
+                forms = [(term.get("english"), "english"), (term.get("chinese"), "chinese")]
+                forms += [(v, "variant") for v in term.get("variants", [])]
+                for pattern, kind in forms:
+                    if not pattern or pattern.lower() in seen:
+                        continue
+                    seen.add(pattern.lower())
+                    self.entries.append((pattern, filename, term_index, kind))
+        self.automaton = AhoCorasick([e[0] for e in self.entries])
+
+    def __getstate__(self):
+        # 只缓存纯数据结构，避免 pickle 绑定到 __main__ 下的类路径
+        automaton = self.automaton
+        return {
+            "domains": self.domains,
+            "entries": self.entries,
+            "automaton": (automaton.patterns, automaton.ignore_case, automaton.goto, automaton.fail, automaton.output)
+        }
+
+    def __setstate__(self, state):
+        self.domains = state["domains"]
+        self.entries = state["entries"]
+        automaton = AhoCorasick.__new__(AhoCorasick)
+        (automaton.patterns, automaton.ignore_case, automaton.goto,
+         automaton.fail, automaton.output) = state["automaton"]
+        self.automaton = automaton
+
+    @staticmethod
+    def _source_digest(hotword_dir):
+        digest = hashlib.sha1()
+        for path in sorted(Path(hotword_dir).glob("*.json")):
+            digest.update(path.name.encode("utf-8"))
+            digest.update(path.read_bytes())
+        return digest.hexdigest()[:16]
+
+    @classmethod
+    def load(cls, hotword_dir=HOTWORD_DIR, use_cache=True):
+        """
+        加载全部词库；自动机按词库内容哈希缓存到磁盘，词库变更后自动重建
+        """
+        digest = cls._source_digest(hotword_dir)
+        cache_file = Path(cache_dir) / f"hotwords_{digest}.pkl"
+
+        if use_cache and cache_file.exists():
+            try:
+                engine = cls.__new__(cls)
+                with open(cache_file, 'rb') as f:
+                    engine.__setstate__(pickle.load(f))
+                print(f"✅ 从缓存加载热词自动机: {len(engine.entries)} 个模式", file=sys.stderr)
+                metrics.record_cache("hotwords", hit=True)
+                return engine
+            except Exception as e:
+                print(f"⚠️ 热词缓存读取失败，重新编译: {e}", file=sys.stderr)
+
+        if use_cache:
+            metrics.record_cache("hotwords", hit=False)
+        domains = {}
+        for path in sorted(Path(hotword_dir).glob("*.json")):
+            with open(path, 'r', encoding='utf-8') as f:
+                domains[path.name] = json.load(f)
+
+        start = time.time()
+        engine = cls(domains)
+        print(f"🔧 热词自动机编译完成: {len(engine.entries)} 个模式, "
+              f"{len(engine.automaton.goto)} 个状态, {time.time() - start:.3f}秒", file=sys.stderr)
+
+        if use_cache:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                tmp_file = cache_file.with_suffix(".tmp")
+                with open(tmp_file, 'wb') as f:
+                    pickle.dump(engine.__getstate__(), f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_file, cache_file)
+            except Exception as e:
+                print(f"⚠️ 热词缓存写入失败: {e}", file=sys.stderr)
+
+        return engine
+
+    def term(self, entry_index):
+        _, filename, term_index, _ = self.entries[entry_index]
+        return self.domains[filename]["terms"][term_index]
+
+    def _accept(self, text, start, end, pid):
+        """英文模式需要词边界，中文不需要（与 JS 服务一致）"""
+        pattern = self.entries[pid][0]
+        if _CJK_RE.search(pattern):
+            return True
+        before = text[start - 1] if start > 0 else ' '
+        after = text[end] if end < len(text) else ' '
+        return not _is_alnum(before) and not _is_alnum(after)
+
+    def scan(self, text):
+        """
+        扫描文本中的热词（最左最长匹配）
+
+        返回:
+            [{"term", "chinese", "english", "matchedText", "position", "length", "type", "domain"}, ...]
+        """
+        matches = []
+        for start, end, pid in self.automaton.find_longest(text, accept=self._accept):
+            _, filename, _, kind = self.entries[pid]
+            term = self.term(pid)
+            matches.append({
+                "term": term.get("english") or term.get("chinese"),
+                "chinese": term.get("chinese"),
+                "english": term.get("english"),
+                "matchedText": text[start:end],
+                "position": start,
+                "length": end - start,
+                "type": kind,
+                "domain": self.domains[filename].get("domain", filename)
+            })
+        return matches
+
+    def _canonical(self, pid, matched):
+        """
+        规范化写法：只修正英文术语的大小写（llm -> LLM）
+
+        中文变体（上市、天使轮等）是说话人的原话，只报告匹配、不改写文本（与 hotwordMatchingService.js 一致）
+        """
+        english = self.term(pid).get("english")
+        if english and matched.lower() == english.lower():
+            return english
+        return matched
+
+    def _domain_accept(self, domain_file):
+        """只接受选定领域词库的匹配；domain_file 为空时接受全部词库"""
+        if not domain_file:
+            return self._accept
+        entries = self.entries
+        return lambda text, start, end, pid: entries[pid][1] == domain_file and self._accept(text, start, end, pid)
+
+    def normalize(self, text, domain_file=None):
+        """
+        一次遍历完成热词扫描与英文术语大小写规范化
+
+        参数:
+            domain_file: 只报告该领域词库的匹配（为空时使用全部词库）
+
+        返回:
+            (规范化后的文本, 匹配列表)
+        """
+        return self._normalize(text, self._domain_accept(domain_file))
+
+    def _normalize(self, text, accept):
+        matches = self.automaton.find_longest(text, accept=accept)
+        if not matches:
+            return text, []
+
+        pieces = []
+        found = []
+        cursor = 0
+        for start, end, pid in matches:
+            matched = text[start:end]
+            canonical = self._canonical(pid, matched)
+            pieces.append(text[cursor:start])
+            pieces.append(canonical)
+            cursor = end
+            term = self.term(pid)
+            found.append({
+                "term": term.get("english") or term.get("chinese"),
+                "matchedText": matched,
+                "normalized": canonical,
+                "position": start
+            })
+        pieces.append(text[cursor:])
+        return ''.join(pieces), found
+
+    def normalize_segments(self, segments, domain_file=None):
+        """
+        规范化片段中英文术语的大小写（原地修改 text），并汇总热词出现的时间点
+
+        参数:
+            domain_file: 选定的领域词库（resolve_domain 的结果），为空时使用全部词库
+
+        返回:
+            按出现次数排序的热词汇总
+        """
+        accept = self._domain_accept(domain_file)
+        summary = {}
+        for seg in segments:
+            seg["text"], found = self._normalize(seg.get("text", ""), accept)
+            for match in found:
+                item = summary.setdefault(match["term"], {"term": match["term"], "count": 0, "timestamps": []})
+                item["count"] += 1
+                item["timestamps"].append(seg.get("start"))
+        return sorted(summary.values(), key=lambda x: -x["count"])
+
+    def detect_domain(self, text):
+        """根据命中次数推断最匹配的词库文件，没有命中返回 None"""
+        counts = {}
+        for _, _, pid in self.automaton.find_longest(text, accept=self._accept):
+            filename = self.entries[pid][1]
+            counts[filename] = counts.get(filename, 0) + 1
+        return max(counts, key=counts.get) if counts else None
+
+    def resolve_domain(self, domain, sample_text=None):
+        """
+        将 --hotwords 参数解析为词库文件名
+
+        参数:
+            domain: 主题名（科技/商业/...）、词库文件名或 "auto"
+            sample_text: auto 模式下用于推断的文本（如播客标题）
+        """
+        if not domain:
+            return None
+        if domain == "auto":
+            return self.detect_domain(sample_text or "") or 'tech-ai.json'
+        if domain in self.domains:
+            return domain
+        if f"{domain}.json" in self.domains:
+            return f"{domain}.json"
+        return DOMAIN_FILE_MAP.get(domain, 'tech-ai.json')
+
+    def build_prompt(self, domain_file, language="zh", max_chars=200):
+        """
+        为 faster-whisper 生成解码提示
+
+        返回:
+            {"initial_prompt": str, "hotwords": str}
+        """
+        data = self.domains.get(domain_file)
+        if not data:
+            return {"initial_prompt": None, "hotwords": None}
+
+        terms = []
+        for term in data.get("terms", []):
+            preferred = term.get("chinese") if language in (None, "zh") else term.get("english")
+            for word in (preferred, term.get("english")):
+                if word and word not in terms:
+                    terms.append(word)
+
+        joined = []
+        length = 0
+        for word in terms:
+            if length + len(word) + 1 > max_chars:
+                break
+            joined.append(word)
+            length += len(word) + 1
+
+        topic = data.get("domain", "")
+        if language in (None, "zh"):
+            prompt = f"以下是一段关于{topic}的播客，涉及：{'、'.join(joined)}。"
+        else:
+            prompt = f"A podcast about {topic}, covering: {', '.join(joined)}."
+        return {"initial_prompt": prompt, "hotwords": " ".join(joined)}
+
+    def decoder_kwargs(self, domain_file, language=None):
+        """
+        生成 model.transcribe 的提示参数：
+        指定中文时同时使用 initial_prompt 和 hotwords，自动检测时只用中英混合的 hotwords，避免提示语言干扰
+        """
+        prompt = self.build_prompt(domain_file, language or "zh")
+        if not prompt["hotwords"]:
+            return {}
+        if language == "zh":
+            return {"initial_prompt": prompt["initial_prompt"], "hotwords": prompt["hotwords"]}
+        return {"hotwords": prompt["hotwords"]}
+
+
+def run_benchmark(engine, num_segments=200000, seed=0):
+    """生成大规模合成转录并测量扫描吞吐"""
+    rng = random.Random(seed)
+    patterns = [e[0] for e in engine.entries]
+    filler = "我们今天来聊一聊这个话题然后其实就是说大家可以看到这个发展非常快"
+    segments = []
+    for i in range(num_segments):
+        text = filler[rng.randrange(10):rng.randrange(20, len(filler))]
+        if rng.random() < 0.3:
+            text += rng.choice(patterns)
+        segments.append({"start": i * 3.0, "end": i * 3.0 + 2.8, "text": text})
+
+    total_chars = sum(len(s["text"]) for s in segments)
+    start = time.perf_counter()
+    summary = engine.normalize_segments(segments)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "segments": num_segments,
+        "characters": total_chars,
+        "seconds": round(elapsed, 3),
+        "segments_per_second": round(num_segments / elapsed),
+        "chars_per_second": round(total_chars / elapsed),
+        "unique_terms": len(summary)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='热词扫描与规范化工具')
+    parser.add_argument('input', nargs='?', help='转录结果JSON文件（含 segments）')
+    parser.add_argument('--domain', default='auto', help='主题/词库 (默认: auto 自动推断)')
+    parser.add_argument('--prompt', action='store_true', help='输出 faster-whisper 解码提示')
+    parser.add_argument('--no-cache', action='store_true', help='不使用磁盘缓存')
+    parser.add_argument('--benchmark', type=int, metavar='N', help='合成 N 个片段测试扫描吞吐')
+
+    args = parser.parse_args()
+    engine = HotwordEngine.load(use_cache=not args.no_cache)
+
+    if args.benchmark:
+        print(json.dumps({"success": True, "benchmark": run_benchmark(engine, args.benchmark)}, ensure_ascii=False))
+        return
+
+    if not args.input:
+        parser.error("需要输入文件，或使用 --benchmark")
+
+    with open(args.input, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    segments = data.get("segments", [])
+    domain_file = engine.resolve_domain(args.domain, data.get("text") or " ".join(s.get("text", "") for s in segments[:50]))
+
+    result = {"success": True, "domain": domain_file, "hotwords": engine.normalize_segments(segments, domain_file),
+              "segments": segments}
+    if args.prompt:
+        result["prompt"] = engine.build_prompt(domain_file, data.get("language", "zh"))
+    print(json.dumps(result, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
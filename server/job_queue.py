@@ -0,0 +1,982 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+本地持久化任务队列（SQLite）
+任务按优先级和用户公平份额排队，全局限制每个引擎 / 每类资源（cpu/gpu）同时运行的任务数；
+worker 常驻并复用已加载的模型，短任务可在片段边界抢占可续跑引擎（engine.resumable）上的长任务（长任务保存进度后重新排队、之后续跑）；
+入口脚本经队列运行的长任务在片段边界暂停解码、让出名额，重新轮到后接着解码
+"""
+
+import sys
+import os
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+
+from engines import create_engine, _parse_options
+from tracing import span
+import metrics
+import runtime_predictor
+import autotune
+import cpu_allocator
+
+cache_dir = os.path.expanduser("~/.cache/podcast-transcriber")
+
+# 每类资源的默认并发上限（cpu 优先取本机调优的最优并行数，否则按每个任务约 4 线程估算）
+DEFAULT_RESOURCE_LIMITS = {"cpu": autotune.recommended_concurrency() or max(1, (os.cpu_count() or 4) // 4), "gpu": 1}
+# 未单独配置的引擎默认同时只跑一个任务（同一引擎并发主要是互相抢核）
+DEFAULT_ENGINE_LIMIT = 1
+
+# 预测耗时不超过该值的算短任务，可以抢占剩余耗时超过 LONG_JOB_SECONDS 的长任务
+SHORT_JOB_SECONDS = 120
+LONG_JOB_SECONDS = 600
+MAX_PREEMPTIONS = 3
+# 片段边界上两次检查抢占的最小间隔（秒）
+PREEMPT_CHECK_INTERVAL = 2.0
+
+# 公平份额统计窗口：按用户最近这段时间占用的处理秒数排序
+FAIR_SHARE_WINDOW = 3600
+# running 任务心跳超过该时长视为 worker 已退出，重新排队
+STALE_SECONDS = 120
+# 运行中的任务由后台线程按该间隔发心跳（加载模型、一次性解码整段的引擎也不会被误判为超时）
+HEARTBEAT_INTERVAL = 30
+# 已结束的任务保留时长（秒），之后在写入结果时清理
+JOB_RETENTION_SECONDS = 7 * 24 * 3600
+
+FINAL_STATES = ("done", "failed", "cancelled")
+
+
+def default_queue_path():
+    return os.getenv("JOB_QUEUE_DB") or os.path.join(cache_dir, "job_queue.db")
+
+
+def load_limits():
+    """
+    并发上限：默认值叠加环境变量 JOB_QUEUE_LIMITS（JSON）
+
+    例: {"engine": {"whisper": 2, "sensevoice": 1}, "resource": {"cpu": 3, "gpu": 1}}
+    """
+    limits = {"engine": {}, "resource": dict(DEFAULT_RESOURCE_LIMITS)}
+    raw = os.getenv("JOB_QUEUE_LIMITS")
+    if raw:
+        try:
+            configured = json.loads(raw)
+            limits["engine"].update(configured.get("engine", {}))
+            limits["resource"].update(configured.get("resource", {}))
+        except (ValueError, AttributeError) as e:
+            print(f"⚠️ JOB_QUEUE_LIMITS 无法解析，使用默认值: {e}", file=sys.stderr)
+    return limits
+
+
+def resource_for(device):
+    return "gpu" if device and device.startswith("cuda") else "cpu"
+
+
+class JobQueue:
+    """
+    任务队列（多进程共用同一个数据库文件）
+
+    任务状态: queued -> running -> done / failed / cancelled；被抢占的任务带着 checkpoint 回到 queued
+    """
+
+    def __init__(self, db_path=None, limits=None):
+        self.db_path = db_path or default_queue_path()
+        self.limits = limits or load_limits()
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                engine TEXT NOT NULL,
+                model TEXT,
+                device TEXT,
+                compute_type TEXT,
+                resource TEXT NOT NULL,
+                audio_path TEXT NOT NULL,
+                language TEXT,
+                options TEXT,
+                user TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                audio_seconds REAL,
+                predicted_seconds REAL,
+                submitted_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                heartbeat_at REAL,
+                worker TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                preemptions INTEGER NOT NULL DEFAULT 0,
+                run_seconds REAL NOT NULL DEFAULT 0,
+                progress REAL,
+                checkpoint TEXT,
+                result TEXT,
+                error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, priority, submitted_at);
+            CREATE INDEX IF NOT EXISTS jobs_user ON jobs (user, finished_at);
+            CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at);
+        """)
+        self._lock = threading.RLock()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _transaction(self):
+        """BEGIN IMMEDIATE：认领、抢占等读后写操作在多个 worker 之间串行"""
+        queue = self
+
+        class _Tx:
+            def __enter__(self):
+                queue._lock.acquire()
+                queue.conn.execute("BEGIN IMMEDIATE")
+                return queue.conn
+
+            def __exit__(self, exc_type, *exc):
+                try:
+                    queue.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+                finally:
+                    queue._lock.release()
+
+        return _Tx()
+
+    # ---------------------------------------------------------------- 提交与查询
+
+    def submit(self, audio_path, engine="whisper", model=None, device=None, compute_type=None, language=None,
+               user="default", priority=0, options=None):
+        """
+        提交任务
+
+        参数:
+            engine: 引擎名；"auto" 时由 engine_policy 按音频时长、语言和当前积压选择引擎、模型和 beam
+            priority: 数值越大越先执行
+            options: 传给引擎构造 / transcribe 的参数，{"engine": {...}, "transcribe": {...}}
+
+        返回:
+            任务 id
+        """
+        audio_path = os.path.abspath(audio_path) if os.path.exists(audio_path) else audio_path
+        if engine == "auto":
+            from engine_policy import EnginePolicy
+            decision = EnginePolicy().decide(audio_path, language=language, backlog_seconds=self.backlog_seconds())
+            engine, model = decision["label"], decision["model"]
+            if decision.get("beam_size"):
+                options = dict(options or {})
+                options["transcribe"] = dict(options.get("transcribe", {}), beam_size=decision["beam_size"],
+                                             best_of=decision["beam_size"])
+            print(f"🧭 引擎选择: {engine} {model} ({decision['reason']})", file=sys.stderr)
+        audio_seconds = runtime_predictor.probe_duration(audio_path)
+        predicted = None
+        try:
+            with runtime_predictor.RuntimePredictor() as predictor:
+                # worker 常驻，模型只在首个任务加载一次，排队预测不计加载耗时
+                beam_size = (options or {}).get("transcribe", {}).get("beam_size")
+                predicted = predictor.predict(engine, audio_seconds=audio_seconds,
+                                              model=runtime_predictor.history_model(model, beam_size),
+                                              compute_type=compute_type, language=language,
+                                              include_load=False)["predicted_seconds"]
+        except Exception as e:
+            print(f"⚠️ 耗时预测失败: {e}", file=sys.stderr)
+        with self._lock:
+            cursor = self.conn.execute(
+                "INSERT INTO jobs (engine, model, device, compute_type, resource, audio_path, language, options, "
+                "user, priority, status, audio_seconds, predicted_seconds, submitted_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'queued', ?, ?, ?)",
+                (engine, model, device, compute_type, resource_for(device), str(audio_path), language,
+                 json.dumps(options or {}, ensure_ascii=False), user, priority, audio_seconds, predicted, time.time())
+            )
+        return cursor.lastrowid
+
+    def get(self, job_id):
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job_dict(row) if row else None
+
+    @staticmethod
+    def _job_dict(row, full=True):
+        job = dict(row)
+        for key in ("options", "checkpoint", "result"):
+            if job.get(key):
+                job[key] = json.loads(job[key])
+        if not full:
+            job.pop("result", None)
+            job.pop("checkpoint", None)
+        return job
+
+    def cancel(self, job_id):
+        """取消排队中的任务（运行中的任务在下一个片段边界停止）"""
+        with self._lock:
+            cursor = self.conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status IN ('queued', 'running')",
+                (time.time(), job_id)
+            )
+        return cursor.rowcount > 0
+
+    def wait(self, job_ids, timeout=None, poll=0.5, on_progress=None):
+        """
+        等待任务结束
+
+        返回:
+            {id: job}；超时时未结束的任务保持当前状态
+        """
+        deadline = time.time() + timeout if timeout else None
+        pending = set(job_ids)
+        jobs = {}
+        while pending:
+            for job_id in list(pending):
+                job = self.get(job_id)
+                if job is None:
+                    pending.discard(job_id)
+                    continue
+                previous = jobs.get(job_id)
+                jobs[job_id] = job
+                if job["status"] in FINAL_STATES:
+                    pending.discard(job_id)
+                elif on_progress and (previous is None or (previous["status"], previous["progress"])
+                                      != (job["status"], job["progress"])):
+                    on_progress(job)
+            if not pending or (deadline and time.time() >= deadline):
+                break
+            time.sleep(poll)
+        return jobs
+
+    def status(self):
+        with self._lock:
+            counts = {row["status"]: row["n"] for row in self.conn.execute(
+                "SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+            running = [self._job_dict(row, full=False) for row in self.conn.execute(
+                "SELECT * FROM jobs WHERE status = 'running' ORDER BY started_at")]
+            queued = [self._job_dict(row, full=False) for row in self.conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY priority DESC, submitted_at LIMIT 50")]
+        return {"counts": counts, "limits": self.limits, "running": running, "queued": queued}
+
+    def backlog_seconds(self):
+        """未完成工作量的预测耗时（运行中的按进度扣除）除以总槽位数，即新任务的大致等待时间"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT status, predicted_seconds, progress FROM jobs WHERE status IN ('queued', 'running') "
+                "AND predicted_seconds IS NOT NULL"
+            ).fetchall()
+        remaining = sum(row["predicted_seconds"] * (1 - (row["progress"] or 0) / 100) for row in rows)
+        return remaining / max(1, sum(int(n) for n in self.limits["resource"].values()))
+
+    # ---------------------------------------------------------------- 调度
+
+    def _engine_limit(self, engine):
+        return int(self.limits["engine"].get(engine, DEFAULT_ENGINE_LIMIT))
+
+    def _resource_limit(self, resource):
+        return int(self.limits["resource"].get(resource, 1))
+
+    def _usage_by_user(self, conn, now):
+        """用户最近占用的处理秒数（已完成任务的实际耗时 + 运行中任务的已运行时间）"""
+        usage = {}
+        for row in conn.execute(
+                "SELECT user, SUM(run_seconds) AS used FROM jobs WHERE finished_at >= ? GROUP BY user",
+                (now - FAIR_SHARE_WINDOW,)):
+            usage[row["user"]] = row["used"] or 0.0
+        for row in conn.execute("SELECT user, run_seconds, started_at FROM jobs WHERE status = 'running'"):
+            usage[row["user"]] = usage.get(row["user"], 0.0) + row["run_seconds"] + (now - row["started_at"])
+        # 被抢占后重新排队的任务已经跑过的部分也计入
+        for row in conn.execute("SELECT user, run_seconds FROM jobs WHERE status = 'queued' AND run_seconds > 0"):
+            usage[row["user"]] = usage.get(row["user"], 0.0) + row["run_seconds"]
+        return usage
+
+    def _requeue_stale(self, conn, now):
+        conn.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND heartbeat_at < ? "
+            "AND json_extract(options, '$.external') IS NULL",
+            (now - STALE_SECONDS,)
+        )
+        # 外部任务只能由提交它的进程运行，进程退出后不再重新排队
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', finished_at = ?, error = '提交任务的进程已退出' "
+            "WHERE status IN ('queued', 'running') AND heartbeat_at < ? "
+            "AND json_extract(options, '$.external') IS NOT NULL",
+            (now, now - STALE_SECONDS)
+        )
+
+    def _running_counts(self, conn):
+        running_engine = {}
+        running_resource = {}
+        for row in conn.execute("SELECT engine, resource, COUNT(*) AS n FROM jobs WHERE status = 'running' "
+                                "GROUP BY engine, resource"):
+            running_engine[row["engine"]] = running_engine.get(row["engine"], 0) + row["n"]
+            running_resource[row["resource"]] = running_resource.get(row["resource"], 0) + row["n"]
+        return running_engine, running_resource
+
+    def _candidates(self, conn, now, engines=None, external=False):
+        """
+        按 (优先级, 用户份额, 提交时间) 排序的可运行任务，满足引擎和资源上限
+
+        参数:
+            external: 是否包含外部任务（worker 认领时不包含）
+        """
+        running_engine, running_resource = self._running_counts(conn)
+        usage = self._usage_by_user(conn, now)
+        queued = conn.execute("SELECT *, json_extract(checkpoint, '$.yield_to') AS yield_to FROM jobs "
+                              "WHERE status = 'queued'").fetchall()
+        queued.sort(key=lambda row: (-row["priority"], usage.get(row["user"], 0.0), row["submitted_at"]))
+        queued_ids = {row["id"] for row in queued}
+        runnable, blocked = [], []
+        for row in queued:
+            if engines and row["engine"] not in engines:
+                continue
+            # 让出名额的外部任务等被让的任务开始后才重新参与排队
+            if row["yield_to"] in queued_ids:
+                continue
+            if not external and json.loads(row["options"] or "{}").get("external"):
+                continue
+            if (running_engine.get(row["engine"], 0) < self._engine_limit(row["engine"])
+                    and running_resource.get(row["resource"], 0) < self._resource_limit(row["resource"])):
+                runnable.append(row)
+            else:
+                blocked.append(row)
+        return runnable, blocked
+
+    def _start(self, conn, row, worker, now):
+        conn.execute(
+            "UPDATE jobs SET status = 'running', worker = ?, started_at = ?, heartbeat_at = ?, "
+            "attempts = attempts + 1 WHERE id = ?",
+            (worker, now, now, row["id"])
+        )
+        return self._job_dict(conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+
+    def claim(self, worker, engines=None):
+        """认领下一个可运行的任务，没有时返回 None"""
+        now = time.time()
+        with self._transaction() as conn:
+            self._requeue_stale(conn, now)
+            runnable, _ = self._candidates(conn, now, engines)
+            if not runnable:
+                return None
+            return self._start(conn, runnable[0], worker, now)
+
+    def claim_external(self, job_id, worker):
+        """
+        外部任务（入口脚本在自己进程里运行）轮到时认领：排在它前面、同引擎 / 同资源的任务
+        都能先拿到名额时才开始，保持与 worker 相同的优先级和公平份额顺序
+
+        返回:
+            开始运行的任务，还没轮到时返回 None（同时刷新排队心跳）
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            self._requeue_stale(conn, now)
+            job = conn.execute("SELECT engine, resource FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            running_engine, running_resource = self._running_counts(conn)
+            runnable, _ = self._candidates(conn, now, external=True)
+            for row in runnable:
+                if row["id"] == job_id:
+                    conn.execute("UPDATE jobs SET checkpoint = NULL WHERE id = ?", (job_id,))
+                    return self._start(conn, row, worker, now)
+                # 排在前面的任务先占名额
+                running_engine[row["engine"]] = running_engine.get(row["engine"], 0) + 1
+                running_resource[row["resource"]] = running_resource.get(row["resource"], 0) + 1
+                if (running_engine.get(job["engine"], 0) >= self._engine_limit(job["engine"])
+                        or running_resource.get(job["resource"], 0) >= self._resource_limit(job["resource"])):
+                    break
+            conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'queued'", (now, job_id))
+        return None
+
+    def heartbeat(self, job_id, worker, progress=None):
+        """
+        更新心跳，返回任务当前状态（被取消时 worker 据此停止）
+
+        返回:
+            状态字符串；任务已不归该 worker（心跳超时后被重新排队或认领）时为 "lost"
+        """
+        with self._lock:
+            self.conn.execute(
+                "UPDATE jobs SET heartbeat_at = ?, progress = COALESCE(?, progress) "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time(), progress, job_id, worker)
+            )
+            row = self.conn.execute("SELECT status, worker FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        if row["status"] == "queued" or (row["status"] == "running" and row["worker"] != worker):
+            return "lost"
+        return row["status"]
+
+    def preempt(self, job, checkpoint, worker, engines=None):
+        """
+        片段边界上尝试抢占：有短任务因为当前任务占着的引擎 / 资源名额而排不上时，
+        当前任务保存进度回到队列，同一事务里由本 worker 认领该短任务
+
+        返回:
+            被换上的短任务，不需要抢占时返回 None
+        """
+        if not self._is_long(job, checkpoint["offset"]):
+            return None
+
+        now = time.time()
+        with self._transaction() as conn:
+            target = self._preempt_target(conn, job, now, engines)
+            if target is None or not self._requeue(conn, job, checkpoint, worker, now):
+                return None
+            return self._start(conn, target, worker, now)
+
+    def yield_slot(self, job, offset, worker):
+        """
+        外部任务在片段边界让出名额：有短任务因当前任务占着名额而排不上时，当前任务回到队列
+        （进程保留解码状态，等被让的任务开始后再重新认领，然后接着解码）
+
+        参数:
+            offset: 已解码到的音频位置（秒）
+
+        返回:
+            被让的任务 id，不需要让出时返回 None
+        """
+        if not self._is_long(job, offset):
+            return None
+
+        now = time.time()
+        with self._transaction() as conn:
+            target = self._preempt_target(conn, job, now, external=True)
+            if target is None or not self._requeue(conn, job, {"offset": offset, "yield_to": target["id"]},
+                                                   worker, now):
+                return None
+            return target["id"]
+
+    @staticmethod
+    def _is_long(job, offset):
+        """还能被抢占、且剩余预测耗时超过 LONG_JOB_SECONDS 的任务"""
+        if job["preemptions"] >= MAX_PREEMPTIONS:
+            return False
+        predicted = job.get("predicted_seconds")
+        if not predicted or not job.get("audio_seconds"):
+            return False
+        return predicted * max(0.0, 1 - offset / job["audio_seconds"]) > LONG_JOB_SECONDS
+
+    def _preempt_target(self, conn, job, now, engines=None, external=False):
+        """因当前任务占着引擎 / 资源名额而排不上的短任务（优先级不低于当前任务）"""
+        _, blocked = self._candidates(conn, now, engines, external)
+        return next((
+            row for row in blocked
+            if row["predicted_seconds"] is not None and row["predicted_seconds"] <= SHORT_JOB_SECONDS
+            and row["priority"] >= job["priority"]
+            and (row["engine"] == job["engine"] or row["resource"] == job["resource"])
+        ), None)
+
+    @staticmethod
+    def _requeue(conn, job, checkpoint, worker, now):
+        """当前任务带着 checkpoint 回到队列；任务已不归本 worker 时（不能拿它的名额换任务）返回 False"""
+        cursor = conn.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL, preemptions = preemptions + 1, "
+            "run_seconds = run_seconds + ?, checkpoint = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (now - job["started_at"], json.dumps(checkpoint, ensure_ascii=False), job["id"], worker)
+        )
+        return cursor.rowcount > 0
+
+    def finish(self, job_id, worker, result):
+        """
+        写入结果；任务已被重新分配给别的 worker 时不覆盖，返回是否写入
+        同时清理结束超过 JOB_RETENTION_SECONDS 的任务
+        """
+        now = time.time()
+        status = "done" if result.get("success") else "failed"
+        with self._lock:
+            cursor = self.conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, run_seconds = run_seconds + (? - started_at), "
+                "result = ?, error = ?, checkpoint = NULL, progress = ? "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (status, now, now, json.dumps(result, ensure_ascii=False), result.get("error"),
+                 100.0 if status == "done" else None, job_id, worker)
+            )
+            self.conn.execute(
+                f"DELETE FROM jobs WHERE finished_at < ? AND status IN ({', '.join('?' * len(FINAL_STATES))})",
+                (now - JOB_RETENTION_SECONDS, *FINAL_STATES)
+            )
+        return cursor.rowcount > 0
+
+
+# ---------------------------------------------------------------------------
+# worker
+# ---------------------------------------------------------------------------
+
+class Preempted(Exception):
+    """当前任务已被换下，next_job 为换上的短任务"""
+
+    def __init__(self, next_job):
+        super().__init__(f"被任务 {next_job['id']} 抢占")
+        self.next_job = next_job
+
+
+class Cancelled(Exception):
+    pass
+
+
+class Lost(Exception):
+    """任务心跳超时后已被重新排队 / 认领，本次运行作废"""
+
+
+class Heartbeat:
+    """
+    运行中任务的后台心跳线程：覆盖模型加载和不分片段返回的解码，
+    最近一次心跳返回的状态记在 status 里（cancelled / lost 时片段边界上停止）
+    """
+
+    def __init__(self, queue, job_id, worker, interval=HEARTBEAT_INTERVAL):
+        self.queue = queue
+        self.job_id = job_id
+        self.worker = worker
+        self.interval = interval
+        self.status = "running"
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-{job_id}", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.status = self.queue.heartbeat(self.job_id, self.worker)
+            except sqlite3.Error as e:
+                print(f"⚠️ 任务 {self.job_id} 心跳失败: {e}", file=sys.stderr)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+class QueueSlot:
+    """
+    入口脚本（whisper_transcribe.py 等）经队列运行：提交一个外部任务，按优先级 / 公平份额 /
+    并发上限等到名额后在本进程里转录，期间后台心跳；解码循环经 track_slot 在片段边界检查取消，
+    并在短任务排不上时让出名额（暂停解码、让出 CPU 核，重新轮到后接着解码）。
+    结束时只把结果摘要写回队列（完整结果由入口脚本自己输出）
+
+    用法:
+        with QueueSlot(audio_path, "whisper", model="base") as slot:
+            result = transcriber.transcribe_file(...)
+            slot.result = result
+    """
+
+    def __init__(self, audio_path, engine, model=None, device=None, compute_type=None, language=None,
+                 user=None, priority=0, poll=1.0, db_path=None, enabled=True):
+        self.enabled = enabled
+        self.audio_path = audio_path
+        self.engine = engine
+        self.model = model
+        self.device = device
+        self.compute_type = compute_type
+        self.language = language
+        self.user = user or os.getenv("JOB_QUEUE_USER") or os.getenv("USER", "default")
+        self.priority = priority
+        self.poll = poll
+        self.db_path = db_path
+        self.worker = f"{socket.gethostname()}:{os.getpid()}/external"
+        self.queue = None
+        self.job = None
+        self.result = None
+        self._heartbeat = None
+        self._last_check = 0.0
+
+    def _wait_turn(self, job_id):
+        """轮询直到认领到名额（排队期间 claim_external 刷新心跳）"""
+        waited = time.time()
+        while True:
+            self.job = self.queue.claim_external(job_id, self.worker)
+            if self.job:
+                break
+            status = self.queue.get(job_id)["status"]
+            if status != "queued":
+                raise RuntimeError(f"队列任务 {job_id} 状态: {status}")
+            time.sleep(self.poll)
+        self._heartbeat = Heartbeat(self.queue, job_id, self.worker).__enter__()
+        self._last_check = time.perf_counter()
+        return time.time() - waited
+
+    def __enter__(self):
+        global _active_slot
+        if not self.enabled:
+            return self
+        self.queue = JobQueue(self.db_path)
+        job_id = self.queue.submit(self.audio_path, self.engine, model=self.model, device=self.device,
+                                   compute_type=self.compute_type, language=self.language, user=self.user,
+                                   priority=self.priority, options={"external": True})
+        print(f"📥 已进入任务队列: 任务 {job_id}", file=sys.stderr)
+        try:
+            waited = self._wait_turn(job_id)
+        except BaseException:
+            self.queue.close()
+            raise
+        print(f"▶️ 任务 {job_id} 开始运行（排队 {waited:.1f}秒）", file=sys.stderr)
+        # 子进程（组合脚本调用的转录 / 分离脚本）在这个名额里运行，不再重复排队
+        os.environ["JOB_QUEUE_SLOT"] = str(job_id)
+        metrics.queue_wait_seconds.observe(max(0.0, self.job["started_at"] - self.job["submitted_at"]),
+                                           engine=self.engine)
+        _active_slot = self
+        return self
+
+    def checkpoint(self, position):
+        """
+        片段边界调用：上报进度、检查取消；有短任务因本任务占着名额排不上时让出名额，
+        等被让的任务开始、本任务重新轮到后返回（期间解码暂停、CPU 核租约释放、暂停时长不计入耗时）
+
+        参数:
+            position: 已解码到的音频位置（秒）
+        """
+        if not self.enabled or time.perf_counter() - self._last_check < PREEMPT_CHECK_INTERVAL:
+            return
+        self._last_check = time.perf_counter()
+        job_id = self.job["id"]
+        progress = None
+        if self.job.get("audio_seconds"):
+            progress = round(min(99.0, position / self.job["audio_seconds"] * 100), 1)
+        status = self.queue.heartbeat(job_id, self.worker, progress)
+        if status == "cancelled":
+            raise Cancelled(f"队列任务 {job_id} 已取消")
+        if status == "lost":
+            raise Lost(f"队列任务 {job_id} 心跳超时已被判定退出")
+        target = self.queue.yield_slot(self.job, position, self.worker)
+        if target is None:
+            return
+        print(f"⏸️ 任务 {job_id} 在 {position:.1f}秒 处让出名额给短任务 {target}", file=sys.stderr)
+        self._heartbeat.__exit__()
+        runtime_predictor.pause_progress()
+        released = cpu_allocator.release_for_job()
+        waited = self._wait_turn(job_id)
+        if released:
+            cpu_allocator.acquire_for_job(self.engine, device=self.device or "cpu")
+        runtime_predictor.resume_progress()
+        print(f"▶️ 任务 {job_id} 继续解码（让出 {waited:.1f}秒）", file=sys.stderr)
+
+    def track(self, segments):
+        """包装解码片段迭代器：每个片段交出后在片段边界调用 checkpoint"""
+        for segment in segments:
+            yield segment
+            self.checkpoint(segment["end"] if isinstance(segment, dict) else segment.end)
+
+    def __exit__(self, exc_type, exc, tb):
+        global _active_slot
+        if not self.enabled:
+            return
+        _active_slot = None
+        self._heartbeat.__exit__()
+        os.environ.pop("JOB_QUEUE_SLOT", None)
+        result = self.result
+        if result is None:
+            result = {"success": False, "file": str(self.audio_path),
+                      "error": str(exc) if exc else "未返回结果", "text": ""}
+        try:
+            self.queue.finish(self.job["id"], self.worker, result_summary(result))
+        finally:
+            self.queue.close()
+
+
+# 当前进程里正在运行的队列名额（由 QueueSlot 设置；没有时 track_slot 原样返回）
+_active_slot = None
+
+
+def track_slot(segments):
+    """解码循环里包装片段迭代器：经队列运行时在片段边界检查取消和让出名额，否则原样返回"""
+    if _active_slot is None:
+        return segments
+    return _active_slot.track(segments)
+
+
+def result_summary(result):
+    """
+    外部任务写回队列的结果摘要：不含片段和全文，避免每个任务在队列库里存一份完整转录
+
+    参数:
+        result: 单个结果 dict，或批量转录的结果列表
+    """
+    items = result if isinstance(result, list) else [result]
+    summary = {
+        "success": all(isinstance(item, dict) and item.get("success") for item in items),
+        "files": [item.get("file") or item.get("audio_file") for item in items],
+        "duration": sum(item.get("duration") or 0.0 for item in items),
+        "processing_time": sum(item.get("processing_time") or 0.0 for item in items),
+        "segments": sum(len(item.get("segments") or []) for item in items),
+        "characters": sum(len(item.get("text") or "") for item in items)
+    }
+    errors = [item["error"] for item in items if item.get("error")]
+    if errors:
+        summary["error"] = "; ".join(errors)
+    return summary
+
+
+class Worker:
+    """
+    常驻 worker：slots 个线程共用一个进程内的引擎缓存（同一模型只加载一次）
+
+    参数:
+        engines: 只处理这些引擎的任务（None 表示全部）
+        exit_when_idle: 队列空闲时退出（测试和批处理用）
+    """
+
+    def __init__(self, queue_path=None, slots=1, engines=None, exit_when_idle=False, poll=1.0):
+        self.queue_path = queue_path
+        self.slots = slots
+        self.engines = engines
+        self.exit_when_idle = exit_when_idle
+        self.poll = poll
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self._engine_cache = {}
+        self._engine_lock = threading.Lock()
+        self.completed = 0
+
+    def _engine(self, job):
+        """按 (引擎, 模型, 设备, 精度, 构造参数) 缓存已加载的引擎"""
+        engine_options = (job.get("options") or {}).get("engine", {})
+        key = (job["engine"], job["model"], job["device"], job["compute_type"],
+               json.dumps(engine_options, sort_keys=True))
+        with self._engine_lock:
+            if key not in self._engine_cache:
+                engine = create_engine(job["engine"], model=job["model"], device=job["device"],
+                                       compute_type=job["compute_type"], **engine_options)
+                engine.load()
+                self._engine_cache[key] = engine
+            return self._engine_cache[key]
+
+    def _execute(self, queue, job, worker):
+        """运行一个任务；可能抛出 Preempted / Cancelled / Lost"""
+        with Heartbeat(queue, job["id"], worker):
+            return self._decode(queue, job, worker)
+
+    def _decode(self, queue, job, worker):
+        engine = self._engine(job)
+        checkpoint = job.get("checkpoint") or {"offset": 0.0, "segments": []}
+        segments = list(checkpoint["segments"])
+        transcribe_options = dict((job.get("options") or {}).get("transcribe", {}))
+        if checkpoint["offset"]:
+            print(f"⏩ 任务 {job['id']} 从 {checkpoint['offset']:.1f}秒 续跑", file=sys.stderr)
+            transcribe_options["offset"] = checkpoint["offset"]
+
+        start = time.perf_counter()
+        last_check = start
+        with span("decoding", engine=engine.name, job=job["id"]):
+            stream = engine.transcribe(job["audio_path"], job["language"], **transcribe_options)
+            for segment in stream:
+                segments.append(segment)
+                if time.perf_counter() - last_check < PREEMPT_CHECK_INTERVAL:
+                    continue
+                last_check = time.perf_counter()
+                # 片段边界：心跳、取消检查、抢占检查
+                progress = None
+                if job.get("audio_seconds"):
+                    progress = round(min(99.0, segment["end"] / job["audio_seconds"] * 100), 1)
+                status = queue.heartbeat(job["id"], worker, progress)
+                if status == "cancelled":
+                    raise Cancelled()
+                if status == "lost":
+                    raise Lost()
+                if engine.resumable:
+                    next_job = queue.preempt(job, {"offset": segment["end"], "segments": segments},
+                                             worker, self.engines)
+                    if next_job:
+                        raise Preempted(next_job)
+
+        elapsed = time.perf_counter() - start
+        run = stream.run
+        duration = run.get("duration") or job.get("audio_seconds")
+        result = {
+            "success": True,
+            "job_id": job["id"],
+            "file": job["audio_path"],
+            "engine": engine.name,
+            "model": engine.model,
+            "text": " ".join(seg["text"] for seg in segments).strip(),
+            "segments": segments,
+            "language": run.get("language"),
+            "duration": duration,
+            "processing_time": round(elapsed, 3),
+            "queue_wait": round(job["started_at"] - job["submitted_at"], 3),
+            "preemptions": job["preemptions"]
+        }
+        # 续跑的任务只统计本次解码的那一段
+        decoded_seconds = (duration or 0.0) - checkpoint["offset"]
+        if decoded_seconds > 0:
+            result["real_time_factor"] = round(elapsed / decoded_seconds, 4)
+            try:
+                with runtime_predictor.RuntimePredictor() as predictor:
+                    model = runtime_predictor.history_model(engine.model, transcribe_options.get("beam_size"))
+                    predictor.record(engine.name, decoded_seconds, elapsed, model=model,
+                                     compute_type=engine.compute_type, language=job["language"],
+                                     load_seconds=engine.load_time)
+            except Exception as e:
+                print(f"⚠️ 耗时历史更新失败: {e}", file=sys.stderr)
+        return result
+
+    def _run_slot(self, slot):
+        queue = JobQueue(self.queue_path)
+        # 每个槽位单独记名：心跳、写结果都按认领者匹配
+        worker = f"{self.name}/{slot}"
+        idle_since = None
+        job = None
+        try:
+            while True:
+                job = job or queue.claim(worker, self.engines)
+                if job is None:
+                    idle_since = idle_since or time.time()
+                    if self.exit_when_idle and time.time() - idle_since >= self.poll:
+                        return
+                    time.sleep(self.poll)
+                    continue
+                idle_since = None
+                print(f"▶️ [{slot}] 任务 {job['id']}: {job['engine']} {os.path.basename(job['audio_path'])} "
+                      f"(用户 {job['user']}, 优先级 {job['priority']})", file=sys.stderr)
+                metrics.queue_wait_seconds.observe(max(0.0, job["started_at"] - job["submitted_at"]),
+                                                   engine=job["engine"])
+                try:
+                    result = self._execute(queue, job, worker)
+                except Preempted as e:
+                    print(f"⏸️ [{slot}] 任务 {job['id']} 让出给短任务 {e.next_job['id']}", file=sys.stderr)
+                    job = e.next_job
+                    continue
+                except Cancelled:
+                    print(f"⏹️ [{slot}] 任务 {job['id']} 已取消", file=sys.stderr)
+                    job = None
+                    continue
+                except Lost:
+                    print(f"⚠️ [{slot}] 任务 {job['id']} 心跳超时已被重新分配，放弃本次运行", file=sys.stderr)
+                    job = None
+                    continue
+                except Exception as e:
+                    result = {"success": False, "job_id": job["id"], "file": job["audio_path"],
+                              "engine": job["engine"], "error": str(e), "text": "", "segments": []}
+                if not queue.finish(job["id"], worker, result):
+                    print(f"⚠️ [{slot}] 任务 {job['id']} 已被重新分配，丢弃本次结果", file=sys.stderr)
+                    job = None
+                    continue
+                metrics.record_job(job["engine"], job["model"], result,
+                                   audio_seconds=result.get("duration"),
+                                   processing_seconds=result.get("processing_time"))
+                metrics.flush()
+                status = "✅" if result["success"] else "❌"
+                print(f"{status} [{slot}] 任务 {job['id']} 完成", file=sys.stderr)
+                self.completed += 1
+                job = None
+        finally:
+            queue.close()
+
+    def run(self):
+        print(f"👷 worker {self.name}: {self.slots} 个槽位, 引擎 {self.engines or '全部'}", file=sys.stderr)
+        threads = [threading.Thread(target=self._run_slot, args=(i,), name=f"job-slot-{i}", daemon=True)
+                   for i in range(self.slots)]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(1.0)
+        finally:
+            for engine in self._engine_cache.values():
+                engine.close()
+        return self.completed
+
+
+def add_queue_arguments(parser):
+    """入口脚本的队列参数（TRANSCRIBE_QUEUE=true 时默认经队列运行）"""
+    parser.add_argument("--queue", action="store_true", default=os.getenv("TRANSCRIBE_QUEUE") == "true",
+                        help="经本地任务队列运行：按优先级、公平份额和并发上限排到名额后再转录")
+    parser.add_argument("--queue-user", help="队列的提交用户（公平份额按用户计算，默认 JOB_QUEUE_USER 或 $USER）")
+    parser.add_argument("--queue-priority", type=int, default=0, help="队列优先级，越大越先执行 (默认: 0)")
+
+
+def queue_slot(args, audio_path, engine, model=None, device=None, compute_type=None, language=None):
+    """
+    按 add_queue_arguments 的参数创建 QueueSlot
+    未开启队列、或已在父进程的名额里运行（JOB_QUEUE_SLOT）时进入 / 退出都不做任何事
+    """
+    return QueueSlot(audio_path, engine, model=model, device=device, compute_type=compute_type, language=language,
+                     user=args.queue_user, priority=args.queue_priority,
+                     enabled=args.queue and not os.getenv("JOB_QUEUE_SLOT"))
+
+def _print_progress(job):
+    print(f"⏳ 任务 {job['id']}: {job['status']} {job.get('progress') or 0:.0f}%", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地转录任务队列')
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("submit", help="提交任务")
+    p.add_argument("files", nargs="+", help="音频文件")
+    p.add_argument("--engine", default="whisper", help="引擎名 (见 engines.py)，auto 表示按策略自动选择")
+    p.add_argument("--model", help="模型名")
+    p.add_argument("--device", help="计算设备 (cuda 计入 gpu 资源)")
+    p.add_argument("--compute-type", help="计算精度")
+    p.add_argument("--language", help="语言")
+    p.add_argument("--user", default=os.getenv("USER", "default"), help="提交用户（公平份额按用户计算）")
+    p.add_argument("--priority", type=int, default=0, help="优先级，越大越先执行")
+    p.add_argument("--option", action="append", metavar="KEY=VALUE", help="引擎构造参数，可重复")
+    p.add_argument("--wait", action="store_true", help="等待任务完成并输出结果")
+    p.add_argument("--timeout", type=float, help="等待超时（秒）")
+
+    p = sub.add_parser("await", help="等待任务完成并输出结果")
+    p.add_argument("ids", nargs="+", type=int)
+    p.add_argument("--timeout", type=float, help="等待超时（秒）")
+
+    p = sub.add_parser("worker", help="运行 worker")
+    p.add_argument("--slots", type=int, default=1, help="本进程的并发槽位（全局上限仍由队列控制）")
+    p.add_argument("--engines", help="只处理这些引擎，逗号分隔")
+    p.add_argument("--exit-when-idle", action="store_true", help="队列空闲时退出")
+
+    p = sub.add_parser("status", help="查看队列或某个任务")
+    p.add_argument("id", nargs="?", type=int)
+
+    p = sub.add_parser("cancel", help="取消任务")
+    p.add_argument("ids", nargs="+", type=int)
+
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        engines = [e.strip() for e in args.engines.split(",")] if args.engines else None
+        completed = Worker(slots=args.slots, engines=engines, exit_when_idle=args.exit_when_idle).run()
+        print(json.dumps({"success": True, "completed": completed}, ensure_ascii=False))
+        return
+
+    with JobQueue() as queue:
+        if args.command == "submit":
+            options = {"engine": _parse_options(args.option)} if args.option else None
+            ids = [queue.submit(path, args.engine, model=args.model, device=args.device,
+                                compute_type=args.compute_type, language=args.language, user=args.user,
+                                priority=args.priority, options=options)
+                   for path in args.files]
+            print(f"📥 已提交任务: {', '.join(map(str, ids))}", file=sys.stderr)
+            if not args.wait:
+                print(json.dumps({"success": True, "job_ids": ids}, ensure_ascii=False))
+                return
+            args.ids = ids
+
+        if args.command in ("submit", "await"):
+            jobs = queue.wait(args.ids, timeout=args.timeout, on_progress=_print_progress)
+            results = []
+            for i in args.ids:
+                job = jobs.get(i)
+                if job is None:
+                    results.append({"success": False, "job_id": i, "error": f"任务不存在: {i}"})
+                else:
+                    results.append(job.get("result") or {"success": False, "job_id": i, "status": job["status"],
+                                                         "error": job.get("error") or f"任务状态: {job['status']}"})
+            output = results[0] if len(results) == 1 else {"results": results, "batch": True}
+            print(json.dumps(output, ensure_ascii=False))
+            sys.exit(0 if all(r.get("success") for r in results) else 1)
+        elif args.command == "status":
+            output = queue.get(args.id) if args.id else queue.status()
+            print(json.dumps(output, ensure_ascii=False))
+        elif args.command == "cancel":
+            print(json.dumps({"cancelled": [i for i in args.ids if queue.cancel(i)]}, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
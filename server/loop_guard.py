@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+重复 / 幻觉循环保护
+音乐垫底、长时间静音时 Whisper 可能连续几分钟重复同一句话。解码过程中按相邻片段的
+n-gram 重复率和压缩比在线检测，一旦判定进入循环就停止解码该区域，从下一个 VAD 语音段重新开始，
+并在输出中标出被跳过的时间段
+"""
+
+import os
+import re
+import sys
+import zlib
+from collections import deque
+from types import SimpleNamespace
+
+from redecode import COMPRESSION_RATIO_THRESHOLD
+from tracing import span
+
+SAMPLE_RATE = 16000
+# 检测窗口：片段的 n-gram 与前几个片段比较
+WINDOW_SEGMENTS = 4
+NGRAM_SIZE = 3
+# 片段中重复 n-gram 占比超过该值（且 n-gram 数足够）时记为重复
+REPETITION_THRESHOLD = 0.5
+MIN_NGRAMS = 4
+# 与上一段逐字相同的短片段至少这么多字 / 词才算重复
+MIN_REPEAT_TOKENS = 4
+# 连续多少个重复片段判定为循环
+CONSECUTIVE_SEGMENTS = 3
+# 每个文件最多重启解码的次数，超过后只丢弃循环片段、不再重启
+MAX_RESTARTS = 20
+# 找下一个语音段时每次做 VAD 的音频长度（秒）
+SCAN_SECONDS = 120
+# 语音段起点离扫描起点不到该值时视为当前语音段的延续（秒）
+EDGE_SECONDS = 0.1
+
+_TOKEN_RE = re.compile(r"[぀-ヿ㐀-鿿가-힯]|\w+")
+
+
+def enabled():
+    return os.getenv("LOOP_GUARD_DISABLE") != "true"
+
+
+def tokens(text):
+    """CJK 按字、其他语言按词切分"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def ngrams(words, n=NGRAM_SIZE):
+    return [tuple(words[i:i + n]) for i in range(len(words) - n + 1)]
+
+
+def repetition_ratio(text, previous_texts, n=NGRAM_SIZE):
+    """
+    片段的 n-gram 中已在前几个片段或本片段前文出现过的比例
+
+    返回:
+        (重复 n-gram 占比, 片段的 n-gram 数)
+    """
+    seen = {gram for previous in previous_texts for gram in ngrams(tokens(previous), n)}
+    grams = ngrams(tokens(text), n)
+    repeated = 0
+    for gram in grams:
+        if gram in seen:
+            repeated += 1
+        seen.add(gram)
+    return (repeated / len(grams) if grams else 0.0), len(grams)
+
+
+def compression_ratio(text):
+    """与 Whisper 相同的 gzip 压缩比（越高越重复）"""
+    data = text.encode("utf-8")
+    return len(data) / len(zlib.compress(data)) if data else 0.0
+
+
+def _time(seconds):
+    return f"{int(seconds // 60):02d}:{int(seconds % 60):02d}"
+
+
+class LoopGuard:
+    """
+    片段流上的循环检测：可疑片段先扣住，后面出现正常片段就放行，
+    连续 CONSECUTIVE_SEGMENTS 个可疑片段则判定为循环，扣住的片段全部丢弃
+
+    参数:
+        restart: 起点秒 -> 从该处重新解码的片段迭代器（时间相对整段音频）；None 时只丢弃循环片段
+        next_speech: 秒 -> 该时刻之后下一个语音段的起点（没有时为 None）
+        audio_seconds: 音频总时长（跳到结尾时用于标记）
+    """
+
+    def __init__(self, restart=None, next_speech=None, audio_seconds=None, window=WINDOW_SEGMENTS,
+                 repetition_threshold=REPETITION_THRESHOLD, compression_ratio_threshold=COMPRESSION_RATIO_THRESHOLD,
+                 consecutive=CONSECUTIVE_SEGMENTS, max_restarts=MAX_RESTARTS):
+        self.restart = restart
+        self.next_speech = next_speech
+        self.audio_seconds = audio_seconds
+        self.repetition_threshold = repetition_threshold
+        self.compression_ratio_threshold = compression_ratio_threshold
+        self.consecutive = consecutive
+        self.max_restarts = max_restarts
+        self.recent = deque(maxlen=window)
+        self.held = []
+        self.looping = None
+        self.spans = []
+        self.restarts = 0
+
+    def check(self, segment):
+        """片段与前几个片段相比是否可疑，返回原因（repetition / compression_ratio）或 None"""
+        previous = list(self.recent)
+        self.recent.append(segment.text)
+        words = tokens(segment.text)
+        ratio, total = repetition_ratio(segment.text, previous)
+        if total >= MIN_NGRAMS and ratio >= self.repetition_threshold:
+            return "repetition"
+        # 短片段逐字重复上一段（“谢谢收看” × N）
+        if len(words) >= MIN_REPEAT_TOKENS and previous and words == tokens(previous[-1]):
+            return "repetition"
+        ratio = getattr(segment, "compression_ratio", None)
+        if ratio is None and len(segment.text) >= 20:
+            ratio = compression_ratio(segment.text)
+        if ratio is not None and ratio > self.compression_ratio_threshold:
+            return "compression_ratio"
+        return None
+
+    def _open_span(self, start, reason):
+        self.looping = {"start": round(start, 3), "end": round(start, 3), "reason": reason,
+                        "dropped_segments": 0, "sample": ""}
+
+    def _drop(self, segments):
+        for segment in segments:
+            self.looping["dropped_segments"] += 1
+            self.looping["end"] = round(max(self.looping["end"], segment.end), 3)
+            if not self.looping["sample"]:
+                self.looping["sample"] = segment.text.strip()[:50]
+
+    def _close_span(self, end):
+        """结束当前跳过区间，返回插入输出的标记片段"""
+        span_info, self.looping = self.looping, None
+        span_info["end"] = round(max(span_info["end"], end), 3)
+        self.spans.append(span_info)
+        self.recent.clear()
+        print(f"⏭️ 检测到重复解码，跳过 {_time(span_info['start'])}-{_time(span_info['end'])}"
+              f"（{span_info['reason']}，丢弃 {span_info['dropped_segments']} 个片段）", file=sys.stderr)
+        return SimpleNamespace(start=span_info["start"], end=span_info["end"],
+                               text=f"[已跳过 {_time(span_info['start'])}-{_time(span_info['end'])} 重复内容]",
+                               skipped=span_info["reason"])
+
+    def run(self, segments):
+        """包装片段迭代器，产出去掉循环后的片段（含跳过标记）"""
+        while segments is not None:
+            source, segments = segments, None
+            for segment in source:
+                if self.looping:
+                    if self.check(segment):
+                        self._drop([segment])
+                        continue
+                    yield self._close_span(segment.start)
+                    yield segment
+                    continue
+                reason = self.check(segment)
+                if not reason:
+                    yield from self.held
+                    yield segment
+                    self.held = []
+                    continue
+                self.held.append(segment)
+                if len(self.held) < self.consecutive:
+                    continue
+                self._open_span(self.held[0].start, reason)
+                self._drop(self.held)
+                self.held = []
+                if self.restart is None or self.restarts >= self.max_restarts:
+                    continue
+                # 停止当前解码，从下一个语音段重新开始（不带上文：循环前的最后一句往往就是循环的源头）
+                if hasattr(source, "close"):
+                    source.close()
+                with span("loop_guard_skip"):
+                    target = self.next_speech(self.looping["end"]) if self.next_speech else self.looping["end"]
+                if target is None:
+                    yield self._close_span(self.audio_seconds or self.looping["end"])
+                    return
+                yield self._close_span(target)
+                self.restarts += 1
+                segments = self.restart(target)
+                break
+        if self.looping:
+            yield self._close_span(self.looping["end"])
+        yield from self.held
+        self.held = []
+
+    def report(self):
+        return {
+            "spans": self.spans,
+            "skipped_seconds": round(sum(s["end"] - s["start"] for s in self.spans), 2),
+            "dropped_segments": sum(s["dropped_segments"] for s in self.spans),
+            "restarts": self.restarts
+        }
+
+
+def next_speech_start(audio, position, vad_parameters=None, scan_seconds=SCAN_SECONDS):
+    """
+    position 之后下一个 VAD 语音段的起点（秒），跳过 position 所在语音段的剩余部分
+
+    返回:
+        秒；之后没有语音时为 None；未安装 faster-whisper 时直接返回 position
+    """
+    try:
+        from faster_whisper.vad import VadOptions, get_speech_timestamps
+    except ImportError:
+        return position
+    options = VadOptions(**(vad_parameters or {}))
+    scan = int(scan_seconds * SAMPLE_RATE)
+    edge = int(EDGE_SECONDS * SAMPLE_RATE)
+    pos = int(position * SAMPLE_RATE)
+    continuing = True
+    while pos < len(audio):
+        chunk = audio[pos:pos + scan]
+        stamps = get_speech_timestamps(chunk, options)
+        for stamp in stamps:
+            if continuing and stamp["start"] <= edge:
+                continue
+            return (pos + stamp["start"]) / SAMPLE_RATE
+        # 语音一直持续到本段末尾时，下一段开头的语音仍属于同一语音段
+        continuing = bool(stamps) and stamps[-1]["end"] >= len(chunk) - edge
+        pos += len(chunk)
+    return None
+
+
+def _shifted(segments, offset):
+    for segment in segments:
+        yield SimpleNamespace(start=segment.start + offset, end=segment.end + offset, text=segment.text,
+                              avg_logprob=segment.avg_logprob, no_speech_prob=segment.no_speech_prob,
+                              compression_ratio=segment.compression_ratio)
+
+
+def guarded_transcribe(model, audio, language=None, options=None, prompt_kwargs=None, **thresholds):
+    """
+    带循环保护的 WhisperModel.transcribe，接口与其一致：返回 (片段生成器, info)
+
+    参数:
+        audio: 16kHz 音频数组
+        options: 脚本的 DECODE_OPTIONS（vad_parameters 也用于寻找下一个语音段）
+        thresholds: LoopGuard 的检测阈值
+
+    返回:
+        (segments, info)；info.loop_guard 在片段迭代完后补全为跳过报告
+    """
+    options = dict(options or {})
+    prompt_kwargs = dict(prompt_kwargs or {})
+    segments, first_info = model.transcribe(audio, language=language, **options, **prompt_kwargs)
+    info = SimpleNamespace(language=first_info.language, language_probability=first_info.language_probability,
+                           duration=first_info.duration, loop_guard=None)
+    if not enabled():
+        return segments, info
+
+    def restart(start):
+        new_segments, _ = model.transcribe(audio[int(start * SAMPLE_RATE):], language=info.language,
+                                           **options, **prompt_kwargs)
+        return _shifted(new_segments, start)
+
+    guard = LoopGuard(restart=restart,
+                      next_speech=lambda t: next_speech_start(audio, t, options.get("vad_parameters")),
+                      audio_seconds=len(audio) / SAMPLE_RATE, **thresholds)
+
+    def generate():
+        yield from guard.run(segments)
+        info.loop_guard = guard.report()
+
+    return generate(), info
+
+
+def guard_segments(segments, info, **thresholds):
+    """
+    只丢弃循环片段、不重启解码的保护（分块解码路径：各块已经独立解码）
+    info.loop_guard 在片段迭代完后补全为跳过报告
+    """
+    info.loop_guard = None
+    if not enabled():
+        return segments
+    guard = LoopGuard(**thresholds)
+
+    def generate():
+        yield from guard.run(segments)
+        info.loop_guard = guard.report()
+
+    return generate()
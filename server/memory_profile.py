@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+分阶段内存分析
+挂在追踪器的阶段边界上记录常驻内存 (RSS)，可选 tracemalloc 按阶段统计分配热点，
+后台定期采样，估算长音频任务每小时的内存增长
+"""
+
+import sys
+import os
+import time
+import threading
+import tracemalloc
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# 运行时间短于该值时不外推每小时增长（模型加载等一次性开销会被放大）
+MIN_GROWTH_WINDOW_S = 600
+
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存，MB"""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def current_rss_mb():
+    """当前常驻内存，MB（非 Linux 平台退化为峰值）"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+def gpu_peak_mb():
+    """已加载 torch 且有 CUDA 时返回显存峰值，否则 None（不主动导入 torch）"""
+    torch = sys.modules.get("torch")
+    try:
+        if torch is not None and torch.cuda.is_available():
+            return round(torch.cuda.max_memory_allocated() / (1024 * 1024), 1)
+    except Exception:
+        pass
+    return None
+
+
+def growth_per_hour(samples):
+    """
+    最小二乘估算内存增长速率
+
+    参数:
+        samples: [(elapsed_s, rss_mb), ...]
+
+    返回:
+        MB/小时，样本不足或时间跨度太短时为 None
+    """
+    if len(samples) < 2 or samples[-1][0] - samples[0][0] < MIN_GROWTH_WINDOW_S:
+        return None
+    n = len(samples)
+    mean_t = sum(t for t, _ in samples) / n
+    mean_m = sum(m for _, m in samples) / n
+    den = sum((t - mean_t) ** 2 for t, _ in samples)
+    if not den:
+        return None
+    slope = sum((t - mean_t) * (m - mean_m) for t, m in samples) / den
+    return slope * 3600
+
+
+class MemoryProfiler:
+    """
+    内存分析器：注册为追踪器的阶段监听器
+
+    参数:
+        tracer: tracing.Tracer 实例
+        top_n: tracemalloc 每个阶段保留的分配热点数（0 表示不启用 tracemalloc）
+        sample_interval: 后台 RSS 采样间隔（秒）
+    """
+
+    def __init__(self, tracer, top_n=0, sample_interval=30.0):
+        self.tracer = tracer
+        self.top_n = top_n
+        self.sample_interval = sample_interval
+        self.origin = time.perf_counter()
+        self.start_rss = current_rss_mb()
+        self.stages = {}
+        self.samples = [(0.0, self.start_rss)]
+        self.allocations = {}
+        self._snapshots = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _record(self, rss):
+        self.samples.append((time.perf_counter() - self.origin, rss))
+        self.tracer.counter("memory", rss_mb=round(rss, 1))
+
+    def on_stage(self, phase, name):
+        """阶段边界回调：记录 RSS；主线程上的阶段额外做 tracemalloc 快照对比"""
+        rss = current_rss_mb()
+        with self._lock:
+            self._record(rss)
+            stage = self.stages.setdefault(name, {"count": 0, "rss_before_mb": rss, "rss_after_mb": rss,
+                                                  "max_delta_mb": 0.0, "max_rss_mb": rss})
+            stage["max_rss_mb"] = max(stage["max_rss_mb"], rss)
+            if phase == "begin":
+                stage.setdefault("_open", []).append(rss)
+            else:
+                before = stage["_open"].pop() if stage.get("_open") else rss
+                stage["count"] += 1
+                stage["rss_after_mb"] = rss
+                stage["max_delta_mb"] = max(stage["max_delta_mb"], rss - before)
+
+        # 后处理线程里按批打开的阶段太密，只对主线程阶段做快照
+        if not self.top_n or threading.current_thread() is not threading.main_thread():
+            return
+        if phase == "begin":
+            self._snapshots[name] = tracemalloc.take_snapshot()
+        elif name in self._snapshots:
+            before = self._snapshots.pop(name)
+            snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, __file__)])
+            diff = snapshot.compare_to(before, "lineno")
+            self.allocations[name] = [
+                {
+                    "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    "size_kb": round(stat.size_diff / 1024, 1),
+                    "count": stat.count_diff
+                }
+                for stat in diff[:self.top_n] if stat.size_diff > 0
+            ]
+
+    def _run(self):
+        while not self._stop.wait(self.sample_interval):
+            with self._lock:
+                self._record(current_rss_mb())
+
+    def start(self):
+        if self.top_n and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.tracer.add_listener(self.on_stage)
+        self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if self.on_stage in self.tracer.listeners:
+            self.tracer.listeners.remove(self.on_stage)
+
+    def report(self):
+        """
+        内存报告（写入结果的 "memory" 字段）
+
+        返回:
+            {"start_rss_mb", "end_rss_mb", "peak_rss_mb", "growth_mb_per_hour", "stages", ...}
+        """
+        end_rss = current_rss_mb()
+        with self._lock:
+            self.samples.append((time.perf_counter() - self.origin, end_rss))
+            samples = list(self.samples)
+            stages = {
+                name: {k: (round(v, 1) if isinstance(v, float) else v) for k, v in stage.items() if k != "_open"}
+                for name, stage in self.stages.items()
+            }
+        growth = growth_per_hour(samples)
+        report = {
+            "start_rss_mb": round(self.start_rss, 1),
+            "end_rss_mb": round(end_rss, 1),
+            "peak_rss_mb": round(max(peak_rss_mb(), end_rss), 1),
+            "elapsed_s": round(samples[-1][0], 2),
+            "growth_mb_per_hour": round(growth, 1) if growth is not None else None,
+            "stages": stages,
+            "timeline": [{"t": round(t, 2), "rss_mb": round(m, 1)} for t, m in samples[::max(1, len(samples) // 200)]]
+        }
+        gpu = gpu_peak_mb()
+        if gpu is not None:
+            report["gpu_peak_mb"] = gpu
+        if self.top_n:
+            report["tracemalloc"] = {
+                "peak_mb": round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1),
+                "top_by_stage": self.allocations
+            }
+        return report
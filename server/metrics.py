@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Prometheus 文本格式指标
+转录任务按引擎/模型计数，记录处理的音频时长、RTF 分布、模型加载耗时、排队等待、
+失败原因和缓存命中；短进程写 node-exporter textfile（跨进程累加），常驻进程可开本地 HTTP 端点
+"""
+
+import sys
+import os
+import copy
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# 指标输出配置（与 TRANSCRIPT_INDEX_DB 等一样走环境变量，Node 端无需改调用参数）
+TEXTFILE_DIR_ENV = "METRICS_TEXTFILE_DIR"
+HTTP_PORT_ENV = "METRICS_PORT"
+# 调用方入队时间（Unix 秒），用于计算排队等待
+ENQUEUED_AT_ENV = "TRANSCRIBE_ENQUEUED_AT"
+TEXTFILE_NAME = "podcast_transcribe.prom"
+
+RTF_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0)
+SECONDS_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+
+def _label_key(labels):
+    return json.dumps(sorted(labels.items()), ensure_ascii=False)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key, extra=None):
+    items = json.loads(key) + (extra or [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in items) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """指标基类：按标签组合保存序列"""
+
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.series = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        missing = set(self.labelnames) - set(labels)
+        if missing or set(labels) - set(self.labelnames):
+            raise ValueError(f"{self.name} 标签应为 {self.labelnames}，实际为 {tuple(labels)}")
+        return _label_key({k: str(v) for k, v in labels.items()})
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self.series.items()):
+                lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key, value):
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}"]
+
+    def empty_copy(self):
+        clone = copy.copy(self)
+        clone.series = {}
+        clone._lock = threading.Lock()
+        return clone
+
+    def merge(self, series):
+        """把另一进程保存的序列合并进来"""
+        with self._lock:
+            for key, value in series.items():
+                self.series[key] = self._merge_value(self.series.get(key), value)
+
+    def _merge_value(self, current, other):
+        return other if current is None else current + other
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.series[key] = value
+
+    def _merge_value(self, current, other):
+        return other
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=SECONDS_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            item = self.series.setdefault(key, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    item["buckets"][i] += 1
+            item["sum"] += value
+            item["count"] += 1
+
+    def _render_series(self, key, value):
+        lines = []
+        for bound, count in zip(self.buckets, value["buckets"]):
+            lines.append(f"{self.name}_bucket{_format_labels(key, [['le', _format_value(float(bound))]])} {count}")
+        lines.append(f"{self.name}_bucket{_format_labels(key, [['le', '+Inf']])} {value['count']}")
+        lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(float(value['sum']))}")
+        lines.append(f"{self.name}_count{_format_labels(key)} {value['count']}")
+        return lines
+
+    def _merge_value(self, current, other):
+        if current is None:
+            return {"buckets": list(other["buckets"]), "sum": other["sum"], "count": other["count"]}
+        if len(other["buckets"]) != len(current["buckets"]):
+            return current  # 分桶定义变了，丢弃旧数据
+        return {
+            "buckets": [a + b for a, b in zip(current["buckets"], other["buckets"])],
+            "sum": current["sum"] + other["sum"],
+            "count": current["count"] + other["count"]
+        }
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """Prometheus 文本格式"""
+        lines = []
+        for metric in self.metrics.values():
+            if metric.series:
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        return {name: metric.series for name, metric in self.metrics.items() if metric.series}
+
+    def clear(self):
+        for metric in self.metrics.values():
+            with metric._lock:
+                metric.series = {}
+
+    def write_textfile(self, directory):
+        """
+        把本进程的增量累加到 textfile 目录（加文件锁，先写临时文件再原子改名）
+
+        node-exporter 只读取 *.prom，累计状态另存为同目录下的隐藏 JSON
+        """
+        os.makedirs(directory, exist_ok=True)
+        prom_path = os.path.join(directory, TEXTFILE_NAME)
+        state_path = os.path.join(directory, "." + TEXTFILE_NAME + ".json")
+        with open(prom_path + ".lock", 'w') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(state_path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = {}
+
+            merged = Registry()
+            for name, metric in self.metrics.items():
+                total = merged.register(metric.empty_copy())
+                total.merge(state.get(name, {}))
+                total.merge(metric.series)
+
+            for path, content in ((state_path, json.dumps(merged.snapshot(), ensure_ascii=False)),
+                                  (prom_path, merged.render())):
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(content)
+                os.replace(tmp_path, path)
+        return prom_path
+
+
+registry = Registry()
+
+jobs_total = registry.register(Counter(
+    "transcribe_jobs_total", "转录任务数", ("engine", "model", "status")))
+audio_seconds_total = registry.register(Counter(
+    "transcribe_audio_seconds_total", "已处理的音频时长（秒）", ("engine", "model")))
+processing_seconds_total = registry.register(Counter(
+    "transcribe_processing_seconds_total", "转录耗时（秒）", ("engine", "model")))
+rtf = registry.register(Histogram(
+    "transcribe_rtf", "实时因子（处理耗时 / 音频时长）", ("engine", "model"), buckets=RTF_BUCKETS))
+model_load_seconds = registry.register(Histogram(
+    "transcribe_model_load_seconds", "模型加载耗时（秒）", ("engine", "model")))
+queue_wait_seconds = registry.register(Histogram(
+    "transcribe_queue_wait_seconds", "从入队到开始处理的等待（秒）", ("engine",)))
+failures_total = registry.register(Counter(
+    "transcribe_failures_total", "失败任务数（按原因）", ("engine", "cause")))
+cache_requests_total = registry.register(Counter(
+    "transcribe_cache_requests_total", "缓存查询（按缓存和结果）", ("cache", "result")))
+stage_seconds_total = registry.register(Counter(
+    "transcribe_stage_seconds_total", "各阶段累计耗时（秒）", ("engine", "stage")))
+last_success = registry.register(Gauge(
+    "transcribe_last_success_timestamp_seconds", "最近一次成功完成的时间", ("engine",)))
+
+# 错误信息关键字 -> 失败原因（按顺序匹配）
+_FAILURE_CAUSES = [
+    ("out_of_memory", ("out of memory", "outofmemory", "memoryerror", "cuda oom", "cannot allocate")),
+    ("file_not_found", ("不存在", "no such file", "not found")),
+    ("model_load", ("模型加载", "加载失败", "未安装", "download", "下载", "auth", "token")),
+    ("audio_decode", ("ffmpeg", "decode", "invalid data", "格式转换")),
+    ("timeout", ("timeout", "timed out", "超时", "deadline")),
+    ("empty_result", ("为空", "empty")),
+    ("interrupted", ("中断", "interrupt", "keyboardinterrupt")),
+]
+
+
+def classify_failure(error):
+    """把错误信息归类为有限的失败原因标签"""
+    text = str(error or "").lower()
+    for cause, keywords in _FAILURE_CAUSES:
+        if any(k in text for k in keywords):
+            return cause
+    return "other"
+
+
+def record_cache(cache, hit):
+    cache_requests_total.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_job(engine, model, result, audio_seconds=None, processing_seconds=None):
+    """
+    记录一次转录任务
+
+    参数:
+        engine: 引擎名（whisper / whisper-enhanced / sensevoice / pyannote ...）
+        model: 模型名
+        result: 入口脚本的结果 dict（success / error）
+        audio_seconds: 音频时长
+        processing_seconds: 处理耗时
+    """
+    model = model or "default"
+    success = isinstance(result, dict) and result.get("success", False)
+    jobs_total.inc(engine=engine, model=model, status="success" if success else "failure")
+    if not success:
+        error = result.get("error") if isinstance(result, dict) else result
+        failures_total.inc(engine=engine, cause=classify_failure(error))
+    else:
+        last_success.set(time.time(), engine=engine)
+
+    if audio_seconds:
+        audio_seconds_total.inc(audio_seconds, engine=engine, model=model)
+    if processing_seconds:
+        processing_seconds_total.inc(processing_seconds, engine=engine, model=model)
+        if audio_seconds and success:
+            rtf.observe(processing_seconds / audio_seconds, engine=engine, model=model)
+
+    enqueued_at = os.getenv(ENQUEUED_AT_ENV)
+    if enqueued_at:
+        try:
+            queue_wait_seconds.observe(max(0.0, _process_start() - float(enqueued_at)), engine=engine)
+        except ValueError:
+            pass
+
+
+def record_stages(engine, model, summary):
+    """把 tracing 分阶段汇总记入阶段耗时，model_load / pipeline_load 同时记入模型加载耗时"""
+    model = model or "default"
+    for name, item in ((summary or {}).get("stages") or {}).items():
+        stage_seconds_total.inc(item["total_s"], engine=engine, stage=name)
+        if name in ("model_load", "pipeline_load"):
+            model_load_seconds.observe(item["total_s"], engine=engine, model=model)
+
+
+def record_failure(engine, model, error):
+    """入口脚本异常退出前记录失败并落盘"""
+    record_job(engine, model, {"success": False, "error": str(error) or type(error).__name__})
+    flush()
+
+
+def _process_start():
+    """进程启动时间（Unix 秒），拿不到时用模块导入时间"""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat") as f:
+            boot = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+        return boot + start_ticks / os.sysconf("SC_CLK_TCK")
+    except Exception:
+        return _IMPORTED_AT
+
+
+_IMPORTED_AT = time.time()
+
+
+def flush():
+    """短进程结束前调用：配置了 METRICS_TEXTFILE_DIR 时写入 textfile 并清空本进程增量"""
+    directory = os.getenv(TEXTFILE_DIR_ENV)
+    if not directory:
+        return None
+    try:
+        path = registry.write_textfile(directory)
+        registry.clear()
+        print(f"📈 指标已写入: {path}", file=sys.stderr)
+        return path
+    except Exception as e:
+        print(f"⚠️ 指标写入失败: {e}", file=sys.stderr)
+        return None
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port=None, host="127.0.0.1"):
+    """
+    常驻模式下在后台线程暴露 /metrics（port 为空时读取 METRICS_PORT，都没有则不启动）
+    """
+    if port is None:
+        port = os.getenv(HTTP_PORT_ENV)
+    if port is None or port == "":
+        return None
+    server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"📈 指标端点: http://{host}:{server.server_address[1]}/metrics", file=sys.stderr)
+    return server
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='查看或暴露转录指标')
+    parser.add_argument('--textfile-dir', default=os.getenv(TEXTFILE_DIR_ENV),
+                      help='node-exporter textfile 目录（默认读取 METRICS_TEXTFILE_DIR）')
+    parser.add_argument('--serve', type=int, help='以 HTTP 方式暴露 textfile 中的累计指标的端口')
+    args = parser.parse_args()
+
+    if not args.textfile_dir:
+        parser.error("需要 --textfile-dir 或环境变量 METRICS_TEXTFILE_DIR")
+    state_path = os.path.join(args.textfile_dir, "." + TEXTFILE_NAME + ".json")
+
+    def reload():
+        registry.clear()
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        for name, series in state.items():
+            if name in registry.metrics:
+                registry.metrics[name].merge(series)
+
+    if not args.serve:
+        reload()
+        sys.stdout.write(registry.render())
+        return
+
+    class Handler(_MetricsHandler):
+        def do_GET(self):
+            reload()
+            super().do_GET()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.serve), Handler)
+    print(f"📈 指标端点: http://127.0.0.1:{args.serve}/metrics", file=sys.stderr)
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+纯 Python 热点路径微基准测试
+在 100 ~ 100k 片段的合成输入上测量对齐、格式化、说话人启发式和情绪标记的耗时，
+用对数坐标斜率估计复杂度增长，提前发现平方级退化；不依赖 torch / 模型
+"""
+
+import sys
+import os
+import io
+import json
+import math
+import time
+import random
+import argparse
+import tempfile
+import contextlib
+
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+
+# 斜率超过该值视为超线性增长
+SUPERLINEAR_SLOPE = 1.3
+
+_WORDS = ["我们", "今天", "聊一聊", "人工智能", "嗯", "对对对", "是的", "然后", "哈哈",
+          "这个", "其实", "什么", "真的吗", "大家好", "所以", "但是", "GPT", "模型"]
+
+
+def make_asr_segments(n, seed=0):
+    """合成 ASR 片段：约 3 秒一段，偶有长停顿"""
+    rng = random.Random(seed)
+    segments = []
+    t = 0.0
+    for _ in range(n):
+        length = rng.uniform(1.0, 5.0)
+        text = "".join(rng.choice(_WORDS) for _ in range(rng.randint(3, 12)))
+        if rng.random() < 0.1:
+            text += rng.choice(["？", "！", "..."])
+        segments.append({"start": round(t, 3), "end": round(t + length, 3), "text": text})
+        t += length + (rng.uniform(2.0, 4.0) if rng.random() < 0.05 else rng.uniform(0.0, 0.5))
+    return segments
+
+
+def make_diarization_segments(n, seed=1):
+    """合成说话人分离片段：与 ASR 片段时长相近的轮次"""
+    rng = random.Random(seed)
+    segments = []
+    t = 0.0
+    for _ in range(n):
+        length = rng.uniform(1.0, 8.0)
+        segments.append({"start": round(t, 3), "end": round(t + length, 3), "speaker": f"SPEAKER_{rng.randint(0, 2):02d}"})
+        t += length + rng.uniform(0.0, 0.3)
+    return segments
+
+
+def _quiet():
+    """屏蔽被测函数的 stderr 日志"""
+    return contextlib.redirect_stderr(io.StringIO())
+
+
+def _setup_alignment(n):
+    return (make_asr_segments(n), make_diarization_segments(n))
+
+
+def bench_align(inputs):
+    from alignment_service import align_asr_with_diarization
+    asr, diarization = inputs
+    with _quiet():
+        align_asr_with_diarization(asr, diarization)
+
+
+def _setup_aligned(n):
+    from alignment_service import align_asr_with_diarization
+    asr, diarization = _setup_alignment(n)
+    with _quiet():
+        return align_asr_with_diarization(asr, diarization, merge_gap=0)
+
+
+def bench_merge(aligned):
+    from alignment_service import merge_adjacent_segments
+    merge_adjacent_segments(aligned, 2.0)
+
+
+def _setup_times(n):
+    rng = random.Random(2)
+    values = []
+    for _ in range(n):
+        seconds = rng.uniform(0, 36000)
+        values.append(f"{int(seconds // 3600):02d}:{int(seconds % 3600 // 60):02d}:{seconds % 60:06.3f}")
+    return values
+
+
+def bench_parse_time(values):
+    from alignment_service import parse_time
+    for value in values:
+        parse_time(value)
+
+
+def bench_save_aligned(aligned):
+    from alignment_service import save_aligned_results
+    with tempfile.TemporaryDirectory() as tmp, _quiet():
+        save_aligned_results(aligned, [], os.path.join(tmp, "aligned.json"))
+
+
+def _formatter():
+    from enhanced_whisper_transcribe import EnhancedWhisperTranscriber
+    with _quiet():
+        return EnhancedWhisperTranscriber(load_model=False)
+
+
+def _setup_format(n):
+    segments = make_asr_segments(n)
+    with _quiet():
+        speakers = _formatter().detect_speaker_change(segments)
+    return (segments, speakers)
+
+
+def bench_format(inputs):
+    segments, speakers = inputs
+    _formatter().format_transcript_with_speakers_and_emotions(segments, speakers)
+
+
+def bench_speaker_change(segments):
+    _formatter().detect_speaker_change(segments)
+
+
+def _setup_texts(n):
+    return [seg["text"] for seg in make_asr_segments(n)]
+
+
+def bench_emotions(texts):
+    transcriber = _formatter()
+    for text in texts:
+        transcriber.detect_emotions(text)
+
+
+# 名称 -> (输入构造函数, 被测函数)
+BENCHMARKS = {
+    "align_asr_with_diarization": (_setup_alignment, bench_align),
+    "merge_adjacent_segments": (_setup_aligned, bench_merge),
+    "parse_time": (_setup_times, bench_parse_time),
+    "save_aligned_results": (_setup_aligned, bench_save_aligned),
+    "format_transcript_with_speakers_and_emotions": (_setup_format, bench_format),
+    "detect_speaker_change": (make_asr_segments, bench_speaker_change),
+    "detect_emotions": (_setup_texts, bench_emotions),
+}
+
+
+def time_call(func, inputs, min_time=0.2, max_repeats=5):
+    """重复执行直到累计超过 min_time，取最小值"""
+    best = math.inf
+    total = 0.0
+    repeats = 0
+    while repeats < max_repeats and (repeats == 0 or total < min_time):
+        start = time.perf_counter()
+        func(inputs)
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+        total += elapsed
+        repeats += 1
+    return best
+
+
+def growth_slope(sizes, seconds):
+    """对数坐标下的最小二乘斜率：1 ≈ 线性，2 ≈ 平方"""
+    points = [(math.log(n), math.log(t)) for n, t in zip(sizes, seconds) if t > 0]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    num = sum((x - mean_x) * (y - mean_y) for x, y in points)
+    den = sum((x - mean_x) ** 2 for x, _ in points)
+    return num / den if den else None
+
+
+def run_benchmark(name, sizes):
+    setup, func = BENCHMARKS[name]
+    timings = []
+    for n in sizes:
+        inputs = setup(n)
+        seconds = time_call(func, inputs)
+        timings.append({"size": n, "seconds": seconds, "us_per_item": seconds / n * 1e6})
+        print(f"   {name:<46} n={n:<7} {seconds * 1000:10.2f} ms  {seconds / n * 1e6:8.2f} µs/项", file=sys.stderr)
+
+    # 小规模时固定开销占比大，斜率只用后面较大的规模估计
+    fit = [t for t in timings if t["size"] >= 1000] or timings
+    slope = growth_slope([t["size"] for t in fit], [t["seconds"] for t in fit])
+    return {
+        "name": name,
+        "timings": timings,
+        "slope": round(slope, 3) if slope is not None else None,
+        "superlinear": slope is not None and slope > SUPERLINEAR_SLOPE
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='纯Python热点路径微基准测试')
+    parser.add_argument('--sizes', default=",".join(map(str, DEFAULT_SIZES)),
+                      help='输入规模列表，逗号分隔 (默认: 100,1000,10000,100000)')
+    parser.add_argument('--filter', help='只运行名称包含该字符串的基准')
+    parser.add_argument('--output', help='报告输出路径（默认输出到stdout）')
+    parser.add_argument('--fail-on-superlinear', action='store_true',
+                      help=f'存在斜率 > {SUPERLINEAR_SLOPE} 的基准时以非零状态退出')
+
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    names = [n for n in BENCHMARKS if not args.filter or args.filter in n]
+
+    print(f"🧪 微基准测试: {len(names)} 项, 规模 {sizes}", file=sys.stderr)
+    results = [run_benchmark(name, sizes) for name in names]
+
+    flagged = [r["name"] for r in results if r["superlinear"]]
+    for r in results:
+        mark = "⚠️" if r["superlinear"] else "✅"
+        print(f"{mark} {r['name']}: 增长斜率 {r['slope']}", file=sys.stderr)
+
+    report = {"success": not flagged, "sizes": sizes, "benchmarks": results, "superlinear": flagged}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"📁 报告已保存到: {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, ensure_ascii=False))
+
+    sys.exit(1 if flagged and args.fail_on_superlinear else 0)
+
+if __name__ == "__main__":
+    main()
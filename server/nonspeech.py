@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+音乐 / 非语音区域预分类
+在 ASR 之前用向量化的频谱特征（低能量帧比例、2-8Hz 能量调制、谱平坦度）按秒标出音乐和噪声，
+片头音乐、插曲、广告 jingle 不再送进解码器和说话人分离；报告跳过的比例和节省的时间
+"""
+
+import re
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+from tracing import span
+
+SAMPLE_RATE = 16000
+FRAME_SAMPLES = 400      # 25ms
+HOP_SAMPLES = 320        # 20ms
+FRAMES_PER_WINDOW = 50   # 每秒一个分类窗口
+BLOCK_WINDOWS = 60       # 每次处理 60 秒，内存与音频长度无关
+
+# 判定阈值：语音的音节间隙带来大量低能量帧和 4Hz 左右的能量起伏，
+# 两者都很低才算非语音（人声叠在音乐上仍判为语音）
+LOW_ENERGY_RATIO = 0.15
+MODULATION_DB = 2.5
+# 谱平坦度高于该值的非语音记为噪声，否则记为音乐
+NOISE_FLATNESS = 0.35
+# 窗口能量低于该值 (dBFS) 为静音（交给 VAD，不计入跳过）
+SILENCE_DB = -45.0
+# 标签平滑的窗口数、跳过区间的最短时长和两侧保留的余量（秒）
+SMOOTH_WINDOWS = 5
+MIN_REGION_SECONDS = 5.0
+EDGE_MARGIN_SECONDS = 0.5
+
+SPEECH, MUSIC, NOISE, SILENCE = 0, 1, 2, 3
+LABELS = {MUSIC: "music", NOISE: "noise"}
+
+# SenseVoice 输出中表示非语音的事件标签
+SENSEVOICE_EVENTS = {"BGM": "music", "Applause": "noise"}
+_EVENT_RE = re.compile(r"<\|([A-Za-z]+)\|>")
+
+
+def _frames(block):
+    n = (len(block) - FRAME_SAMPLES) // HOP_SAMPLES + 1
+    if n <= 0:
+        return np.zeros((0, FRAME_SAMPLES), dtype=np.float32)
+    stride = block.strides[0]
+    return np.lib.stride_tricks.as_strided(block, (n, FRAME_SAMPLES), (stride * HOP_SAMPLES, stride))
+
+
+def window_features(audio):
+    """
+    每秒一个窗口的特征
+
+    返回:
+        dict: db / low_energy / modulation / flatness，各为长度 = 整秒数的数组
+    """
+    audio = np.ascontiguousarray(audio, dtype=np.float32)
+    window = np.hanning(FRAME_SAMPLES).astype(np.float32)
+    block_samples = BLOCK_WINDOWS * SAMPLE_RATE
+    parts = {name: [] for name in ("db", "low_energy", "modulation", "flatness")}
+    for start in range(0, len(audio) // SAMPLE_RATE * SAMPLE_RATE, block_samples):
+        block = audio[start:start + block_samples + FRAME_SAMPLES]
+        windows = min(BLOCK_WINDOWS, (len(audio) - start) // SAMPLE_RATE)
+        frames = _frames(block)[:windows * FRAMES_PER_WINDOW]
+        if len(frames) < windows * FRAMES_PER_WINDOW:
+            windows = len(frames) // FRAMES_PER_WINDOW
+            frames = frames[:windows * FRAMES_PER_WINDOW]
+        if not windows:
+            break
+        power = np.abs(np.fft.rfft(frames * window, axis=1)) ** 2 + 1e-10
+        energy = power.sum(axis=1).reshape(windows, FRAMES_PER_WINDOW)
+        flatness = (np.exp(np.log(power).mean(axis=1)) / power.mean(axis=1)).reshape(windows, FRAMES_PER_WINDOW)
+
+        rms = np.sqrt(energy)
+        envelope = 10 * np.log10(energy)
+        spectrum = np.abs(np.fft.rfft(envelope, axis=1)) ** 2
+        parts["db"].append(10 * np.log10(energy.mean(axis=1) / (FRAME_SAMPLES * FRAME_SAMPLES / 4)))
+        parts["low_energy"].append((rms < 0.5 * rms.mean(axis=1, keepdims=True)).mean(axis=1))
+        # 1 秒窗口的包络频谱分辨率为 1Hz：2-8Hz 分量的均方根起伏 (dB)
+        parts["modulation"].append(np.sqrt(2 * spectrum[:, 2:9].sum(axis=1)) / FRAMES_PER_WINDOW)
+        parts["flatness"].append(flatness.mean(axis=1))
+    return {name: np.concatenate(values) if values else np.zeros(0) for name, values in parts.items()}
+
+
+def classify_windows(features):
+    """每秒的标签数组 (SPEECH / MUSIC / NOISE / SILENCE)，经多数平滑"""
+    labels = np.full(len(features["db"]), SPEECH, dtype=np.int8)
+    nonspeech = (features["low_energy"] < LOW_ENERGY_RATIO) & (features["modulation"] < MODULATION_DB)
+    labels[nonspeech] = np.where(features["flatness"][nonspeech] >= NOISE_FLATNESS, NOISE, MUSIC)
+    labels[features["db"] < SILENCE_DB] = SILENCE
+    if len(labels) < SMOOTH_WINDOWS:
+        return labels
+    # 多数平滑：每个窗口取前后 SMOOTH_WINDOWS 个窗口里最多的标签
+    half = SMOOTH_WINDOWS // 2
+    padded = np.pad(labels, half, mode="edge")
+    counts = np.stack([np.convolve(padded == label, np.ones(SMOOTH_WINDOWS), mode="valid")
+                       for label in (SPEECH, MUSIC, NOISE, SILENCE)])
+    return counts.argmax(axis=0).astype(np.int8)
+
+
+def labels_to_regions(labels, min_seconds=MIN_REGION_SECONDS, margin=EDGE_MARGIN_SECONDS, offset=0.0):
+    """连续的音乐 / 噪声窗口合并为区间（两侧各留 margin 秒给语音起止）"""
+    regions = []
+    start = None
+    for i in range(len(labels) + 1):
+        label = labels[i] if i < len(labels) else SPEECH
+        if start is not None and label != labels[start]:
+            if i - start >= min_seconds:
+                regions.append({"start": round(offset + start + (margin if start or offset else 0.0), 2),
+                                "end": round(offset + i - (margin if i < len(labels) else 0.0), 2),
+                                "label": LABELS[int(labels[start])]})
+            start = None
+        if start is None and label in LABELS:
+            start = i
+    return regions
+
+
+def nonspeech_regions(audio, min_seconds=MIN_REGION_SECONDS, offset=0.0):
+    """音频中的音乐 / 噪声区间 [{"start", "end", "label"}, ...]"""
+    return labels_to_regions(classify_windows(window_features(audio)), min_seconds, offset=offset)
+
+
+def mask(audio, regions, offset=0.0):
+    """把区间置零（VAD 会把它们当静音整段跳过）；没有区间时原样返回"""
+    if not regions:
+        return audio
+    masked = np.array(audio, dtype=np.float32, copy=True)
+    for region in regions:
+        masked[max(0, int((region["start"] - offset) * SAMPLE_RATE)):int((region["end"] - offset) * SAMPLE_RATE)] = 0.0
+    return masked
+
+
+def skip_report(regions, audio_seconds, classify_seconds=0.0, rtf=None):
+    """
+    跳过统计
+
+    参数:
+        rtf: 解码的实时率（来自耗时预测），用于估算节省的时间；未知时不估算
+    """
+    skipped = sum(r["end"] - r["start"] for r in regions)
+    by_label = {}
+    for region in regions:
+        by_label[region["label"]] = round(by_label.get(region["label"], 0.0) + region["end"] - region["start"], 2)
+    report = {
+        "regions": regions,
+        "skipped_seconds": round(skipped, 2),
+        "skipped_fraction": round(skipped / audio_seconds, 4) if audio_seconds else 0.0,
+        "by_label": by_label,
+        "classify_seconds": round(classify_seconds, 2)
+    }
+    if rtf:
+        report["estimated_saved_seconds"] = round(skipped * rtf - classify_seconds, 2)
+    return report
+
+
+def detect(audio, rtf=None):
+    """
+    预分类并屏蔽整段音频中的音乐 / 噪声
+
+    返回:
+        (屏蔽后的音频, 报告 dict)
+    """
+    started = time.perf_counter()
+    with span("music_detection"):
+        regions = nonspeech_regions(audio)
+    audio_seconds = len(audio) / SAMPLE_RATE
+    report = skip_report(regions, audio_seconds, time.perf_counter() - started, rtf)
+    if regions:
+        print(f"🎵 跳过 {len(regions)} 段音乐 / 噪声，共 {report['skipped_seconds']:.0f}秒"
+              f"（{report['skipped_fraction']:.1%}），分类耗时 {report['classify_seconds']:.1f}秒", file=sys.stderr)
+    else:
+        print(f"🎵 未发现需要跳过的音乐 / 噪声（分类耗时 {report['classify_seconds']:.1f}秒）", file=sys.stderr)
+    return mask(audio, regions), report
+
+
+class WindowMasker:
+    """恒定内存模式：逐个解码窗口分类并屏蔽，只累计区间列表"""
+
+    def __init__(self, rtf=None):
+        self.rtf = rtf
+        self.regions = []
+        self.audio_seconds = 0.0
+        self.classify_seconds = 0.0
+
+    def __call__(self, windows):
+        for offset, audio in windows:
+            started = time.perf_counter()
+            regions = nonspeech_regions(audio, offset=offset)
+            self.classify_seconds += time.perf_counter() - started
+            self.regions.extend(regions)
+            self.audio_seconds = offset + len(audio) / SAMPLE_RATE
+            yield offset, mask(audio, regions, offset)
+
+    def report(self):
+        return skip_report(self.regions, self.audio_seconds, self.classify_seconds, self.rtf)
+
+
+def sensevoice_event_regions(segments):
+    """
+    SenseVoice 片段的事件标签（<|BGM|> 等）标为非语音的区间
+
+    返回:
+        (保留的片段, 区间列表)
+    """
+    kept, regions = [], []
+    for segment in segments:
+        events = set(segment.get("event") or []) if isinstance(segment.get("event"), list) else \
+            {segment["event"]} if segment.get("event") else set()
+        events.update(_EVENT_RE.findall(segment.get("text", "")))
+        label = next((SENSEVOICE_EVENTS[e] for e in events if e in SENSEVOICE_EVENTS), None)
+        if label and "Speech" not in events and segment.get("end", 0) > segment.get("start", 0):
+            regions.append({"start": round(segment["start"], 2), "end": round(segment["end"], 2), "label": label})
+        else:
+            kept.append(segment)
+    return kept, regions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='音乐 / 非语音区域预分类')
+    parser.add_argument('file', help='音频文件')
+    parser.add_argument('--min-seconds', type=float, default=MIN_REGION_SECONDS, help='最短跳过区间（秒）')
+    args = parser.parse_args()
+
+    from deadline import load_audio
+    audio = load_audio(args.file)
+    started = time.perf_counter()
+    regions = nonspeech_regions(audio, args.min_seconds)
+    print(json.dumps(skip_report(regions, len(audio) / SAMPLE_RATE, time.perf_counter() - started),
+                     ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
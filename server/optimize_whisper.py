@@ -11,10 +11,33 @@ import time
 import multiprocessing
 import concurrent.futures
 from pathlib import Path
-from faster_whisper import WhisperModel
+from faster_whisper import WhisperModel, decode_audio
+from tracing import tracer, span, add_trace_arguments, start_tracing, finish_tracing
+import runtime_predictor
+import autotune
+import cpu_allocator
+import feature_cache
+from loop_guard import guarded_transcribe
+import metrics
 import warnings
 warnings.filterwarnings("ignore")
 
+# 优化解码参数（基准测试和评估工具复用）
+DECODE_OPTIONS = dict(
+    vad_filter=True,
+    vad_parameters={
+        "min_silence_duration_ms": 250,  # 减少静音检测时间
+        "threshold": 0.5,               # 提高语音活动检测阈值
+        "min_speech_duration_ms": 250   # 减少最小语音时长
+    },
+    beam_size=1,        # 减少beam size提升速度
+    best_of=1,          # 减少候选数量
+    temperature=0,      # 确定性输出，提升速度
+    condition_on_previous_text=True,  # 利用上下文提升准确性
+    initial_prompt=None,
+    word_timestamps=False  # 关闭词级时间戳以提升速度
+)
+
 class OptimizedWhisperTranscriber:
     def __init__(self, model_size="base", device="auto", compute_type="auto", cpu_threads=None):
         """
@@ -35,67 +58,59 @@ class OptimizedWhisperTranscriber:
             else:
                 compute_type = "int8"     # CPU优化
         
-        # 优化CPU线程数
+        # 优化CPU线程数（优先用本机调优结果）
+        tuned = autotune.whisper_model_kwargs(device, engine="whisper-optimized")
         if cpu_threads is None:
-            cpu_threads = min(8, multiprocessing.cpu_count())  # 最多8线程，避免过载
+            cpu_threads = tuned.get("cpu_threads") or min(8, multiprocessing.cpu_count())  # 最多8线程，避免过载
+        num_workers = tuned.get("num_workers", 1)
         
         print(f"🚀 正在加载优化版Whisper模型: {model_size}", file=sys.stderr)
         print(f"📱 设备: {device}, 计算类型: {compute_type}, CPU线程: {cpu_threads}", file=sys.stderr)
         
-        self.model = WhisperModel(
-            model_size, 
-            device=device, 
-            compute_type=compute_type,
-            cpu_threads=cpu_threads,
-            num_workers=1  # 单worker但优化内部并行
-        )
+        with span("model_load", model=model_size):
+            self.model = WhisperModel(
+                model_size, 
+                device=device, 
+                compute_type=compute_type,
+                cpu_threads=cpu_threads,
+                num_workers=num_workers  # 默认单worker但优化内部并行
+            )
+            feature_cache.install(self.model)
         
         self.device = device
         self.compute_type = compute_type
         
         print(f"✅ 优化版模型加载完成", file=sys.stderr)
     
-    def transcribe_file_optimized(self, audio_path, language=None):
+    def transcribe_file_optimized(self, audio_path, language=None, decode_options=None):
         """
-        优化版转录，注重速度
+        优化版转录，注重速度（decode_options 覆盖默认解码参数）
         """
         try:
             print(f"⚡ 开始优化转录: {audio_path}", file=sys.stderr)
             start_time = time.time()
             
-            # 优化参数设置
-            vad_parameters = {
-                "min_silence_duration_ms": 250,  # 减少静音检测时间
-                "threshold": 0.5,               # 提高语音活动检测阈值
-                "min_speech_duration_ms": 250   # 减少最小语音时长
-            }
+            with span("audio_decode"):
+                audio = feature_cache.load_audio(audio_path, decode_audio)
             
             # 执行优化转录
-            segments, info = self.model.transcribe(
-                audio_path, 
-                language=language,
-                vad_filter=True,
-                vad_parameters=vad_parameters,
-                beam_size=1,        # 减少beam size提升速度
-                best_of=1,          # 减少候选数量
-                temperature=0,      # 确定性输出，提升速度
-                condition_on_previous_text=True,  # 利用上下文提升准确性
-                initial_prompt=None,
-                word_timestamps=False  # 关闭词级时间戳以提升速度
-            )
+            with span("vad_language_detection"):
+                segments, info = guarded_transcribe(self.model, audio, language,
+                                                    {**DECODE_OPTIONS, **(decode_options or {})})
             
             # 收集所有片段
             transcript_segments = []
             full_text = ""
             
-            for segment in segments:
-                segment_dict = {
-                    "start": segment.start,
-                    "end": segment.end,
-                    "text": segment.text.strip()
-                }
-                transcript_segments.append(segment_dict)
-                full_text += segment.text.strip() + " "
+            with span("decoding"):
+                for segment in runtime_predictor.track_progress(segments, info.duration):
+                    segment_dict = {
+                        "start": segment.start,
+                        "end": segment.end,
+                        "text": segment.text.strip()
+                    }
+                    transcript_segments.append(segment_dict)
+                    full_text += segment.text.strip() + " "
             
             duration = time.time() - start_time
             
@@ -121,6 +136,8 @@ class OptimizedWhisperTranscriber:
                     "words_per_minute": len(full_text.split()) / (duration / 60) if duration > 0 else 0
                 }
             }
+            if info.loop_guard and info.loop_guard["spans"]:
+                result["loop_guard"] = info.loop_guard
             
             print(f"⚡ 优化转录完成: {duration:.1f}秒", file=sys.stderr)
             print(f"📊 实时因子: {real_time_factor:.3f}x (越小越快)", file=sys.stderr)
@@ -156,21 +173,35 @@ class OptimizedWhisperTranscriber:
 
 def benchmark_model(model_size, test_file, iterations=3):
     """
-    基准测试不同模型的性能
+    基准测试不同模型的性能（模型只加载一次，加载与推理分开计时）
+    
+    完整的多引擎基准测试见 benchmark_engines.py
     """
     print(f"🧪 基准测试模型: {model_size}", file=sys.stderr)
     
-    results = []
+    load_start = time.time()
+    transcriber = OptimizedWhisperTranscriber(model_size)
+    load_time = time.time() - load_start
+    
+    times = []
+    rtfs = []
     for i in range(iterations):
-        transcriber = OptimizedWhisperTranscriber(model_size)
         result = transcriber.transcribe_file_optimized(test_file)
         if result['success']:
-            results.append(result['processing_time'])
+            times.append(result['processing_time'])
+            rtfs.append(result['real_time_factor'])
     
-    if results:
-        avg_time = sum(results) / len(results)
-        print(f"📊 模型 {model_size} 平均耗时: {avg_time:.2f}秒", file=sys.stderr)
-        return avg_time
+    if times:
+        avg_time = sum(times) / len(times)
+        avg_rtf = sum(rtfs) / len(rtfs)
+        print(f"📊 模型 {model_size} 加载耗时: {load_time:.2f}秒, 平均推理耗时: {avg_time:.2f}秒, 平均RTF: {avg_rtf:.3f}", file=sys.stderr)
+        return {
+            "model": model_size,
+            "load_time": round(load_time, 2),
+            "avg_time": round(avg_time, 2),
+            "avg_rtf": round(avg_rtf, 3),
+            "iterations": len(times)
+        }
     return None
 
 def main():
@@ -186,10 +217,14 @@ def main():
     parser.add_argument("--output", help="输出JSON文件路径")
     parser.add_argument("--chunk-length", type=int, default=600, help="分块长度(秒)")
     parser.add_argument("--benchmark", action="store_true", help="运行性能基准测试")
+    parser.add_argument("--benchmark-models", default="tiny,base,small",
+                       help="基准测试的模型列表，逗号分隔 (默认: tiny,base,small)")
     parser.add_argument("--save-transcript", help="保存转录文本到指定目录")
     parser.add_argument("--file-prefix", help="保存文件前缀")
+    add_trace_arguments(parser)
     
     args = parser.parse_args()
+    start_tracing(args)
     
     # 验证文件存在
     audio_files = []
@@ -204,11 +239,20 @@ def main():
         if args.benchmark:
             # 运行基准测试
             print("🧪 开始性能基准测试...", file=sys.stderr)
-            models = ["tiny", "base", "small"]
-            for model in models:
-                benchmark_model(model, audio_files[0])
+            models = [m.strip() for m in args.benchmark_models.split(",") if m.strip()]
+            benchmarks = [benchmark_model(model, audio_files[0]) for model in models]
+            print(json.dumps({"success": True, "benchmark": [b for b in benchmarks if b]}, ensure_ascii=False))
             return
         
+        # 多个转录同时运行时分到互不重叠的 CPU 核
+        cpu_allocator.acquire_for_job("whisper-optimized", device=args.device, threads=args.cpu_threads)
+        
+        # 按历史 RTF 预测耗时，解码过程中输出进度
+        job_start = time.perf_counter()
+        prediction = runtime_predictor.start_job("whisper-optimized", audio_files, model=args.model,
+                                                 compute_type=args.compute_type, threads=args.cpu_threads,
+                                                 language=args.language)
+        
         # 初始化优化转录器
         transcriber = OptimizedWhisperTranscriber(
             model_size=args.model,
@@ -239,12 +283,26 @@ def main():
                 transcript_text=result['text'],
                 save_dir=args.save_transcript,
                 file_prefix=args.file_prefix or "optimized",
-                original_filename=audio_files[0] if len(audio_files) == 1 else None
+                original_filename=audio_files[0] if len(audio_files) == 1 else None,
+                segments=result.get('segments')
             )
             if file_info:
                 saved_files.append(file_info)
                 result['savedFiles'] = saved_files
         
+        # 分阶段耗时汇总和任务指标
+        trace_summary = finish_tracing(result, args)
+        items = result.get("results", [result])
+        runtime_predictor.finish_job(result, prediction, time.perf_counter() - job_start,
+                                     load_seconds=tracer.stage_seconds("model_load"),
+                                     audio_seconds=sum(item.get("duration") or 0 for item in items))
+        for item in items:
+            metrics.record_job("whisper-optimized", args.model, item,
+                               audio_seconds=item.get("duration"),
+                               processing_seconds=item.get("processing_time"))
+        metrics.record_stages("whisper-optimized", args.model, trace_summary)
+        metrics.flush()
+        
         # 输出结果
         if args.output:
             with open(args.output, 'w', encoding='utf-8') as f:
@@ -255,9 +313,11 @@ def main():
     
     except KeyboardInterrupt:
         print("\n⚠️ 转录被用户中断", file=sys.stderr)
+        metrics.record_failure("whisper-optimized", args.model, "KeyboardInterrupt")
         sys.exit(1)
     except Exception as e:
         print(f"❌ 程序错误: {e}", file=sys.stderr)
+        metrics.record_failure("whisper-optimized", args.model, e)
         sys.exit(1)
 
 if __name__ == "__main__":
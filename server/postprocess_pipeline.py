@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+解码后处理流水线
+繁简转换按批调用 OpenCC，情绪关键词用单个 Aho-Corasick 自动机匹配，
+并在后台线程中与模型解码并行执行
+"""
+
+import sys
+import re
+import queue
+import threading
+
+from hotword_engine import AhoCorasick
+from tracing import span
+
+# 批量转换时的片段分隔符（OpenCC 原样保留换行）
+_SEPARATOR = "\n"
+_REPEAT_RE = re.compile(r'(.)\1{2,}')
+# 同一字符连续超过该长度是解码循环而不是强调（“对对对对对对对对…”）
+MAX_EMPHASIS_RUN = 6
+
+# 标点类情绪与关键词一起编入自动机
+_PUNCTUATION_EMOTIONS = {
+    '?': '疑问', '？': '疑问',
+    '!': '激动', '！': '激动'
+}
+
+
+class BatchConverter:
+    """
+    批量繁简转换：多个片段拼接后一次调用 OpenCC，再按分隔符切回
+
+    参数:
+        converter: opencc.OpenCC 实例（None 表示不转换）
+    """
+
+    def __init__(self, converter):
+        self.converter = converter
+
+    def convert_batch(self, texts):
+        if not self.converter or not texts:
+            return texts
+        cleaned = [t.replace(_SEPARATOR, " ") for t in texts]
+        try:
+            converted = self.converter.convert(_SEPARATOR.join(cleaned)).split(_SEPARATOR)
+            if len(converted) == len(cleaned):
+                return converted
+            print("⚠️ 批量繁简转换片段数不一致，改为逐段转换", file=sys.stderr)
+            return [self.converter.convert(t) for t in cleaned]
+        except Exception as e:
+            print(f"⚠️ 繁简转换失败: {e}", file=sys.stderr)
+            return texts
+
+
+class EmotionTagger:
+    """
+    情绪标记：所有类别的关键词和标点编入一个自动机，单次遍历得到命中的类别
+
+    参数:
+        emotion_keywords: {情绪: [关键词, ...]}
+    """
+
+    def __init__(self, emotion_keywords):
+        self.categories = list(emotion_keywords.keys())
+        patterns = []
+        self.pattern_emotion = []
+        for emotion, keywords in emotion_keywords.items():
+            for keyword in keywords:
+                patterns.append(keyword)
+                self.pattern_emotion.append(emotion)
+        for mark, emotion in _PUNCTUATION_EMOTIONS.items():
+            patterns.append(mark)
+            self.pattern_emotion.append(emotion)
+            if emotion not in self.categories:
+                self.categories.append(emotion)
+        self.order = {e: i for i, e in enumerate(self.categories + ['强调'])}
+        self.automaton = AhoCorasick(patterns, ignore_case=False)
+
+    def tag(self, text):
+        """返回文本命中的情绪列表（按类别顺序去重）"""
+        emotions = {self.pattern_emotion[pid] for pid in self.automaton.contains_any(text)}
+        # 检测重复字符（表示强调或情绪）；过长的重复是解码循环，只跳过这一段，不影响其余的强调
+        if any(len(m.group(0)) <= MAX_EMPHASIS_RUN for m in _REPEAT_RE.finditer(text)):
+            emotions.add('强调')
+        return sorted(emotions, key=self.order.get)
+
+
+class PostProcessor:
+    """
+    解码后处理：繁简转换 + 情绪标记
+
+    参数:
+        converter: opencc.OpenCC 实例
+        emotion_keywords: 情绪关键词字典（None 表示不做情绪标记）
+        batch_size: 每批处理的片段数
+    """
+
+    def __init__(self, converter=None, emotion_keywords=None, batch_size=32):
+        self.batch_converter = BatchConverter(converter)
+        self.tagger = EmotionTagger(emotion_keywords) if emotion_keywords else None
+        self.batch_size = batch_size
+
+    def process_batch(self, batch, need_conversion=False):
+        """原地处理一批片段 dict"""
+        if need_conversion:
+            with span("t2s_conversion", segments=len(batch)):
+                texts = self.batch_converter.convert_batch([seg["text"] for seg in batch])
+            for seg, text in zip(batch, texts):
+                seg["text"] = text
+        if self.tagger:
+            with span("emotion_tagging", segments=len(batch)):
+                for seg in batch:
+                    seg["emotions"] = self.tagger.tag(seg["text"])
+        return batch
+
+    def run(self, segments, need_conversion=False):
+        """
+        边解码边处理：当前线程消费模型产出的片段，后台线程按批做后处理
+
+        参数:
+            segments: 片段 dict 的可迭代对象（通常是包装了模型生成器的生成器）
+            need_conversion: 是否进行繁简转换
+
+        返回:
+            处理后的片段列表（保持原顺序）
+        """
+        if not need_conversion and not self.tagger:
+            return list(segments)
+
+        pending = queue.Queue(maxsize=64)
+        processed = []
+        errors = []
+
+        def worker():
+            while True:
+                batch = pending.get()
+                if batch is None:
+                    return
+                if errors:
+                    continue
+                try:
+                    processed.extend(self.process_batch(batch, need_conversion))
+                except Exception as e:
+                    errors.append(e)
+
+        thread = threading.Thread(target=worker, name="postprocess", daemon=True)
+        thread.start()
+
+        batch = []
+        try:
+            for seg in segments:
+                batch.append(seg)
+                if len(batch) >= self.batch_size:
+                    pending.put(batch)
+                    batch = []
+            if batch:
+                pending.put(batch)
+        finally:
+            pending.put(None)
+            thread.join()
+
+        if errors:
+            raise errors[0]
+        return processed
@@ -16,6 +16,14 @@ import torch
 from pyannote.audio import Pipeline
 import warnings
 
+from segment_table import SegmentTable
+from tracing import span, add_trace_arguments, start_tracing, finish_tracing
+import metrics
+import autotune
+import cpu_allocator
+import nonspeech
+from deadline import load_audio
+
 # 禁用所有警告输出到 stdout
 warnings.filterwarnings("ignore")
 
@@ -30,7 +38,7 @@ def format_timestamp(seconds):
     secs = seconds % 60
     return f"{hours:02d}:{minutes:02d}:{secs:06.3f}"
 
-def diarize_audio(audio_path, num_speakers=None, min_speakers=1, max_speakers=10):
+def diarize_audio(audio_path, num_speakers=None, min_speakers=1, max_speakers=10, skip_music=False):
     """
     使用 pyannote.audio 进行说话人分离
 
@@ -39,6 +47,7 @@ def diarize_audio(audio_path, num_speakers=None, min_speakers=1, max_speakers=10
         num_speakers: 指定说话人数量（None表示自动检测）
         min_speakers: 最少说话人数量
         max_speakers: 最多说话人数量
+        skip_music: 预分类并屏蔽音乐 / 噪声区域，不参与说话人分离
     """
     start_time = time.time()
 
@@ -51,12 +60,15 @@ def diarize_audio(audio_path, num_speakers=None, min_speakers=1, max_speakers=10
         # 检查CUDA可用性
         device = "cuda" if torch.cuda.is_available() else "cpu"
         print(f"🎯 使用设备: {device}", file=sys.stderr)
+        threads = autotune.apply_torch_threads("pyannote", device)
+        if threads:
+            print(f"⚙️ 本机调优: torch 线程数 {threads}", file=sys.stderr)
 
         # 初始化说话人分离管道
         print(f"🔄 加载 pyannote.audio 管道...", file=sys.stderr)
 
         # 重定向stdout避免模型输出污染
-        with contextlib.redirect_stdout(captured_output):
+        with span("pipeline_load"), contextlib.redirect_stdout(captured_output):
             # 使用预训练的说话人分离模型
             token = os.getenv('HF_TOKEN') or True
 
@@ -89,17 +101,22 @@ def diarize_audio(audio_path, num_speakers=None, min_speakers=1, max_speakers=10
         # 配置说话人数量参数
         if num_speakers is not None:
             print(f"🎯 指定说话人数量: {num_speakers}", file=sys.stderr)
-            diarization = pipeline(
-                audio_path,
-                num_speakers=num_speakers
-            )
+            speaker_kwargs = dict(num_speakers=num_speakers)
         else:
             print(f"🔍 自动检测说话人 (范围: {min_speakers}-{max_speakers})", file=sys.stderr)
-            diarization = pipeline(
-                audio_path,
-                min_speakers=min_speakers,
-                max_speakers=max_speakers
-            )
+            speaker_kwargs = dict(min_speakers=min_speakers, max_speakers=max_speakers)
+
+        # 音乐 / 噪声区域置零后以波形输入管道
+        audio_input = audio_path
+        nonspeech_report = None
+        if skip_music:
+            with span("audio_decode"):
+                audio = load_audio(audio_path)
+            masked, nonspeech_report = nonspeech.detect(audio)
+            audio_input = {"waveform": torch.from_numpy(masked).unsqueeze(0), "sample_rate": nonspeech.SAMPLE_RATE}
+
+        with span("diarization"):
+            diarization = pipeline(audio_input, **speaker_kwargs)
 
         # 处理分离结果
         segments = []
@@ -119,6 +136,7 @@ def diarize_audio(audio_path, num_speakers=None, min_speakers=1, max_speakers=10
 
         # 按时间排序
         segments.sort(key=lambda x: x["start"])
+        table = SegmentTable.from_segments(segments)
 
         elapsed_time = time.time() - start_time
 
@@ -138,10 +156,12 @@ def diarize_audio(audio_path, num_speakers=None, min_speakers=1, max_speakers=10
             "stats": {
                 "total_segments": len(segments),
                 "total_speakers": len(speaker_labels),
-                "audio_duration": max([seg["end"] for seg in segments]) if segments else 0,
-                "avg_segment_duration": sum([seg["duration"] for seg in segments]) / len(segments) if segments else 0
+                "audio_duration": float(table.end.max()) if len(table) else 0,
+                "avg_segment_duration": float(table.durations.mean()) if len(table) else 0
             }
         }
+        if nonspeech_report:
+            result["nonspeech"] = nonspeech_report
 
         return result
 
@@ -174,7 +194,7 @@ def save_diarization_results(result, output_dir, file_prefix):
 
         # 保存 JSON 格式
         json_file = os.path.join(output_dir, f"{file_prefix}_diarization.json")
-        with open(json_file, 'w', encoding='utf-8') as f:
+        with span("file_write"), open(json_file, 'w', encoding='utf-8') as f:
             json.dump(result, f, ensure_ascii=False, indent=2)
         saved_files.append(json_file)
         print(f"💾 保存JSON: {json_file}", file=sys.stderr)
@@ -182,7 +202,7 @@ def save_diarization_results(result, output_dir, file_prefix):
         if result["success"]:
             # 保存 CSV 格式
             csv_file = os.path.join(output_dir, f"{file_prefix}_diarization.csv")
-            with open(csv_file, 'w', encoding='utf-8') as f:
+            with span("file_write"), open(csv_file, 'w', encoding='utf-8') as f:
                 f.write("start,end,duration,speaker,start_formatted,end_formatted\n")
                 for seg in result["segments"]:
                     f.write(f"{seg['start']:.3f},{seg['end']:.3f},{seg['duration']:.3f},"
@@ -192,7 +212,7 @@ def save_diarization_results(result, output_dir, file_prefix):
 
             # 保存可视化 Markdown
             md_file = os.path.join(output_dir, f"{file_prefix}_diarization.md")
-            with open(md_file, 'w', encoding='utf-8') as f:
+            with span("file_write"), open(md_file, 'w', encoding='utf-8') as f:
                 f.write(f"# 说话人分离结果\n\n")
                 f.write(f"**音频文件**: {result['audio_file']}  \n")
                 f.write(f"**说话人数量**: {result['num_speakers']}  \n")
@@ -200,10 +220,10 @@ def save_diarization_results(result, output_dir, file_prefix):
                 f.write(f"**处理时间**: {result['processing_time']:.2f} 秒  \n\n")
 
                 f.write("## 说话人列表\n\n")
-                for i, speaker in enumerate(result['speakers'], 1):
-                    speaker_segments = [seg for seg in result['segments'] if seg['speaker'] == speaker]
-                    total_time = sum(seg['duration'] for seg in speaker_segments)
-                    f.write(f"- **{speaker}**: {len(speaker_segments)} 个片段, 总时长 {total_time:.1f} 秒\n")
+                speaker_totals = SegmentTable.from_segments(result['segments']).speaker_totals()
+                for speaker in result['speakers']:
+                    totals = speaker_totals.get(speaker, {"segments": 0, "duration": 0.0})
+                    f.write(f"- **{speaker}**: {totals['segments']} 个片段, 总时长 {totals['duration']:.1f} 秒\n")
 
                 f.write("\n## 时间线\n\n")
                 for seg in result['segments']:
@@ -225,11 +245,15 @@ def main():
     parser.add_argument('--num-speakers', type=int, help='指定说话人数量（留空则自动检测）')
     parser.add_argument('--min-speakers', type=int, default=1, help='最少说话人数量')
     parser.add_argument('--max-speakers', type=int, default=10, help='最多说话人数量')
+    parser.add_argument('--skip-music', action='store_true',
+                      help='按频谱特征标出音乐 / 噪声区域，不参与说话人分离')
     parser.add_argument('--output-dir', help='保存结果的目录')
     parser.add_argument('--file-prefix', default='pyannote',
                       help='保存文件的前缀')
+    add_trace_arguments(parser)
 
     args = parser.parse_args()
+    start_tracing(args)
 
     # 检查音频文件是否存在
     if not os.path.exists(args.audio_file):
@@ -241,12 +265,16 @@ def main():
         }, ensure_ascii=False))
         sys.exit(1)
 
+    # 多个任务同时运行时分到互不重叠的 CPU 核
+    cpu_allocator.acquire_for_job("pyannote", device="cuda" if torch.cuda.is_available() else "cpu")
+
     # 执行说话人分离
     result = diarize_audio(
         args.audio_file,
         num_speakers=args.num_speakers,
         min_speakers=args.min_speakers,
-        max_speakers=args.max_speakers
+        max_speakers=args.max_speakers,
+        skip_music=args.skip_music
     )
 
     # 保存文件（如果指定）
@@ -258,6 +286,14 @@ def main():
         )
         result["savedFiles"] = saved_files
 
+    # 分阶段耗时汇总和任务指标
+    trace_summary = finish_tracing(result, args)
+    metrics.record_job("pyannote", "speaker-diarization", result,
+                       audio_seconds=result["segments"][-1]["end"] if result["segments"] else None,
+                       processing_seconds=result.get("processing_time"))
+    metrics.record_stages("pyannote", "speaker-diarization", trace_summary)
+    metrics.flush()
+
     # 输出结果（JSON格式到stdout，用于管道通信）
     print(json.dumps(result, ensure_ascii=False))
 
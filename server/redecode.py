@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+低置信度片段二次解码
+第一遍用小模型保证吞吐，按 faster-whisper 的 avg_logprob / no_speech_prob / compression_ratio
+挑出难段，只对这些时间段用更大的模型（或更大的 beam）重新解码并拼回原结果
+"""
+
+import sys
+import time
+
+from tracing import span
+
+SAMPLE_RATE = 16000
+# 置信度阈值：平均对数概率低于它、或压缩比高于它（重复/幻觉）的片段重新解码
+LOGPROB_THRESHOLD = -0.8
+COMPRESSION_RATIO_THRESHOLD = 2.4
+# no_speech_prob 高于它的片段多半是静音 / 音乐，换模型也无济于事
+NO_SPEECH_THRESHOLD = 0.6
+# 相邻难段间隔不超过该值时合并为一个区间；区间两侧在相邻片段的空隙内外扩
+MERGE_GAP_SECONDS = 1.0
+PAD_SECONDS = 0.3
+# 二次解码的默认模型：比第一遍大一档以上
+REDECODE_MODEL = {"tiny": "small", "base": "medium", "small": "medium", "medium": "large-v3", "large-v3": "large-v3"}
+
+CONFIDENCE_FIELDS = ("avg_logprob", "no_speech_prob", "compression_ratio")
+
+
+def confidence_fields(segment):
+    """faster-whisper 片段的置信度字段（写入结果片段）"""
+    return {name: round(float(getattr(segment, name)), 4) for name in CONFIDENCE_FIELDS
+            if getattr(segment, name, None) is not None}
+
+
+def is_low_confidence(segment, logprob_threshold=LOGPROB_THRESHOLD,
+                      compression_ratio_threshold=COMPRESSION_RATIO_THRESHOLD):
+    """片段 dict 是否需要二次解码（没有置信度字段的片段不处理）"""
+    if "avg_logprob" not in segment:
+        return False
+    if segment.get("no_speech_prob", 0) > NO_SPEECH_THRESHOLD:
+        return False
+    return (segment["avg_logprob"] < logprob_threshold
+            or segment.get("compression_ratio", 0) > compression_ratio_threshold)
+
+
+def low_confidence_regions(segments, audio_seconds, merge_gap=MERGE_GAP_SECONDS, pad=PAD_SECONDS, **thresholds):
+    """
+    把需要二次解码的片段合并成区间
+
+    返回:
+        [(第一个片段下标, 最后一个片段下标 + 1, 区间起点秒, 区间终点秒), ...]
+    """
+    regions = []
+    for i, segment in enumerate(segments):
+        if not is_low_confidence(segment, **thresholds):
+            continue
+        # 只合并紧挨着的难段（中间隔了保留片段就分开）
+        if regions and regions[-1][1] == i and segment["start"] - segments[i - 1]["end"] <= merge_gap:
+            regions[-1][1] = i + 1
+        else:
+            regions.append([i, i + 1])
+
+    bounds = []
+    for first, last in regions:
+        # 外扩不越过相邻的保留片段，避免重复解码它们的内容
+        before = segments[first - 1]["end"] if first > 0 else 0.0
+        after = segments[last]["start"] if last < len(segments) else audio_seconds
+        start = max(before, segments[first]["start"] - pad)
+        end = min(after, segments[last - 1]["end"] + pad)
+        bounds.append((first, last, start, end))
+    return bounds
+
+
+# 压缩比超标（重复）的片段在比较时按这个对数概率扣分
+REPETITION_PENALTY = 1.0
+
+
+def _score(segments, compression_ratio_threshold=COMPRESSION_RATIO_THRESHOLD):
+    """按时长加权的平均对数概率，重复片段扣分（用于比较新旧结果）"""
+    total = sum(max(s["end"] - s["start"], 1e-3) for s in segments)
+    if not total:
+        return None
+    score = 0.0
+    for s in segments:
+        value = s["avg_logprob"]
+        if s.get("compression_ratio", 0) > compression_ratio_threshold:
+            value -= REPETITION_PENALTY
+        score += value * max(s["end"] - s["start"], 1e-3)
+    return score / total
+
+
+def redecode_low_confidence(segments, audio, load_model, model_size, language=None, options=None,
+                            beam_size=5, postprocess=None, **thresholds):
+    """
+    二次解码难段并拼回
+
+    参数:
+        segments: 第一遍的片段 dict 列表（带置信度字段），不修改原列表
+        audio: 16kHz 音频数组
+        load_model: model_size -> WhisperModel（有难段时才调用）
+        options: 第一遍的解码参数（beam_size / best_of 覆盖为二次解码的值）
+        postprocess: 对新片段 dict 列表做与第一遍相同的后处理（繁简转换、情绪标记等）
+
+    返回:
+        (新片段列表, 报告 dict)
+    """
+    audio_seconds = len(audio) / SAMPLE_RATE
+    regions = low_confidence_regions(segments, audio_seconds, **thresholds)
+    report = {
+        "model": model_size,
+        "beam_size": beam_size,
+        "segments_flagged": sum(last - first for first, last, _, _ in regions),
+        "regions": len(regions),
+        "redecoded_seconds": round(sum(end - start for _, _, start, end in regions), 2),
+        "audio_seconds": round(audio_seconds, 2),
+        "accepted": 0,
+        "rejected": 0,
+        "load_seconds": 0.0,
+        "extra_seconds": 0.0
+    }
+    report["redecoded_fraction"] = round(report["redecoded_seconds"] / audio_seconds, 4) if audio_seconds else 0.0
+    if not regions:
+        print("✅ 没有需要二次解码的低置信度片段", file=sys.stderr)
+        return segments, report
+
+    print(f"🔁 二次解码 {report['segments_flagged']} 个低置信度片段（{len(regions)} 段，"
+          f"{report['redecoded_seconds']:.0f}秒 / {report['redecoded_fraction']:.1%}），模型 {model_size} beam {beam_size}",
+          file=sys.stderr)
+    started = time.perf_counter()
+    with span("model_load", model=model_size):
+        model = load_model(model_size)
+    report["load_seconds"] = round(time.perf_counter() - started, 2)
+    decode_options = dict(options or {}, beam_size=beam_size, best_of=beam_size)
+    # 区间很短，VAD 会把边缘切掉；上文用前一个保留片段的文本
+    decode_options["vad_filter"] = False
+    decode_options.pop("vad_parameters", None)
+
+    output = []
+    cursor = 0
+    with span("redecode", regions=len(regions)):
+        for first, last, start, end in regions:
+            output.extend(segments[cursor:first])
+            cursor = last
+            previous = segments[first - 1]["text"] if first > 0 else None
+            chunk = audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)]
+            new_segments, _ = model.transcribe(chunk, language=language, initial_prompt=previous, **decode_options)
+            replacement = []
+            for segment in new_segments:
+                text = segment.text.strip()
+                if not text:
+                    continue
+                replacement.append(dict({"start": round(start + segment.start, 3),
+                                          "end": round(min(end, start + segment.end), 3), "text": text,
+                                          "redecoded": True}, **confidence_fields(segment)))
+            old = segments[first:last]
+            # 只有新结果的置信度更高时才替换
+            ratio_threshold = thresholds.get("compression_ratio_threshold", COMPRESSION_RATIO_THRESHOLD)
+            new_score = _score(replacement, ratio_threshold) if replacement else None
+            if new_score is not None and new_score > _score(old, ratio_threshold):
+                if postprocess:
+                    postprocess(replacement)
+                output.extend(replacement)
+                report["accepted"] += 1
+            else:
+                output.extend(old)
+                report["rejected"] += 1
+        output.extend(segments[cursor:])
+    report["extra_seconds"] = round(time.perf_counter() - started, 2)
+    print(f"🔁 二次解码完成: 采用 {report['accepted']} 段，保留原结果 {report['rejected']} 段，"
+          f"额外耗时 {report['extra_seconds']:.1f}秒", file=sys.stderr)
+    return output, report
@@ -0,0 +1,679 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+任务耗时预测
+按 (引擎, 模型, 计算精度, 线程数, 语言) 记录实际 RTF，用指数加权平均在线更新；
+音频时长直接读容器文件头（WAV/MP3/M4A/FLAC，不解码），预测结果写入结果对象、进度行，并供调度器调用
+"""
+
+import sys
+import os
+import json
+import time
+import struct
+import sqlite3
+import argparse
+import threading
+import subprocess
+
+from tracing import tracer
+
+cache_dir = os.path.expanduser("~/.cache/podcast-transcriber")
+
+# 指数加权平均的权重（越大越偏向最近的任务）
+EWMA_ALPHA = 0.2
+
+# 没有历史时的先验 RTF（默认模型、CPU int8 粗略值，第一批任务跑完后就被实测覆盖）
+PRIOR_RTF = {
+    "whisper": 0.12,
+    "whisper-enhanced": 0.15,
+    "whisper-optimized": 0.08,
+    "sensevoice": 0.03,
+    "sensevoice-optimized": 0.03,
+    "pyannote": 0.1,
+    "combined": 0.2,
+    "synthetic": 0.05,
+}
+# Whisper 模型相对 base 的耗时比例、beam 相对 beam 5 的比例：先验和跨模型借用历史时按此折算
+MODEL_COST = {"tiny": 0.4, "base": 1.0, "small": 2.9, "medium": 7.5, "large-v3": 15.0}
+BEAM_COST = {5: 1.0, 1: 0.55}
+PRIOR_LOAD_SECONDS = 5.0
+# 结果里带这些字段说明实际解码量与音频时长不成正比（截止时间降级、二次解码、跳过音乐、复用往期），不计入历史
+MODIFIED_RUN_KEYS = ("deadline", "redecode", "nonspeech", "recurring")
+DEFAULT_PRIOR_RTF = 0.3
+
+# 进度行前缀：Node 端按行读取 stderr 时可直接解析其后的 JSON
+PROGRESS_PREFIX = "PROGRESS "
+
+
+# ---------------------------------------------------------------------------
+# 从容器头读取时长
+# ---------------------------------------------------------------------------
+
+def _wav_duration(f, size):
+    header = f.read(12)
+    if header[:4] not in (b"RIFF", b"RF64") or header[8:12] != b"WAVE":
+        return None
+    byte_rate = None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            return None
+        chunk_id, chunk_size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+        if chunk_id == b"fmt ":
+            fmt = f.read(chunk_size)
+            byte_rate = struct.unpack("<I", fmt[8:12])[0]
+            if chunk_size % 2:
+                f.seek(1, 1)
+        elif chunk_id == b"data":
+            if not byte_rate:
+                return None
+            # 流式写入的 WAV 可能没有回填长度
+            if chunk_size in (0, 0xFFFFFFFF):
+                chunk_size = size - f.tell()
+            return min(chunk_size, size - f.tell()) / byte_rate
+        else:
+            f.seek(chunk_size + (chunk_size % 2), 1)
+
+
+_MP3_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_MP3_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 25: [11025, 12000, 8000]}
+
+
+def _mp3_frame_header(data, i):
+    """解析 data[i:i+4] 处的 MPEG 音频帧头，无效时返回 None"""
+    if data[i] != 0xFF or (data[i + 1] & 0xE0) != 0xE0:
+        return None
+    version_bits = (data[i + 1] >> 3) & 3
+    layer_bits = (data[i + 1] >> 1) & 3
+    bitrate_index = data[i + 2] >> 4
+    rate_index = (data[i + 2] >> 2) & 3
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    version = {3: 1, 2: 2, 0: 25}[version_bits]
+    layer = 4 - layer_bits
+    bitrate = _MP3_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+    samples = 384 if layer == 1 else (1152 if layer == 2 or version == 1 else 576)
+    mono = (data[i + 3] >> 6) == 3
+    return {"version": version, "layer": layer, "bitrate": bitrate, "sample_rate": sample_rate,
+            "samples": samples, "mono": mono}
+
+
+def _mp3_duration(f, size):
+    start = 0
+    head = f.read(10)
+    if head[:3] == b"ID3":
+        tag_size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+        start = 10 + tag_size + (10 if head[5] & 0x10 else 0)
+    f.seek(start)
+    data = f.read(65536)
+    for i in range(len(data) - 4):
+        frame = _mp3_frame_header(data, i)
+        if not frame:
+            continue
+        # Xing/Info（LAME VBR/CBR）或 VBRI 头里有总帧数，时长精确
+        side = (17 if frame["mono"] else 32) if frame["version"] == 1 else (9 if frame["mono"] else 17)
+        xing = i + 4 + side
+        if data[xing:xing + 4] in (b"Xing", b"Info"):
+            flags = struct.unpack(">I", data[xing + 4:xing + 8])[0]
+            if flags & 1:
+                frames = struct.unpack(">I", data[xing + 8:xing + 12])[0]
+                return frames * frame["samples"] / frame["sample_rate"]
+        vbri = i + 4 + 32
+        if data[vbri:vbri + 4] == b"VBRI":
+            frames = struct.unpack(">I", data[vbri + 14:vbri + 18])[0]
+            return frames * frame["samples"] / frame["sample_rate"]
+        # 没有 VBR 头：按首帧码率当作 CBR 估算（扣掉末尾 ID3v1）
+        audio_bytes = size - start - i
+        f.seek(max(size - 128, 0))
+        if f.read(3) == b"TAG":
+            audio_bytes -= 128
+        return audio_bytes * 8 / frame["bitrate"]
+    return None
+
+
+def _mp4_boxes(f, start, end):
+    """遍历 [start, end) 范围内的 box，产出 (类型, 内容起点, box 终点)"""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        box_size, box_type = struct.unpack(">I", header[:4])[0], header[4:8]
+        offset = 8
+        if box_size == 1:
+            box_size = struct.unpack(">Q", f.read(8))[0]
+            offset = 16
+        elif box_size == 0:
+            box_size = end - pos
+        if box_size < offset:
+            return
+        yield box_type, pos + offset, pos + box_size
+        pos += box_size
+
+
+def _mp4_duration(f, size):
+    for box_type, body, box_end in _mp4_boxes(f, 0, size):
+        if box_type != b"moov":
+            continue
+        for child, child_body, _ in _mp4_boxes(f, body, box_end):
+            if child != b"mvhd":
+                continue
+            f.seek(child_body)
+            version = f.read(4)[0]
+            if version == 1:
+                f.seek(16, 1)
+                timescale, duration = struct.unpack(">IQ", f.read(12))
+            else:
+                f.seek(8, 1)
+                timescale, duration = struct.unpack(">II", f.read(8))
+            return duration / timescale if timescale else None
+    return None
+
+
+def _flac_duration(f, size):
+    if f.read(4) != b"fLaC":
+        return None
+    header = f.read(4)
+    if len(header) < 4 or header[0] & 0x7F != 0:  # 第一个块必须是 STREAMINFO
+        return None
+    info = f.read(34)
+    packed = int.from_bytes(info[10:18], "big")
+    sample_rate = packed >> 44
+    total_samples = packed & ((1 << 36) - 1)
+    return total_samples / sample_rate if sample_rate and total_samples else None
+
+
+_HEADER_PARSERS = {
+    ".wav": _wav_duration,
+    ".mp3": _mp3_duration,
+    ".m4a": _mp4_duration,
+    ".mp4": _mp4_duration,
+    ".m4b": _mp4_duration,
+    ".flac": _flac_duration,
+}
+
+
+def header_duration(path):
+    """只读容器头得到时长（秒），不支持或解析失败时返回 None"""
+    ext = os.path.splitext(str(path))[1].lower()
+    parser = _HEADER_PARSERS.get(ext)
+    if parser is None:
+        return None
+    try:
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            duration = parser(f, size)
+        return duration if duration and duration > 0 else None
+    except (OSError, struct.error, IndexError, ValueError, KeyError):
+        return None
+
+
+def probe_duration(path):
+    """音频时长：优先读文件头，其次 ffprobe，都失败返回 None"""
+    duration = header_duration(path)
+    if duration:
+        return duration
+    try:
+        output = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", str(path)],
+            capture_output=True, text=True, check=True, timeout=30
+        )
+        return float(output.stdout.strip())
+    except (OSError, ValueError, subprocess.SubprocessError):
+        return None
+
+
+# ---------------------------------------------------------------------------
+# 历史记录与预测
+# ---------------------------------------------------------------------------
+
+def default_history_path():
+    return os.getenv("RUNTIME_HISTORY_DB") or os.path.join(cache_dir, "runtime_history.db")
+
+
+def history_model(model, beam_size=None):
+    """耗时历史里的模型键：非默认 beam 单独记录（如 "base/beam1"），不和 beam 5 的 RTF 混在一起"""
+    if beam_size and beam_size != 5:
+        return f"{model}/beam{beam_size}"
+    return model
+
+
+def model_cost(model):
+    """模型键（可带 /beamN 后缀，如 "base/beam1"）相对 base/beam 5 的耗时比例，未知模型为 1"""
+    name, _, beam = (model or "").partition("/beam")
+    cost = MODEL_COST.get(name, 1.0)
+    if beam.isdigit():
+        cost *= BEAM_COST.get(int(beam), 1.0)
+    return cost
+
+
+def _normalize_key(engine, model=None, compute_type=None, threads=None, language=None):
+    return (
+        engine,
+        model or "",
+        compute_type or "",
+        str(threads) if threads else "",
+        (language or "auto").lower()
+    )
+
+
+class RuntimePredictor:
+    """
+    RTF 历史与耗时预测（SQLite，多进程共用）
+
+    预测 = 模型加载耗时 + RTF × 音频时长；没有精确匹配的历史时逐级放宽
+    （去掉语言、线程数、计算精度、模型），最后退回先验值
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or default_history_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS runtime_stats (
+                engine TEXT, model TEXT, compute_type TEXT, threads TEXT, language TEXT,
+                samples INTEGER NOT NULL,
+                rtf REAL NOT NULL,
+                rtf_var REAL NOT NULL,
+                load_seconds REAL,
+                updated_at REAL,
+                PRIMARY KEY (engine, model, compute_type, threads, language)
+            );
+            CREATE TABLE IF NOT EXISTS runtime_observations (
+                id INTEGER PRIMARY KEY,
+                engine TEXT, model TEXT, compute_type TEXT, threads TEXT, language TEXT,
+                audio_seconds REAL, processing_seconds REAL, load_seconds REAL, observed_at REAL
+            );
+        """)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, engine, audio_seconds, processing_seconds, model=None, compute_type=None,
+               threads=None, language=None, load_seconds=None):
+        """
+        记录一次实际耗时并更新指数加权的 RTF 和方差
+
+        参数:
+            processing_seconds: 不含模型加载的处理耗时
+            load_seconds: 模型加载耗时（可选）
+        """
+        if not audio_seconds or audio_seconds <= 0 or processing_seconds is None:
+            return None
+        key = _normalize_key(engine, model, compute_type, threads, language)
+        rtf = processing_seconds / audio_seconds
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO runtime_observations (engine, model, compute_type, threads, language, "
+                "audio_seconds, processing_seconds, load_seconds, observed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                key + (audio_seconds, processing_seconds, load_seconds, time.time())
+            )
+            row = self.conn.execute(
+                "SELECT samples, rtf, rtf_var, load_seconds FROM runtime_stats WHERE engine = ? AND model = ? "
+                "AND compute_type = ? AND threads = ? AND language = ?", key
+            ).fetchone()
+            if row:
+                samples, mean, var, load = row
+                delta = rtf - mean
+                mean += EWMA_ALPHA * delta
+                var = (1 - EWMA_ALPHA) * (var + EWMA_ALPHA * delta * delta)
+                if load_seconds is not None:
+                    load = load_seconds if load is None else load + EWMA_ALPHA * (load_seconds - load)
+                samples += 1
+            else:
+                samples, mean, var, load = 1, rtf, 0.0, load_seconds
+            self.conn.execute(
+                "INSERT OR REPLACE INTO runtime_stats (engine, model, compute_type, threads, language, "
+                "samples, rtf, rtf_var, load_seconds, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                key + (samples, mean, var, load, time.time())
+            )
+        return {"rtf": mean, "samples": samples}
+
+    def _lookup(self, key):
+        """逐级放宽匹配条件，按样本数加权合并同级的多条统计；借用其他模型的历史时按模型耗时比例折算"""
+        names = ("engine", "model", "compute_type", "threads", "language")
+        # 放宽顺序：语言 -> 线程数 -> 计算精度 -> 模型
+        for width in (5, 4, 3, 2, 1):
+            fixed = range(width)
+            where = " AND ".join(f"{names[i]} = ?" for i in fixed)
+            rows = self.conn.execute(
+                f"SELECT samples, rtf, rtf_var, load_seconds, model FROM runtime_stats WHERE {where}",
+                tuple(key[i] for i in fixed)
+            ).fetchall()
+            if rows:
+                scales = [model_cost(key[1]) / model_cost(r[4]) for r in rows]
+                total = sum(r[0] for r in rows)
+                loads = [(r[0], r[3] * scale) for r, scale in zip(rows, scales) if r[3] is not None]
+                return {
+                    "basis": "+".join(names[i] for i in fixed),
+                    "samples": total,
+                    "rtf": sum(r[0] * r[1] * scale for r, scale in zip(rows, scales)) / total,
+                    "rtf_std": (sum(r[0] * r[2] * scale ** 2 for r, scale in zip(rows, scales)) / total) ** 0.5,
+                    "load_seconds": sum(n * l for n, l in loads) / sum(n for n, _ in loads) if loads else None
+                }
+        return None
+
+    def predict(self, engine, audio_seconds=None, audio_path=None, model=None, compute_type=None,
+                threads=None, language=None, include_load=True):
+        """
+        预测任务耗时
+
+        参数:
+            audio_seconds: 音频时长；为空时从 audio_path 的文件头读取
+            include_load: 是否计入模型加载耗时（常驻 worker 已加载模型时传 False）
+
+        返回:
+            {"audio_seconds", "predicted_seconds", "low_seconds", "high_seconds", "rtf", "basis", "samples"}
+        """
+        if audio_seconds is None and audio_path:
+            audio_seconds = probe_duration(audio_path)
+        key = _normalize_key(engine, model, compute_type, threads, language)
+        stats = self._lookup(key)
+        if stats is None:
+            scale = model_cost(model)
+            prior = PRIOR_RTF.get(engine, DEFAULT_PRIOR_RTF) * scale
+            stats = {"basis": "prior", "samples": 0, "rtf": prior, "rtf_std": prior * 0.5,
+                     "load_seconds": PRIOR_LOAD_SECONDS * max(1.0, scale ** 0.5)}
+
+        load = (stats["load_seconds"] or 0.0) if include_load else 0.0
+        prediction = {
+            "engine": engine,
+            "model": model,
+            "audio_seconds": round(audio_seconds, 2) if audio_seconds else None,
+            "rtf": round(stats["rtf"], 4),
+            "basis": stats["basis"],
+            "samples": stats["samples"],
+            "load_seconds": round(load, 2),
+            "predicted_seconds": None
+        }
+        if audio_seconds:
+            spread = 2 * stats["rtf_std"] * audio_seconds
+            predicted = load + stats["rtf"] * audio_seconds
+            prediction.update(
+                predicted_seconds=round(predicted, 1),
+                low_seconds=round(max(load, predicted - spread), 1),
+                high_seconds=round(predicted + spread, 1)
+            )
+        return prediction
+
+    def stats(self):
+        rows = self.conn.execute(
+            "SELECT engine, model, compute_type, threads, language, samples, rtf, rtf_var, load_seconds "
+            "FROM runtime_stats ORDER BY engine, model"
+        ).fetchall()
+        return [
+            {"engine": r[0], "model": r[1], "compute_type": r[2], "threads": r[3], "language": r[4],
+             "samples": r[5], "rtf": round(r[6], 4), "rtf_std": round(r[7] ** 0.5, 4),
+             "load_seconds": round(r[8], 2) if r[8] is not None else None}
+            for r in rows
+        ]
+
+
+# ---------------------------------------------------------------------------
+# 进度输出
+# ---------------------------------------------------------------------------
+
+class ProgressReporter:
+    """
+    按预测耗时向 stderr 输出进度行：PROGRESS {"stage", "percent", "elapsed_s", "eta_s", ...}
+
+    解码循环里按已解码到的音频位置换算进度；模型加载、整段 generate() 等看不到内部进度的阶段
+    由后台心跳按已用时间 / 预测耗时估算。百分比只增不减
+
+    参数:
+        prediction: RuntimePredictor.predict() 的返回值
+        interval: 两次输出的最小间隔（秒）
+    """
+
+    def __init__(self, prediction, interval=2.0, stream=None):
+        self.prediction = prediction
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self.start = time.perf_counter()
+        self._last = 0.0
+        self._percent = 0.0
+        self._paused_at = None
+        self.paused_seconds = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def emit(self, stage, percent=None, **extra):
+        with self._lock:
+            elapsed = time.perf_counter() - self.start
+            predicted = self.prediction.get("predicted_seconds")
+            if percent is None and predicted:
+                percent = min(99.0, elapsed / predicted * 100)
+            if percent is not None:
+                percent = self._percent = max(self._percent, percent)
+            eta = None
+            if percent and percent > 0:
+                eta = max(0.0, elapsed * (100 - percent) / percent)
+            elif predicted:
+                eta = max(0.0, predicted - elapsed)
+            line = {"stage": stage, "percent": round(percent, 1) if percent is not None else None,
+                    "elapsed_s": round(elapsed, 1), "eta_s": round(eta, 1) if eta is not None else None,
+                    "predicted_s": predicted, **extra}
+            print(PROGRESS_PREFIX + json.dumps(line, ensure_ascii=False), file=self.stream, flush=True)
+            self._last = time.perf_counter()
+            return line
+
+    def track(self, segments, audio_seconds=None, position=lambda seg: seg.end):
+        """包装片段迭代器：按已解码到的音频位置换算进度，节流输出"""
+        audio_seconds = audio_seconds or self.prediction.get("audio_seconds")
+        for segment in segments:
+            if time.perf_counter() - self._last >= self.interval:
+                percent = None
+                if audio_seconds:
+                    percent = min(99.0, position(segment) / audio_seconds * 100)
+                self.emit("decoding", percent)
+            yield segment
+
+    def pause(self):
+        """暂停（任务让出队列名额等待期间）：心跳不再推进进度，暂停时长不计入已用时间"""
+        self.emit("queued")
+        self._paused_at = time.perf_counter()
+
+    def resume(self):
+        if self._paused_at is None:
+            return
+        paused = time.perf_counter() - self._paused_at
+        with self._lock:
+            self._paused_at = None
+            self.paused_seconds += paused
+            self.start += paused
+
+    def _heartbeat(self):
+        main_tid = threading.main_thread().ident
+        while not self._stop.wait(self.interval):
+            if self._paused_at is None and time.perf_counter() - self._last >= 2 * self.interval:
+                self.emit(tracer.current_stage(main_tid) or "running")
+
+    def start_heartbeat(self):
+        self._thread = threading.Thread(target=self._heartbeat, name="progress-heartbeat", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+
+# 当前进程的进度输出（由入口脚本设置；未设置时 track_progress 原样返回）
+_reporter = None
+
+
+def start_job(engine, audio_paths, model=None, compute_type=None, threads=None, language=None):
+    """
+    入口脚本开始任务时调用：预测耗时、输出首个进度行，并设为当前进程的进度输出
+
+    参数:
+        audio_paths: 音频文件路径或路径列表（多文件按总时长预测）
+
+    返回:
+        预测 dict（历史库不可用时为 None）
+    """
+    global _reporter
+    if os.getenv("RUNTIME_PREDICTION_DISABLE") == "1":
+        return None
+    if isinstance(audio_paths, (str, os.PathLike)):
+        audio_paths = [audio_paths]
+    durations = [probe_duration(path) for path in audio_paths]
+    audio_seconds = sum(durations) if all(durations) else None
+    try:
+        with RuntimePredictor() as predictor:
+            prediction = predictor.predict(engine, audio_seconds=audio_seconds, model=model,
+                                           compute_type=compute_type, threads=threads, language=language)
+    except Exception as e:
+        print(f"⚠️ 耗时预测失败: {e}", file=sys.stderr)
+        return None
+    prediction.update(compute_type=compute_type, threads=threads, language=language)
+    if prediction["predicted_seconds"]:
+        print(f"⏳ 预计耗时 {prediction['predicted_seconds']:.0f}秒 "
+              f"(音频 {prediction['audio_seconds']:.0f}秒, RTF {prediction['rtf']}, 依据: {prediction['basis']})",
+              file=sys.stderr)
+    _reporter = ProgressReporter(prediction)
+    _reporter.emit("started", 0.0)
+    _reporter.start_heartbeat()
+    return prediction
+
+
+def current_prediction():
+    """当前任务的耗时预测（start_job 之后、finish_job 之前），没有时为 None"""
+    return _reporter.prediction if _reporter is not None else None
+
+
+def track_progress(segments, audio_seconds=None):
+    """解码循环里包装片段迭代器；没有进行中的任务时原样返回"""
+    if _reporter is None:
+        return segments
+    return _reporter.track(segments, audio_seconds)
+
+
+def pause_progress():
+    """当前任务让出队列名额时调用：暂停进度心跳，暂停时长不计入耗时"""
+    if _reporter is not None:
+        _reporter.pause()
+
+
+def resume_progress():
+    if _reporter is not None:
+        _reporter.resume()
+
+
+def finish_job(result, prediction, processing_seconds, load_seconds=None, audio_seconds=None):
+    """
+    任务结束：把预测与实际耗时写入结果，全部成功且是普通解码时更新历史
+
+    参数:
+        result: 单个结果 dict，或多文件结果（列表 / {"batch": True, "results": [...]}）
+        processing_seconds: 总耗时（含模型加载；让出队列名额暂停的时长会被扣除）
+        load_seconds: 其中模型加载的部分
+        audio_seconds: 实际音频时长（为空时用预测时读到的时长）
+    """
+    global _reporter
+    if prediction is None:
+        return
+    if isinstance(result, dict) and result.get("batch"):
+        items = result.get("results", [])
+    else:
+        items = result if isinstance(result, list) else [result]
+    audio_seconds = audio_seconds or prediction.get("audio_seconds")
+    if _reporter is not None:
+        processing_seconds -= _reporter.paused_seconds
+    entry = dict(prediction, actual_seconds=round(processing_seconds, 2))
+    if isinstance(result, dict):
+        result["runtime_prediction"] = entry
+    if _reporter is not None:
+        _reporter.stop()
+        _reporter.emit("finished", 100.0)
+        _reporter = None
+    if not audio_seconds or not all(isinstance(item, dict) and item.get("success") for item in items):
+        return
+    modified = sorted({key for item in items for key in MODIFIED_RUN_KEYS if item.get(key)})
+    if modified:
+        print(f"ℹ️ 本次任务用了 {', '.join(modified)}，RTF 不计入耗时历史", file=sys.stderr)
+        return
+    try:
+        with RuntimePredictor() as predictor:
+            predictor.record(prediction["engine"], audio_seconds, processing_seconds - (load_seconds or 0.0),
+                             model=prediction.get("model"), compute_type=prediction.get("compute_type"),
+                             threads=prediction.get("threads"), language=prediction.get("language"),
+                             load_seconds=load_seconds)
+    except Exception as e:
+        print(f"⚠️ 耗时历史更新失败: {e}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='转录耗时预测')
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("predict", help="预测任务耗时")
+    p.add_argument("files", nargs="+", help="音频文件")
+    p.add_argument("--engine", default="whisper", help="引擎名")
+    p.add_argument("--model", help="模型名")
+    p.add_argument("--compute-type", help="计算精度")
+    p.add_argument("--threads", type=int, help="线程数")
+    p.add_argument("--language", help="语言")
+    p.add_argument("--no-load", action="store_true", help="不计模型加载耗时（常驻 worker）")
+
+    p = sub.add_parser("duration", help="读取音频时长（文件头优先）")
+    p.add_argument("files", nargs="+", help="音频文件")
+
+    p = sub.add_parser("record", help="手动记录一次实际耗时")
+    p.add_argument("--engine", required=True)
+    p.add_argument("--model")
+    p.add_argument("--compute-type")
+    p.add_argument("--threads", type=int)
+    p.add_argument("--language")
+    p.add_argument("--audio-seconds", type=float, required=True)
+    p.add_argument("--processing-seconds", type=float, required=True)
+    p.add_argument("--load-seconds", type=float)
+
+    sub.add_parser("stats", help="查看历史统计")
+
+    args = parser.parse_args()
+    if args.command == "duration":
+        output = [{"file": path, "header_duration": header_duration(path), "duration": probe_duration(path)}
+                  for path in args.files]
+        print(json.dumps(output, ensure_ascii=False))
+        return
+
+    with RuntimePredictor() as predictor:
+        if args.command == "predict":
+            output = [
+                dict(predictor.predict(args.engine, audio_path=path, model=args.model,
+                                       compute_type=args.compute_type, threads=args.threads,
+                                       language=args.language, include_load=not args.no_load), file=path)
+                for path in args.files
+            ]
+            output = output[0] if len(output) == 1 else output
+        elif args.command == "record":
+            output = predictor.record(args.engine, args.audio_seconds, args.processing_seconds, model=args.model,
+                                      compute_type=args.compute_type, threads=args.threads,
+                                      language=args.language, load_seconds=args.load_seconds)
+        else:
+            output = predictor.stats()
+    print(json.dumps(output, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
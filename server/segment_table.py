@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+列式片段表 (SegmentTable)
+用 numpy 列存储片段的 start/end/说话人/置信度，文本统一驻留存储，
+替代各脚本中逐片段的 dict 列表，统计与合并均为向量化实现
+"""
+
+import numpy as np
+
+NO_SPEAKER = -1
+# 列存储的字段，以及 to_segments 按列重新生成的字段；其余字段可作为附加字段原样带回
+_COLUMN_KEYS = frozenset(("start", "end", "speaker", "confidence", "text",
+                          "duration", "start_formatted", "end_formatted"))
+
+
+class TextPool:
+    """
+    驻留文本存储：相同文本只保存一份，片段中只记录整数 ID
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._texts = []
+
+    def intern(self, text):
+        """返回文本对应的 ID（不存在则新增）"""
+        text = text or ""
+        text_id = self._ids.get(text)
+        if text_id is None:
+            text_id = len(self._texts)
+            self._ids[text] = text_id
+            self._texts.append(text)
+        return text_id
+
+    def __getitem__(self, text_id):
+        return self._texts[text_id]
+
+    def __len__(self):
+        return len(self._texts)
+
+    def word_counts(self):
+        """每个驻留文本的词数（按空白切分），每个唯一文本只计算一次"""
+        return np.fromiter((len(t.split()) for t in self._texts), dtype=np.int64, count=len(self._texts))
+
+
+def _to_seconds(value):
+    """兼容 float 和 HH:MM:SS.mmm 字符串"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    parts = str(value).split(':')
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+class SegmentTable:
+    """
+    列式片段表
+
+    列:
+        start, end: float64 秒
+        speaker: int32 说话人 ID（NO_SPEAKER 表示无说话人），标签见 self.speakers
+        confidence: float64（与 JSON 中的数值一致，导出时不产生 0.8999999761581421 这类误差）
+        text_id: int32 文本 ID，文本见 self.texts
+        extra: object 数组，每个片段其余字段的 dict（from_segments(keep_extra=True) 时才有，否则为 None）
+    """
+
+    def __init__(self, start, end, speaker, confidence, text_id, speakers, texts, extra=None):
+        self.start = np.asarray(start, dtype=np.float64)
+        self.end = np.asarray(end, dtype=np.float64)
+        self.speaker = np.asarray(speaker, dtype=np.int32)
+        self.confidence = np.asarray(confidence, dtype=np.float64)
+        self.text_id = np.asarray(text_id, dtype=np.int32)
+        self.speakers = speakers
+        self.texts = texts
+        self.extra = extra
+
+    @classmethod
+    def empty(cls):
+        return cls([], [], [], [], [], [], TextPool())
+
+    @classmethod
+    def from_segments(cls, segments, default_confidence=1.0, keep_extra=False):
+        """
+        从 dict 片段列表构建片段表
+
+        参数:
+            segments: [{"start", "end", "text", "speaker"?, "confidence"?}, ...]
+            default_confidence: 片段没有 confidence 字段时使用的值
+            keep_extra: 是否保留其余字段（如 emotions、words），to_segments 时原样带回
+        """
+        n = len(segments)
+        start = np.empty(n, dtype=np.float64)
+        end = np.empty(n, dtype=np.float64)
+        speaker = np.empty(n, dtype=np.int32)
+        confidence = np.empty(n, dtype=np.float64)
+        text_id = np.empty(n, dtype=np.int32)
+        extra = np.empty(n, dtype=object) if keep_extra else None
+
+        speakers = []
+        speaker_ids = {}
+        texts = TextPool()
+
+        for i, seg in enumerate(segments):
+            start[i] = _to_seconds(seg.get("start", 0))
+            end[i] = _to_seconds(seg.get("end", 0))
+            label = seg.get("speaker")
+            if label is None:
+                speaker[i] = NO_SPEAKER
+            else:
+                sid = speaker_ids.get(label)
+                if sid is None:
+                    sid = len(speakers)
+                    speaker_ids[label] = sid
+                    speakers.append(label)
+                speaker[i] = sid
+            confidence[i] = seg.get("confidence", default_confidence)
+            text_id[i] = texts.intern(seg.get("text", ""))
+            if keep_extra:
+                extra[i] = {k: v for k, v in seg.items() if k not in _COLUMN_KEYS}
+
+        return cls(start, end, speaker, confidence, text_id, speakers, texts, extra)
+
+    def __len__(self):
+        return len(self.start)
+
+    @property
+    def durations(self):
+        return self.end - self.start
+
+    def text(self, i):
+        return self.texts[int(self.text_id[i])]
+
+    def speaker_label(self, i):
+        sid = int(self.speaker[i])
+        return None if sid == NO_SPEAKER else self.speakers[sid]
+
+    def sort_by_start(self):
+        """按开始时间排序（稳定排序），返回新表"""
+        order = np.argsort(self.start, kind="stable")
+        return self.take(order)
+
+    def take(self, indices):
+        """按下标选取片段，返回共享说话人/文本存储的新表"""
+        return SegmentTable(
+            self.start[indices], self.end[indices], self.speaker[indices],
+            self.confidence[indices], self.text_id[indices],
+            self.speakers, self.texts, self.extra[indices] if self.extra is not None else None
+        )
+
+    def speaker_mask(self, label):
+        """某说话人的布尔掩码"""
+        if label not in self.speakers:
+            return np.zeros(len(self), dtype=bool)
+        return self.speaker == self.speakers.index(label)
+
+    def speaker_totals(self):
+        """
+        向量化的说话人统计（一次遍历）
+
+        返回:
+            {speaker: {"segments": int, "duration": float, "words": int}}，按首次出现顺序
+        """
+        if len(self) == 0:
+            return {}
+
+        num = len(self.speakers)
+        labelled = self.speaker != NO_SPEAKER
+        sid = self.speaker[labelled]
+        counts = np.bincount(sid, minlength=num)
+        durations = np.bincount(sid, weights=self.durations[labelled], minlength=num)
+        words = np.bincount(sid, weights=self.texts.word_counts()[self.text_id[labelled]], minlength=num)
+
+        return {
+            self.speakers[i]: {
+                "segments": int(counts[i]),
+                "duration": float(durations[i]),
+                "words": int(words[i])
+            }
+            for i in range(num) if counts[i] > 0
+        }
+
+    def gaps(self):
+        """相邻片段间隔：gaps[i] = start[i+1] - end[i]"""
+        if len(self) < 2:
+            return np.zeros(0, dtype=np.float64)
+        return self.start[1:] - self.end[:-1]
+
+    def gap_stats(self, min_gap=0.0):
+        """间隔分析：超过 min_gap 的停顿数量、总时长和最长停顿"""
+        gaps = self.gaps()
+        pauses = gaps[gaps > min_gap]
+        return {
+            "count": int(len(pauses)),
+            "total": float(pauses.sum()) if len(pauses) else 0.0,
+            "max": float(pauses.max()) if len(pauses) else 0.0,
+            "mean": float(pauses.mean()) if len(pauses) else 0.0
+        }
+
+    def merge_adjacent(self, max_gap=2.0):
+        """
+        合并相邻的同说话人片段（向量化分组）
+
+        参数:
+            max_gap: 最大允许的间隔（秒）
+
+        返回:
+            合并后的新表；文本以空格拼接，置信度和附加字段取组内首个片段
+        """
+        n = len(self)
+        if n < 2:
+            return self
+
+        breaks = (self.speaker[1:] != self.speaker[:-1]) | (self.gaps() > max_gap)
+        firsts = np.concatenate(([0], np.flatnonzero(breaks) + 1))
+        lasts = np.concatenate((firsts[1:] - 1, [n - 1]))
+
+        texts = TextPool()
+        text_id = np.empty(len(firsts), dtype=np.int32)
+        for g, (a, b) in enumerate(zip(firsts, lasts)):
+            if a == b:
+                text_id[g] = texts.intern(self.text(a))
+            else:
+                text_id[g] = texts.intern(" ".join(self.texts[t] for t in self.text_id[a:b + 1]))
+
+        return SegmentTable(
+            self.start[firsts], self.end[lasts], self.speaker[firsts],
+            self.confidence[firsts], text_id, self.speakers, texts,
+            self.extra[firsts] if self.extra is not None else None
+        )
+
+    def to_segments(self, formatter=None, with_confidence=True):
+        """
+        导出为 dict 片段列表（JSON 输出格式）
+
+        参数:
+            formatter: 可选的时间格式化函数，提供时额外输出 start_formatted/end_formatted
+            with_confidence: 是否输出 confidence 字段
+        """
+        segments = []
+        starts = self.start.tolist()
+        ends = self.end.tolist()
+        confidences = self.confidence.tolist()
+        for i in range(len(self)):
+            seg = {
+                "start": starts[i],
+                "end": ends[i],
+                "duration": ends[i] - starts[i],
+                "text": self.text(i),
+            }
+            label = self.speaker_label(i)
+            if label is not None:
+                seg["speaker"] = label
+            if with_confidence:
+                seg["confidence"] = confidences[i]
+            if formatter:
+                seg["start_formatted"] = formatter(starts[i])
+                seg["end_formatted"] = formatter(ends[i])
+            if self.extra is not None:
+                seg.update(self.extra[i])
+            segments.append(seg)
+        return segments
+
+    def nbytes(self):
+        """列数据与文本存储的近似内存占用（字节）"""
+        columns = (self.start.nbytes + self.end.nbytes + self.speaker.nbytes +
+                   self.confidence.nbytes + self.text_id.nbytes)
+        text_bytes = sum(len(t.encode("utf-8")) for t in self.texts._texts)
+        return columns + text_bytes
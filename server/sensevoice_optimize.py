@@ -17,6 +17,14 @@ import torch
 from funasr import AutoModel
 from funasr.utils.postprocess_utils import rich_transcription_postprocess
 from modelscope import snapshot_download
+from tracing import tracer, span, add_trace_arguments, start_tracing, finish_tracing
+import runtime_predictor
+import autotune
+import cpu_allocator
+from deadline import parse_deadline, sensevoice_deadline_generate, load_audio
+import nonspeech
+import metrics
+from job_queue import add_queue_arguments, queue_slot
 
 # 设置缓存目录
 cache_dir = os.path.expanduser("~/.cache/funasr")
@@ -88,93 +96,139 @@ def optimize_model_settings(device):
                 "merge_length_s": 45,
             })
     else:
-        # CPU优化设置
+        # CPU优化设置（有本机调优结果时以其为准）
+        tuned = autotune.engine_settings("sensevoice")
         settings.update({
-            "batch_size_s": 100,
-            "merge_length_s": 15,
+            "batch_size_s": tuned.get("batch_size_s", 100),
+            "merge_length_s": tuned.get("merge_length_s", 15),
+            "ncpu": tuned.get("torch_threads", 4),
         })
 
     return settings
 
-def transcribe_audio_optimized(audio_path, language="auto", use_itn=True):
+def load_optimized_model():
+    """
+    选择设备、优化参数并加载模型
+
+    返回:
+        {"model": AutoModel, "device": str, "settings": dict}
+    """
+    # 清理GPU缓存
+    clear_gpu_cache()
+
+    # 获取最优设备
+    device = get_optimal_gpu()
+    print(f"🎯 选定设备: {device}", file=sys.stderr)
+
+    # 优化设置
+    settings = optimize_model_settings(device)
+    print(f"⚙️ 优化参数: batch_size={settings['batch_size_s']}, merge_length={settings['merge_length_s']}", file=sys.stderr)
+
+    # 下载模型（重定向输出到stderr）
+    import contextlib
+    from io import StringIO
+
+    # 捕获模型下载的stdout输出
+    f = StringIO()
+    with span("model_download"), contextlib.redirect_stdout(f):
+        model_dir = snapshot_download("iic/SenseVoiceSmall", cache_dir=cache_dir)
+
+    # 将下载信息输出到stderr
+    download_info = f.getvalue()
+    if download_info.strip():
+        print(f"📦 模型下载信息: {download_info.strip()}", file=sys.stderr)
+
+    # 初始化模型
+    print(f"🔄 加载SenseVoice模型到{device}...", file=sys.stderr)
+
+    # 设置PyTorch优化
+    if device.startswith("cuda"):
+        torch.backends.cudnn.benchmark = True  # 优化CUDNN性能
+        torch.backends.cudnn.deterministic = False
+
+    # 捕获模型初始化的输出
+    f2 = StringIO()
+    with span("model_load", model="SenseVoiceSmall"), contextlib.redirect_stdout(f2):
+        model = AutoModel(
+            model=model_dir,
+            trust_remote_code=True,
+            remote_code="./model.py",
+            vad_model="fsmn-vad",
+            vad_kwargs={
+                "max_single_segment_time": settings["max_single_segment_time"],
+                "max_end_silence_time": settings["max_end_silence_time"],
+            },
+            device=device,
+            # 添加性能优化参数
+            ncpu=settings.get("ncpu", 4) if device == "cpu" else 1,  # CPU线程数
+        )
+
+    # 将模型初始化信息输出到stderr
+    init_info = f2.getvalue()
+    if init_info.strip():
+        print(f"🏗️ 模型初始化信息: {init_info.strip()}", file=sys.stderr)
+
+    print(f"✅ 模型加载完成", file=sys.stderr)
+
+    return {"model": model, "device": device, "settings": settings}
+
+def transcribe_audio_optimized(audio_path, language="auto", use_itn=True, loaded=None, deadline=None,
+                               skip_music=False):
     """
     优化版音频转录
+
+    参数:
+        loaded: load_optimized_model() 的返回值（None 时现场加载，转录后释放）
+        deadline: 截止时间 (epoch 秒)，设置后分块转录并按需降级
+        skip_music: 转录前预分类并屏蔽音乐 / 噪声，转录后再去掉 SenseVoice 标为 BGM 等事件的片段
     """
     start_time = time.time()
 
     print(f"🚀 SenseVoice优化转录: {os.path.basename(audio_path)}", file=sys.stderr)
 
-    try:
-        # 清理GPU缓存
-        clear_gpu_cache()
+    own_model = loaded is None
 
-        # 获取最优设备
-        device = get_optimal_gpu()
-        print(f"🎯 选定设备: {device}", file=sys.stderr)
-
-        # 优化设置
-        settings = optimize_model_settings(device)
-        print(f"⚙️ 优化参数: batch_size={settings['batch_size_s']}, merge_length={settings['merge_length_s']}", file=sys.stderr)
-
-        # 下载模型（重定向输出到stderr）
-        import contextlib
-        from io import StringIO
-
-        # 捕获模型下载的stdout输出
-        f = StringIO()
-        with contextlib.redirect_stdout(f):
-            model_dir = snapshot_download("iic/SenseVoiceSmall", cache_dir=cache_dir)
-
-        # 将下载信息输出到stderr
-        download_info = f.getvalue()
-        if download_info.strip():
-            print(f"📦 模型下载信息: {download_info.strip()}", file=sys.stderr)
-
-        # 初始化模型
-        print(f"🔄 加载SenseVoice模型到{device}...", file=sys.stderr)
-
-        # 设置PyTorch优化
-        if device.startswith("cuda"):
-            torch.backends.cudnn.benchmark = True  # 优化CUDNN性能
-            torch.backends.cudnn.deterministic = False
-
-        # 捕获模型初始化的输出
-        f2 = StringIO()
-        with contextlib.redirect_stdout(f2):
-            model = AutoModel(
-                model=model_dir,
-                trust_remote_code=True,
-                remote_code="./model.py",
-                vad_model="fsmn-vad",
-                vad_kwargs={
-                    "max_single_segment_time": settings["max_single_segment_time"],
-                    "max_end_silence_time": settings["max_end_silence_time"],
-                },
-                device=device,
-                # 添加性能优化参数
-                ncpu=4 if device == "cpu" else 1,  # CPU线程数
-            )
-
-        # 将模型初始化信息输出到stderr
-        init_info = f2.getvalue()
-        if init_info.strip():
-            print(f"🏗️ 模型初始化信息: {init_info.strip()}", file=sys.stderr)
-
-        print(f"✅ 模型加载完成，开始转录...", file=sys.stderr)
-
-        # 执行转录
-        res = model.generate(
-            input=audio_path,
-            cache={},
-            language=language,
-            use_itn=use_itn,
-            batch_size_s=settings["batch_size_s"],
-            merge_vad=True,
-            merge_length_s=settings["merge_length_s"],
-            pred_timestamp=True,
-            # 性能优化参数
-            disable_pbar=False,  # 显示进度条
-        )
+    try:
+        if own_model:
+            loaded = load_optimized_model()
+        model = loaded["model"]
+        device = loaded["device"]
+        settings = loaded["settings"]
+
+        print(f"🎯 开始转录...", file=sys.stderr)
+
+        # 执行转录（generate() 内部完成音频解码、VAD 切分和批量解码）
+        deadline_report = None
+        nonspeech_report = None
+        audio_input = audio_path
+        if skip_music:
+            with span("audio_decode"):
+                audio = load_audio(audio_path)
+            prediction = runtime_predictor.current_prediction()
+            audio_input, nonspeech_report = nonspeech.detect(audio, prediction["rtf"] if prediction else None)
+        if deadline:
+            prediction = runtime_predictor.current_prediction()
+            with span("decoding"):
+                res, deadline_report = sensevoice_deadline_generate(
+                    model, audio_path, deadline, language, use_itn, settings["batch_size_s"],
+                    merge_length_s=settings["merge_length_s"],
+                    initial_rtf=prediction["rtf"] if prediction else 0.03,
+                    audio=audio_input if skip_music else None
+                )
+        else:
+            with span("decoding"):
+                res = model.generate(
+                    input=audio_input,
+                    cache={},
+                    language=language,
+                    use_itn=use_itn,
+                    batch_size_s=settings["batch_size_s"],
+                    merge_vad=True,
+                    merge_length_s=settings["merge_length_s"],
+                    pred_timestamp=True,
+                    # 性能优化参数
+                    disable_pbar=False,  # 显示进度条
+                )
 
         # 处理结果
         if not res or len(res) == 0:
@@ -184,7 +238,8 @@ def transcribe_audio_optimized(audio_path, language="auto", use_itn=True):
 
         # 后处理
         if use_itn:
-            full_text = rich_transcription_postprocess(full_text)
+            with span("postprocess"):
+                full_text = rich_transcription_postprocess(full_text)
 
         # 提取信息
         detected_language = res[0].get("language", language if language != "auto" else "zh")
@@ -210,6 +265,16 @@ def transcribe_audio_optimized(audio_path, language="auto", use_itn=True):
                 "text": full_text
             }]
 
+        # SenseVoice 自己标出的音乐 / 掌声片段也从转录中去掉
+        if skip_music:
+            segments, event_regions = nonspeech.sensevoice_event_regions(segments)
+            if event_regions:
+                nonspeech_report["sensevoice_events"] = event_regions
+                full_text = "".join(seg["text"] for seg in segments)
+                if use_itn:
+                    full_text = rich_transcription_postprocess(full_text)
+                print(f"🎵 去掉 {len(event_regions)} 个 SenseVoice 标为音乐 / 掌声的片段", file=sys.stderr)
+
         elapsed_time = time.time() - start_time
 
         # 计算性能指标
@@ -219,9 +284,10 @@ def transcribe_audio_optimized(audio_path, language="auto", use_itn=True):
         print(f"🎉 转录完成!", file=sys.stderr)
         print(f"📊 性能统计: {len(full_text)}字符, {elapsed_time:.1f}秒, RTF={rtf:.3f}", file=sys.stderr)
 
-        # 清理内存
-        del model
-        clear_gpu_cache()
+        # 清理内存（复用外部加载的模型时不释放）
+        if own_model:
+            del model, loaded
+            clear_gpu_cache()
 
         result = {
             "success": True,
@@ -246,6 +312,10 @@ def transcribe_audio_optimized(audio_path, language="auto", use_itn=True):
             result["emotion"] = emotion
         if events:
             result["events"] = events
+        if deadline_report:
+            result["deadline"] = deadline_report
+        if nonspeech_report:
+            result["nonspeech"] = nonspeech_report
 
         return result
 
@@ -267,6 +337,10 @@ def main():
                       help='语言设置 (默认: auto)')
     parser.add_argument('--no-itn', action='store_true',
                       help='禁用数字规范化（ITN）')
+    parser.add_argument('--deadline',
+                      help='截止时间 (秒数、15m/2h、HH:MM 或 ISO 时间)，来不及时逐块降低开销')
+    parser.add_argument('--skip-music', action='store_true',
+                      help='转录前按频谱特征标出音乐 / 噪声区域并跳过（片头音乐、插曲、广告 jingle）')
     parser.add_argument('--save-transcript', help='保存转录文本的目录')
     parser.add_argument('--file-prefix', default='sensevoice-opt',
                       help='保存文件的前缀')
@@ -274,8 +348,19 @@ def main():
                       help='播客标题')
     parser.add_argument('--source-url', default='',
                       help='源URL（可选）')
+    add_queue_arguments(parser)
+    add_trace_arguments(parser)
 
     args = parser.parse_args()
+    start_tracing(args)
+
+    deadline = None
+    if args.deadline:
+        try:
+            deadline = parse_deadline(args.deadline)
+        except ValueError as e:
+            print(json.dumps({"success": False, "error": str(e), "text": "", "segments": []}, ensure_ascii=False))
+            sys.exit(1)
 
     # 检查音频文件
     if not os.path.exists(args.audio_file):
@@ -287,12 +372,28 @@ def main():
         }, ensure_ascii=False))
         sys.exit(1)
 
-    # 执行转录
-    result = transcribe_audio_optimized(
-        args.audio_file,
-        language=args.language,
-        use_itn=not args.no_itn
-    )
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    # 经队列运行时先等到名额，再租 CPU 核、开始计时和加载模型（排队时间不占核、不计入耗时）
+    with queue_slot(args, args.audio_file, "sensevoice-optimized", "SenseVoiceSmall", device,
+                    language=args.language) as slot:
+        # 多个转录同时运行时分到互不重叠的 CPU 核
+        cpu_allocator.acquire_for_job("sensevoice-optimized", device=device)
+
+        # 按历史 RTF 预测耗时并输出进度
+        job_start = time.perf_counter()
+        prediction = runtime_predictor.start_job("sensevoice-optimized", args.audio_file,
+                                                 model="SenseVoiceSmall", language=args.language)
+
+        # 执行转录
+        result = transcribe_audio_optimized(
+            args.audio_file,
+            language=args.language,
+            use_itn=not args.no_itn,
+            deadline=deadline,
+            skip_music=args.skip_music
+        )
+        slot.result = result
 
     # 保存文件（复用原脚本的保存函数）
     if args.save_transcript and result["success"]:
@@ -305,6 +406,16 @@ def main():
         )
         result["savedFiles"] = saved_files
 
+    # 分阶段耗时汇总和任务指标
+    trace_summary = finish_tracing(result, args)
+    runtime_predictor.finish_job(result, prediction, time.perf_counter() - job_start,
+                                 load_seconds=tracer.stage_seconds("model_load"))
+    metrics.record_job("sensevoice-optimized", "SenseVoiceSmall", result,
+                       audio_seconds=result.get("stats", {}).get("audio_duration") or (result["segments"][-1]["end"] if result["segments"] else None),
+                       processing_seconds=result.get("duration"))
+    metrics.record_stages("sensevoice-optimized", "SenseVoiceSmall", trace_summary)
+    metrics.flush()
+
     # 输出结果
     print(json.dumps(result, ensure_ascii=False, indent=2))
     sys.exit(0 if result["success"] else 1)
@@ -15,6 +15,15 @@ from pathlib import Path
 from funasr import AutoModel
 from funasr.utils.postprocess_utils import rich_transcription_postprocess
 from modelscope import snapshot_download
+from transcript_search import index_saved_transcript
+from tracing import tracer, span, add_trace_arguments, start_tracing, finish_tracing
+import runtime_predictor
+import autotune
+import cpu_allocator
+from deadline import parse_deadline, sensevoice_deadline_generate, load_audio
+import nonspeech
+from job_queue import add_queue_arguments, queue_slot
+import metrics
 
 # 设置缓存目录
 cache_dir = os.path.expanduser("~/.cache/funasr")
@@ -56,7 +65,70 @@ def format_timestamp(seconds):
     secs = int(seconds % 60)
     return f"{hours:02d}:{minutes:02d}:{secs:02d}"
 
-def transcribe_audio(audio_path, language="auto", use_itn=True, batch_size=64):
+def load_model():
+    """
+    下载并加载 SenseVoice 模型
+
+    返回:
+        (model, device)
+    """
+    # 下载或获取模型路径
+    with span("model_download"):
+        model_dir = download_model()
+
+    # 选择最佳GPU设备
+    import torch
+    if torch.cuda.is_available():
+        # 选择显存最多的GPU
+        gpu_count = torch.cuda.device_count()
+        best_gpu = 0
+        if gpu_count > 1:
+            max_memory = 0
+            for i in range(gpu_count):
+                memory = torch.cuda.get_device_properties(i).total_memory
+                if memory > max_memory:
+                    max_memory = memory
+                    best_gpu = i
+        device = f"cuda:{best_gpu}"
+        print(f"🎯 使用GPU: {torch.cuda.get_device_name(best_gpu)} (设备 {best_gpu})", file=sys.stderr)
+    else:
+        device = "cpu"
+        print(f"⚠️ 未检测到CUDA，使用CPU", file=sys.stderr)
+
+    # 初始化 SenseVoice 模型（优化配置）
+    print(f"🔄 加载 SenseVoice 模型到 {device}...", file=sys.stderr)
+
+    # 捕获模型初始化的输出
+    import contextlib
+    from io import StringIO
+    f2 = StringIO()
+    with span("model_load", model="SenseVoiceSmall"), contextlib.redirect_stdout(f2):
+        model = AutoModel(
+            model=model_dir,
+            trust_remote_code=True,
+            remote_code="./model.py",
+            vad_model="fsmn-vad",
+            vad_kwargs={
+                "max_single_segment_time": 30000,
+                "max_end_silence_time": 800,  # 减少静音检测时间
+            },
+            device=device
+        )
+
+    # 将模型初始化信息输出到stderr
+    init_info = f2.getvalue()
+    if init_info.strip():
+        print(f"🏗️ 模型初始化: {init_info.strip()}", file=sys.stderr)
+
+    # CPU 推理按本机调优结果设置 torch 线程数
+    threads = autotune.apply_torch_threads("sensevoice", device)
+    if threads:
+        print(f"⚙️ 本机调优: torch 线程数 {threads}", file=sys.stderr)
+
+    return model, device
+
+def transcribe_audio(audio_path, language="auto", use_itn=True, batch_size=None, model=None, deadline=None,
+                     skip_music=False):
     """
     使用 SenseVoice 转录音频
 
@@ -64,73 +136,53 @@ def transcribe_audio(audio_path, language="auto", use_itn=True, batch_size=64):
         audio_path: 音频文件路径
         language: 语言设置 (auto/zh/en/yue/ja/ko)
         use_itn: 是否使用数字规范化 (ITN)
-        batch_size: 批处理大小
+        batch_size: 批处理大小（None 时用本机调优结果，没有则为 64）
+        model: 已加载的模型（None 时现场加载，供基准测试等场景复用）
+        deadline: 截止时间 (epoch 秒)，设置后分块转录并按需降级
+        skip_music: 转录前预分类并屏蔽音乐 / 噪声，转录后再去掉 SenseVoice 标为 BGM 等事件的片段
     """
     start_time = time.time()
+    if batch_size is None:
+        batch_size = autotune.engine_settings("sensevoice").get("batch_size_s", 64)
 
     print(f"🎤 开始转录: {os.path.basename(audio_path)}", file=sys.stderr)
     print(f"📊 配置: 语言={language}, ITN={use_itn}, 批大小={batch_size}", file=sys.stderr)
 
     try:
-        # 下载或获取模型路径
-        model_dir = download_model()
-
-        # 选择最佳GPU设备
-        import torch
-        if torch.cuda.is_available():
-            # 选择显存最多的GPU
-            gpu_count = torch.cuda.device_count()
-            best_gpu = 0
-            if gpu_count > 1:
-                max_memory = 0
-                for i in range(gpu_count):
-                    memory = torch.cuda.get_device_properties(i).total_memory
-                    if memory > max_memory:
-                        max_memory = memory
-                        best_gpu = i
-            device = f"cuda:{best_gpu}"
-            print(f"🎯 使用GPU: {torch.cuda.get_device_name(best_gpu)} (设备 {best_gpu})", file=sys.stderr)
-        else:
-            device = "cpu"
-            print(f"⚠️ 未检测到CUDA，使用CPU", file=sys.stderr)
-
-        # 初始化 SenseVoice 模型（优化配置）
-        print(f"🔄 加载 SenseVoice 模型到 {device}...", file=sys.stderr)
-
-        # 捕获模型初始化的输出
-        import contextlib
-        from io import StringIO
-        f2 = StringIO()
-        with contextlib.redirect_stdout(f2):
-            model = AutoModel(
-                model=model_dir,
-                trust_remote_code=True,
-                remote_code="./model.py",
-                vad_model="fsmn-vad",
-                vad_kwargs={
-                    "max_single_segment_time": 30000,
-                    "max_end_silence_time": 800,  # 减少静音检测时间
-                },
-                device=device
-            )
-
-        # 将模型初始化信息输出到stderr
-        init_info = f2.getvalue()
-        if init_info.strip():
-            print(f"🏗️ 模型初始化: {init_info.strip()}", file=sys.stderr)
+        if model is None:
+            model, _ = load_model()
 
         # 执行转录（优化参数）
         print(f"🎯 正在转录...", file=sys.stderr)
-        res = model.generate(
-            input=audio_path,
-            cache={},
-            language=language,
-            use_itn=use_itn,
-            batch_size_s=batch_size,
-            merge_vad=True,
-            merge_length_s=30,  # 增加合并长度，减少片段数量
-            pred_timestamp=True,  # 启用时间戳预测
-        )
+        # generate() 内部完成音频解码、VAD 切分和批量解码
+        deadline_report = None
+        nonspeech_report = None
+        audio_input = audio_path
+        if skip_music:
+            with span("audio_decode"):
+                audio = load_audio(audio_path)
+            prediction = runtime_predictor.current_prediction()
+            audio_input, nonspeech_report = nonspeech.detect(audio, prediction["rtf"] if prediction else None)
+        if deadline:
+            prediction = runtime_predictor.current_prediction()
+            with span("decoding"):
+                res, deadline_report = sensevoice_deadline_generate(
+                    model, audio_path, deadline, language, use_itn, batch_size, merge_length_s=30,
+                    initial_rtf=prediction["rtf"] if prediction else 0.03,
+                    audio=audio_input if skip_music else None
+                )
+        else:
+            with span("decoding"):
+                res = model.generate(
+                    input=audio_input,
+                    cache={},
+                    language=language,
+                    use_itn=use_itn,
+                    batch_size_s=batch_size,
+                    merge_vad=True,
+                    merge_length_s=30,  # 增加合并长度，减少片段数量
+                    pred_timestamp=True,  # 启用时间戳预测
+                )
 
         # 处理结果
         if not res or len(res) == 0:
@@ -141,7 +193,8 @@ def transcribe_audio(audio_path, language="auto", use_itn=True, batch_size=64):
 
         # 应用后处理（如果需要）
         if use_itn:
-            full_text = rich_transcription_postprocess(full_text)
+            with span("postprocess"):
+                full_text = rich_transcription_postprocess(full_text)
 
         # 检测语言
         detected_language = res[0].get("language", language if language != "auto" else "zh")
@@ -170,6 +223,16 @@ def transcribe_audio(audio_path, language="auto", use_itn=True, batch_size=64):
                 "text": full_text
             }]
 
+        # SenseVoice 自己标出的音乐 / 掌声片段也从转录中去掉
+        if skip_music:
+            segments, event_regions = nonspeech.sensevoice_event_regions(segments)
+            if event_regions:
+                nonspeech_report["sensevoice_events"] = event_regions
+                full_text = "".join(seg["text"] for seg in segments)
+                if use_itn:
+                    full_text = rich_transcription_postprocess(full_text)
+                print(f"🎵 去掉 {len(event_regions)} 个 SenseVoice 标为音乐 / 掌声的片段", file=sys.stderr)
+
         elapsed_time = time.time() - start_time
         print(f"✅ 转录完成: {len(full_text)} 字符, 耗时 {elapsed_time:.2f} 秒", file=sys.stderr)
 
@@ -194,6 +257,10 @@ def transcribe_audio(audio_path, language="auto", use_itn=True, batch_size=64):
             result["emotion"] = emotion
         if events:
             result["events"] = events
+        if deadline_report:
+            result["deadline"] = deadline_report
+        if nonspeech_report:
+            result["nonspeech"] = nonspeech_report
 
         return result
 
@@ -216,7 +283,7 @@ def save_transcript_files(result, output_dir, file_prefix, podcast_title):
 
         # 保存纯文本文件
         txt_file = os.path.join(output_dir, f"{file_prefix}_transcript.txt")
-        with open(txt_file, 'w', encoding='utf-8') as f:
+        with span("file_write"), open(txt_file, 'w', encoding='utf-8') as f:
             f.write(result["text"])
         saved_files.append(txt_file)
         print(f"💾 保存文本: {txt_file}", file=sys.stderr)
@@ -239,14 +306,14 @@ def save_transcript_files(result, output_dir, file_prefix, podcast_title):
         if "events" in result:
             json_data["events"] = result["events"]
 
-        with open(json_file, 'w', encoding='utf-8') as f:
+        with span("file_write"), open(json_file, 'w', encoding='utf-8') as f:
             json.dump(json_data, f, ensure_ascii=False, indent=2)
         saved_files.append(json_file)
         print(f"💾 保存JSON: {json_file}", file=sys.stderr)
 
         # 保存 Markdown 格式（带时间戳）
         md_file = os.path.join(output_dir, f"{file_prefix}_transcript.md")
-        with open(md_file, 'w', encoding='utf-8') as f:
+        with span("file_write"), open(md_file, 'w', encoding='utf-8') as f:
             f.write(f"# {podcast_title}\n\n")
             f.write(f"**模型**: {result.get('model', 'SenseVoiceSmall')}  \n")
             f.write(f"**语言**: {result.get('language', 'auto')}  \n")
@@ -270,6 +337,10 @@ def save_transcript_files(result, output_dir, file_prefix, podcast_title):
         saved_files.append(md_file)
         print(f"💾 保存Markdown: {md_file}", file=sys.stderr)
 
+        # 增量更新全文检索索引
+        with span("search_index"):
+            index_saved_transcript(json_file, result["segments"], title=podcast_title, save_dir=output_dir)
+
         return saved_files
 
     except Exception as e:
@@ -284,8 +355,12 @@ def main():
                       help='语言设置 (默认: auto)')
     parser.add_argument('--no-itn', action='store_true',
                       help='禁用数字规范化（ITN）')
-    parser.add_argument('--batch-size', type=int, default=64,
-                      help='批处理大小（默认: 64）')
+    parser.add_argument('--batch-size', type=int,
+                      help='批处理大小（默认: 本机调优结果或 64）')
+    parser.add_argument('--deadline',
+                      help='截止时间 (秒数、15m/2h、HH:MM 或 ISO 时间)，来不及时逐块降低开销')
+    parser.add_argument('--skip-music', action='store_true',
+                      help='转录前按频谱特征标出音乐 / 噪声区域并跳过（片头音乐、插曲、广告 jingle）')
     parser.add_argument('--save-transcript', help='保存转录文本的目录')
     parser.add_argument('--file-prefix', default='sensevoice',
                       help='保存文件的前缀')
@@ -293,8 +368,19 @@ def main():
                       help='播客标题')
     parser.add_argument('--source-url', default='',
                       help='源URL（可选）')
+    add_queue_arguments(parser)
+    add_trace_arguments(parser)
 
     args = parser.parse_args()
+    start_tracing(args)
+
+    deadline = None
+    if args.deadline:
+        try:
+            deadline = parse_deadline(args.deadline)
+        except ValueError as e:
+            print(json.dumps({"success": False, "error": str(e), "text": "", "segments": []}, ensure_ascii=False))
+            sys.exit(1)
 
     # 检查音频文件是否存在
     if not os.path.exists(args.audio_file):
@@ -306,13 +392,30 @@ def main():
         }, ensure_ascii=False))
         sys.exit(1)
 
-    # 执行转录
-    result = transcribe_audio(
-        args.audio_file,
-        language=args.language,
-        use_itn=not args.no_itn,
-        batch_size=args.batch_size
-    )
+    import torch
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    # 经队列运行时先等到名额，再租 CPU 核、开始计时和加载模型（排队时间不占核、不计入耗时）
+    with queue_slot(args, args.audio_file, "sensevoice", "SenseVoiceSmall", device,
+                    language=args.language) as slot:
+        # 多个转录同时运行时分到互不重叠的 CPU 核
+        cpu_allocator.acquire_for_job("sensevoice", device=device)
+
+        # 按历史 RTF 预测耗时并输出进度
+        job_start = time.perf_counter()
+        prediction = runtime_predictor.start_job("sensevoice", args.audio_file, model="SenseVoiceSmall",
+                                                 language=args.language)
+
+        # 执行转录
+        result = transcribe_audio(
+            args.audio_file,
+            language=args.language,
+            use_itn=not args.no_itn,
+            batch_size=args.batch_size,
+            deadline=deadline,
+            skip_music=args.skip_music
+        )
+        slot.result = result
 
     # 保存文件（如果指定）
     if args.save_transcript and result["success"]:
@@ -324,6 +427,16 @@ def main():
         )
         result["savedFiles"] = saved_files
 
+    # 分阶段耗时汇总和任务指标
+    trace_summary = finish_tracing(result, args)
+    runtime_predictor.finish_job(result, prediction, time.perf_counter() - job_start,
+                                 load_seconds=tracer.stage_seconds("model_load"))
+    metrics.record_job("sensevoice", "SenseVoiceSmall", result,
+                       audio_seconds=(result["segments"][-1]["end"] if result["segments"] else None),
+                       processing_seconds=result.get("duration"))
+    metrics.record_stages("sensevoice", "SenseVoiceSmall", trace_summary)
+    metrics.flush()
+
     # 输出结果（JSON格式）
     print(json.dumps(result, ensure_ascii=False, indent=2))
 
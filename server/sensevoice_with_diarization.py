@@ -15,6 +15,14 @@ import subprocess
 import tempfile
 from pathlib import Path
 
+from segment_table import SegmentTable
+from alignment_service import parse_time
+from transcript_search import index_saved_transcript
+from tracing import tracer, span, add_trace_arguments, start_tracing, finish_tracing
+import runtime_predictor
+import metrics
+from job_queue import add_queue_arguments, queue_slot
+
 def run_command(command, description=""):
     """运行命令并返回结果"""
     try:
@@ -36,7 +44,7 @@ def run_command(command, description=""):
         return None
 
 def sensevoice_with_diarization(audio_path, language="auto", num_speakers=None,
-                              save_dir=None, file_prefix="combined"):
+                              save_dir=None, file_prefix="combined", skip_music=False):
     """
     使用 SenseVoice + PyAnnote 组合进行转录和说话人分离
 
@@ -46,6 +54,7 @@ def sensevoice_with_diarization(audio_path, language="auto", num_speakers=None,
         num_speakers: 指定说话人数量（None表示自动检测）
         save_dir: 保存目录
         file_prefix: 文件前缀
+        skip_music: 转录和说话人分离都跳过音乐 / 噪声区域
     """
     start_time = time.time()
 
@@ -59,7 +68,8 @@ def sensevoice_with_diarization(audio_path, language="auto", num_speakers=None,
 
         # 使用ffmpeg转换格式
         convert_cmd = f'ffmpeg -i "{audio_path}" -ar 16000 -ac 1 "{wav_path}" -y'
-        convert_result = subprocess.run(convert_cmd, shell=True, capture_output=True, text=True)
+        with span("audio_convert"):
+            convert_result = subprocess.run(convert_cmd, shell=True, capture_output=True, text=True)
 
         if convert_result.returncode != 0:
             print(f"❌ 音频格式转换失败: {convert_result.stderr}", file=sys.stderr)
@@ -88,8 +98,11 @@ def sensevoice_with_diarization(audio_path, language="auto", num_speakers=None,
             f'--save-transcript "{temp_dir}" '
             f'--file-prefix "sensevoice_temp"'
         )
+        if skip_music:
+            sensevoice_cmd += ' --skip-music'
 
-        sensevoice_output = run_command(sensevoice_cmd, "SenseVoice 转录")
+        with span("sensevoice"):
+            sensevoice_output = run_command(sensevoice_cmd, "SenseVoice 转录")
         if not sensevoice_output:
             raise Exception("SenseVoice 转录失败")
 
@@ -111,8 +124,11 @@ def sensevoice_with_diarization(audio_path, language="auto", num_speakers=None,
 
         if num_speakers:
             diarization_cmd += f' --num-speakers {num_speakers}'
+        if skip_music:
+            diarization_cmd += ' --skip-music'
 
-        diarization_output = run_command(diarization_cmd, "PyAnnote 说话人分离")
+        with span("diarization"):
+            diarization_output = run_command(diarization_cmd, "PyAnnote 说话人分离")
         if not diarization_output:
             raise Exception("PyAnnote 说话人分离失败")
 
@@ -145,7 +161,8 @@ def sensevoice_with_diarization(audio_path, language="auto", num_speakers=None,
             f'--output "{aligned_json}"'
         )
 
-        alignment_output = run_command(alignment_cmd, "结果对齐")
+        with span("alignment"):
+            alignment_output = run_command(alignment_cmd, "结果对齐")
         if not alignment_output:
             raise Exception("结果对齐失败")
 
@@ -157,6 +174,7 @@ def sensevoice_with_diarization(audio_path, language="auto", num_speakers=None,
 
         # 构建最终结果
         elapsed_time = time.time() - start_time
+        aligned_table = SegmentTable.from_segments(aligned_result["segments"])
 
         final_result = {
             "success": True,
@@ -175,18 +193,29 @@ def sensevoice_with_diarization(audio_path, language="auto", num_speakers=None,
                 "processing_time": elapsed_time,
                 "sensevoice_time": sensevoice_result.get("duration", 0),
                 "diarization_time": diarization_result.get("processing_time", 0),
-                "alignment_time": elapsed_time - sensevoice_result.get("duration", 0) - diarization_result.get("processing_time", 0),
+                "alignment_time": tracer.stage_seconds("alignment"),
+                "speaker_stats": aligned_table.speaker_totals(),
+                "pauses": aligned_table.gap_stats(min_gap=0.0),
                 "audio_file": os.path.basename(audio_path)
+            },
+            # 子进程各自的分阶段耗时
+            "child_traces": {
+                "sensevoice": sensevoice_result.get("trace"),
+                "diarization": diarization_result.get("trace"),
+                "alignment": aligned_result.get("trace")
             }
         }
 
+        if sensevoice_result.get("nonspeech"):
+            final_result["nonspeech"] = sensevoice_result["nonspeech"]
+
         # 保存到指定目录
         if save_dir:
             os.makedirs(save_dir, exist_ok=True)
 
             # 保存JSON结果
             json_file = os.path.join(save_dir, f"{file_prefix}_combined.json")
-            with open(json_file, 'w', encoding='utf-8') as f:
+            with span("file_write"), open(json_file, 'w', encoding='utf-8') as f:
                 json.dump(final_result, f, ensure_ascii=False, indent=2)
 
             # 保存Markdown结果
@@ -195,6 +224,10 @@ def sensevoice_with_diarization(audio_path, language="auto", num_speakers=None,
 
             final_result["savedFiles"] = [json_file, md_file]
 
+            # 增量更新全文检索索引
+            with span("search_index"):
+                index_saved_transcript(json_file, final_result["segments"], save_dir=save_dir)
+
         # 清理临时文件
         import shutil
         try:
@@ -272,8 +305,13 @@ def main():
                       help='播客标题')
     parser.add_argument('--source-url', default='',
                       help='源URL（可选）')
+    parser.add_argument('--skip-music', action='store_true',
+                      help='转录和说话人分离前标出音乐 / 噪声区域并跳过（片头音乐、插曲、广告 jingle）')
+    add_queue_arguments(parser)
+    add_trace_arguments(parser)
 
     args = parser.parse_args()
+    start_tracing(args)
 
     # 检查音频文件是否存在
     if not os.path.exists(args.audio_file):
@@ -286,14 +324,32 @@ def main():
         }, ensure_ascii=False))
         sys.exit(1)
 
-    # 执行组合转录
-    result = sensevoice_with_diarization(
-        args.audio_file,
-        language=args.language,
-        num_speakers=args.num_speakers,
-        save_dir=args.save_transcript,
-        file_prefix=args.file_prefix
-    )
+    # 经队列运行时整个组合占一个名额（子进程不再排队），等到名额后才开始计时
+    with queue_slot(args, args.audio_file, "combined", "SenseVoice+PyAnnote", language=args.language) as slot:
+        # 按历史 RTF 预测耗时并输出进度（子进程的进度行被 run_command 捕获，不会混入）
+        job_start = time.perf_counter()
+        prediction = runtime_predictor.start_job("combined", args.audio_file, model="SenseVoice+PyAnnote",
+                                                 language=args.language)
+
+        # 执行组合转录
+        result = sensevoice_with_diarization(
+            args.audio_file,
+            language=args.language,
+            num_speakers=args.num_speakers,
+            save_dir=args.save_transcript,
+            file_prefix=args.file_prefix,
+            skip_music=args.skip_music
+        )
+        slot.result = result
+
+    # 分阶段耗时汇总和任务指标（子进程各自记录本阶段指标）
+    trace_summary = finish_tracing(result, args)
+    runtime_predictor.finish_job(result, prediction, time.perf_counter() - job_start)
+    metrics.record_job("combined", "SenseVoice+PyAnnote", result,
+                       audio_seconds=parse_time(result["segments"][-1]["end"]) if result["segments"] else None,
+                       processing_seconds=result.get("duration"))
+    metrics.record_stages("combined", "SenseVoice+PyAnnote", trace_summary)
+    metrics.flush()
 
     # 输出结果（JSON格式）
     print(json.dumps(result, ensure_ascii=False, indent=2))
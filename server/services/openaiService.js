@@ -160,6 +160,8 @@ ${summary}${sourceSection}
 
 // 本地Whisper转录配置
 const WHISPER_MODEL = process.env.WHISPER_MODEL || 'base'; // Whisper模型大小
+// 正在运行的本地转录数（ENGINE_POLICY=adaptive 时交给 engine_policy.py 估算争用）
+let activeTranscriptions = 0;
 console.log(`🎤 转录模式: 本地Faster-Whisper`);
 
 // 初始化OpenAI客户端（用于总结和文本优化）
@@ -202,11 +204,34 @@ async function processAudioWithOpenAI(audioFiles, shouldSummarize = false, outpu
             console.log(`🎵 单文件处理模式`);
 
             // 选择转录引擎：SenseVoice 或 Whisper
-            const transcriptionEngine = process.env.TRANSCRIPTION_ENGINE || 'whisper';
+            let transcriptionEngine = process.env.TRANSCRIPTION_ENGINE || 'whisper';
+            let whisperModel = process.env.WHISPER_MODEL || 'base';
+            let beamSize = null;
             const venvPython = path.join(__dirname, '..', '..', 'venv', 'bin', 'python');
             const filePrefix = generateFilePrefix('raw', podcastTitle || 'Untitled');
             let command;
 
+            // 自适应策略：按音频时长、语言和当前并发选择引擎、模型和 beam（需要说话人分离时保持静态配置）
+            if (process.env.ENGINE_POLICY === 'adaptive' && transcriptionEngine !== 'sensevoice_diarization') {
+                try {
+                    const policyScript = path.join(__dirname, '..', 'engine_policy.py');
+                    const languageArg = audioLanguage && audioLanguage !== 'auto' ? ` --language ${audioLanguage}` : '';
+                    const { stdout: policyOutput } = await execAsync(
+                        `"${venvPython}" "${policyScript}" decide "${files[0]}" --inflight ${activeTranscriptions}${languageArg}${sessionId ? ` --job-id "${sessionId}"` : ''}`,
+                        { cwd: path.join(__dirname, '..'), timeout: 30000 }
+                    );
+                    const decision = JSON.parse(policyOutput);
+                    transcriptionEngine = decision.engine;
+                    if (decision.engine === 'whisper') {
+                        whisperModel = decision.model;
+                        beamSize = decision.beam_size;
+                    }
+                    console.log(`🧭 引擎选择: ${decision.label} ${decision.model}${beamSize ? ` beam ${beamSize}` : ''} (${decision.reason})`);
+                } catch (error) {
+                    console.warn(`⚠️ 引擎选择失败，使用静态配置: ${error.message}`);
+                }
+            }
+
             if (transcriptionEngine === 'sensevoice') {
                 // 使用 SenseVoice 转录（更快）
                 const useOptimize = process.env.SENSEVOICE_OPTIMIZE !== 'false'; // 默认使用优化版本
@@ -243,7 +268,11 @@ async function processAudioWithOpenAI(audioFiles, shouldSummarize = false, outpu
                     ? path.join(__dirname, '..', 'enhanced_whisper_transcribe.py')
                     : path.join(__dirname, '..', 'whisper_transcribe.py');
 
-                command = `"${venvPython}" "${scriptPath}" "${files[0]}" --model ${process.env.WHISPER_MODEL || 'base'} --save-transcript "${tempDir}" --file-prefix "${filePrefix}" --podcast-title "${podcastTitle || 'Untitled'}" --source-url "${originalUrl || ''}"`;
+                command = `"${venvPython}" "${scriptPath}" "${files[0]}" --model ${whisperModel} --save-transcript "${tempDir}" --file-prefix "${filePrefix}" --podcast-title "${podcastTitle || 'Untitled'}" --source-url "${originalUrl || ''}"`;
+
+                if (beamSize) {
+                    command += ` --beam-size ${beamSize}`;
+                }
 
                 if (useEnhanced) {
                     command += ' --enhanced'; // 启用增强功能
@@ -261,28 +290,66 @@ async function processAudioWithOpenAI(audioFiles, shouldSummarize = false, outpu
                 progressInterval = setInterval(() => {
                     if (currentProgress < 45) {
                         currentProgress += 1;
-                        const engineName = process.env.TRANSCRIPTION_ENGINE === 'sensevoice' ? 'SenseVoice' : 'Whisper';
+                        const engineName = transcriptionEngine === 'sensevoice' ? 'SenseVoice' : 'Whisper';
                         const stageText = outputLanguage === 'zh' ? `${engineName} 正在转录音频...` : `${engineName} transcribing audio...`;
                         sendProgressCallback(sessionId, currentProgress, 'transcribing', stageText);
                     }
-                }, process.env.TRANSCRIPTION_ENGINE === 'sensevoice' ? 3000 : 8000); // SenseVoice更快，进度更新更频繁
+                }, transcriptionEngine === 'sensevoice' ? 3000 : 8000); // SenseVoice更快，进度更新更频繁
             }
             
+            activeTranscriptions += 1;
             try {
-                const { stdout, stderr } = await execAsync(command, {
+                const transcription = execAsync(command, {
                     cwd: path.join(__dirname, '..'),
+                    // 默认经本地任务队列排队（按并发上限和公平份额），TRANSCRIBE_QUEUE=false 关闭
+                    env: { ...process.env, TRANSCRIBE_QUEUE: process.env.TRANSCRIBE_QUEUE || 'true' },
                     maxBuffer: 1024 * 1024 * 20,
                     timeout: 3600000 // 1小时超时，支持长音频
                 });
+
+                // Python 端按历史 RTF 预测耗时并输出 "PROGRESS {json}" 行，收到后用真实进度替换模拟器
+                if (sendProgressCallback && sessionId && transcription.child && transcription.child.stderr) {
+                    let pending = '';
+                    transcription.child.stderr.on('data', (chunk) => {
+                        pending += chunk;
+                        const lines = pending.split('\n');
+                        pending = lines.pop();
+                        for (const line of lines) {
+                            if (!line.startsWith('PROGRESS ')) continue;
+                            let update;
+                            try {
+                                update = JSON.parse(line.slice('PROGRESS '.length));
+                            } catch (e) {
+                                continue;
+                            }
+                            if (progressInterval) {
+                                clearInterval(progressInterval);
+                                progressInterval = null;
+                            }
+                            if (typeof update.percent !== 'number') continue;
+                            // 转录阶段占总进度的 30% → 45%
+                            const mapped = Math.min(45, Math.max(currentProgress, Math.round(30 + update.percent * 0.15)));
+                            if (mapped === currentProgress && update.stage !== 'started') continue;
+                            currentProgress = mapped;
+                            const eta = typeof update.eta_s === 'number' ? Math.round(update.eta_s) : null;
+                            const stageText = outputLanguage === 'zh'
+                                ? `正在转录音频...${eta !== null ? ` 预计剩余 ${eta} 秒` : ''}`
+                                : `Transcribing audio...${eta !== null ? ` about ${eta}s remaining` : ''}`;
+                            sendProgressCallback(sessionId, currentProgress, 'transcribing', stageText);
+                        }
+                    });
+                }
+
+                const { stdout, stderr } = await transcription;
                 
                 // 清除进度模拟器
                 if (progressInterval) {
                     clearInterval(progressInterval);
-                    // 转录完成，跳到45%
-                    if (sendProgressCallback && sessionId) {
-                        const stageText = outputLanguage === 'zh' ? '转录完成，正在处理...' : 'Transcription complete, processing...';
-                        sendProgressCallback(sessionId, 45, 'processing', stageText);
-                    }
+                }
+                // 转录完成，跳到45%
+                if (sendProgressCallback && sessionId) {
+                    const stageText = outputLanguage === 'zh' ? '转录完成，正在处理...' : 'Transcription complete, processing...';
+                    sendProgressCallback(sessionId, 45, 'processing', stageText);
                 }
                 
                 if (stderr && stderr.trim()) {
@@ -309,6 +376,8 @@ async function processAudioWithOpenAI(audioFiles, shouldSummarize = false, outpu
                     clearInterval(progressInterval);
                 }
                 throw error;
+            } finally {
+                activeTranscriptions -= 1;
             }
             
             // 获取检测到的语言信息
@@ -780,6 +849,7 @@ async function transcribeAudioLocal(audioPath, language = null, shouldSaveDirect
         // 执行转录脚本
         const { stdout, stderr } = await execAsync(command, {
             cwd: path.join(__dirname, '..'),
+            env: { ...process.env, TRANSCRIBE_QUEUE: process.env.TRANSCRIBE_QUEUE || 'true' },
             maxBuffer: 1024 * 1024 * 20,
             timeout: 1200000
         });
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+合成测试音频
+生成确定性的类语音、多人对话、音乐垫底等 WAV 片段，供基准测试和离线验证使用
+"""
+
+import os
+import sys
+import wave
+import argparse
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+# 元音共振峰 (F1, F2)
+_VOWELS = [(730, 1090), (270, 2290), (300, 870), (530, 1840), (570, 840), (440, 1020)]
+
+
+def _syllable(rng, f0, sample_rate):
+    """一个音节：带共振峰包络的谐波 + 汉宁包络"""
+    duration = rng.uniform(0.12, 0.28)
+    n = int(duration * sample_rate)
+    t = np.arange(n) / sample_rate
+    f1, f2 = _VOWELS[rng.integers(len(_VOWELS))]
+
+    # 声调：线性滑动的基频
+    contour = f0 * (1 + rng.uniform(-0.15, 0.15) * t / duration)
+    phase = 2 * np.pi * np.cumsum(contour) / sample_rate
+
+    harmonics = np.arange(1, 16)
+    freqs = f0 * harmonics
+    gains = (np.exp(-((freqs - f1) / 200.0) ** 2) + 0.6 * np.exp(-((freqs - f2) / 300.0) ** 2) + 0.05) / harmonics
+    signal = (gains[:, None] * np.sin(harmonics[:, None] * phase[None, :])).sum(axis=0)
+    return signal * np.hanning(n)
+
+
+def speech_like(duration, seed=0, f0_range=(110, 180), sample_rate=SAMPLE_RATE):
+    """
+    类语音信号：音节组成词，词组成短句，短句之间有停顿
+
+    参数:
+        duration: 时长（秒）
+        f0_range: 基频范围，区分不同“说话人”
+    """
+    rng = np.random.default_rng(seed)
+    total = int(duration * sample_rate)
+    out = np.zeros(total, dtype=np.float32)
+    pos = int(rng.uniform(0.2, 0.5) * sample_rate)
+    f0 = rng.uniform(*f0_range)
+
+    while pos < total:
+        for _ in range(rng.integers(2, 6)):  # 一个词
+            syl = _syllable(rng, f0 * rng.uniform(0.9, 1.1), sample_rate)
+            end = min(pos + len(syl), total)
+            out[pos:end] += syl[:end - pos]
+            pos = end + int(0.03 * sample_rate)
+            if pos >= total:
+                break
+        pos += int(rng.uniform(0.05, 0.15) * sample_rate)
+        if rng.random() < 0.25:  # 短句之间的停顿
+            pos += int(rng.uniform(0.3, 1.0) * sample_rate)
+
+    out += rng.normal(0, 0.003, total).astype(np.float32)
+    return _normalize(out)
+
+
+def conversation(duration, speakers=2, seed=0, turn_range=(3.0, 12.0), sample_rate=SAMPLE_RATE):
+    """
+    多人轮流说话的类语音信号
+
+    返回:
+        (samples, turns)，turns 为 [(start, end, speaker), ...]
+    """
+    rng = np.random.default_rng(seed)
+    voice_ranges = [(95, 130), (180, 240), (140, 170), (250, 300)]
+    total = int(duration * sample_rate)
+    out = np.zeros(total, dtype=np.float32)
+    turns = []
+    pos = 0.0
+    speaker = 0
+    while pos < duration:
+        length = min(rng.uniform(*turn_range), duration - pos)
+        chunk = speech_like(length, seed=int(rng.integers(1 << 30)),
+                            f0_range=voice_ranges[speaker % len(voice_ranges)], sample_rate=sample_rate)
+        start = int(pos * sample_rate)
+        out[start:start + len(chunk)] = chunk[:total - start]
+        turns.append((round(pos, 3), round(pos + length, 3), f"SPEAKER_{speaker:02d}"))
+        pos += length + rng.uniform(0.2, 0.8)
+        speaker = (speaker + int(rng.integers(1, speakers))) % speakers if speakers > 1 else 0
+    return _normalize(out), turns
+
+
+def music_bed(duration, seed=0, bpm=110, sample_rate=SAMPLE_RATE):
+    """音乐垫底：持续和弦 + 节拍噪声"""
+    rng = np.random.default_rng(seed)
+    total = int(duration * sample_rate)
+    t = np.arange(total) / sample_rate
+    out = np.zeros(total, dtype=np.float32)
+
+    chord_len = 60.0 / bpm * 4
+    roots = [220.0, 174.6, 261.6, 196.0]
+    for i in range(int(np.ceil(duration / chord_len))):
+        a, b = int(i * chord_len * sample_rate), min(int((i + 1) * chord_len * sample_rate), total)
+        root = roots[i % len(roots)]
+        seg_t = t[a:b]
+        for ratio in (1.0, 1.25, 1.5, 2.0):
+            for k in (1, 2, 3):
+                out[a:b] += (0.3 / k) * np.sin(2 * np.pi * root * ratio * k * seg_t)
+
+    beat = int(60.0 / bpm * sample_rate)
+    hit_len = int(0.05 * sample_rate)
+    hit = rng.normal(0, 1.0, hit_len) * np.exp(-np.linspace(0, 8, hit_len))
+    for pos in range(0, total - hit_len, beat):
+        out[pos:pos + hit_len] += hit.astype(np.float32)
+    return _normalize(out)
+
+
+def silence(duration, sample_rate=SAMPLE_RATE, noise=0.001, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.normal(0, noise, int(duration * sample_rate)).astype(np.float32)
+
+
+def _normalize(samples, peak=0.8):
+    top = float(np.abs(samples).max()) if len(samples) else 0.0
+    return (samples * (peak / top)).astype(np.float32) if top > 0 else samples.astype(np.float32)
+
+
+def write_wav(path, samples, sample_rate=SAMPLE_RATE):
+    """写 16-bit 单声道 WAV"""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    with wave.open(str(path), 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm.tobytes())
+    return str(path)
+
+
+def build_corpus(output_dir, scale=1.0):
+    """
+    生成固定的基准测试语料（已存在则直接复用）
+
+    参数:
+        scale: 时长倍数（1.0 约为 30s/120s/90s/60s）
+
+    返回:
+        [{"name", "path", "duration", "kind", "turns"?}, ...]
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    specs = [
+        ("monologue_30s", "speech", 30),
+        ("dialogue_120s", "dialogue", 120),
+        ("music_intro_90s", "music+speech", 90),
+        ("silence_gaps_60s", "sparse", 60),
+    ]
+    corpus = []
+    for name, kind, seconds in specs:
+        duration = round(seconds * scale, 3)
+        suffix = "" if scale == 1.0 else f"_x{scale:g}"
+        path = os.path.join(output_dir, f"{name}{suffix}.wav")
+        clip = {"name": name, "path": path, "duration": duration, "kind": kind}
+        turns = None
+
+        if kind == "speech":
+            samples = speech_like(duration, seed=1)
+        elif kind == "dialogue":
+            samples, turns = conversation(duration, speakers=2, seed=2)
+        elif kind == "music+speech":
+            intro = duration / 3
+            samples = np.concatenate([music_bed(intro, seed=3), speech_like(duration - intro, seed=4)])
+        else:
+            parts = []
+            for i in range(6):
+                parts.append(speech_like(duration / 12, seed=10 + i))
+                parts.append(silence(duration / 12, seed=20 + i))
+            samples = np.concatenate(parts)
+
+        if turns:
+            clip["turns"] = turns
+        if not os.path.exists(path):
+            write_wav(path, samples)
+        corpus.append(clip)
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成合成测试音频')
+    parser.add_argument('output_dir', help='输出目录')
+    parser.add_argument('--scale', type=float, default=1.0, help='时长倍数')
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.output_dir, args.scale)
+    for clip in corpus:
+        print(f"🎵 {clip['name']}: {clip['duration']}秒 -> {clip['path']}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+轻量级分阶段追踪
+用上下文管理器记录模型加载、音频解码、解码、繁简转换、说话人分离、对齐、写文件等阶段，
+导出 Chrome trace / Perfetto JSON，并在结果中附带分阶段耗时汇总；可选采样分析器和内存分析器
+"""
+
+import sys
+import os
+import json
+import time
+import threading
+import contextlib
+from collections import Counter
+
+
+class Tracer:
+    """
+    阶段追踪器（线程安全，进程内全局一个实例）
+
+    事件使用 Chrome trace 格式：完整事件 "X"、计数器 "C"、瞬时事件 "i"；
+    分阶段汇总始终按阶段名累计（内存占用与运行时长无关），逐条事件只在 recording 时保留（--trace）
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        self.recording = False
+        self.events = []
+        self.stages = {}  # 阶段名 -> {"count", "total_s", "max_s"}
+        self._lock = threading.Lock()
+        self.listeners = []
+        self.active = {}  # 线程ID -> 当前打开的阶段栈
+        self.thread_names = {}
+
+    def _now_us(self):
+        return (time.perf_counter() - self.origin) * 1e6
+
+    def add_listener(self, listener):
+        """注册阶段边界回调 listener(phase, name)，phase 为 "begin" / "end"（供内存分析等复用）"""
+        self.listeners.append(listener)
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        """记录一个阶段"""
+        tid = threading.get_ident()
+        self.thread_names.setdefault(tid, threading.current_thread().name)
+        stack = self.active.setdefault(tid, [])
+        stack.append(name)
+        for listener in self.listeners:
+            listener("begin", name)
+        start = self._now_us()
+        try:
+            yield
+        finally:
+            end = self._now_us()
+            stack.pop()
+            seconds = (end - start) / 1e6
+            with self._lock:
+                item = self.stages.setdefault(name, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+                item["count"] += 1
+                item["total_s"] += seconds
+                item["max_s"] = max(item["max_s"], seconds)
+            if self.recording:
+                event = {"name": name, "cat": "stage", "ph": "X", "ts": start, "dur": end - start,
+                         "pid": self.pid, "tid": tid}
+                if args:
+                    event["args"] = args
+                self.events.append(event)
+            for listener in self.listeners:
+                listener("end", name)
+
+    def counter(self, name, **values):
+        """记录计数器（如内存占用）"""
+        if self.recording:
+            self.events.append({"name": name, "ph": "C", "ts": self._now_us(), "pid": self.pid, "args": values})
+
+    def instant(self, name, **args):
+        if self.recording:
+            self.events.append({"name": name, "ph": "i", "s": "p", "ts": self._now_us(), "pid": self.pid,
+                                "tid": threading.get_ident(), "args": args})
+
+    def current_stage(self, tid):
+        stack = self.active.get(tid)
+        return stack[-1] if stack else None
+
+    def summary(self):
+        """
+        分阶段耗时汇总（嵌套阶段各自计入）
+
+        返回:
+            {"wall_s": float, "stages": {name: {"count", "total_s", "max_s"}}}
+        """
+        with self._lock:
+            stages = {name: {"count": item["count"], "total_s": round(item["total_s"], 4),
+                             "max_s": round(item["max_s"], 4)}
+                      for name, item in self.stages.items()}
+        return {"wall_s": round(self._now_us() / 1e6, 4), "stages": stages}
+
+    def stage_seconds(self, name):
+        """某阶段累计耗时（秒）"""
+        return self.summary()["stages"].get(name, {}).get("total_s", 0.0)
+
+    def chrome_trace(self):
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+            for tid, name in self.thread_names.items()
+        ]
+        metadata.append({"name": "process_name", "ph": "M", "pid": self.pid,
+                         "args": {"name": os.path.basename(sys.argv[0]) or "python"}})
+        return {"traceEvents": metadata + list(self.events), "displayTimeUnit": "ms"}
+
+    def export_chrome(self, path):
+        """导出为 Chrome trace JSON（chrome://tracing 或 ui.perfetto.dev 打开）"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f, ensure_ascii=False)
+        print(f"🧭 追踪文件已保存: {path}", file=sys.stderr)
+
+
+class SamplingProfiler:
+    """
+    采样分析器：后台线程定期采集各线程调用栈，按调用栈和所处阶段计数
+
+    参数:
+        tracer: 用于把样本归属到当前阶段
+        interval: 采样间隔（秒）
+    """
+
+    def __init__(self, tracer, interval=0.005, max_depth=24):
+        self.tracer = tracer
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.by_stage = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        own = threading.get_ident()
+        for tid, frame in sys._current_frames().items():
+            if tid == own:
+                continue
+            names = []
+            while frame is not None and len(names) < self.max_depth:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+            self.by_stage[self.tracer.current_stage(tid) or "(无阶段)"] += 1
+            self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def report(self, top_n=15):
+        total = max(self.samples, 1)
+        return {
+            "interval_s": self.interval,
+            "samples": self.samples,
+            "by_stage": {stage: round(count / total, 4) for stage, count in self.by_stage.most_common()},
+            "top_stacks": [
+                {"stack": stack, "samples": count, "fraction": round(count / total, 4)}
+                for stack, count in self.stacks.most_common(top_n)
+            ]
+        }
+
+    def export_folded(self, path):
+        """导出折叠调用栈（flamegraph.pl / speedscope 可用）"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+# 进程内全局追踪器
+tracer = Tracer()
+span = tracer.span
+_profiler = None
+_memory_profiler = None
+
+
+def add_trace_arguments(parser):
+    """为入口脚本添加统一的追踪参数"""
+    parser.add_argument('--trace', help='导出 Chrome trace / Perfetto JSON 到指定路径')
+    parser.add_argument('--profile-sampling', action='store_true',
+                      help='启用采样分析器，热点调用栈写入结果的 trace.profile')
+    parser.add_argument('--profile-memory', action='store_true',
+                      help='记录各阶段边界的常驻内存和峰值内存，写入结果的 memory 字段')
+    parser.add_argument('--memory-top', type=int, default=0,
+                      help='配合 --profile-memory，用 tracemalloc 记录每个阶段的前 N 个分配热点 (默认: 0 关闭)')
+    parser.add_argument('--memory-interval', type=float, default=30.0,
+                      help='配合 --profile-memory，后台内存采样间隔秒数 (默认: 30)')
+
+
+def start_tracing(args):
+    """按命令行参数启动可选的采样分析器和内存分析器；指定 --trace 时才保留逐条事件"""
+    global _profiler, _memory_profiler
+    if getattr(args, 'trace', None):
+        tracer.recording = True
+    if getattr(args, 'profile_sampling', False) and _profiler is None:
+        _profiler = SamplingProfiler(tracer).start()
+        print(f"🔬 采样分析器已启动 (间隔 {_profiler.interval * 1000:.0f}ms)", file=sys.stderr)
+    if getattr(args, 'profile_memory', False) and _memory_profiler is None:
+        from memory_profile import MemoryProfiler
+        _memory_profiler = MemoryProfiler(tracer, top_n=args.memory_top,
+                                          sample_interval=args.memory_interval).start()
+        print(f"🧠 内存分析已启动 (tracemalloc: {'前 %d 项' % args.memory_top if args.memory_top else '关闭'})",
+              file=sys.stderr)
+
+
+def finish_tracing(result, args):
+    """把分阶段汇总（及内存报告）写入结果对象，并按需导出追踪文件"""
+    global _profiler, _memory_profiler
+    summary = tracer.summary()
+    if _memory_profiler is not None:
+        _memory_profiler.stop()
+        memory = _memory_profiler.report()
+        _memory_profiler = None
+        if isinstance(result, dict):
+            result["memory"] = memory
+        growth = memory["growth_mb_per_hour"]
+        print(f"🧠 峰值内存: {memory['peak_rss_mb']:.0f}MB, 结束时: {memory['end_rss_mb']:.0f}MB"
+              + (f", 增长 {growth:+.0f}MB/小时" if growth is not None else ""), file=sys.stderr)
+    if _profiler is not None:
+        _profiler.stop()
+        summary["profile"] = _profiler.report()
+        if getattr(args, 'trace', None):
+            _profiler.export_folded(os.path.splitext(args.trace)[0] + ".folded")
+        _profiler = None
+    if isinstance(result, dict):
+        result["trace"] = summary
+    if getattr(args, 'trace', None):
+        tracer.export_chrome(args.trace)
+    return summary
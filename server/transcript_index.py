@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+转录索引查询服务
+基于对齐结果构建隐式区间树，支持按时间点、时间范围和说话人的对数级查询
+"""
+
+import sys
+import json
+import argparse
+
+import numpy as np
+
+from segment_table import SegmentTable
+
+# 子树规模小于 2^(k+1) 时直接线性扫描
+_SCAN_LEVEL = 3
+
+
+class IntervalTree:
+    """
+    隐式增强区间树（cgranges 结构）
+
+    区间按 start 排序存放在数组中，数组下标即为平衡二叉树的中序位置，
+    每个节点额外记录子树内的最大 end，查询复杂度 O(log n + k)
+    """
+
+    def __init__(self, starts, ends):
+        starts = np.asarray(starts, dtype=np.float64)
+        ends = np.asarray(ends, dtype=np.float64)
+        order = np.argsort(starts, kind="stable")
+
+        self.order = order.tolist()
+        self.starts = starts[order].tolist()
+        self.ends = ends[order].tolist()
+        self.max_ends = list(self.ends)
+        self.max_level = self._build()
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _build(self):
+        n = len(self.starts)
+        if n == 0:
+            return -1
+
+        max_ends = self.max_ends
+        last_i = 0
+        last = 0.0
+        for i in range(0, n, 2):
+            last_i = i
+            last = max_ends[i]
+
+        k = 1
+        while (1 << k) <= n:
+            x = 1 << (k - 1)
+            for i in range((x << 1) - 1, n, x << 2):
+                el = max_ends[i - x]
+                er = max_ends[i + x] if i + x < n else last
+                max_ends[i] = max(max_ends[i], el, er)
+            last_i = last_i + x if (last_i >> k) & 1 else last_i - x
+            if last_i < n and max_ends[last_i] > last:
+                last = max_ends[last_i]
+            k += 1
+
+        return k - 1
+
+    def overlap(self, start, end):
+        """
+        查询与 [start, end) 重叠的区间
+
+        返回:
+            原始输入下标列表（按 start 升序）
+        """
+        n = len(self.starts)
+        if n == 0:
+            return []
+
+        starts, ends, max_ends = self.starts, self.ends, self.max_ends
+        hits = []
+        stack = [(self.max_level, (1 << self.max_level) - 1, False)]
+        while stack:
+            k, x, left_done = stack.pop()
+            if k <= _SCAN_LEVEL:
+                i = x >> k << k
+                i1 = min(i + (1 << (k + 1)) - 1, n)
+                while i < i1 and starts[i] < end:
+                    if start < ends[i]:
+                        hits.append(i)
+                    i += 1
+            elif not left_done:
+                y = x - (1 << (k - 1))
+                stack.append((k, x, True))
+                if y >= n or max_ends[y] > start:
+                    stack.append((k - 1, y, False))
+            elif x < n and starts[x] < end:
+                if start < ends[x]:
+                    hits.append(x)
+                stack.append((k - 1, x + (1 << (k - 1)), False))
+
+        hits.sort()
+        return [self.order[i] for i in hits]
+
+    def stab(self, t):
+        """查询包含时间点 t 的区间（start <= t < end）"""
+        return self.overlap(t, float(np.nextafter(t, np.inf)))
+
+
+class TranscriptIndex:
+    """
+    对齐转录结果的索引对象
+
+    参数:
+        table: SegmentTable 片段表
+    """
+
+    def __init__(self, table):
+        self.table = table.sort_by_start()
+        self.tree = IntervalTree(self.table.start, self.table.end)
+        self.speaker_trees = {}
+        self.speaker_rows = {}
+        for sid, label in enumerate(self.table.speakers):
+            rows = np.flatnonzero(self.table.speaker == sid)
+            self.speaker_rows[label] = rows
+            self.speaker_trees[label] = IntervalTree(self.table.start[rows], self.table.end[rows])
+
+    @classmethod
+    def from_result(cls, result):
+        """从对齐结果 dict（含 segments 列表）构建索引"""
+        return cls(SegmentTable.from_segments(result.get("segments", [])))
+
+    @classmethod
+    def load(cls, filepath):
+        """从保存的结果文件（*_combined.json / 对齐结果 / 说话人分离结果）加载"""
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return cls.from_result(json.load(f))
+
+    @property
+    def speakers(self):
+        return list(self.table.speakers)
+
+    def _row(self, i):
+        table = self.table
+        return {
+            "start": float(table.start[i]),
+            "end": float(table.end[i]),
+            "speaker": table.speaker_label(i),
+            "text": table.text(i)
+        }
+
+    def segments_at(self, t):
+        """时间点 t 上的片段"""
+        return [self._row(i) for i in self.tree.stab(t)]
+
+    def speaker_at(self, t):
+        """时间点 t 正在说话的说话人（可能有重叠说话）"""
+        labels = []
+        for i in self.tree.stab(t):
+            label = self.table.speaker_label(i)
+            if label is not None and label not in labels:
+                labels.append(label)
+        return labels
+
+    def segments_between(self, start, end):
+        """与 [start, end) 重叠的片段"""
+        return [self._row(i) for i in self.tree.overlap(start, end)]
+
+    def text_between(self, start, end, separator=" "):
+        """[start, end) 之间的文本"""
+        return separator.join(self.table.text(i) for i in self.tree.overlap(start, end)).strip()
+
+    def turns(self, speaker, start=None, end=None):
+        """
+        某说话人的全部发言（可选限定时间范围）
+        """
+        rows = self.speaker_rows.get(speaker)
+        if rows is None:
+            return []
+        if start is None and end is None:
+            hits = range(len(rows))
+        else:
+            hits = self.speaker_trees[speaker].overlap(
+                -np.inf if start is None else start,
+                np.inf if end is None else end
+            )
+        return [self._row(int(rows[j])) for j in hits]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='转录结果索引查询工具')
+    parser.add_argument('result_file', help='对齐结果JSON文件路径')
+    parser.add_argument('--at', type=float, help='查询某时间点（秒）的说话人与片段')
+    parser.add_argument('--range', nargs=2, type=float, metavar=('START', 'END'),
+                      help='查询时间范围内的文本')
+    parser.add_argument('--speaker', help='查询某说话人的全部发言（可与 --range 组合）')
+
+    args = parser.parse_args()
+
+    try:
+        index = TranscriptIndex.load(args.result_file)
+    except Exception as e:
+        print(json.dumps({"success": False, "error": f"无法加载结果文件: {e}"}, ensure_ascii=False))
+        sys.exit(1)
+
+    print(f"📇 已索引 {len(index.table)} 个片段, {len(index.speakers)} 个说话人", file=sys.stderr)
+
+    result = {"success": True, "speakers": index.speakers}
+    start, end = args.range if args.range else (None, None)
+
+    if args.at is not None:
+        result["at"] = {
+            "time": args.at,
+            "speakers": index.speaker_at(args.at),
+            "segments": index.segments_at(args.at)
+        }
+    if args.speaker:
+        result["turns"] = index.turns(args.speaker, start, end)
+    elif args.range:
+        result["range"] = {
+            "start": start,
+            "end": end,
+            "text": index.text_between(start, end),
+            "segments": index.segments_between(start, end)
+        }
+
+    print(json.dumps(result, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
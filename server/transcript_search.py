@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+转录全文检索索引
+基于 SQLite FTS5 的片段级索引，保存转录文件时增量更新，支持中日韩文本检索
+"""
+
+import sys
+import os
+import re
+import json
+import time
+import argparse
+import sqlite3
+from pathlib import Path
+
+INDEX_FILENAME = "transcript_index.db"
+
+# 中日韩字符逐字切分，其他文字按词切分
+_CJK_RANGES = (
+    "぀-ヿ"      # 日文假名
+    "㐀-䶿"      # 扩展A
+    "一-鿿"      # 基本汉字
+    "가-힯"      # 韩文
+    "豈-﫿"      # 兼容汉字
+)
+_TOKEN_RE = re.compile(f"[{_CJK_RANGES}]|[^\\W_]+", re.UNICODE)
+
+_MD_TIMESTAMP_RE = re.compile(r"^\*\*\[([\d:.]+)(?:\s*-\s*([\d:.]+))?\]\*\*\s*(.*)$")
+_MD_SPEAKER_RE = re.compile(r"^##\s+(.+)$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS episodes (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    title TEXT,
+    source_url TEXT,
+    mtime REAL,
+    indexed_at REAL,
+    first_rowid INTEGER,
+    last_rowid INTEGER
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS segments USING fts5(
+    tokens,
+    text UNINDEXED,
+    episode_id UNINDEXED,
+    start UNINDEXED,
+    end UNINDEXED,
+    speaker UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+
+def tokenize(text):
+    """将文本切分为索引用的词元：中日韩逐字，其他按词（小写）"""
+    return [t.lower() for t in _TOKEN_RE.findall(text or "")]
+
+
+def default_index_path(save_dir=None):
+    """索引文件位置：TRANSCRIPT_INDEX_DB 环境变量优先，否则放在保存目录下"""
+    env_path = os.getenv("TRANSCRIPT_INDEX_DB")
+    if env_path:
+        return env_path
+    return os.path.join(save_dir or ".", INDEX_FILENAME)
+
+
+def _parse_clock(value):
+    """解析 HH:MM:SS / MM:SS 时间"""
+    seconds = 0.0
+    for part in value.split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+class TranscriptSearchIndex:
+    """
+    转录检索索引
+
+    参数:
+        db_path: SQLite 数据库路径
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        # 旧版本建的库没有片段行号范围列
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(episodes)")}
+        for column in ("first_rowid", "last_rowid"):
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE episodes ADD COLUMN {column} INTEGER")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def index_episode(self, path, segments, title=None, source_url=None, mtime=None):
+        """
+        写入（或替换）一个转录文件的片段
+
+        参数:
+            path: 转录文件路径（作为剧集唯一键）
+            segments: [{"start", "end", "text", "speaker"?}, ...]
+            title: 播客标题
+            source_url: 来源链接
+
+        返回:
+            写入的片段数量
+        """
+        path = str(Path(path).absolute())
+        if mtime is None:
+            mtime = os.path.getmtime(path) if os.path.exists(path) else time.time()
+
+        count = 0
+
+        def rows(episode_id, first_rowid):
+            # 逐行交给 executemany，长节目不必先把全部片段攒成列表；行号连续，删除时按范围删
+            nonlocal count
+            for seg in segments:
+                text = (seg.get("text") or "").strip()
+                if not text:
+                    continue
+                yield (
+                    first_rowid + count, " ".join(tokenize(text)), text, episode_id,
+                    seg.get("start"), seg.get("end"), seg.get("speaker")
+                )
+                count += 1
+
+        with self.conn:
+            existing = self.conn.execute(
+                "SELECT id, first_rowid, last_rowid FROM episodes WHERE path = ?", (path,)
+            ).fetchone()
+            if existing:
+                episode_id = existing[0]
+                self._delete_segments(*existing)
+                self.conn.execute(
+                    "UPDATE episodes SET title = ?, source_url = ?, mtime = ?, indexed_at = ? WHERE id = ?",
+                    (title, source_url, mtime, time.time(), episode_id)
+                )
+            else:
+                cur = self.conn.execute(
+                    "INSERT INTO episodes (path, title, source_url, mtime, indexed_at) VALUES (?, ?, ?, ?, ?)",
+                    (path, title, source_url, mtime, time.time())
+                )
+                episode_id = cur.lastrowid
+
+            last = self.conn.execute("SELECT rowid FROM segments ORDER BY rowid DESC LIMIT 1").fetchone()
+            first_rowid = (last[0] if last else 0) + 1
+            self.conn.executemany(
+                "INSERT INTO segments (rowid, tokens, text, episode_id, start, end, speaker) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows(episode_id, first_rowid)
+            )
+            self.conn.execute("UPDATE episodes SET first_rowid = ?, last_rowid = ? WHERE id = ?",
+                              (first_rowid, first_rowid + count - 1, episode_id))
+
+        return count
+
+    def _delete_segments(self, episode_id, first_rowid, last_rowid):
+        """按行号范围删除一个剧集的片段（FTS5 按 rowid 定位，不扫描整个索引）"""
+        if first_rowid is None:
+            # 旧版本建的索引没有行号范围：按 episode_id 全表扫描一次，重建后就有范围了
+            self.conn.execute("DELETE FROM segments WHERE episode_id = ?", (episode_id,))
+        else:
+            self.conn.execute("DELETE FROM segments WHERE rowid BETWEEN ? AND ?", (first_rowid, last_rowid))
+
+    def remove_episode(self, path):
+        path = str(Path(path).absolute())
+        with self.conn:
+            row = self.conn.execute(
+                "SELECT id, first_rowid, last_rowid FROM episodes WHERE path = ?", (path,)
+            ).fetchone()
+            if row:
+                self._delete_segments(*row)
+                self.conn.execute("DELETE FROM episodes WHERE id = ?", (row[0],))
+
+    def is_current(self, path):
+        """文件自上次索引后是否未修改"""
+        path = str(Path(path).absolute())
+        row = self.conn.execute("SELECT mtime FROM episodes WHERE path = ?", (path,)).fetchone()
+        return bool(row) and row[0] is not None and row[0] >= os.path.getmtime(path)
+
+    @staticmethod
+    def build_match_query(query):
+        """
+        将用户查询转换为 FTS5 MATCH 表达式：
+        每个词（或引号内短语）切分为词元后作为一个短语，多个短语之间为 AND
+        """
+        parts = re.findall(r'"([^"]+)"|(\S+)', query)
+        phrases = []
+        for quoted, bare in parts:
+            tokens = tokenize(quoted or bare)
+            if tokens:
+                phrases.append('"' + " ".join(tokens) + '"')
+        return " AND ".join(phrases)
+
+    def search(self, query, limit=50, speaker=None):
+        """
+        检索片段
+
+        返回:
+            [{"path", "title", "start", "end", "speaker", "text"}, ...]，按相关度排序
+        """
+        match = self.build_match_query(query)
+        if not match:
+            return []
+
+        sql = (
+            "SELECT e.path, e.title, s.start, s.end, s.speaker, s.text "
+            "FROM segments s JOIN episodes e ON e.id = s.episode_id "
+            "WHERE segments MATCH ?"
+        )
+        params = [match]
+        if speaker:
+            sql += " AND s.speaker = ?"
+            params.append(speaker)
+        sql += " ORDER BY bm25(segments) LIMIT ?"
+        params.append(limit)
+
+        return [
+            {"path": path, "title": title, "start": start, "end": end, "speaker": spk, "text": text}
+            for path, title, start, end, spk, text in self.conn.execute(sql, params)
+        ]
+
+    def stats(self):
+        episodes = self.conn.execute("SELECT COUNT(*) FROM episodes").fetchone()[0]
+        segments = self.conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+        return {"episodes": episodes, "segments": segments}
+
+
+def index_saved_transcript(file_path, segments, title=None, source_url=None, save_dir=None):
+    """
+    保存转录文件后的增量索引钩子，失败只打印警告，不影响保存流程
+    """
+    if os.getenv("TRANSCRIPT_INDEX_DISABLE") == "1":
+        return False
+    try:
+        db_path = default_index_path(save_dir or os.path.dirname(str(file_path)))
+        with TranscriptSearchIndex(db_path) as index:
+            count = index.index_episode(file_path, segments, title=title, source_url=source_url)
+        print(f"🔎 已更新检索索引: {count} 个片段 -> {db_path}", file=sys.stderr)
+        return True
+    except Exception as e:
+        print(f"⚠️ 更新检索索引失败: {e}", file=sys.stderr)
+        return False
+
+
+def load_transcript_file(file_path):
+    """
+    读取已保存的转录文件，返回 (title, segments)
+
+    支持 *_transcript.json / *_combined.json 以及带时间戳的 Markdown
+    """
+    path = Path(file_path)
+    if path.suffix == ".json":
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        segments = data.get("segments") or []
+        if not segments and data.get("text"):
+            segments = [{"start": 0, "end": None, "text": data["text"]}]
+        title = data.get("title") or data.get("audio_file")
+        return title, segments
+
+    title = None
+    segments = []
+    speaker = None
+    plain_lines = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if title is None and line.startswith("# "):
+                title = line[2:].replace("📝", "").strip()
+                continue
+            match = _MD_TIMESTAMP_RE.match(line)
+            if match:
+                start, end, text = match.groups()
+                segments.append({
+                    "start": _parse_clock(start),
+                    "end": _parse_clock(end) if end else None,
+                    "text": re.sub(r"^(\[[^\]]+\]\s*)+", "", text),
+                    "speaker": speaker
+                })
+                continue
+            match = _MD_SPEAKER_RE.match(line)
+            if match:
+                speaker = match.group(1).strip()
+                continue
+            if not line.startswith(("**", "---")):
+                plain_lines.append(line)
+
+    if not segments and plain_lines:
+        segments = [{"start": 0, "end": None, "text": " ".join(plain_lines)}]
+    return title, segments
+
+
+def backfill(index, root_dir, force=False):
+    """
+    批量索引目录下已有的转录文件；同前缀同时有 JSON 和 Markdown 时只索引 JSON
+    """
+    root = Path(root_dir)
+    json_files = list(root.rglob("*_transcript.json")) + list(root.rglob("*_combined.json"))
+    json_prefixes = {str(p)[:-len(".json")] for p in json_files}
+    md_files = [
+        p for p in root.rglob("*transcript*.md")
+        if str(p)[:-len(".md")] not in json_prefixes
+    ]
+
+    indexed = skipped = failed = 0
+    for path in json_files + md_files:
+        if not force and index.is_current(path):
+            skipped += 1
+            continue
+        try:
+            title, segments = load_transcript_file(path)
+            index.index_episode(path, segments, title=title)
+            indexed += 1
+        except Exception as e:
+            failed += 1
+            print(f"⚠️ 索引失败 {path}: {e}", file=sys.stderr)
+
+    print(f"✅ 回填完成: 新索引 {indexed} 个, 跳过 {skipped} 个, 失败 {failed} 个", file=sys.stderr)
+    return {"indexed": indexed, "skipped": skipped, "failed": failed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='转录全文检索工具')
+    parser.add_argument('--db', help=f'索引数据库路径 (默认: $TRANSCRIPT_INDEX_DB 或 ./{INDEX_FILENAME})')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    search_parser = subparsers.add_parser('search', help='检索关键词或短语')
+    search_parser.add_argument('query', help='查询（引号内为短语）')
+    search_parser.add_argument('--limit', type=int, default=50, help='最多返回条数')
+    search_parser.add_argument('--speaker', help='只检索某说话人')
+
+    backfill_parser = subparsers.add_parser('backfill', help='批量索引已有的转录文件')
+    backfill_parser.add_argument('directory', help='转录文件目录')
+    backfill_parser.add_argument('--force', action='store_true', help='忽略修改时间，全部重建')
+
+    index_parser = subparsers.add_parser('index', help='索引单个转录文件')
+    index_parser.add_argument('file', help='转录文件路径')
+
+    subparsers.add_parser('stats', help='索引统计')
+
+    args = parser.parse_args()
+    db_path = args.db or default_index_path(
+        args.directory if args.command == 'backfill' else None
+    )
+
+    with TranscriptSearchIndex(db_path) as index:
+        if args.command == 'search':
+            start = time.perf_counter()
+            hits = index.search(args.query, limit=args.limit, speaker=args.speaker)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            print(f"🔎 {len(hits)} 条结果, 耗时 {elapsed_ms:.1f} 毫秒", file=sys.stderr)
+            result = {"success": True, "query": args.query, "hits": hits, "elapsed_ms": round(elapsed_ms, 2)}
+        elif args.command == 'backfill':
+            result = {"success": True, **backfill(index, args.directory, force=args.force)}
+        elif args.command == 'index':
+            title, segments = load_transcript_file(args.file)
+            result = {"success": True, "segments": index.index_episode(args.file, segments, title=title)}
+        else:
+            result = {"success": True, **index.stats()}
+
+    print(json.dumps(result, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,29 @@ import json
 import argparse
 import time
 from pathlib import Path
-from faster_whisper import WhisperModel
+from transcript_search import index_saved_transcript
+from hotword_engine import HotwordEngine
+from postprocess_pipeline import PostProcessor
+from tracing import tracer, span, add_trace_arguments, start_tracing, finish_tracing
+import runtime_predictor
+import autotune
+import cpu_allocator
+from deadline import parse_deadline, whisper_deadline_transcribe
+from loop_guard import guarded_transcribe, guard_segments
+from redecode import confidence_fields, redecode_low_confidence, REDECODE_MODEL, LOGPROB_THRESHOLD
+import constant_memory
+import nonspeech
+from fingerprint import RecurringSegments, source_feed
+from job_queue import add_queue_arguments, queue_slot, track_slot
+import feature_cache
+import metrics
+
+# 模型库（只用保存/格式化函数时可以不安装）
+try:
+    from faster_whisper import WhisperModel, decode_audio
+except ImportError:
+    WhisperModel = None
+    decode_audio = None
 
 # 繁简转换
 try:
@@ -20,6 +42,16 @@ except ImportError:
     HAS_OPENCC = False
     print("⚠️ 繁简转换库未安装，跳过转换", file=sys.stderr)
 
+# 解码参数（基准测试和评估工具复用）
+DECODE_OPTIONS = dict(
+    vad_filter=True,  # 启用语音活动检测
+    vad_parameters=dict(min_silence_duration_ms=500),
+    # 添加其他参数来优化中文转录
+    beam_size=5,
+    best_of=5,
+    temperature=0.0  # 使用确定性解码
+)
+
 class LocalWhisperTranscriber:
     def __init__(self, model_size="base", device="cpu", compute_type="int8"):
         """
@@ -30,9 +62,16 @@ class LocalWhisperTranscriber:
             device: 设备类型 ("cpu", "cuda")
             compute_type: 计算类型 ("int8", "int16", "float16", "float32")
         """
+        if WhisperModel is None:
+            raise ImportError("faster-whisper 未安装，无法加载模型")
         print(f"🔄 正在加载Whisper模型: {model_size}", file=sys.stderr)
-        self.model = WhisperModel(model_size, device=device, compute_type=compute_type)
+        with span("model_load", model=model_size):
+            self.model = feature_cache.install(WhisperModel(model_size, device=device, compute_type=compute_type,
+                                                            **autotune.whisper_model_kwargs(device)))
         print(f"✅ 模型加载完成", file=sys.stderr)
+        self.model_size = model_size
+        self.device = device
+        self.compute_type = compute_type
         
         # 初始化繁简转换器
         if HAS_OPENCC:
@@ -57,19 +96,35 @@ class LocalWhisperTranscriber:
                 return text
         return text
 
-    def transcribe_file(self, audio_path, language=None):
+    def load_extra_model(self, model_size):
+        """按需加载另一个尺寸的模型（截止时间降级、低置信度二次解码；同设备、同精度）"""
+        if model_size == self.model_size and self.model is not None:
+            return self.model
+        print(f"🔄 加载模型: {model_size}", file=sys.stderr)
+        return feature_cache.install(WhisperModel(model_size, device=self.device, compute_type=self.compute_type,
+                                                  **autotune.whisper_model_kwargs(self.device)))
+
+    def transcribe_file(self, audio_path, language=None, hotwords=None, deadline=None, redecode=None,
+                        skip_music=False, feed=None, decode_options=None):
         """
         转录单个音频文件
         
         Args:
             audio_path: 音频文件路径
             language: 指定语言 (None为自动检测)
+            hotwords: 热词词库 (None为不使用; 主题名/词库名/"auto")
+            deadline: 截止时间 (epoch 秒)，设置后分块解码并按需降级
+            redecode: 低置信度片段二次解码设置 {"model", "beam_size", "logprob_threshold"}（None 为不做）
+            skip_music: 解码前预分类，音乐 / 噪声区域不送进解码器
+            feed: 节目名，设置后与该节目往期的片头 / 片尾 / 重复口播比对，重合部分复用往期转录
+            decode_options: 覆盖默认解码参数（如队列按积压选的 beam_size）
         
         Returns:
             dict: 转录结果
         """
         try:
             print(f"🎤 开始转录: {audio_path}", file=sys.stderr)
+            options = {**DECODE_OPTIONS, **(decode_options or {})}
             start_time = time.time()
             
             # 执行转录 - 自动检测语言，但中文统一使用简体
@@ -80,39 +135,81 @@ class LocalWhisperTranscriber:
             elif language is None:
                 print(f"🌐 自动检测语言模式", file=sys.stderr)
             
-            segments, info = self.model.transcribe(
-                audio_path, 
-                language=language,
-                vad_filter=True,  # 启用语音活动检测
-                vad_parameters=dict(min_silence_duration_ms=500),
-                # 添加其他参数来优化中文转录
-                beam_size=5,
-                best_of=5,
-                temperature=0.0  # 使用确定性解码
-            )
+            # 热词提示
+            hotword_engine = None
+            hotword_domain = None
+            prompt_kwargs = {}
+            if hotwords:
+                hotword_engine = HotwordEngine.load()
+                hotword_domain = hotword_engine.resolve_domain(hotwords, Path(audio_path).stem)
+                prompt_kwargs = hotword_engine.decoder_kwargs(hotword_domain, language)
+                print(f"🔥 使用热词库: {hotword_domain}", file=sys.stderr)
             
-            # 收集所有片段
-            transcript_segments = []
-            full_text = ""
+            with span("audio_decode"):
+                audio = feature_cache.load_audio(audio_path, decode_audio)
+            
+            # 与往期重合的片段（在屏蔽音乐之前比对，片头音乐也是指纹）
+            recurring = RecurringSegments(feed, audio, audio_path) if feed else None
+            
+            # 音乐 / 噪声区域置零，VAD 整段跳过
+            nonspeech_report = None
+            if skip_music:
+                prediction = runtime_predictor.current_prediction()
+                audio, nonspeech_report = nonspeech.detect(audio, prediction["rtf"] if prediction else None)
+            if recurring:
+                audio = recurring.mask(audio)
+            
+            # transcribe() 内完成 VAD、特征提取和语言检测，返回的生成器才开始解码
+            if deadline:
+                prediction = runtime_predictor.current_prediction()
+                segments, info = whisper_deadline_transcribe(
+                    self, audio, deadline, options, self.model_size, language, prompt_kwargs,
+                    initial_rtf=prediction["rtf"] if prediction else None,
+                    load_model=self.load_extra_model
+                )
+                segments = guard_segments(segments, info)
+            else:
+                with span("vad_language_detection"):
+                    segments, info = guarded_transcribe(self.model, audio, language, options, prompt_kwargs)
             
             # 根据检测的语言决定是否需要繁简转换
             need_conversion = info.language in ['zh', 'chinese'] and original_language is None
             if need_conversion:
                 print(f"🔄 检测到中文内容，将进行繁简转换", file=sys.stderr)
             
-            for segment in segments:
-                text = segment.text.strip()
-                # 如果是自动检测到的中文，进行繁简转换
-                if need_conversion:
-                    text = self.convert_to_simplified(text)
-                
-                segment_dict = {
-                    "start": segment.start,
-                    "end": segment.end,
-                    "text": text
-                }
-                transcript_segments.append(segment_dict)
-                full_text += text + " "
+            # 收集所有片段：解码的同时在后台线程批量做繁简转换
+            processor = PostProcessor(self.converter)
+            with span("decoding"):
+                transcript_segments = processor.run(
+                    (
+                        {"start": segment.start, "end": segment.end, "text": segment.text.strip(),
+                         **confidence_fields(segment)}
+                        for segment in track_slot(runtime_predictor.track_progress(segments, info.duration))
+                    ),
+                    need_conversion=need_conversion
+                )
+            
+            # 低置信度片段用更大的模型 / beam 二次解码
+            redecode_report = None
+            if redecode:
+                transcript_segments, redecode_report = redecode_low_confidence(
+                    transcript_segments, audio, self.load_extra_model,
+                    redecode.get("model") or REDECODE_MODEL.get(self.model_size, "medium"),
+                    language=info.language, options=options, beam_size=redecode.get("beam_size", 5),
+                    postprocess=lambda batch: processor.process_batch(batch, need_conversion),
+                    logprob_threshold=redecode.get("logprob_threshold", LOGPROB_THRESHOLD)
+                )
+            # 拼入复用的往期片段（在二次解码之后，复用部分不会被重新解码）
+            if recurring:
+                transcript_segments = recurring.splice(transcript_segments)
+            full_text = " ".join(seg["text"] for seg in transcript_segments)
+            
+            # 热词规范化（单次扫描）
+            hotword_summary = None
+            if hotword_engine:
+                with span("hotword_normalization"):
+                    hotword_summary = hotword_engine.normalize_segments(transcript_segments, hotword_domain)
+                full_text = " ".join(seg["text"] for seg in transcript_segments)
             
             duration = time.time() - start_time
             
@@ -126,6 +223,20 @@ class LocalWhisperTranscriber:
                 "duration": info.duration,
                 "processing_time": round(duration, 2)
             }
+            if hotword_engine:
+                result["hotword_domain"] = hotword_domain
+                result["hotwords"] = hotword_summary
+            if deadline:
+                result["deadline"] = info.deadline
+            if redecode_report:
+                result["redecode"] = redecode_report
+            if info.loop_guard and info.loop_guard["spans"]:
+                result["loop_guard"] = info.loop_guard
+            if nonspeech_report:
+                result["nonspeech"] = nonspeech_report
+            if recurring:
+                result["recurring"] = recurring.report(nonspeech_report["regions"] if nonspeech_report else None)
+                recurring.store(transcript_segments)
             
             print(f"✅ 转录完成: {duration:.1f}秒", file=sys.stderr)
             return result
@@ -140,13 +251,108 @@ class LocalWhisperTranscriber:
             print(f"❌ 转录失败: {e}", file=sys.stderr)
             return error_result
 
-    def transcribe_multiple(self, audio_paths, language=None):
+    def transcribe_file_constant_memory(self, audio_path, spool, language=None, hotwords=None,
+                                        window_seconds=constant_memory.WINDOW_SECONDS, skip_music=False):
+        """
+        恒定内存转录：音频按窗口流式解码，片段逐批写入 spool
+
+        Args:
+            spool: constant_memory.SegmentSpool，片段写入其中
+            window_seconds: 每个解码窗口的时长
+            skip_music: 逐窗口预分类，音乐 / 噪声区域不送进解码器
+
+        Returns:
+            dict: 转录结果（不含 text / segments，输出时从 spool 拼接）
+        """
+        try:
+            print(f"🎤 开始转录（恒定内存模式，窗口 {window_seconds:.0f}秒）: {audio_path}", file=sys.stderr)
+            start_time = time.time()
+            
+            original_language = language
+            if language in ['zh', 'chinese', 'zh-cn', 'zh-tw']:
+                language = 'zh'
+            
+            hotword_engine = None
+            hotword_domain = None
+            prompt_kwargs = {}
+            if hotwords:
+                hotword_engine = HotwordEngine.load()
+                hotword_domain = hotword_engine.resolve_domain(hotwords, Path(audio_path).stem)
+                prompt_kwargs = hotword_engine.decoder_kwargs(hotword_domain, language)
+                print(f"🔥 使用热词库: {hotword_domain}", file=sys.stderr)
+            
+            windows = constant_memory.audio_windows(constant_memory.ffmpeg_blocks(audio_path), window_seconds)
+            masker = None
+            if skip_music:
+                prediction = runtime_predictor.current_prediction()
+                masker = nonspeech.WindowMasker(prediction["rtf"] if prediction else None)
+                windows = masker(windows)
+            segments, info = constant_memory.whisper_window_transcribe(
+                self.model, windows, language, DECODE_OPTIONS, prompt_kwargs,
+                audio_seconds=runtime_predictor.probe_duration(audio_path)
+            )
+            segments = guard_segments(segments, info)
+            need_conversion = info.language in ['zh', 'chinese'] and original_language is None
+            
+            # 每攒一批片段做后处理、热词规范化后落盘，内存里不保留已完成的片段
+            processor = PostProcessor(self.converter)
+            hotword_summary = {}
+            batch = []
+            
+            def flush():
+                processor.process_batch(batch, need_conversion)
+                if hotword_engine:
+                    with span("hotword_normalization"):
+                        for item in hotword_engine.normalize_segments(batch, hotword_domain):
+                            merged = hotword_summary.setdefault(item["term"], {"term": item["term"], "count": 0, "timestamps": []})
+                            merged["count"] += item["count"]
+                            merged["timestamps"].extend(item["timestamps"])
+                spool.extend(batch)
+                batch.clear()
+            
+            with span("decoding"):
+                for segment in track_slot(runtime_predictor.track_progress(segments, info.duration)):
+                    batch.append({"start": segment.start, "end": segment.end, "text": segment.text.strip(),
+                                  **confidence_fields(segment)})
+                    if len(batch) >= processor.batch_size:
+                        flush()
+                flush()
+            
+            duration = time.time() - start_time
+            result = {
+                "success": True,
+                "file": str(audio_path),
+                "language": info.language,
+                "language_probability": info.language_probability,
+                "duration": info.duration,
+                "processing_time": round(duration, 2),
+                "constant_memory": {"window_seconds": window_seconds, "segments": len(spool),
+                                    "characters": spool.characters}
+            }
+            if info.loop_guard and info.loop_guard["spans"]:
+                result["loop_guard"] = info.loop_guard
+            if masker:
+                result["nonspeech"] = masker.report()
+            if hotword_engine:
+                result["hotword_domain"] = hotword_domain
+                result["hotwords"] = sorted(hotword_summary.values(), key=lambda x: -x["count"])
+            
+            print(f"✅ 转录完成: {duration:.1f}秒, {len(spool)} 个片段", file=sys.stderr)
+            return result
+            
+        except Exception as e:
+            print(f"❌ 转录失败: {e}", file=sys.stderr)
+            return {"success": False, "file": str(audio_path), "error": str(e), "text": ""}
+
+    def transcribe_multiple(self, audio_paths, language=None, hotwords=None, deadline=None, redecode=None,
+                            skip_music=False, feed=None):
         """
         批量转录多个音频文件
         
         Args:
             audio_paths: 音频文件路径列表
             language: 指定语言
+            deadline: 整批的截止时间 (epoch 秒)
         
         Returns:
             list: 转录结果列表
@@ -158,7 +364,7 @@ class LocalWhisperTranscriber:
         
         for i, audio_path in enumerate(audio_paths, 1):
             print(f"🎵 处理文件 {i}/{total_files}: {Path(audio_path).name}", file=sys.stderr)
-            result = self.transcribe_file(audio_path, language)
+            result = self.transcribe_file(audio_path, language, hotwords, deadline, redecode, skip_music, feed)
             results.append(result)
         
         return results
@@ -200,7 +406,16 @@ def format_transcript_as_markdown(transcript_text, podcast_title=None, original_
     
     return markdown_content
 
-def save_transcript_to_file(transcript_text, save_dir, file_prefix=None, original_filename=None, source_url=None, podcast_title=None):
+def _transcript_filename(file_prefix=None, original_filename=None):
+    """转录文件名：前缀优先，其次按音频文件名加时间戳"""
+    timestamp = int(time.time())
+    if file_prefix:
+        return f"{file_prefix}_transcript.md"
+    if original_filename:
+        return f"{Path(original_filename).stem}_transcript_{timestamp}.md"
+    return f"transcript_{timestamp}.md"
+
+def save_transcript_to_file(transcript_text, save_dir, file_prefix=None, original_filename=None, source_url=None, podcast_title=None, segments=None):
     """
     保存转录文本到文件
     
@@ -210,6 +425,7 @@ def save_transcript_to_file(transcript_text, save_dir, file_prefix=None, origina
         file_prefix: 文件前缀
         original_filename: 原始音频文件名
         source_url: 播客来源链接
+        segments: 带时间戳的片段（用于更新检索索引，缺省时按整篇文本索引）
     
     Returns:
         dict: 保存的文件信息
@@ -219,23 +435,14 @@ def save_transcript_to_file(transcript_text, save_dir, file_prefix=None, origina
         save_path.mkdir(parents=True, exist_ok=True)
         
         # 生成文件名
-        if file_prefix:
-            filename = f"{file_prefix}_transcript.md"
-        elif original_filename:
-            audio_name = Path(original_filename).stem
-            timestamp = int(time.time())
-            filename = f"{audio_name}_transcript_{timestamp}.md"
-        else:
-            timestamp = int(time.time())
-            filename = f"transcript_{timestamp}.md"
-        
+        filename = _transcript_filename(file_prefix, original_filename)
         file_path = save_path / filename
         
         # 格式化为Markdown
         markdown_content = format_transcript_as_markdown(transcript_text, podcast_title, original_filename, source_url)
         
         # 保存文件
-        with open(file_path, 'w', encoding='utf-8') as f:
+        with span("file_write"), open(file_path, 'w', encoding='utf-8') as f:
             f.write(markdown_content)
         
         # 获取文件信息
@@ -249,12 +456,48 @@ def save_transcript_to_file(transcript_text, save_dir, file_prefix=None, origina
         }
         
         print(f"📄 转录文本已保存: {file_path} ({file_size/1024:.1f}KB)", file=sys.stderr)
+
+        # 增量更新全文检索索引
+        with span("search_index"):
+            index_saved_transcript(
+                file_path,
+                segments or [{"start": 0, "end": None, "text": transcript_text}],
+                title=podcast_title,
+                source_url=source_url,
+                save_dir=save_dir
+            )
         return file_info
         
     except Exception as e:
         print(f"❌ 保存转录文件失败: {e}", file=sys.stderr)
         return None
 
+def save_spooled_transcript(spool, save_dir, file_prefix=None, original_filename=None, source_url=None, podcast_title=None):
+    """
+    恒定内存模式的保存：正文从落盘片段逐段写入，格式与 save_transcript_to_file 相同
+    
+    Returns:
+        dict: 保存的文件信息
+    """
+    try:
+        save_path = Path(save_dir)
+        save_path.mkdir(parents=True, exist_ok=True)
+        file_path = save_path / _transcript_filename(file_prefix, original_filename)
+        
+        # 用占位符拆出 Markdown 的头尾，正文不经过内存
+        header, footer = format_transcript_as_markdown("\0", podcast_title, original_filename, source_url).split("\0")
+        constant_memory.write_markdown(file_path, header, spool, footer)
+        
+        file_size = file_path.stat().st_size
+        print(f"📄 转录文本已保存: {file_path} ({file_size/1024:.1f}KB)", file=sys.stderr)
+        with span("search_index"):
+            index_saved_transcript(file_path, spool, title=podcast_title, source_url=source_url, save_dir=save_dir)
+        return {"type": "transcript", "filename": file_path.name, "path": str(file_path), "size": file_size}
+        
+    except Exception as e:
+        print(f"❌ 保存转录文件失败: {e}", file=sys.stderr)
+        return None
+
 def main():
     parser = argparse.ArgumentParser(description="本地Faster-Whisper音频转录")
     parser.add_argument("files", nargs="+", help="音频文件路径")
@@ -272,8 +515,49 @@ def main():
     parser.add_argument("--file-prefix", help="保存文件的前缀名称")
     parser.add_argument("--source-url", help="播客来源链接")
     parser.add_argument("--podcast-title", help="播客标题")
+    parser.add_argument("--hotwords", help="热词库 (科技/商业/教育/词库文件名，或 auto 按标题推断)")
+    parser.add_argument("--beam-size", type=int, help="解码 beam 大小 (默认: 5，积压时由调度策略调小)")
+    parser.add_argument("--deadline", help="截止时间 (秒数、15m/2h、HH:MM 或 ISO 时间)，来不及时逐块降低解码开销")
+    parser.add_argument("--constant-memory", action="store_true",
+                       help="恒定内存模式：按窗口流式解码、片段落盘（多小时录音，仅单文件）")
+    parser.add_argument("--window-seconds", type=float, default=constant_memory.WINDOW_SECONDS,
+                       help=f"恒定内存模式的解码窗口时长 (默认: {constant_memory.WINDOW_SECONDS}秒)")
+    parser.add_argument("--redecode", action="store_true", help="用更大的模型二次解码低置信度片段")
+    parser.add_argument("--skip-music", action="store_true",
+                       help="解码前按频谱特征标出音乐 / 噪声区域并跳过（片头音乐、插曲、广告 jingle）")
+    parser.add_argument("--feed", help="节目名：与该节目往期比对音频指纹，片头 / 片尾 / 重复口播复用往期转录")
+    parser.add_argument("--reuse-previous", action="store_true",
+                       help="与同一 --source-url 之前转录过的版本对齐（重新上传、插入的广告不同），只转录变化的部分")
+    parser.add_argument("--redecode-model", choices=["tiny", "base", "small", "medium", "large-v3"],
+                       help="二次解码的模型 (默认: 比 --model 大一档以上)")
+    parser.add_argument("--redecode-beam", type=int, default=5, help="二次解码的 beam 大小 (默认: 5)")
+    parser.add_argument("--redecode-threshold", type=float, default=LOGPROB_THRESHOLD,
+                       help=f"avg_logprob 低于该值的片段二次解码 (默认: {LOGPROB_THRESHOLD})")
+    add_queue_arguments(parser)
+    add_trace_arguments(parser)
     
     args = parser.parse_args()
+    start_tracing(args)
+    
+    redecode = None
+    if args.redecode:
+        redecode = {"model": args.redecode_model, "beam_size": args.redecode_beam,
+                    "logprob_threshold": args.redecode_threshold}
+    
+    # 没有指定节目时按来源链接比对：同一链接之前下载的版本都在这个“节目”下
+    if args.reuse_previous and not args.feed:
+        if args.source_url:
+            args.feed = source_feed(args.source_url)
+        else:
+            print("⚠️ --reuse-previous 需要 --source-url，已忽略", file=sys.stderr)
+    
+    deadline = None
+    if args.deadline:
+        try:
+            deadline = parse_deadline(args.deadline)
+        except ValueError as e:
+            print(f"❌ {e}", file=sys.stderr)
+            sys.exit(1)
     
     # 验证文件存在
     audio_files = []
@@ -284,30 +568,82 @@ def main():
             sys.exit(1)
         audio_files.append(str(path.absolute()))
     
+    if args.beam_size:
+        DECODE_OPTIONS.update(beam_size=args.beam_size, best_of=args.beam_size)
+    
     try:
-        # 初始化转录器
-        transcriber = LocalWhisperTranscriber(
-            model_size=args.model,
-            device=args.device,
-            compute_type=args.compute_type.replace("-", "_")
-        )
-        
-        # 执行转录
-        if len(audio_files) == 1:
-            result = transcriber.transcribe_file(audio_files[0], args.language)
-        else:
-            result = transcriber.transcribe_multiple(audio_files, args.language)
+        # 经队列运行时先等到名额，再租 CPU 核、开始计时和加载模型（排队时间不占核、不计入耗时）
+        with queue_slot(args, audio_files[0], "whisper", args.model, args.device, args.compute_type,
+                        args.language) as slot:
+            # 多个转录同时运行时分到互不重叠的 CPU 核
+            cpu_allocator.acquire_for_job("whisper", device=args.device)
+            
+            # 按历史 RTF 预测耗时，解码过程中输出进度
+            job_start = time.perf_counter()
+            prediction = runtime_predictor.start_job("whisper", audio_files,
+                                                     model=runtime_predictor.history_model(args.model, args.beam_size),
+                                                     compute_type=args.compute_type, language=args.language)
+            
+            # 初始化转录器
+            transcriber = LocalWhisperTranscriber(
+                model_size=args.model,
+                device=args.device,
+                compute_type=args.compute_type.replace("-", "_")
+            )
+            
+            # auto 模式优先用播客标题推断领域
+            hotwords = args.hotwords
+            if hotwords == "auto" and args.podcast_title:
+                hotwords = HotwordEngine.load().resolve_domain("auto", args.podcast_title)
+            
+            # 执行转录
+            spool = None
+            # 恒定内存模式不支持截止时间、二次解码和往期复用：用了这些参数时不自动启用
+            unsupported = deadline or redecode or args.feed
+            if not args.constant_memory and len(audio_files) == 1 and not unsupported \
+                    and constant_memory.should_enable(audio_files[0]):
+                print("💾 音频较长，自动启用恒定内存模式", file=sys.stderr)
+                args.constant_memory = True
+            if args.constant_memory and len(audio_files) == 1:
+                if unsupported:
+                    print("⚠️ 恒定内存模式不支持 --deadline / --redecode / --feed / --reuse-previous，已忽略",
+                          file=sys.stderr)
+                spool = constant_memory.SegmentSpool()
+                result = transcriber.transcribe_file_constant_memory(audio_files[0], spool, args.language, hotwords,
+                                                                     args.window_seconds, args.skip_music)
+            elif len(audio_files) == 1:
+                result = transcriber.transcribe_file(audio_files[0], args.language, hotwords, deadline, redecode,
+                                                     args.skip_music, args.feed)
+            else:
+                if args.constant_memory:
+                    print("⚠️ 恒定内存模式仅支持单文件，按普通模式批量转录", file=sys.stderr)
+                result = transcriber.transcribe_multiple(audio_files, args.language, hotwords, deadline, redecode,
+                                                         args.skip_music, args.feed)
+            slot.result = result
         
         # 处理转录文本保存
         saved_files = []
-        if args.save_transcript and isinstance(result, dict) and result.get('success') and result.get('text'):
+        if spool is not None:
+            if args.save_transcript and result.get('success') and spool.characters:
+                file_info = save_spooled_transcript(
+                    spool,
+                    save_dir=args.save_transcript,
+                    file_prefix=args.file_prefix,
+                    original_filename=audio_files[0],
+                    source_url=args.source_url,
+                    podcast_title=args.podcast_title
+                )
+                if file_info:
+                    saved_files.append(file_info)
+        elif args.save_transcript and isinstance(result, dict) and result.get('success') and result.get('text'):
             file_info = save_transcript_to_file(
                 transcript_text=result['text'],
                 save_dir=args.save_transcript,
                 file_prefix=args.file_prefix,
                 original_filename=audio_files[0] if len(audio_files) == 1 else None,
                 source_url=args.source_url,
-                podcast_title=args.podcast_title
+                podcast_title=args.podcast_title,
+                segments=result.get('segments')
             )
             if file_info:
                 saved_files.append(file_info)
@@ -316,8 +652,29 @@ def main():
         if isinstance(result, dict):
             result['savedFiles'] = saved_files
         
-        # 输出结果
-        if args.output:
+        # 分阶段耗时汇总和任务指标
+        trace_summary = finish_tracing(result, args)
+        items = result if isinstance(result, list) else [result]
+        runtime_predictor.finish_job(result, prediction, time.perf_counter() - job_start,
+                                     load_seconds=tracer.stage_seconds("model_load"),
+                                     audio_seconds=sum(item.get("duration") or 0 for item in items))
+        for item in items:
+            metrics.record_job("whisper", args.model, item,
+                               audio_seconds=item.get("duration"),
+                               processing_seconds=item.get("processing_time"))
+        metrics.record_stages("whisper", args.model, trace_summary)
+        metrics.flush()
+        
+        # 输出结果（恒定内存模式从落盘片段流式写出）
+        if spool is not None:
+            with spool:
+                if args.output:
+                    with open(args.output, 'w', encoding='utf-8') as f:
+                        constant_memory.write_result_json(f, result, spool)
+                    print(f"📁 结果已保存到: {args.output}", file=sys.stderr)
+                else:
+                    constant_memory.write_result_json(sys.stdout, result, spool)
+        elif args.output:
             with open(args.output, 'w', encoding='utf-8') as f:
                 json.dump(result, f, ensure_ascii=False, indent=2)
             print(f"📁 结果已保存到: {args.output}", file=sys.stderr)
@@ -327,9 +684,11 @@ def main():
     
     except KeyboardInterrupt:
         print("\n⚠️ 转录被用户中断", file=sys.stderr)
+        metrics.record_failure("whisper", args.model, "KeyboardInterrupt")
         sys.exit(1)
     except Exception as e:
         print(f"❌ 程序错误: {e}", file=sys.stderr)
+        metrics.record_failure("whisper", args.model, e)
         sys.exit(1)
 
 if __name__ == "__main__":
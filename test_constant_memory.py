@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+恒定内存模式测试
+用 1h / 3h / 6h 的合成音频流（不落盘、不需要 ffmpeg）和一个模拟 Whisper 解码器，
+跑完整的 窗口切分 -> 解码 -> 片段落盘 -> 流式写结果 流程，检查峰值内存不随时长增长
+"""
+
+import os
+import sys
+import json
+import subprocess
+import tempfile
+from types import SimpleNamespace
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server")
+sys.path.insert(0, SERVER_DIR)
+
+HOURS = (1, 3, 6)
+# 各时长峰值内存之差的容许范围（MB）
+MAX_GROWTH_MB = 20
+BLOCK_SECONDS = 30
+SEGMENT_SECONDS = 2.0
+
+
+class FakeWhisperModel:
+    """接口与 WhisperModel.transcribe 一致：每 2 秒产出一个片段"""
+
+    def transcribe(self, audio, language=None, **options):
+        duration = len(audio) / 16000
+
+        def segments():
+            t = 0.0
+            while t < duration:
+                end = min(duration, t + SEGMENT_SECONDS)
+                yield SimpleNamespace(start=t, end=end, text=f" 第{t:.0f}秒 我们今天聊一聊人工智能和大模型的进展 ",
+                                      avg_logprob=-0.3, no_speech_prob=0.01, compression_ratio=1.4)
+                t = end
+
+        return segments(), SimpleNamespace(language=language or "zh", language_probability=0.99, duration=duration)
+
+
+def synthetic_blocks(hours):
+    """按块生成合成语音（同一段基础信号循环移位，避免生成开销主导测试时间）"""
+    import numpy as np
+    from synthetic_audio import speech_like
+    base = speech_like(BLOCK_SECONDS, seed=1)
+    for i in range(int(hours * 3600 / BLOCK_SECONDS)):
+        yield np.roll(base, i * 1601)
+
+
+def run_child(hours, output_path):
+    """子进程：跑完整流程并输出峰值内存"""
+    from constant_memory import audio_windows, whisper_window_transcribe, SegmentSpool, write_result_json, write_markdown
+    from memory_profile import peak_rss_mb
+
+    segments, info = whisper_window_transcribe(FakeWhisperModel(), audio_windows(synthetic_blocks(hours)),
+                                               language="zh", audio_seconds=hours * 3600)
+    with SegmentSpool() as spool:
+        for segment in segments:
+            spool.append({"start": segment.start, "end": segment.end, "text": segment.text.strip()})
+        result = {"success": True, "language": info.language, "duration": info.duration}
+        with open(output_path, "w", encoding="utf-8") as f:
+            write_result_json(f, result, spool)
+        write_markdown(output_path + ".md", "# 📝 测试\n\n", spool, "\n")
+        print(json.dumps({"hours": hours, "peak_rss_mb": round(peak_rss_mb(), 1), "segments": len(spool),
+                          "duration": info.duration}))
+
+
+def test_constant_memory():
+    print("🧪 恒定内存模式测试")
+    print("=" * 40)
+
+    peaks = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for hours in HOURS:
+            output = os.path.join(tmp, f"result_{hours}h.json")
+            proc = subprocess.run([sys.executable, __file__, "--child", str(hours), output],
+                                  capture_output=True, text=True, cwd=SERVER_DIR)
+            assert proc.returncode == 0, f"{hours}h 运行失败:\n{proc.stderr}"
+            stats = json.loads(proc.stdout.strip().splitlines()[-1])
+            peaks[hours] = stats["peak_rss_mb"]
+            print(f"📊 {hours}h: 峰值内存 {stats['peak_rss_mb']}MB, {stats['segments']} 个片段, "
+                  f"时长 {stats['duration']:.0f}秒")
+
+            # 结果文件是合法 JSON，片段连续覆盖整段音频，全文与片段一致
+            with open(output, encoding="utf-8") as f:
+                data = json.load(f)
+            assert abs(data["segments"][-1]["end"] - hours * 3600) <= 1e-3, \
+                f"{hours}h: 片段没有覆盖整段音频 ({data['segments'][-1]['end']})"
+            assert data["text"] == " ".join(seg["text"] for seg in data["segments"]), f"{hours}h: text 与片段不一致"
+
+    growth = max(peaks.values()) - min(peaks.values())
+    print(f"📈 1h -> 6h 峰值内存变化: {growth:.1f}MB (容许 {MAX_GROWTH_MB}MB)")
+    assert growth <= MAX_GROWTH_MB, f"峰值内存随时长增长 {growth:.1f}MB（容许 {MAX_GROWTH_MB}MB）: {peaks}"
+    print("✅ 峰值内存与时长无关")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        run_child(float(sys.argv[2]), sys.argv[3])
+        sys.exit(0)
+    try:
+        test_constant_memory()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+截止时间分块解码测试
+用不需要模型权重的假 WhisperModel 检查：时间充足时保持原设置，来不及时逐级降级（只降不升）并切到更小的模型
+"""
+
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server")
+sys.path.insert(0, SERVER_DIR)
+
+from deadline import parse_deadline, whisper_levels, whisper_deadline_transcribe, SAMPLE_RATE
+
+OPTIONS = {"beam_size": 5, "best_of": 5, "word_timestamps": True, "vad_filter": True}
+
+
+class FakeModel:
+    """每块返回一个覆盖整块的片段，并记下每次调用的解码参数"""
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = []
+
+    def transcribe(self, audio, language=None, **options):
+        self.calls.append(options)
+        seconds = len(audio) / SAMPLE_RATE
+        segment = SimpleNamespace(start=0.0, end=seconds, text=f"{self.name}", avg_logprob=-0.2,
+                                  no_speech_prob=0.01, compression_ratio=1.2)
+        return iter([segment]), SimpleNamespace(language=language or "zh", language_probability=0.99)
+
+
+def _run(deadline_in, seconds=360):
+    base = FakeModel("base")
+    loaded = {}
+
+    def load_model(size):
+        loaded[size] = FakeModel(size)
+        return loaded[size]
+
+    audio = np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+    segments, info = whisper_deadline_transcribe(SimpleNamespace(model=base), audio, time.time() + deadline_in,
+                                                 OPTIONS, "base", load_model=load_model)
+    return list(segments), info, base, loaded
+
+
+def test_parse_deadline():
+    assert parse_deadline("900", now=1000) == 1900
+    assert parse_deadline("15m", now=1000) == 1900
+    assert parse_deadline("2h", now=1000) == 1000 + 7200
+    try:
+        parse_deadline("明天早上")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("无法解析的截止时间应抛出 ValueError")
+    print("✅ 截止时间解析")
+
+
+def test_levels():
+    levels = whisper_levels("base", OPTIONS)
+    assert [(l["model"], l["beam_size"], l["best_of"], l["word_timestamps"]) for l in levels] == [
+        ("base", 5, 5, True), ("base", 2, 2, True), ("base", 1, 1, True), ("base", 1, 1, False),
+        ("tiny", 1, 1, False)
+    ], levels
+    print("✅ 降级顺序: beam 减半 -> beam 1 -> 关词级时间戳 -> 更小的模型")
+
+
+def test_enough_time_keeps_settings():
+    segments, info, base, loaded = _run(3600)
+    assert not loaded and not info.deadline["degraded"], info.deadline
+    assert all(call["beam_size"] == 5 and call["word_timestamps"] for call in base.calls), base.calls
+    assert info.deadline["met"] and len(info.deadline["ranges"]) == 1
+    # 各块片段的时间戳加回块起点，首尾相接覆盖整段音频
+    assert segments[0].start == 0.0 and abs(segments[-1].end - 360.0) < 1e-6
+    assert all(abs(a.end - b.start) < 1e-6 for a, b in zip(segments, segments[1:]))
+    print("✅ 时间充足时保持原设置")
+
+
+def test_tight_deadline_steps_down():
+    segments, info, base, loaded = _run(10)
+    report = info.deadline
+    assert report["degraded"], report
+    assert list(loaded) == ["tiny"], "来不及时应降级到更小的模型"
+    assert not base.calls, "第一块就应改用小模型"
+    # 实测很快也不回升
+    assert all(call["beam_size"] == 1 and not call["word_timestamps"] for call in loaded["tiny"].calls)
+    assert [r["settings"]["model"] for r in report["ranges"]] == ["tiny"], report["ranges"]
+    assert report["ranges"][0]["start"] == 0.0 and report["ranges"][0]["end"] == 360.0
+    assert {seg.text for seg in segments} == {"tiny"}
+    print("✅ 截止时间紧张时逐级降级并切到更小的模型")
+
+
+if __name__ == "__main__":
+    try:
+        test_parse_deadline()
+        test_levels()
+        test_enough_time_keeps_settings()
+        test_tight_deadline_steps_down()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+评估工具测试
+位并行编辑距离与逐格动态规划一致，CER/WER 的切分和规范化，以及 DER 的漏检 / 虚警 / 混淆和边界容差
+"""
+
+import os
+import sys
+import random
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server")
+sys.path.insert(0, SERVER_DIR)
+
+from evaluate import edit_distance, char_tokens, word_tokens, error_rate, diarization_error
+
+
+def _naive_distance(a, b):
+    row = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        prev, row[0] = row[0], i
+        for j, y in enumerate(b, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (x != y))
+    return row[-1]
+
+
+def test_edit_distance():
+    assert edit_distance("kitten", "sitting") == 3
+    assert edit_distance("", "abc") == 3
+    assert edit_distance(["今天", "天气"], ["今天", "不错", "天气"]) == 1
+    rng = random.Random(0)
+    for _ in range(200):
+        a = "".join(rng.choice("abc我们") for _ in range(rng.randint(0, 90)))
+        b = "".join(rng.choice("abc我们") for _ in range(rng.randint(0, 90)))
+        assert edit_distance(a, b) == _naive_distance(a, b), (a, b)
+    print("✅ 位并行编辑距离与动态规划一致")
+
+
+def test_cer_wer():
+    # 标点、全角和大小写不计入错误
+    assert char_tokens("你好，ＡＩ！") == ["你", "好", "a", "i"]
+    errors, total = error_rate(char_tokens("我们今天聊播客"), char_tokens("我门今天聊博客。"))
+    assert (errors, total) == (2, 7)
+
+    # 中英混排：中文按字、英文按词
+    assert word_tokens("用 GPT-4 写代码") == ["用", "gpt", "4", "写", "代", "码"]
+    errors, total = error_rate(word_tokens("we use large language models"),
+                               word_tokens("We use a large language model"))
+    assert (errors, total) == (2, 5)
+    print("✅ CER / WER 切分和计分")
+
+
+def test_der():
+    reference = [(0.0, 10.0, "A"), (10.0, 20.0, "B")]
+
+    # 说话人标签不同但切分一致：映射后没有错误
+    perfect = diarization_error(reference, [(0.0, 10.0, "spk1"), (10.0, 20.0, "spk0")], collar=0)
+    assert perfect["der"] == 0.0 and perfect["mapping"] == {"A": "spk1", "B": "spk0"}, perfect
+
+    # 后 5 秒漏检
+    missed = diarization_error(reference, [(0.0, 10.0, "x"), (10.0, 15.0, "y")], collar=0)
+    assert abs(missed["missed"] - 5.0) < 0.02 and missed["false_alarm"] == 0 and missed["confusion"] == 0
+    assert abs(missed["der"] - 0.25) < 1e-3, missed
+
+    # 把 B 的一半判给 A：混淆 5 秒
+    confused = diarization_error(reference, [(0.0, 15.0, "x"), (15.0, 20.0, "y")], collar=0)
+    assert abs(confused["confusion"] - 5.0) < 0.02 and confused["missed"] == 0, confused
+
+    # 参考之外多报 2 秒：虚警
+    extra = diarization_error(reference, reference + [(20.0, 22.0, "B")], collar=0)
+    assert abs(extra["false_alarm"] - 2.0) < 0.02 and extra["missed"] == 0, extra
+
+    # 边界偏移在容差之内不计分
+    shifted = [(0.0, 10.2, "A"), (10.2, 20.0, "B")]
+    assert diarization_error(reference, shifted, collar=0.25)["der"] == 0.0
+    assert diarization_error(reference, shifted, collar=0)["der"] > 0.0
+    print("✅ DER 漏检 / 虚警 / 混淆和边界容差")
+
+
+if __name__ == "__main__":
+    try:
+        test_edit_distance()
+        test_cer_wer()
+        test_der()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+音频指纹测试
+合成的两期节目共用同一段片头（第二期前面多了一段新内容）：第二期找到片头、复用第一期的转录并按偏移校正时间，
+拼接时去掉落在复用区间里的零碎解码；同一文件重跑时不匹配自己
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server")
+sys.path.insert(0, SERVER_DIR)
+
+from fingerprint import RecurringSegments, SAMPLE_RATE
+
+TMP_DIR = tempfile.mkdtemp()
+DB_PATH = os.path.join(TMP_DIR, "fingerprints.db")
+JINGLE_SECONDS = 20
+LEAD_SECONDS = 5.0
+
+
+def _tones(seconds, seed):
+    """每 0.25 秒换一组随机和弦（频谱峰值清晰、不同种子互不相同）"""
+    rng = np.random.default_rng(seed)
+    note = int(0.25 * SAMPLE_RATE)
+    t = np.arange(note) / SAMPLE_RATE
+    notes = []
+    for _ in range(int(seconds / 0.25)):
+        freqs = rng.uniform(200, 4000, size=3)
+        notes.append(sum(np.sin(2 * np.pi * f * t) for f in freqs) / 3)
+    return np.concatenate(notes).astype(np.float32)
+
+
+def _write(name, audio):
+    path = os.path.join(TMP_DIR, name)
+    audio.tofile(path)
+    return path
+
+
+def _segments(start, end, label, length=5.0):
+    return [{"start": s, "end": s + length, "text": f"{label}{int(s)}"} for s in np.arange(start, end, length).tolist()]
+
+
+JINGLE = _tones(JINGLE_SECONDS, seed=1)
+EPISODE_1 = np.concatenate([JINGLE, _tones(40, seed=2)])
+EPISODE_2 = np.concatenate([_tones(LEAD_SECONDS, seed=3), JINGLE, _tones(40, seed=4)])
+EPISODE_1_SEGMENTS = _segments(0, JINGLE_SECONDS, "片头") + _segments(JINGLE_SECONDS, 60, "第一期")
+
+
+def test_reuse_and_splice():
+    first = RecurringSegments("demo", EPISODE_1, _write("ep1.raw", EPISODE_1), db_path=DB_PATH)
+    assert not first.matches, "空索引不应有匹配"
+    first.store(EPISODE_1_SEGMENTS)
+
+    second = RecurringSegments("demo", EPISODE_2, _write("ep2.raw", EPISODE_2), db_path=DB_PATH)
+    assert len(second.matches) == 1, second.matches
+    match = second.matches[0]
+    assert abs(match["offset"] + LEAD_SECONDS) < 0.1, match
+    assert match["episode"] == "ep1.raw"
+
+    # 复用的都是片头的转录，时间按偏移校正到第二期
+    reused = {s["text"]: s for s in second.cached}
+    assert set(reused) <= {s["text"] for s in EPISODE_1_SEGMENTS[:4]} and len(reused) >= 3, reused
+    for segment in EPISODE_1_SEGMENTS[:4]:
+        if segment["text"] in reused:
+            assert abs(reused[segment["text"]]["start"] - (segment["start"] + LEAD_SECONDS)) < 0.1
+            assert reused[segment["text"]]["cached"]
+    assert second.reused_seconds() >= 14.0, second.spans()
+
+    # 复用区间屏蔽为静音，其余部分不动
+    masked = second.mask(EPISODE_2)
+    span = second.spans()[0]
+    inside = slice(int(span["start"] * SAMPLE_RATE) + 1, int(span["end"] * SAMPLE_RATE) - 1)
+    before = slice(0, int(span["start"] * SAMPLE_RATE))
+    assert not masked[inside].any() and np.array_equal(masked[before], EPISODE_2[before])
+
+    # 拼接：新解码的片段 + 复用片段，落在复用区间内的零碎结果去掉
+    decoded = [{"start": 0.0, "end": 5.0, "text": "新开场"},
+               {"start": 12.0, "end": 13.0, "text": "零碎"},
+               {"start": 25.0, "end": 30.0, "text": "新内容"}]
+    spliced = second.splice(decoded)
+    texts = [s["text"] for s in spliced]
+    assert "零碎" not in texts and texts[0] == "新开场" and texts[-1] == "新内容", texts
+    assert [s["start"] for s in spliced] == sorted(s["start"] for s in spliced)
+
+    report = second.report()
+    assert report["matches"][0]["segments"] == len(reused)
+    assert abs(report["decoded_seconds"] + report["reused_seconds"] - 65.0) < 0.01, report
+    second.store(spliced)
+    print("✅ 片头匹配、复用往期转录并拼接")
+
+
+def test_same_file_not_matched():
+    again = RecurringSegments("demo", EPISODE_1, os.path.join(TMP_DIR, "ep1.raw"), db_path=DB_PATH)
+    # 第二期里也有片头，可以匹配到；但不能匹配到这一期自己
+    assert all(m["episode"] != "ep1.raw" for m in again.matches), again.matches
+    again.index.close()
+
+    other = RecurringSegments("other-feed", EPISODE_2, os.path.join(TMP_DIR, "ep2.raw"), db_path=DB_PATH)
+    assert not other.matches, "不同节目的指纹互不匹配"
+    other.index.close()
+    print("✅ 同一文件不匹配自己，不同节目互不匹配")
+
+
+if __name__ == "__main__":
+    try:
+        test_reuse_and_splice()
+        test_same_file_not_matched()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+热词引擎测试
+用仓库自带词库检查：普通中文句子原样保留（只报告匹配），英文术语只修正大小写
+"""
+
+import os
+import sys
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server")
+sys.path.insert(0, SERVER_DIR)
+
+from hotword_engine import HotwordEngine
+
+# 含商业词库中文变体的普通句子：规范化后必须与原文一致
+PLAIN_SENTENCES = (
+    "这家公司明年上市",
+    "我们在做业务转型",
+    "他拿到了天使轮融资",
+    "公司在快速扩张",
+)
+
+
+def test_chinese_text_unchanged():
+    engine = HotwordEngine.load(use_cache=False)
+    for sentence in PLAIN_SENTENCES:
+        for domain_file in (None, engine.resolve_domain("商业")):
+            text, found = engine.normalize(sentence, domain_file)
+            assert text == sentence, f"规范化改写了原话: {sentence!r} -> {text!r}"
+            assert found, f"{sentence!r} 应报告热词匹配"
+            assert all(m["normalized"] == m["matchedText"] for m in found), found
+
+    segments = [{"start": float(i), "text": s} for i, s in enumerate(PLAIN_SENTENCES)]
+    summary = engine.normalize_segments(segments)
+    assert [seg["text"] for seg in segments] == list(PLAIN_SENTENCES)
+    assert summary, "片段汇总应包含匹配到的热词"
+    print("✅ 中文原话保持不变")
+
+
+def test_english_case_only():
+    engine = HotwordEngine.load(use_cache=False)
+    text, found = engine.normalize("我们用 llm 做 rag，不是 rags")
+    assert text == "我们用 LLM 做 RAG，不是 rags", text
+    assert [m["normalized"] for m in found] == ["LLM", "RAG"], found
+    print("✅ 英文术语只修正大小写")
+
+
+if __name__ == "__main__":
+    try:
+        test_chinese_text_unchanged()
+        test_english_case_only()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+任务队列测试
+临时数据库上检查：并发上限、用户公平份额、worker 在片段边界抢占长任务、
+入口脚本的外部任务让出名额后等被让的任务开始再继续，以及结果摘要和过期清理
+"""
+
+import os
+import sys
+import tempfile
+
+# 队列、耗时历史都写到临时目录
+os.environ["HOME"] = tempfile.mkdtemp()
+os.environ["RUNTIME_PREDICTION_DISABLE"] = "1"
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server")
+sys.path.insert(0, SERVER_DIR)
+
+import job_queue
+from job_queue import JobQueue, LONG_JOB_SECONDS, SHORT_JOB_SECONDS
+
+LIMITS = {"engine": {"synthetic": 1}, "resource": {"cpu": 1, "gpu": 1}}
+
+
+def _queue():
+    return JobQueue(os.path.join(tempfile.mkdtemp(), "queue.db"), limits=LIMITS)
+
+
+def _submit(queue, name, user="alice", priority=0, predicted=None, audio_seconds=None, external=False):
+    job_id = queue.submit(name, "synthetic", user=user, priority=priority,
+                          options={"external": True} if external else None)
+    queue.conn.execute("UPDATE jobs SET predicted_seconds = ?, audio_seconds = ? WHERE id = ?",
+                       (predicted, audio_seconds, job_id))
+    return job_id
+
+
+def test_limits_and_priority():
+    queue = _queue()
+    low = _submit(queue, "low.wav")
+    high = _submit(queue, "high.wav", priority=5)
+    job = queue.claim("w1")
+    assert job["id"] == high, "优先级高的任务先运行"
+    assert queue.claim("w2") is None, "引擎上限为 1 时不能再认领"
+    assert queue.finish(high, "w1", {"success": True})
+    assert queue.claim("w2")["id"] == low
+    print("✅ 并发上限与优先级")
+
+
+def test_fair_share():
+    queue = _queue()
+    first = _submit(queue, "a1.wav", user="alice")
+    queue.claim("w1")
+    queue.conn.execute("UPDATE jobs SET started_at = started_at - 1000 WHERE id = ?", (first,))
+    queue.finish(first, "w1", {"success": True})
+    alice = _submit(queue, "a2.wav", user="alice")
+    bob = _submit(queue, "b1.wav", user="bob")
+    assert queue.claim("w1")["id"] == bob, "最近占用少的用户先运行"
+    assert queue.get(alice)["status"] == "queued"
+    print("✅ 公平份额")
+
+
+def test_worker_preemption():
+    queue = _queue()
+    long_id = _submit(queue, "long.wav", predicted=LONG_JOB_SECONDS * 3, audio_seconds=3600)
+    job = queue.claim("w1")
+    short_id = _submit(queue, "short.wav", predicted=SHORT_JOB_SECONDS / 2)
+    checkpoint = {"offset": 60.0, "segments": [{"start": 0.0, "end": 60.0, "text": "x"}]}
+    assert queue.preempt(job, checkpoint, "w2") is None, "不归本 worker 的任务不能被拿来换"
+    next_job = queue.preempt(job, checkpoint, "w1")
+    assert next_job and next_job["id"] == short_id
+    requeued = queue.get(long_id)
+    assert requeued["status"] == "queued" and requeued["preemptions"] == 1
+    assert requeued["checkpoint"] == checkpoint
+
+    # 剩余耗时不长的任务不抢占
+    queue.finish(short_id, "w1", {"success": True})
+    job = queue.claim("w1")
+    _submit(queue, "short2.wav", predicted=SHORT_JOB_SECONDS / 2)
+    assert queue.preempt(job, {"offset": 3500.0, "segments": []}, "w1") is None
+    print("✅ worker 在片段边界抢占长任务")
+
+
+def test_external_yield():
+    queue = _queue()
+    long_id = _submit(queue, "long.wav", predicted=LONG_JOB_SECONDS * 3, audio_seconds=3600, external=True)
+    assert queue.claim("worker") is None, "worker 不认领外部任务"
+    job = queue.claim_external(long_id, "p1")
+    assert job["id"] == long_id
+    short_id = _submit(queue, "short.wav", predicted=SHORT_JOB_SECONDS / 2, external=True)
+    assert queue.claim_external(short_id, "p2") is None, "名额被长任务占着"
+
+    assert queue.yield_slot(job, 120.0, "p1") == short_id
+    assert queue.get(long_id)["status"] == "queued"
+    assert queue.claim_external(long_id, "p1") is None, "被让的任务开始前不能重新认领"
+    assert queue.claim_external(short_id, "p2")["id"] == short_id
+    assert queue.claim_external(long_id, "p1") is None, "被让的任务还在运行"
+    queue.finish(short_id, "p2", {"success": True})
+    resumed = queue.claim_external(long_id, "p1")
+    assert resumed and resumed["preemptions"] == 1 and resumed["checkpoint"] is None
+    print("✅ 外部任务让出名额后继续")
+
+
+def test_result_summary_and_retention():
+    summary = job_queue.result_summary([
+        {"success": True, "file": "a.wav", "duration": 10.0, "text": "你好", "segments": [{}, {}]},
+        {"success": False, "file": "b.wav", "error": "解码失败", "text": "", "segments": []},
+    ])
+    assert summary == {"success": False, "files": ["a.wav", "b.wav"], "duration": 10.0, "processing_time": 0.0,
+                       "segments": 2, "characters": 2, "error": "解码失败"}, summary
+
+    queue = _queue()
+    old = _submit(queue, "old.wav")
+    queue.claim("w1")
+    queue.finish(old, "w1", {"success": True})
+    queue.conn.execute("UPDATE jobs SET finished_at = finished_at - ? WHERE id = ?",
+                       (job_queue.JOB_RETENTION_SECONDS + 1, old))
+    new = _submit(queue, "new.wav")
+    queue.claim("w1")
+    queue.finish(new, "w1", {"success": True})
+    assert queue.get(old) is None, "过期任务应被清理"
+    assert queue.get(new)["status"] == "done"
+    print("✅ 结果摘要与过期清理")
+
+
+if __name__ == "__main__":
+    try:
+        test_limits_and_priority()
+        test_fair_share()
+        test_worker_preemption()
+        test_external_yield()
+        test_result_summary_and_retention()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
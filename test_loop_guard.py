@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+循环保护测试
+连续重复的片段整段丢弃并插入跳过标记，偶发的重复放行，检测到循环后从下一个语音段重新解码
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server")
+sys.path.insert(0, SERVER_DIR)
+
+from loop_guard import LoopGuard, repetition_ratio, CONSECUTIVE_SEGMENTS
+
+LOOP_TEXT = "谢谢大家收看我们下期再见"
+
+
+def _segments(texts, start=0.0, length=2.0):
+    return [SimpleNamespace(start=start + i * length, end=start + (i + 1) * length, text=text, compression_ratio=1.2)
+            for i, text in enumerate(texts)]
+
+
+def test_repetition_ratio():
+    ratio, total = repetition_ratio(LOOP_TEXT, [LOOP_TEXT])
+    assert ratio == 1.0 and total == len(LOOP_TEXT) - 2
+    ratio, _ = repetition_ratio("今天聊一聊大模型的推理成本", ["欢迎收听本期节目"])
+    assert ratio == 0.0
+    print("✅ n-gram 重复比例")
+
+
+def test_loop_span_dropped():
+    texts = ["欢迎收听本期节目", "今天聊一聊大模型的推理成本", LOOP_TEXT] + [LOOP_TEXT] * CONSECUTIVE_SEGMENTS \
+        + ["好我们回到正题来看数据"]
+    guard = LoopGuard()
+    output = list(guard.run(iter(_segments(texts))))
+    assert [seg.text for seg in output[:3]] == texts[:3], "循环前的片段（含第一次出现）应保留"
+    marker = output[3]
+    assert getattr(marker, "skipped", None) == "repetition", marker
+    assert (marker.start, marker.end) == (6.0, 12.0), marker
+    assert output[4].text == texts[-1] and len(output) == 5
+    report = guard.report()
+    assert report["dropped_segments"] == CONSECUTIVE_SEGMENTS and report["skipped_seconds"] == 6.0, report
+    print("✅ 连续重复的片段整段丢弃并插入跳过标记")
+
+
+def test_isolated_repeat_kept():
+    texts = ["欢迎收听本期节目", LOOP_TEXT, LOOP_TEXT, "好我们回到正题来看数据"]
+    guard = LoopGuard()
+    output = list(guard.run(iter(_segments(texts))))
+    assert [seg.text for seg in output] == texts
+    assert guard.report()["spans"] == []
+    print("✅ 偶发的重复放行")
+
+
+def test_restart_from_next_speech():
+    closed = []
+
+    def looping():
+        yield from _segments(["欢迎收听本期节目"])
+        try:
+            while True:
+                yield from _segments([LOOP_TEXT], start=2.0)
+        finally:
+            closed.append(True)
+
+    restarts = []
+
+    def restart(start):
+        restarts.append(start)
+        return iter(_segments(["好我们回到正题来看数据"], start=start))
+
+    guard = LoopGuard(restart=restart, next_speech=lambda t: t + 3.0, audio_seconds=60.0)
+    output = list(guard.run(looping()))
+    assert closed, "检测到循环后应停止原来的解码"
+    assert restarts == [7.0], restarts
+    assert [seg.text for seg in output][0:2] == ["欢迎收听本期节目", LOOP_TEXT]
+    assert output[2].skipped and output[2].end == 7.0, output[2]
+    assert output[3].text == "好我们回到正题来看数据" and output[3].start == 7.0
+    assert guard.report()["restarts"] == 1
+    print("✅ 从下一个语音段重新解码")
+
+
+if __name__ == "__main__":
+    try:
+        test_repetition_ratio()
+        test_loop_span_dropped()
+        test_isolated_repeat_kept()
+        test_restart_from_next_speech()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
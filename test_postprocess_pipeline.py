@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+解码后处理测试
+情绪标记的“强调”：过长的重复（解码循环）只跳过那一段，同一片段里正常的短重复仍算强调
+"""
+
+import os
+import sys
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server")
+sys.path.insert(0, SERVER_DIR)
+
+from postprocess_pipeline import EmotionTagger, MAX_EMPHASIS_RUN
+
+TAGGER = EmotionTagger({"开心": ["哈哈"]})
+
+
+def test_short_run_is_emphasis():
+    assert "强调" in TAGGER.tag("好好好，就这么定了")
+    print("✅ 短重复算强调")
+
+
+def test_loop_run_is_not_emphasis():
+    loop = "对" * (MAX_EMPHASIS_RUN + 4)
+    assert "强调" not in TAGGER.tag(f"他说{loop}")
+    print("✅ 解码循环不算强调")
+
+
+def test_long_run_does_not_hide_short_run():
+    loop = "对" * (MAX_EMPHASIS_RUN + 4)
+    emotions = TAGGER.tag(f"{loop}，真的真的太棒了啊啊啊")
+    assert "强调" in emotions, emotions
+    print("✅ 过长重复不影响同一片段里的短重复")
+
+
+def test_keywords_and_punctuation():
+    assert TAGGER.tag("哈哈，真的吗？") == ["开心", "疑问"]
+    print("✅ 关键词和标点按类别顺序标记")
+
+
+if __name__ == "__main__":
+    try:
+        test_short_run_is_emphasis()
+        test_loop_run_is_not_emphasis()
+        test_long_run_does_not_hide_short_run()
+        test_keywords_and_punctuation()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+二次解码测试
+用假模型检查：只挑出低置信度片段，新结果更好时替换（并做同样的后处理），更差时保留原结果
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server")
+sys.path.insert(0, SERVER_DIR)
+
+from redecode import low_confidence_regions, redecode_low_confidence, SAMPLE_RATE
+
+
+def _seg(start, end, text, logprob, no_speech=0.01, ratio=1.3):
+    return {"start": start, "end": end, "text": text, "avg_logprob": logprob,
+            "no_speech_prob": no_speech, "compression_ratio": ratio}
+
+
+SEGMENTS = [
+    _seg(0.0, 2.0, "开场白", -0.2),
+    _seg(2.0, 4.0, "听不清的一句", -1.2),
+    _seg(4.0, 6.0, "正常的一句", -0.3),
+    _seg(6.0, 8.0, "又一句听不清", -1.5),
+    _seg(8.0, 10.0, "背景音乐", -1.5, no_speech=0.9),
+    _seg(10.0, 12.0, "结束语", -0.25),
+]
+
+
+class FakeModel:
+    """按调用顺序返回预设的 (文本, avg_logprob)"""
+
+    def __init__(self, results):
+        self.results = list(results)
+        self.calls = []
+
+    def transcribe(self, audio, language=None, initial_prompt=None, **options):
+        self.calls.append({"seconds": len(audio) / SAMPLE_RATE, "prompt": initial_prompt, **options})
+        text, logprob = self.results.pop(0)
+        seconds = len(audio) / SAMPLE_RATE
+        return iter([SimpleNamespace(start=0.0, end=seconds, text=f" {text} ", avg_logprob=logprob,
+                                     no_speech_prob=0.01, compression_ratio=1.2)]), None
+
+
+def test_regions():
+    regions = low_confidence_regions(SEGMENTS, 12.0)
+    assert regions == [(1, 2, 2.0, 4.0), (3, 4, 6.0, 8.0)], regions
+    # 相邻的难段合并成一个区间，外扩不越过保留片段
+    merged = low_confidence_regions([_seg(0.0, 1.0, "a", -0.1), _seg(1.5, 2.5, "b", -1.0),
+                                     _seg(2.8, 3.5, "c", -1.1), _seg(5.0, 6.0, "d", -0.1)], 6.0)
+    assert merged == [(1, 3, 1.2, 3.8)], merged
+    print("✅ 低置信度区间（跳过静音 / 音乐片段）")
+
+
+def test_accept_and_reject():
+    model = FakeModel([("听得清的一句", -0.1), ("更糟的结果", -2.0)])
+    loaded = []
+    processed = []
+
+    def load_model(size):
+        loaded.append(size)
+        return model
+
+    def postprocess(batch):
+        processed.extend(seg["text"] for seg in batch)
+
+    audio = np.zeros(12 * SAMPLE_RATE, dtype=np.float32)
+    output, report = redecode_low_confidence([dict(s) for s in SEGMENTS], audio, load_model, "medium",
+                                             language="zh", options={"beam_size": 1, "vad_filter": True},
+                                             beam_size=5, postprocess=postprocess)
+    assert loaded == ["medium"]
+    assert [seg["text"] for seg in output] == ["开场白", "听得清的一句", "正常的一句", "又一句听不清", "背景音乐", "结束语"]
+    assert output[1]["redecoded"] and (output[1]["start"], output[1]["end"]) == (2.0, 4.0), output[1]
+    assert "redecoded" not in output[3], "更差的新结果不应替换原片段"
+    assert processed == ["听得清的一句"], "只对采用的新片段做后处理"
+    assert (report["accepted"], report["rejected"], report["regions"]) == (1, 1, 2), report
+
+    first = model.calls[0]
+    assert first["prompt"] == "开场白" and first["beam_size"] == 5 and first["best_of"] == 5
+    assert first["vad_filter"] is False and abs(first["seconds"] - 2.0) < 1e-6, first
+    print("✅ 新结果更好时替换、更差时保留")
+
+
+def test_nothing_to_redecode():
+    confident = [s for s in SEGMENTS if s["avg_logprob"] > -0.5]
+
+    def load_model(size):
+        raise AssertionError("没有难段时不应加载大模型")
+
+    output, report = redecode_low_confidence(confident, np.zeros(12 * SAMPLE_RATE, dtype=np.float32),
+                                             load_model, "medium")
+    assert output == confident and report["regions"] == 0
+    print("✅ 没有难段时不加载模型")
+
+
+if __name__ == "__main__":
+    try:
+        test_regions()
+        test_accept_and_reject()
+        test_nothing_to_redecode()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+耗时预测测试
+用临时生成的极小文件头检查 WAV/MP3/M4A/FLAC 时长解析，
+以及 RTF 指数加权更新和“改变了解码量的任务不计入历史”
+"""
+
+import os
+import sys
+import struct
+import tempfile
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server")
+sys.path.insert(0, SERVER_DIR)
+
+import runtime_predictor
+from runtime_predictor import RuntimePredictor, header_duration, EWMA_ALPHA, MODIFIED_RUN_KEYS
+
+TMP_DIR = tempfile.mkdtemp()
+
+
+def _write(name, data):
+    path = os.path.join(TMP_DIR, name)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def _wav(seconds, sample_rate=16000):
+    data = b"\0" * int(seconds * sample_rate * 2)
+    fmt = struct.pack("<HHIIHH", 1, 1, sample_rate, sample_rate * 2, 2, 16)
+    # fmt 之前放一个奇数长度的 LIST 块，检查补齐字节的跳过
+    extra = b"LIST" + struct.pack("<I", 3) + b"abc\0"
+    body = b"WAVE" + extra + b"fmt " + struct.pack("<I", len(fmt)) + fmt + b"data" + struct.pack("<I", len(data)) + data
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, 立体声
+_MP3_FRAME = bytes([0xFF, 0xFB, 0x90, 0x00])
+
+
+def _id3():
+    return b"ID3\x03\x00\x00" + bytes([0, 0, 0, 20]) + b"\0" * 20
+
+
+def _mp4(timescale, duration):
+    def box(kind, payload):
+        return struct.pack(">I", 8 + len(payload)) + kind + payload
+
+    mvhd = box(b"mvhd", b"\0" * 4 + struct.pack(">IIII", 0, 0, timescale, duration) + b"\0" * 80)
+    return box(b"ftyp", b"M4A \0\0\0\0") + box(b"moov", mvhd)
+
+
+def _flac(sample_rate, total_samples):
+    packed = (sample_rate << 44) | (1 << 41) | (15 << 36) | total_samples
+    streaminfo = b"\0" * 10 + packed.to_bytes(8, "big") + b"\0" * 16
+    return b"fLaC" + bytes([0x80, 0, 0, 34]) + streaminfo
+
+
+def test_header_parsers():
+    assert abs(header_duration(_write("a.wav", _wav(2.0))) - 2.0) < 1e-6
+
+    # CBR：按首帧码率估算（ID3v2 头不计入）
+    cbr = _id3() + _MP3_FRAME + b"\0" * (16000 * 3 - 4)
+    assert abs(header_duration(_write("cbr.mp3", cbr)) - 3.0) < 1e-6
+    # Xing 头里的总帧数
+    xing = _MP3_FRAME + b"\0" * 32 + b"Xing" + struct.pack(">II", 1, 100) + b"\0" * 400
+    assert abs(header_duration(_write("vbr.mp3", xing)) - 100 * 1152 / 44100) < 1e-6
+
+    assert abs(header_duration(_write("a.m4a", _mp4(1000, 4500))) - 4.5) < 1e-6
+    assert abs(header_duration(_write("a.flac", _flac(16000, 80000))) - 5.0) < 1e-6
+
+    # 格式不对、被截断或不支持的扩展名返回 None，不抛异常
+    assert header_duration(_write("bad.wav", b"RIFF\0\0\0\0WAVX")) is None
+    assert header_duration(_write("cut.flac", b"fLaC\x80")) is None
+    assert header_duration(_write("a.ogg", b"OggS")) is None
+    print("✅ 文件头时长解析")
+
+
+def test_ewma_update():
+    with RuntimePredictor(os.path.join(tempfile.mkdtemp(), "history.db")) as predictor:
+        predictor.record("synthetic", 100, 10, model="base", load_seconds=2.0)
+        stats = predictor.record("synthetic", 100, 20, model="base", load_seconds=4.0)
+        assert stats["samples"] == 2
+        assert abs(stats["rtf"] - (0.1 + EWMA_ALPHA * 0.1)) < 1e-9, stats
+        [row] = predictor.stats()
+        assert abs(row["rtf_std"] - ((1 - EWMA_ALPHA) * EWMA_ALPHA * 0.01) ** 0.5) < 1e-4, row
+        assert abs(row["load_seconds"] - (2.0 + EWMA_ALPHA * 2.0)) < 1e-9, row
+
+        prediction = predictor.predict("synthetic", audio_seconds=50, model="base")
+        assert prediction["basis"] == "engine+model+compute_type+threads+language", prediction
+        assert abs(prediction["predicted_seconds"] - round(row["load_seconds"] + stats["rtf"] * 50, 1)) < 0.11
+
+        # 无效输入不记录
+        assert predictor.record("synthetic", 0, 10) is None
+    print("✅ RTF 指数加权更新")
+
+
+def _history():
+    with RuntimePredictor() as predictor:
+        return predictor.stats()
+
+
+def test_modified_runs_excluded():
+    # 耗时历史写到新的临时数据库（路径在调用时按环境变量取）
+    os.environ["RUNTIME_HISTORY_DB"] = os.path.join(tempfile.mkdtemp(), "runtime_history.db")
+    prediction = {"engine": "synthetic", "model": "tiny", "audio_seconds": 60.0}
+    for key in MODIFIED_RUN_KEYS:
+        result = {"success": True, key: {"applied": True}}
+        runtime_predictor.finish_job(result, dict(prediction), 6.0)
+        assert result["runtime_prediction"]["actual_seconds"] == 6.0
+    assert _history() == [], "截止时间降级 / 二次解码等任务不应写入耗时历史"
+
+    runtime_predictor.finish_job({"success": False, "error": "x"}, dict(prediction), 6.0)
+    assert _history() == [], "失败的任务不应写入耗时历史"
+
+    runtime_predictor.finish_job({"success": True}, dict(prediction), 6.0, load_seconds=1.2)
+    [row] = _history()
+    assert row["engine"] == "synthetic" and row["model"] == "tiny"
+    assert abs(row["rtf"] - (6.0 - 1.2) / 60.0) < 1e-4, row
+    print("✅ 改变解码量的任务不计入耗时历史")
+
+
+if __name__ == "__main__":
+    try:
+        test_header_parsers()
+        test_ewma_update()
+        test_modified_runs_excluded()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
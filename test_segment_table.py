@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+列式片段表测试
+合并相邻片段时保留附加字段，置信度导出后与输入数值一致
+"""
+
+import os
+import sys
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server")
+sys.path.insert(0, SERVER_DIR)
+
+from segment_table import SegmentTable
+from alignment_service import merge_adjacent_segments
+
+SEGMENTS = [
+    {"start": 0.0, "end": 1.0, "text": "第一句", "speaker": "SPEAKER_00", "confidence": 0.9,
+     "emotions": ["激动"], "avg_logprob": -0.31},
+    {"start": 1.5, "end": 2.0, "text": "第二句", "speaker": "SPEAKER_00", "confidence": 0.7},
+    {"start": 5.0, "end": 6.0, "text": "第三句", "speaker": "SPEAKER_01", "confidence": 0.3, "words": []},
+]
+
+
+def test_merge_keeps_extra_fields():
+    merged = merge_adjacent_segments([dict(seg) for seg in SEGMENTS])
+    assert len(merged) == 2, merged
+    first, second = merged
+    assert first["text"] == "第一句 第二句" and first["end"] == 2.0 and first["duration"] == 2.0
+    assert first["emotions"] == ["激动"] and first["avg_logprob"] == -0.31, first
+    assert first["end_formatted"] == "00:00:02", first
+    assert second["words"] == [], second
+    print("✅ 合并后保留附加字段")
+
+
+def test_confidence_round_trip():
+    for segments in (SEGMENTS, merge_adjacent_segments([dict(seg) for seg in SEGMENTS])):
+        exported = SegmentTable.from_segments(segments).to_segments()
+        assert [seg["confidence"] for seg in exported] == [seg["confidence"] for seg in segments], exported
+    # 不要求附加字段时不带回
+    assert "emotions" not in SegmentTable.from_segments(SEGMENTS).to_segments()[0]
+    print("✅ 置信度导出与输入一致")
+
+
+if __name__ == "__main__":
+    try:
+        test_merge_keeps_extra_fields()
+        test_confidence_round_trip()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
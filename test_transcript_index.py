@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+转录索引区间树测试
+检查 stab 的半开区间语义：相邻区间在边界点只命中后一个
+"""
+
+import os
+import sys
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server")
+sys.path.insert(0, SERVER_DIR)
+
+from transcript_index import IntervalTree
+
+
+def test_stab_boundary():
+    tree = IntervalTree([0.0, 5.0], [5.0, 10.0])
+    assert tree.stab(5.0) == [1], f"边界点 5.0 应只命中 (5, 10)，实际 {tree.stab(5.0)}"
+    assert tree.stab(0.0) == [0]
+    assert tree.stab(4.999) == [0]
+    assert tree.stab(10.0) == []
+
+    # 零长度区间不包含任何时间点
+    assert IntervalTree([3.0], [3.0]).stab(3.0) == []
+    print("✅ stab 边界语义正确")
+
+
+if __name__ == "__main__":
+    try:
+        test_stab_boundary()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
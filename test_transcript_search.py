@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+转录检索索引测试
+检查检索、重建索引（旧片段被替换、其他剧集不受影响）、删除，以及旧版本索引库的兼容
+"""
+
+import os
+import sys
+import sqlite3
+import tempfile
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server")
+sys.path.insert(0, SERVER_DIR)
+
+from transcript_search import TranscriptSearchIndex
+
+EPISODE_A = [
+    {"start": 0.0, "end": 3.0, "text": "今天我们聊一聊大模型", "speaker": "SPEAKER_00"},
+    {"start": 3.0, "end": 6.0, "text": "", "speaker": "SPEAKER_00"},
+    {"start": 6.0, "end": 9.0, "text": "Transformer architecture", "speaker": "SPEAKER_01"},
+]
+EPISODE_B = [{"start": 0.0, "end": 2.0, "text": "创业公司的融资", "speaker": "SPEAKER_00"}]
+
+
+def _paths(hits):
+    return sorted(os.path.basename(hit["path"]) for hit in hits)
+
+
+def test_index_and_reindex():
+    tmp = tempfile.mkdtemp()
+    a, b = os.path.join(tmp, "a_transcript.json"), os.path.join(tmp, "b_transcript.json")
+    with TranscriptSearchIndex(os.path.join(tmp, "index.db")) as index:
+        assert index.index_episode(a, EPISODE_A, mtime=1.0) == 2, "空文本片段不入索引"
+        assert index.index_episode(b, EPISODE_B, mtime=1.0) == 1
+        assert _paths(index.search("大模型")) == ["a_transcript.json"]
+        assert index.search("transformer", speaker="SPEAKER_01")[0]["start"] == 6.0
+        assert index.search("transformer", speaker="SPEAKER_00") == []
+
+        # 重建 a：旧片段全部替换，b 不受影响
+        assert index.index_episode(a, [{"start": 0.0, "end": 1.0, "text": "新的一期讲融资"}], mtime=2.0) == 1
+        assert index.search("大模型") == []
+        assert _paths(index.search("融资")) == ["a_transcript.json", "b_transcript.json"]
+        assert index.stats() == {"episodes": 2, "segments": 2}
+
+        # 重建最后写入的剧集不会覆盖别的剧集的行号
+        assert index.index_episode(b, EPISODE_B + EPISODE_A, mtime=2.0) == 3
+        assert index.index_episode(a, EPISODE_A, mtime=3.0) == 2
+        assert index.stats() == {"episodes": 2, "segments": 5}
+
+        index.remove_episode(b)
+        assert _paths(index.search("融资")) == []
+        assert _paths(index.search("大模型")) == ["a_transcript.json"]
+        assert index.stats() == {"episodes": 1, "segments": 2}
+    print("✅ 检索与增量重建")
+
+
+def test_delete_by_rowid():
+    tmp = tempfile.mkdtemp()
+    with TranscriptSearchIndex(os.path.join(tmp, "index.db")) as index:
+        plan = " ".join(str(row[-1]) for row in index.conn.execute(
+            "EXPLAIN QUERY PLAN DELETE FROM segments WHERE rowid BETWEEN 1 AND 5"))
+        assert "VIRTUAL TABLE INDEX" in plan, plan
+    print("✅ 按行号范围删除")
+
+
+def test_legacy_index():
+    tmp = tempfile.mkdtemp()
+    db_path = os.path.join(tmp, "index.db")
+    path = os.path.join(tmp, "old_transcript.json")
+    # 旧版本的表结构：episodes 没有行号范围列
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE episodes (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, title TEXT,
+                               source_url TEXT, mtime REAL, indexed_at REAL);
+        CREATE VIRTUAL TABLE segments USING fts5(tokens, text UNINDEXED, episode_id UNINDEXED,
+                                                 start UNINDEXED, end UNINDEXED, speaker UNINDEXED);
+    """)
+    conn.execute("INSERT INTO episodes (id, path) VALUES (1, ?)", (path,))
+    conn.execute("INSERT INTO segments (tokens, text, episode_id) VALUES ('旧 内 容', '旧内容', 1)")
+    conn.commit()
+    conn.close()
+
+    with TranscriptSearchIndex(db_path) as index:
+        index.index_episode(path, EPISODE_B, mtime=1.0)
+        assert index.search("旧内容") == []
+        assert _paths(index.search("融资")) == ["old_transcript.json"]
+    print("✅ 兼容旧版本索引库")
+
+
+if __name__ == "__main__":
+    try:
+        test_index_and_reindex()
+        test_delete_by_rowid()
+        test_legacy_index()
+    except AssertionError as e:
+        print(f"❌ {e}")
+        sys.exit(1)